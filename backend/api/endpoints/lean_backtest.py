@@ -8,7 +8,12 @@ from fastapi import APIRouter, HTTPException, BackgroundTasks
 from pydantic import BaseModel
 
 from services.lean_backtest_service import (
-    lean_service, BacktestRequest, BacktestResult, StrategyPerformance
+    lean_service, BacktestRequest, BacktestResult, BacktestSummary, StrategyPerformance
+)
+from services.backtest_executor import backtest_executor
+from services.parameter_sweep import sweep_service, sweep_executor, SweepRequest, SweepResult
+from services.robustness_service import (
+    robustness_service, AnalysisResult, MonteCarloRequest, WalkForwardRequest
 )
 
 logger = logging.getLogger(__name__)
@@ -25,7 +30,10 @@ class StartBacktestResponse(BaseModel):
 class BacktestListResponse(BaseModel):
     """回测列表响应"""
     active_backtests: List[BacktestResult]
-    historical_backtests: List[BacktestResult]
+    historical_backtests: List[BacktestSummary]
+    total: int
+    limit: int
+    offset: int
 
 
 class StrategyTemplateResponse(BaseModel):
@@ -53,6 +61,8 @@ async def start_backtest(
     - initial_capital: 初始资金（默认10000）
     - parameters: 策略参数
     - data_source: 数据源（yfinance, alpha_vantage, akshare）
+    - priority: 排队优先级，数值越小越先执行（默认0）
+    - engine: backtesting（默认，逐K线执行）或 vectorized（内置模板的向量化引擎，自定义策略自动回退到 backtesting）
     """
     try:
         backtest_id = await lean_service.start_backtest(request)
@@ -72,7 +82,7 @@ async def get_backtest_status(backtest_id: str):
     """
     获取回测状态和结果
     """
-    result = lean_service.get_backtest_status(backtest_id)
+    result = await lean_service.get_backtest_status(backtest_id)
     
     if not result:
         raise HTTPException(status_code=404, detail="回测不存在")
@@ -81,19 +91,33 @@ async def get_backtest_status(backtest_id: str):
 
 
 @router.get("/backtest/list", response_model=BacktestListResponse)
-async def list_backtests(strategy_id: Optional[str] = None):
+async def list_backtests(strategy_id: Optional[str] = None, limit: int = 50, offset: int = 0):
     """
     获取回测列表
     
     参数:
     - strategy_id: 可选，按策略ID过滤
+    - limit: 历史记录每页条数（默认50，最多500）
+    - offset: 历史记录偏移量
+    
+    历史记录按创建时间倒序分页，只包含摘要和统计指标，完整结果通过 /backtest/status/{backtest_id} 获取
     """
-    historical = lean_service.get_all_backtests(strategy_id)
-    active = list(lean_service.active_backtests.values())
+    try:
+        total, historical = await lean_service.get_all_backtests(strategy_id, limit, offset)
+    except Exception as e:
+        logger.error(f"获取回测历史失败: {e}")
+        raise HTTPException(status_code=500, detail=f"获取回测历史失败: {str(e)}")
+    active = [
+        result for result in lean_service.active_backtests.values()
+        if not strategy_id or result.strategy_id == strategy_id
+    ]
     
     return BacktestListResponse(
         active_backtests=active,
-        historical_backtests=historical
+        historical_backtests=historical,
+        total=total,
+        limit=limit,
+        offset=offset
     )
 
 
@@ -102,7 +126,7 @@ async def cancel_backtest(backtest_id: str):
     """
     取消正在运行的回测
     """
-    success = lean_service.cancel_backtest(backtest_id)
+    success = await lean_service.cancel_backtest(backtest_id)
     
     if not success:
         raise HTTPException(status_code=404, detail="回测不存在或无法取消")
@@ -110,6 +134,180 @@ async def cancel_backtest(backtest_id: str):
     return {"message": "回测已取消", "backtest_id": backtest_id}
 
 
+@router.delete("/backtest/{backtest_id}")
+async def delete_backtest(backtest_id: str):
+    """
+    删除已结束的回测记录
+    """
+    try:
+        success = await lean_service.delete_backtest(backtest_id)
+    except Exception as e:
+        logger.error(f"删除回测失败: {e}")
+        raise HTTPException(status_code=500, detail=f"删除回测失败: {str(e)}")
+    
+    if not success:
+        raise HTTPException(status_code=404, detail="回测不存在或仍在运行")
+    
+    return {"message": "回测已删除", "backtest_id": backtest_id}
+
+
+@router.post("/backtest/sweep", response_model=StartBacktestResponse)
+async def start_parameter_sweep(request: SweepRequest):
+    """
+    启动参数扫描（网格搜索）
+    
+    参数:
+    - strategy_id: 策略ID
+    - symbol: 交易标的
+    - start_date / end_date: 回测区间（YYYY-MM-DD）
+    - parameter_grid: 参数名 -> {"start", "stop", "step"}（含终点）或取值列表，
+      例如 {"fast_period": {"start": 5, "stop": 50, "step": 5}, "slow_period": [20, 50, 100, 200]}
+    - fixed_parameters: 不参与扫描的固定参数
+    - metric: 排名指标（默认 sharpe_ratio）
+    - engine: backtesting（默认）或 vectorized
+    """
+    try:
+        sweep_id = await sweep_service.start_sweep(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"启动参数扫描失败: {e}")
+        raise HTTPException(status_code=500, detail=f"启动参数扫描失败: {str(e)}")
+    
+    return StartBacktestResponse(
+        backtest_id=sweep_id,
+        status="started",
+        message=f"参数扫描已启动，ID: {sweep_id}"
+    )
+
+
+@router.get("/backtest/sweep/{sweep_id}", response_model=SweepResult)
+async def get_parameter_sweep(sweep_id: str, limit: int = 100):
+    """
+    获取参数扫描进度和结果（排名表只返回前 limit 名，热力图矩阵包含全部组合）
+    """
+    result = sweep_service.get_sweep(sweep_id)
+    
+    if not result:
+        raise HTTPException(status_code=404, detail="参数扫描不存在")
+    
+    return result.model_copy(update={"results": result.results[:limit]})
+
+
+@router.get("/backtest/sweeps")
+async def list_parameter_sweeps(strategy_id: Optional[str] = None):
+    """
+    获取参数扫描列表（不含结果明细）
+    """
+    return [
+        result.model_dump(exclude={"results", "heatmap", "logs"})
+        for result in sweep_service.get_all_sweeps(strategy_id)
+    ]
+
+
+@router.post("/backtest/sweep/cancel/{sweep_id}")
+async def cancel_parameter_sweep(sweep_id: str):
+    """
+    取消正在运行的参数扫描
+    """
+    if not sweep_service.cancel_sweep(sweep_id):
+        raise HTTPException(status_code=404, detail="参数扫描不存在或已结束")
+    
+    return {"message": "参数扫描已取消", "sweep_id": sweep_id}
+
+
+@router.post("/backtest/walk-forward", response_model=StartBacktestResponse)
+async def start_walk_forward(request: WalkForwardRequest):
+    """
+    启动前向滚动分析
+    
+    参数:
+    - parameter_grid: 每个训练窗口内寻优的参数网格（格式同参数扫描）
+    - metric: 寻优指标（默认 sharpe_ratio）
+    - train_bars / test_bars: 训练、测试窗口的K线数（默认 252 / 63），测试窗口首尾相接
+    - anchored: 训练窗口是否固定从第一根K线开始
+    - engine: vectorized（默认）或 backtesting
+    """
+    try:
+        analysis_id = await robustness_service.start_walk_forward(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"启动前向分析失败: {e}")
+        raise HTTPException(status_code=500, detail=f"启动前向分析失败: {str(e)}")
+    
+    return StartBacktestResponse(
+        backtest_id=analysis_id,
+        status="started",
+        message=f"前向分析已启动，ID: {analysis_id}"
+    )
+
+
+@router.post("/backtest/monte-carlo", response_model=StartBacktestResponse)
+async def start_monte_carlo(request: MonteCarloRequest):
+    """
+    启动蒙特卡洛分析：对已完成回测（或前向分析）的逐笔收益率重抽样
+    
+    参数:
+    - source_id: 回测ID或前向分析ID
+    - simulations: 模拟次数（默认10000）
+    - method: bootstrap（有放回抽样）或 shuffle（打乱交易顺序）
+    - percentiles: 输出的分位数
+    - seed: 随机种子（可复现）
+    """
+    try:
+        analysis_id = await robustness_service.start_monte_carlo(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"启动蒙特卡洛分析失败: {e}")
+        raise HTTPException(status_code=500, detail=f"启动蒙特卡洛分析失败: {str(e)}")
+    
+    return StartBacktestResponse(
+        backtest_id=analysis_id,
+        status="started",
+        message=f"蒙特卡洛分析已启动，ID: {analysis_id}"
+    )
+
+
+@router.get("/backtest/analysis/{analysis_id}", response_model=AnalysisResult)
+async def get_analysis(analysis_id: str):
+    """
+    获取稳健性分析的进度和结果
+    """
+    result = robustness_service.get_analysis(analysis_id)
+    
+    if not result:
+        raise HTTPException(status_code=404, detail="分析不存在")
+    
+    return result
+
+
+@router.get("/backtest/analyses")
+async def list_analyses(kind: Optional[str] = None):
+    """
+    获取稳健性分析列表（不含结果明细）
+    
+    参数:
+    - kind: 可选，walk_forward 或 monte_carlo
+    """
+    return [
+        result.model_dump(exclude={"result", "logs"})
+        for result in robustness_service.get_all_analyses(kind)
+    ]
+
+
+@router.post("/backtest/analysis/cancel/{analysis_id}")
+async def cancel_analysis(analysis_id: str):
+    """
+    取消正在运行的稳健性分析
+    """
+    if not robustness_service.cancel_analysis(analysis_id):
+        raise HTTPException(status_code=404, detail="分析不存在或已结束")
+    
+    return {"message": "分析已取消", "analysis_id": analysis_id}
+
+
 @router.get("/strategies/templates")
 async def get_strategy_templates():
     """
@@ -198,5 +396,7 @@ async def health_check():
         "status": "healthy",
         "service": "lean_backtest_service",
         "active_backtests": len(lean_service.active_backtests),
-        "historical_backtests": len(lean_service.backtest_history)
+        "historical_backtests": lean_service.store.count(),
+        "executor": backtest_executor.get_stats(),
+        "sweep_executor": sweep_executor.get_stats()
     }
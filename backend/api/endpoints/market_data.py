@@ -1,16 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
 
 from database import get_db
-from models.market_data import Kline, KlineCreate, TickerData, MarketType, Timeframe
+from models.market_data import Kline, KlineBase, KlineCreate, TickerData, CandleSeries, MarketType, Timeframe
 from services.data_service import DataService
 from services.data_quality_monitor import data_quality_monitor
+from services.wire_format import MSGPACK_MEDIA_TYPE, packb, wants_msgpack
 
 router = APIRouter()
 
-@router.get("/klines", response_model=List[Kline])
+
+def _candle_response(klines, symbol: str, market_type: MarketType, exchange: str,
+                     timeframe: Timeframe, accept: Optional[str]):
+    """按 Accept 头返回K线：MessagePack 时为列式类型化数组，否则保持原有 JSON 列表"""
+    if klines:
+        series = CandleSeries.from_klines(klines)
+    else:
+        series = CandleSeries.empty(symbol, market_type, exchange, timeframe)
+    if wants_msgpack(accept):
+        return Response(content=packb(series.to_columns()), media_type=MSGPACK_MEDIA_TYPE,
+                        headers={"Vary": "Accept"})
+    return series.to_dicts()
+
+
+@router.get("/klines", response_model=List[KlineBase])
 async def get_klines(
     symbol: str = Query(..., description="交易对符号，如 BTC/USDT"),
     market_type: MarketType = Query(..., description="市场类型"),
@@ -19,6 +35,7 @@ async def get_klines(
     start_time: Optional[datetime] = Query(None, description="开始时间"),
     end_time: Optional[datetime] = Query(None, description="结束时间"),
     limit: int = Query(1000, description="返回数据条数", ge=1, le=10000),
+    accept: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
     """
@@ -35,7 +52,7 @@ async def get_klines(
             end_time=end_time,
             limit=limit
         )
-        return klines
+        return _candle_response(klines, symbol, market_type, exchange, timeframe, accept)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取K线数据失败: {str(e)}")
 
@@ -132,7 +149,8 @@ async def get_historical_data(
     market_type: MarketType,
     exchange: str,
     timeframe: Timeframe,
-    days: int = Query(30, description="历史天数", ge=1, le=365)
+    days: int = Query(30, description="历史天数", ge=1, le=365),
+    accept: Optional[str] = Header(None)
 ):
     """
     获取历史数据
@@ -150,7 +168,7 @@ async def get_historical_data(
             start_time=start_time,
             end_time=end_time
         )
-        return historical_data
+        return _candle_response(historical_data, symbol, market_type, exchange, timeframe, accept)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取历史数据失败: {str(e)}")
 
@@ -1,6 +1,7 @@
 """
 形态识别API端点
 """
+import asyncio
 from fastapi import APIRouter, HTTPException, Query
 from typing import List, Optional
 from pydantic import BaseModel, Field
@@ -187,9 +188,7 @@ async def scan_patterns(
         if len(symbol_list) > 50:
             raise HTTPException(status_code=400, detail="最多同时扫描50个品种")
         
-        results = []
-        
-        for symbol in symbol_list:
+        async def scan_symbol(symbol: str) -> Optional[dict]:
             try:
                 # 获取K线数据
                 klines = await data_service.get_klines(
@@ -201,7 +200,7 @@ async def scan_patterns(
                 )
                 
                 if not klines:
-                    continue
+                    return None
                 
                 # 检测形态
                 pattern_matches = await pattern_recognition_service.detect_all_patterns(
@@ -210,7 +209,7 @@ async def scan_patterns(
                 )
                 
                 if pattern_matches:
-                    results.append({
+                    return {
                         "symbol": symbol,
                         "pattern_count": len(pattern_matches),
                         "patterns": [
@@ -222,11 +221,16 @@ async def scan_patterns(
                             }
                             for m in pattern_matches[:3]  # 只返回前3个最高置信度形态
                         ]
-                    })
+                    }
                     
             except Exception as e:
                 # 单个品种失败不影响其他品种
-                continue
+                return None
+            return None
+        
+        # 各品种的K线并发获取（数据源并发度由数据服务统一限制）
+        scanned = await asyncio.gather(*(scan_symbol(symbol) for symbol in symbol_list))
+        results = [result for result in scanned if result is not None]
         
         return {
             "total_symbols": len(symbol_list),
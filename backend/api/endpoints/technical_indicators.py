@@ -2,12 +2,38 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+from pydantic import BaseModel, Field
 
 from database import get_db
-from services.technical_analysis_service import technical_analysis_service
+from models.market_data import CandleSeries, MarketType, Timeframe
+from services.technical_analysis_service import batch_result_keys, technical_analysis_service
+from services.data_service import data_service
 
 router = APIRouter()
 
+
+class IndicatorSpec(BaseModel):
+    """批量计算中的单个指标定义"""
+    name: str = Field(..., description="指标名称，如 SMA、EMA、MACD、RSI、BOLLINGER、ATR、STOCHASTIC、CCI、MOMENTUM、VWAP")
+    params: Dict[str, Any] = Field(default_factory=dict, description="指标参数，如 {\"period\": 20}")
+    id: Optional[str] = Field(None, description="结果键，默认由名称和参数生成")
+
+
+class BatchIndicatorRequest(BaseModel):
+    """批量指标计算请求：提供 symbol 时从数据服务取K线，否则使用请求体中的价格数组"""
+    symbol: Optional[str] = Field(None, description="交易对符号")
+    market_type: MarketType = Field(MarketType.CRYPTO, description="市场类型")
+    exchange: Optional[str] = Field(None, description="交易所名称")
+    timeframe: Timeframe = Field(Timeframe.H1, description="时间周期")
+    limit: int = Field(500, ge=1, le=10000, description="K线数量")
+    prices: Optional[List[float]] = Field(None, description="收盘价数组（close 的别名）")
+    open: Optional[List[float]] = None
+    high: Optional[List[float]] = None
+    low: Optional[List[float]] = None
+    close: Optional[List[float]] = None
+    volume: Optional[List[float]] = None
+    indicators: List[IndicatorSpec] = Field(..., min_length=1, description="指标定义列表")
+
 @router.get("/indicators")
 async def get_available_indicators():
     """
@@ -76,6 +102,63 @@ async def calculate_technical_indicators(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"计算技术指标失败: {str(e)}")
 
+@router.post("/batch")
+async def calculate_indicators_batch(request: BatchIndicatorRequest):
+    """
+    批量计算技术指标
+    
+    一次请求计算多个指标，EMA、前缀和、真实波幅等中间结果在指标间共享，只计算一次。
+    """
+    try:
+        specs = [spec.model_dump() for spec in request.indicators]
+        # 取K线之前先检查结果键，重复的键直接返回 400
+        batch_result_keys(specs)
+        timestamps = None
+        if request.symbol:
+            exchange = request.exchange or ("binance" if request.market_type == MarketType.CRYPTO else "nasdaq")
+            klines = await data_service.get_klines(
+                symbol=request.symbol,
+                market_type=request.market_type,
+                exchange=exchange,
+                timeframe=request.timeframe,
+                limit=request.limit
+            )
+            series = CandleSeries.from_klines(klines).tail(request.limit)
+            sources = {
+                "open": series.open,
+                "high": series.high,
+                "low": series.low,
+                "close": series.close,
+                "volume": series.volume
+            }
+            timestamps = series.timestamp.tolist()
+        else:
+            close = request.close if request.close is not None else request.prices
+            if close is None:
+                raise HTTPException(status_code=400, detail="需要提供 symbol 或价格数组")
+            sources = {
+                "open": request.open,
+                "high": request.high,
+                "low": request.low,
+                "close": close,
+                "volume": request.volume
+            }
+        
+        batch = technical_analysis_service.calculate_batch(sources, specs)
+        return {
+            "symbol": request.symbol,
+            "timeframe": request.timeframe.value if request.symbol else None,
+            "count": len(sources["close"]),
+            "timestamps": timestamps,
+            **batch
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"批量计算技术指标失败: {str(e)}")
+
 @router.get("/ma")
 async def calculate_moving_averages(
     prices: List[float] = Query(..., description="价格数据"),
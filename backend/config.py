@@ -28,9 +28,46 @@ class Settings(BaseSettings):
     INFLUXDB_ORG: str = "omnimarket"
     INFLUXDB_BUCKET: str = "market_data"
     
+    # InfluxDB批量写入配置
+    INFLUX_WRITE_BATCH_SIZE: int = 5000  # 每批最多写入的点数
+    INFLUX_WRITE_FLUSH_INTERVAL: float = 1.0  # 未满一批时的最长等待（秒）
+    INFLUX_WRITE_MAX_PENDING: int = 100000  # 队列中待写入点数上限，超过时丢弃新数据
+    INFLUX_WRITE_MAX_RETRIES: int = 3  # 写入失败的重试次数（指数退避）
+    
+    # 本地K线历史库配置
+    CANDLE_STORE_ENABLED: bool = True
+    CANDLE_STORE_DIR: str = "./data/candles"  # 按 市场/交易所/品种/周期/月份 分区的列式文件
+    
+    # 回测进程池配置
+    BACKTEST_MAX_WORKERS: int = 2  # 同时运行的回测数（每个回测占用一个工作进程）
+    BACKTEST_START_METHOD: str = "spawn"  # 工作进程启动方式：spawn（跨平台）、fork 或 forkserver
+    BACKTEST_SWEEP_WORKERS: int = 0  # 参数扫描的工作进程数，0 表示使用全部 CPU 核心
+    BACKTEST_SWEEP_MAX_COMBINATIONS: int = 10000  # 单次参数扫描允许的最大参数组合数
+    BACKTEST_SWEEP_HISTORY: int = 20  # 内存中保留的已结束参数扫描数，超出时淘汰最早创建的
+    BACKTEST_MONTE_CARLO_MAX_SIMULATIONS: int = 100000  # 单次蒙特卡洛分析允许的最大模拟次数
+    BACKTEST_ANALYSIS_HISTORY: int = 20  # 内存中保留的已结束稳健性分析数，超出时淘汰最早创建的
+    
     # Redis配置
     REDIS_URL: str = "redis://localhost:6379"
     
+    # 缓存配置
+    CACHE_MAX_MEMORY_MB: int = 256  # 进程内缓存（L1）内存上限
+    CACHE_EVICTION_POLICY: str = "lru"  # L1淘汰策略：lru 或 lfu
+    CACHE_REDIS_ENABLED: bool = True  # Redis可用时作为二级缓存（L2），多个worker共享
+    
+    # WebSocket推送配置
+    WS_SEND_QUEUE_SIZE: int = 256  # 每个连接的待发送消息上限
+    WS_SLOW_CONSUMER_POLICY: str = "drop_oldest"  # 队列满时的处理：drop_oldest、conflate（按品种合并）或 disconnect
+    WS_TICK_FLUSH_MS: int = 200  # 行情合并推送间隔（毫秒）
+    
+    # 多 worker 背板配置
+    BACKPLANE_BACKEND: str = "memory"  # memory（单进程）或 redis（多个 worker 共享行情推送）
+    BACKPLANE_REDIS_URL: str = ""  # 为空时使用 REDIS_URL
+    BACKPLANE_LEADER_TTL: float = 15.0  # 行情主节点租约时长（秒）
+    
+    # 交易所配置
+    CRYPTO_EXCHANGES: List[str] = ["binance", "okx", "bybit"]  # 交易所连接池中可用的交易所（ccxt id）
+    
     # API密钥配置
     BINANCE_API_KEY: str = ""
     BINANCE_SECRET_KEY: str = ""
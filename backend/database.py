@@ -3,7 +3,6 @@ from sqlalchemy import create_engine, MetaData, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from influxdb_client import InfluxDBClient
-from influxdb_client.client.write_api import SYNCHRONOUS
 import redis
 import asyncio
 import time
@@ -15,6 +14,12 @@ logger = logging.getLogger(__name__)
 # 优化的SQLAlchemy配置
 from sqlalchemy.pool import QueuePool
 
+# SQLite 驱动不接受 connect_timeout（对应参数为 timeout），且连接会在线程池之间复用
+if settings.DATABASE_URL.startswith("sqlite"):
+    connect_args = {"timeout": 10, "check_same_thread": False}
+else:
+    connect_args = {"connect_timeout": 10}
+
 engine = create_engine(
     settings.DATABASE_URL,
     poolclass=QueuePool,
@@ -24,9 +29,7 @@ engine = create_engine(
     pool_recycle=3600,         # 连接回收时间（1小时）
     pool_pre_ping=True,        # 使用前测试连接
     echo=False,                # 生产环境不打印SQL
-    connect_args={
-        "connect_timeout": 10
-    }
+    connect_args=connect_args
 )
 
 # 监听连接池事件（性能监控）
@@ -69,7 +72,8 @@ async def init_db():
             token=settings.INFLUXDB_TOKEN,
             org=settings.INFLUXDB_ORG
         )
-        influx_write_api = influx_client.write_api(write_options=SYNCHRONOUS)
+        # 写入由 services.influx_writer 在后台异步批量完成，这里不创建同步写入接口
+        influx_write_api = None
         influx_query_api = influx_client.query_api()
         logger.info("InfluxDB连接成功")
         
@@ -123,6 +127,7 @@ async def create_tables():
         from models.market_data import MarketData, KlineData
         from models.alerts import Alert
         from models.users import User
+        from models.backtest import BacktestRecord, BacktestPayload
         
         Base.metadata.create_all(bind=engine)
         logger.info("数据库表创建成功")
@@ -13,7 +13,6 @@ from contextlib import asynccontextmanager
 import asyncio
 import uvicorn
 from typing import List, Dict, Any
-import json
 import logging
 
 from backend.config import settings
@@ -21,7 +20,7 @@ from backend.database import init_db
 from backend.api.routes import api_router
 from backend.services.data_service import DataService
 from backend.services.alert_service import alert_service
-from backend.services.websocket_manager import websocket_manager
+from backend.services.websocket_manager import ASGIConnection, websocket_manager
 from backend.services.warrants_monitoring_service import warrants_monitoring_service
 from backend.services.data_quality_monitor import data_quality_monitor
 
@@ -46,6 +45,14 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"性能监控服务启动警告: {e}")
     
+    # 启动InfluxDB批量写入
+    logger.info("启动InfluxDB批量写入...")
+    from backend.services.influx_writer import influx_writer
+    try:
+        await influx_writer.start()
+    except Exception as e:
+        logger.warning(f"InfluxDB批量写入启动警告: {e}")
+    
     # 启动数据服务（使用全局实例）
     logger.info("启动数据服务...")
     from backend.services.data_service import data_service
@@ -101,6 +108,28 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"关闭数据服务时出错: {e}")
     
+    logger.info("关闭InfluxDB批量写入...")
+    try:
+        await influx_writer.stop()
+    except Exception as e:
+        logger.warning(f"关闭InfluxDB批量写入时出错: {e}")
+    
+    logger.info("关闭回测进程池...")
+    try:
+        from backend.services.backtest_executor import backtest_executor
+        from backend.services.parameter_sweep import sweep_executor
+        backtest_executor.shutdown()
+        sweep_executor.shutdown()
+    except Exception as e:
+        logger.warning(f"关闭回测进程池时出错: {e}")
+    
+    logger.info("关闭数据源线程池...")
+    try:
+        from backend.services.provider_executor import provider_executor
+        provider_executor.shutdown()
+    except Exception as e:
+        logger.warning(f"关闭数据源线程池时出错: {e}")
+    
     logger.info("关闭WebSocket管理器...")
     try:
         await websocket_manager.stop()
@@ -131,15 +160,21 @@ app.include_router(api_router, prefix="/api/v1")
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await websocket_manager.register(websocket)
+    await websocket.accept()
+    connection = ASGIConnection(websocket)
+    await websocket_manager.register(connection)
     try:
         while True:
-            data = await websocket.receive_text()
-            # 处理客户端消息
-            message = json.loads(data)
-            await websocket_manager.handle_message(websocket, message)
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                break
+            # 原样交给管理器解码：文本帧为 JSON，二进制帧为 MessagePack
+            text = frame.get("text")
+            await websocket_manager.handle_message(connection, text if text is not None else frame.get("bytes"))
     except WebSocketDisconnect:
-        await websocket_manager.unregister(websocket)
+        pass
+    finally:
+        await websocket_manager.unregister(connection)
 
 @app.get("/")
 async def root():
@@ -1,7 +1,8 @@
 # Models package initialization
-from .market_data import MarketData, KlineData
+from .market_data import MarketData, KlineData, Candle, CandleSeries
 from .alerts import Alert
 from .users import User
 from .assistant import StrategyInstance, ExecutionHistory, SimpleReport
+from .backtest import BacktestRecord, BacktestPayload
 
-__all__ = ["MarketData", "KlineData", "Alert", "User", "StrategyInstance", "ExecutionHistory", "SimpleReport"]
+__all__ = ["MarketData", "KlineData", "Candle", "CandleSeries", "Alert", "User", "StrategyInstance", "ExecutionHistory", "SimpleReport", "BacktestRecord", "BacktestPayload"]
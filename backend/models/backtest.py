@@ -0,0 +1,31 @@
+from sqlalchemy import Column, String, Text, JSON, LargeBinary, ForeignKey, Index
+from database import Base
+
+
+class BacktestRecord(Base):
+    """回测摘要：状态、统计指标和时间，列表查询只读这张表"""
+    __tablename__ = "backtest_results"
+    __table_args__ = (
+        Index("ix_backtest_results_strategy_created", "strategy_id", "created_at"),
+        {'extend_existing': True}
+    )
+
+    backtest_id = Column(String(128), primary_key=True)
+    strategy_id = Column(String(64), nullable=False)
+    status = Column(String(16), nullable=False)
+    statistics = Column(JSON, default=dict)
+    error_message = Column(Text, nullable=True)
+    created_at = Column(String(32), nullable=False, index=True)  # ISO 格式，字典序即时间序
+    completed_at = Column(String(32), nullable=True)
+
+
+class BacktestPayload(Base):
+    """回测明细：日志、权益曲线和交易记录，均为压缩后的二进制"""
+    __tablename__ = "backtest_payloads"
+    __table_args__ = {'extend_existing': True}
+
+    backtest_id = Column(String(128), ForeignKey("backtest_results.backtest_id", ondelete="CASCADE"),
+                         primary_key=True)
+    logs = Column(LargeBinary, nullable=False)
+    equity_curve = Column(LargeBinary, nullable=False)  # 列式编码，见 services.backtest_store
+    trades = Column(LargeBinary, nullable=False)
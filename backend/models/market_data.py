@@ -2,9 +2,13 @@ from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text,
 from sqlalchemy.sql import func
 from database import Base
 import enum
-from typing import Optional
+import json
+import struct
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, Iterable, Iterator, NamedTuple, Union
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import datetime, date
+import numpy as np
 
 class MarketType(enum.Enum):
     STOCK = "stock"
@@ -115,3 +119,314 @@ class OrderBookSnapshot(BaseModel):
     timestamp: datetime
     bids: list  # list of [price, volume]
     asks: list  # list of [price, volume]
+
+
+def _to_epoch_ms(value: Any) -> int:
+    """把 datetime / date / ISO 字符串 / 数值时间戳统一转换为毫秒时间戳
+
+    无时区的 datetime 按本地时间处理，与 datetime.fromtimestamp 的反向转换保持一致。
+    """
+    if isinstance(value, datetime):
+        return int(round(value.timestamp() * 1000))
+    if isinstance(value, date):
+        return _to_epoch_ms(datetime(value.year, value.month, value.day))
+    if isinstance(value, str):
+        return int(round(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() * 1000))
+    if hasattr(value, "to_pydatetime"):
+        return _to_epoch_ms(value.to_pydatetime())
+    return int(value)
+
+
+class Candle(NamedTuple):
+    """单根K线的只读视图，属性名与 KlineData 一致，便于逐根访问的旧代码直接使用"""
+    symbol: str
+    market_type: MarketType
+    exchange: str
+    timeframe: Timeframe
+    timestamp: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+
+
+@dataclass(eq=False)
+class CandleSeries:
+    """列式K线序列
+
+    按时间升序存放一段K线：timestamp 为 int64 毫秒时间戳，OHLCV 为 float64 数组，
+    symbol/market_type/exchange/timeframe 作为整段序列的元数据只保存一份。
+    读取路径（数据源 -> 缓存 -> 分析服务）统一使用该结构，只有在持久化时才转换为 ORM 对象。
+    """
+    symbol: str
+    market_type: MarketType
+    exchange: str
+    timeframe: Timeframe
+    timestamp: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+    is_mock: bool = False  # 模拟数据，不写入本地历史库和 InfluxDB
+
+    _COLUMNS = ("open", "high", "low", "close", "volume")
+    # 二进制序列化格式标识：魔数 + 头部长度 + JSON 头部 + 小端序原始数组
+    _BINARY_MAGIC = b"CSR1"
+
+    def __post_init__(self):
+        self.timestamp = np.ascontiguousarray(self.timestamp, dtype=np.int64)
+        n = len(self.timestamp)
+        for name in self._COLUMNS:
+            column = np.ascontiguousarray(getattr(self, name), dtype=np.float64)
+            if column.shape != (n,):
+                raise ValueError(f"K线列 {name} 长度 {column.shape} 与时间戳长度 {n} 不一致")
+            setattr(self, name, column)
+
+    # ------------------------------------------------------------------
+    # 构造
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def empty(cls, symbol: str, market_type: MarketType, exchange: str, timeframe: Timeframe) -> "CandleSeries":
+        """创建空序列"""
+        zeros = np.empty(0, dtype=np.float64)
+        return cls(symbol, market_type, exchange, timeframe,
+                   np.empty(0, dtype=np.int64), zeros, zeros, zeros, zeros, zeros)
+
+    @classmethod
+    def from_ohlcv(cls, rows: Iterable, symbol: str, market_type: MarketType,
+                   exchange: str, timeframe: Timeframe) -> "CandleSeries":
+        """从 ccxt 风格的 [ms, open, high, low, close(, volume)] 行数据构建
+
+        缺失的成交量列或 None 值记为 NaN，结果按时间升序排列。
+        """
+        data = np.array([[np.nan if v is None else v for v in row] for row in rows], dtype=np.float64)
+        if data.size == 0:
+            return cls.empty(symbol, market_type, exchange, timeframe)
+        if data.shape[1] == 5:
+            data = np.column_stack([data, np.full(len(data), np.nan)])
+        series = cls(symbol, market_type, exchange, timeframe,
+                     data[:, 0].astype(np.int64), data[:, 1], data[:, 2],
+                     data[:, 3], data[:, 4], data[:, 5])
+        return series.sort_by_time()
+
+    @classmethod
+    def from_frame(cls, df, symbol: str, market_type: MarketType, exchange: str, timeframe: Timeframe,
+                   columns: Optional[Dict[str, str]] = None, time_column: Optional[str] = None) -> "CandleSeries":
+        """从 pandas DataFrame 构建
+
+        Args:
+            columns: OHLCV 字段到 DataFrame 列名的映射，默认 Open/High/Low/Close/Volume
+            time_column: 时间列名，为空时使用索引
+        """
+        if df is None or len(df) == 0:
+            return cls.empty(symbol, market_type, exchange, timeframe)
+        mapping = {"open": "Open", "high": "High", "low": "Low", "close": "Close", "volume": "Volume"}
+        if columns:
+            mapping.update(columns)
+        times = df[time_column] if time_column else df.index
+        timestamps = np.fromiter((_to_epoch_ms(t) for t in times), dtype=np.int64, count=len(df))
+        arrays = {
+            name: (df[col].to_numpy(dtype=np.float64) if col in df.columns else np.full(len(df), np.nan))
+            for name, col in mapping.items()
+        }
+        series = cls(symbol, market_type, exchange, timeframe, timestamps, **arrays)
+        return series.sort_by_time()
+
+    @classmethod
+    def concat(cls, parts: List["CandleSeries"]) -> "CandleSeries":
+        """按顺序拼接多段序列，元数据取第一段（调用方保证时间不重叠）"""
+        first = parts[0]
+        return cls(
+            first.symbol, first.market_type, first.exchange, first.timeframe,
+            np.concatenate([p.timestamp for p in parts]),
+            **{name: np.concatenate([getattr(p, name) for p in parts]) for name in cls._COLUMNS},
+            is_mock=any(p.is_mock for p in parts),
+        )
+
+    @classmethod
+    def from_klines(cls, klines: List[Any], symbol: Optional[str] = None,
+                    market_type: Optional[MarketType] = None, exchange: Optional[str] = None,
+                    timeframe: Optional[Timeframe] = None) -> "CandleSeries":
+        """从 KlineData（或任何带 OHLCV 属性的对象）列表构建，元数据缺省时取第一根K线"""
+        if isinstance(klines, cls):
+            return klines
+        first = klines[0] if klines else None
+        symbol = symbol if symbol is not None else getattr(first, "symbol", "")
+        market_type = market_type if market_type is not None else getattr(first, "market_type", None)
+        exchange = exchange if exchange is not None else (getattr(first, "exchange", None) or "")
+        timeframe = timeframe if timeframe is not None else getattr(first, "timeframe", None)
+        if not klines:
+            return cls.empty(symbol, market_type, exchange, timeframe)
+        n = len(klines)
+        timestamps = np.fromiter((_to_epoch_ms(k.timestamp) for k in klines), dtype=np.int64, count=n)
+        arrays = {
+            name: np.fromiter(
+                (np.nan if getattr(k, name, None) is None else getattr(k, name) for k in klines),
+                dtype=np.float64, count=n,
+            )
+            for name in cls._COLUMNS
+        }
+        series = cls(symbol, market_type, exchange, timeframe, timestamps, **arrays)
+        return series.sort_by_time()
+
+    # ------------------------------------------------------------------
+    # 访问
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def __iter__(self) -> Iterator[Candle]:
+        for i in range(len(self)):
+            yield self._candle(i)
+
+    def __getitem__(self, item: Union[int, slice, np.ndarray]) -> Union[Candle, "CandleSeries"]:
+        if isinstance(item, (int, np.integer)):
+            n = len(self)
+            if item < -n or item >= n:
+                raise IndexError("CandleSeries 索引越界")
+            return self._candle(int(item) % n)
+        return self._take(item)
+
+    def _candle(self, i: int) -> Candle:
+        return Candle(
+            self.symbol, self.market_type, self.exchange, self.timeframe,
+            datetime.fromtimestamp(self.timestamp[i] / 1000),
+            float(self.open[i]), float(self.high[i]), float(self.low[i]),
+            float(self.close[i]), float(self.volume[i]),
+        )
+
+    def _take(self, index) -> "CandleSeries":
+        return CandleSeries(
+            self.symbol, self.market_type, self.exchange, self.timeframe,
+            self.timestamp[index], self.open[index], self.high[index],
+            self.low[index], self.close[index], self.volume[index], self.is_mock,
+        )
+
+    @property
+    def datetimes(self) -> List[datetime]:
+        """时间戳对应的 datetime 列表（本地时间）"""
+        return [datetime.fromtimestamp(ms / 1000) for ms in self.timestamp.tolist()]
+
+    def sort_by_time(self) -> "CandleSeries":
+        """按时间升序排列，已有序时直接返回自身"""
+        if len(self) < 2 or bool(np.all(self.timestamp[1:] >= self.timestamp[:-1])):
+            return self
+        return self._take(np.argsort(self.timestamp, kind="stable"))
+
+    def tail(self, n: int) -> "CandleSeries":
+        """最近 n 根K线"""
+        if n <= 0:
+            return self._take(slice(0, 0))
+        return self._take(slice(-n, None))
+
+    def between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> "CandleSeries":
+        """截取 [start, end] 闭区间内的K线（二分查找，不逐根比较）"""
+        lo = 0 if start is None else int(np.searchsorted(self.timestamp, _to_epoch_ms(start), side="left"))
+        hi = len(self) if end is None else int(np.searchsorted(self.timestamp, _to_epoch_ms(end), side="right"))
+        return self._take(slice(lo, hi))
+
+    @property
+    def nbytes(self) -> int:
+        """数组占用的字节数"""
+        return self.timestamp.nbytes + sum(getattr(self, name).nbytes for name in self._COLUMNS)
+
+    # ------------------------------------------------------------------
+    # 输出
+    # ------------------------------------------------------------------
+
+    def to_bytes(self) -> bytes:
+        """紧凑二进制序列化（用于 Redis 等外部缓存），数组按原始字节写出"""
+        header = json.dumps({
+            "symbol": self.symbol,
+            "market_type": self.market_type.value if self.market_type is not None else None,
+            "exchange": self.exchange,
+            "timeframe": self.timeframe.value if self.timeframe is not None else None,
+            "length": len(self),
+        }).encode("utf-8")
+        parts = [self._BINARY_MAGIC, struct.pack("<I", len(header)), header,
+                 self.timestamp.astype("<i8", copy=False).tobytes()]
+        parts.extend(getattr(self, name).astype("<f8", copy=False).tobytes() for name in self._COLUMNS)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CandleSeries":
+        """从 to_bytes 的结果还原，格式不符时抛出 ValueError"""
+        if data[:4] != cls._BINARY_MAGIC:
+            raise ValueError("不是 CandleSeries 二进制数据")
+        (header_len,) = struct.unpack_from("<I", data, 4)
+        header = json.loads(data[8:8 + header_len].decode("utf-8"))
+        n = header["length"]
+        offset = 8 + header_len
+        if len(data) != offset + n * 8 * (1 + len(cls._COLUMNS)):
+            raise ValueError("CandleSeries 二进制数据长度不正确")
+        timestamp = np.frombuffer(data, dtype="<i8", count=n, offset=offset).astype(np.int64)
+        arrays = {}
+        for i, name in enumerate(cls._COLUMNS):
+            arrays[name] = np.frombuffer(data, dtype="<f8", count=n, offset=offset + n * 8 * (i + 1)).astype(np.float64)
+        market_type = header["market_type"]
+        timeframe = header["timeframe"]
+        return cls(
+            header["symbol"],
+            MarketType(market_type) if market_type is not None else None,
+            header["exchange"],
+            Timeframe(timeframe) if timeframe is not None else None,
+            timestamp, **arrays,
+        )
+
+    def to_columns(self) -> Dict[str, Any]:
+        """列式表示（用于二进制传输格式），每列为小端序原始字节：timestamp 为 int64 毫秒，其余为 float64"""
+        columns = {"timestamp": self.timestamp.astype("<i8", copy=False).tobytes()}
+        columns.update((name, getattr(self, name).astype("<f8", copy=False).tobytes()) for name in self._COLUMNS)
+        return {
+            "symbol": self.symbol,
+            "market_type": self.market_type.value if self.market_type is not None else None,
+            "exchange": self.exchange,
+            "timeframe": self.timeframe.value if self.timeframe is not None else None,
+            "length": len(self),
+            "dtypes": {"timestamp": "<i8", **{name: "<f8" for name in self._COLUMNS}},
+            "columns": columns,
+        }
+
+    def to_frame(self):
+        """转换为以时间（UTC，无时区）为索引、列名为 Open/High/Low/Close/Volume 的 DataFrame"""
+        import pandas as pd
+        index = pd.to_datetime(self.timestamp, unit="ms")
+        return pd.DataFrame({name.capitalize(): getattr(self, name) for name in self._COLUMNS}, index=index)
+
+    def to_klines(self) -> List[KlineData]:
+        """转换为 ORM 对象列表，仅用于持久化"""
+        return [
+            KlineData(
+                symbol=c.symbol, market_type=c.market_type, exchange=c.exchange,
+                timestamp=c.timestamp, open=c.open, high=c.high, low=c.low,
+                close=c.close, volume=None if np.isnan(c.volume) else c.volume,
+                timeframe=c.timeframe,
+            )
+            for c in self
+        ]
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """转换为 API 响应使用的字典列表"""
+        volumes = [None if np.isnan(v) else v for v in self.volume.tolist()]
+        return [
+            {
+                "symbol": self.symbol,
+                "market_type": self.market_type,
+                "exchange": self.exchange,
+                "timeframe": self.timeframe,
+                "timestamp": ts,
+                "open": o,
+                "high": h,
+                "low": l,
+                "close": c,
+                "volume": v,
+            }
+            for ts, o, h, l, c, v in zip(
+                self.datetimes, self.open.tolist(), self.high.tolist(),
+                self.low.tolist(), self.close.tolist(), volumes,
+            )
+        ]
@@ -0,0 +1,175 @@
+"""
+合成行情压测脚本
+用途: 不连接任何数据源，按固定速率回放合成行情，压测预警与 WebSocket 推送
+
+--alerts 在合成品种上创建价格阈值预警并启动预警监控，--clients 创建进程内的订阅连接，
+两者都经过与线上相同的代码路径（价格事件总线、阈值索引、行情合并推送和各连接的写任务）。
+
+示例:
+    python scripts/synthetic_load.py --symbols 500 --rate 20 --duration 60 --alerts 2000 --clients 50
+    python scripts/synthetic_load.py --symbols 500 --rate 20 --duration 60 --port 8774
+"""
+import argparse
+import asyncio
+import logging
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.alerts import Alert, AlertConditionType, AlertStatus
+from models.market_data import MarketType, Timeframe
+from services.alert_service import alert_service
+from services.synthetic_market import SyntheticMarket, VOLATILITY, YEAR_MS, base_price_of
+from services.websocket_manager import websocket_manager
+from services.price_event_bus import price_event_bus
+
+logging.basicConfig(level=logging.INFO)
+# 逐条的订阅、触发和通知日志会淹没压测输出，服务日志只保留警告和错误
+logging.getLogger("services").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+
+class InProcessClient:
+    """进程内订阅连接：代替真实的 WebSocket 连接，只统计收到的帧数和字节数"""
+
+    def __init__(self, client_id: int):
+        self.client_id = client_id
+        self.frames = 0
+        self.bytes = 0
+        self.closed = False
+
+    async def send(self, payload):
+        self.frames += 1
+        self.bytes += len(payload)
+
+    async def close(self):
+        self.closed = True
+
+
+def create_alerts(symbols, count: int, duration: float, seed: int):
+    """在合成品种上创建 count 个高于/低于价格预警
+
+    阈值按回放时长内的预期价格波动分布在起始价两侧，回放期间约有一半会被触发。
+    """
+    rng = np.random.default_rng(seed)
+    spread = VOLATILITY[MarketType.CRYPTO] * math.sqrt(max(duration, 1.0) * 1000 / YEAR_MS)
+    for i in range(count):
+        symbol = symbols[i % len(symbols)]
+        above = bool(i % 2)
+        offset = rng.uniform(0, 2 * spread)
+        threshold = base_price_of(symbol) * (1 + offset if above else 1 - offset)
+        alert = Alert(
+            id=f"syn-{i}",
+            user_id=0,
+            name=f"合成预警 {i}",
+            symbol=symbol,
+            market_type=MarketType.CRYPTO,
+            exchange="synthetic",
+            timeframe=Timeframe.M1,
+            condition_type=AlertConditionType.PRICE_ABOVE if above else AlertConditionType.PRICE_BELOW,
+            condition_config={"threshold": threshold},
+            status=AlertStatus.ACTIVE.value,
+            is_recurring=False,
+            notification_types=["in_app"]
+        )
+        alert_service.add_alert(alert)
+
+
+async def connect_clients(symbols, count: int, watch: int, seed: int):
+    """创建 count 个进程内连接，各自订阅 watch 个随机品种（0 表示订阅全部品种）"""
+    rng = np.random.default_rng(seed + 1)
+    clients = []
+    for i in range(count):
+        client = InProcessClient(i)
+        await websocket_manager.register(client)
+        watched = symbols if not watch or watch >= len(symbols) else \
+            [symbols[j] for j in rng.choice(len(symbols), size=watch, replace=False)]
+        for symbol in watched:
+            await websocket_manager.subscribe(client, symbol)
+        clients.append(client)
+    return clients
+
+
+async def run(args):
+    market = SyntheticMarket(seed=args.seed)
+    symbols = [f"SYN{i:05d}/USDT" for i in range(args.symbols)]
+    server = None
+    if args.port:
+        server = await websocket_manager.start_websocket_server(port=args.port)
+    clients = await connect_clients(symbols, args.clients, args.watch, args.seed)
+    if args.alerts:
+        create_alerts(symbols, args.alerts, args.duration, args.seed)
+        # 合成品种没有真实行情源，关闭兜底全量检查，只走价格事件路径
+        alert_service.FALLBACK_SWEEP_SECONDS = 10 ** 9
+        alert_service._last_full_sweep = time.time()
+        await alert_service.start_monitoring()
+        logger.info(f"已创建 {args.alerts} 个合成预警，订阅品种 {len(price_event_bus.subscribers)} 个")
+
+    max_ticks = int(args.duration * args.rate) if args.duration else None
+    started = time.perf_counter()
+    batches = 0
+    try:
+        async for batch in market.replay(symbols, ticks_per_second=args.rate, max_ticks=max_ticks):
+            for tick in batch:
+                websocket_manager.publish_tick(tick['symbol'], {
+                    'price': tick['last'],
+                    'change': tick['change'],
+                    'change_percent': tick['change_percent'],
+                    'volume': tick['volume']
+                })
+            await price_event_bus.publish_tickers(batch)
+            batches += 1
+            if batches % max(int(args.rate * 10), 1) == 0:
+                elapsed = time.perf_counter() - started
+                logger.info(f"已回放 {batches} 批 / {batches * len(symbols)} 条行情，"
+                            f"实际速率 {batches / elapsed:.1f} 批/秒，"
+                            f"预警触发 {alert_service.alert_stats['total_triggers']} 次")
+    finally:
+        elapsed = time.perf_counter() - started
+        # 等最后一次合并推送和预警确认完成
+        await asyncio.sleep(websocket_manager.tick_conflator.flush_interval * 2)
+        logger.info(f"回放结束: {batches} 批，耗时 {elapsed:.1f} 秒")
+        if args.alerts:
+            await alert_service.stop_monitoring()
+            stats = alert_service.get_alert_statistics()
+            logger.info(f"预警统计: 共 {stats['total_alerts']} 个，触发 {stats['total_triggers']} 次，"
+                        f"仍活跃 {stats['active_alerts']} 个")
+        if clients:
+            frames = sum(c.frames for c in clients)
+            size = sum(c.bytes for c in clients)
+            logger.info(f"进程内连接: {len(clients)} 个，收到 {frames} 帧 / {size / 1024:.1f} KB，"
+                        f"被断开 {sum(c.closed for c in clients)} 个")
+        logger.info(f"WebSocket 统计: {websocket_manager.get_stats()}")
+        await websocket_manager.stop()
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+
+
+def main():
+    """解析参数并开始回放"""
+    parser = argparse.ArgumentParser(description="按固定速率回放合成行情")
+    parser.add_argument("--symbols", type=int, default=100, help="品种数量")
+    parser.add_argument("--rate", type=float, default=10.0, help="每秒回放批次数")
+    parser.add_argument("--duration", type=float, default=60.0, help="回放时长（秒），0 表示持续回放")
+    parser.add_argument("--seed", type=int, default=42, help="随机数种子")
+    parser.add_argument("--port", type=int, default=0, help="WebSocket 服务端口，0 表示不启动服务")
+    parser.add_argument("--alerts", type=int, default=0, help="创建的合成价格预警数量，0 表示不启动预警监控")
+    parser.add_argument("--clients", type=int, default=0, help="进程内订阅连接数量")
+    parser.add_argument("--watch", type=int, default=20, help="每个进程内连接订阅的品种数，0 表示订阅全部")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        logger.info("回放已中断")
+
+
+if __name__ == "__main__":
+    main()
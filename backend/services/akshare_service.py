@@ -4,10 +4,20 @@ import akshare as ak
 import pandas as pd
 from datetime import datetime, timedelta
 from typing import List, Optional
-from models.market_data import KlineData, MarketType, Timeframe
+from models.market_data import CandleSeries, MarketType, Timeframe
+from .provider_executor import provider_executor
 
 logger = logging.getLogger(__name__)
 
+# AkShare 历史行情的中文列名映射
+AKSHARE_COLUMNS = {
+    "open": "开盘",
+    "high": "最高",
+    "low": "最低",
+    "close": "收盘",
+    "volume": "成交量",
+}
+
 class AkShareService:
     """AkShare数据服务"""
     
@@ -22,7 +32,7 @@ class AkShareService:
         limit: int = 1000,
         start_time: Optional[datetime] = None,
         end_time: Optional[datetime] = None
-    ) -> List[KlineData]:
+    ) -> CandleSeries:
         """获取股票K线数据"""
         try:
             # 转换时间框架到AkShare格式
@@ -36,48 +46,34 @@ class AkShareService:
             # 获取A股代码格式（AkShare使用类似"000001"的格式）
             stock_code = self._format_stock_code(symbol)
             
-            # 获取历史数据
-            if ak_tf == "D":
-                df = ak.stock_zh_a_hist(symbol=stock_code, period=ak_tf, adjust="qfq")
-            else:
-                df = ak.stock_zh_a_hist(symbol=stock_code, period=ak_tf, adjust="qfq")
+            # 获取历史数据（akshare 为阻塞调用，在数据源线程池中执行）
+            df = await provider_executor.run("akshare", ak.stock_zh_a_hist, symbol=stock_code, period=ak_tf, adjust="qfq")
             
             if df.empty:
                 logger.warning(f"AkShare获取股票数据为空: {symbol}")
-                return []
+                return CandleSeries.empty(symbol, MarketType.STOCK, 'akshare', timeframe)
             
             # 限制数据量
             df = df.tail(limit)
             
-            klines = []
-            for _, row in df.iterrows():
-                kline = KlineData(
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    market_type=MarketType.STOCK,
-                    exchange='akshare',
-                    timestamp=row['日期'] if isinstance(row['日期'], datetime) else datetime.strptime(row['日期'], '%Y-%m-%d'),
-                    open=float(row['开盘']),
-                    high=float(row['最高']),
-                    low=float(row['最低']),
-                    close=float(row['收盘']),
-                    volume=float(row['成交量'])
-                )
-                klines.append(kline)
+            klines = CandleSeries.from_frame(
+                df, symbol, MarketType.STOCK, 'akshare', timeframe,
+                columns=AKSHARE_COLUMNS, time_column='日期'
+            )
             
             logger.info(f"AkShare获取股票K线数据成功: {symbol}, 数据点: {len(klines)}")
             return klines
             
         except Exception as e:
             logger.error(f"AkShare获取股票K线数据失败: {symbol}, 错误: {e}")
-            return []
+            return CandleSeries.empty(symbol, MarketType.STOCK, 'akshare', timeframe)
     
     async def get_index_klines(
         self, 
         symbol: str, 
         timeframe: Timeframe, 
         limit: int = 1000
-    ) -> List[KlineData]:
+    ) -> CandleSeries:
         """获取指数K线数据"""
         try:
             # 转换时间框架
@@ -89,43 +85,32 @@ class AkShareService:
             ak_tf = tf_mapping.get(timeframe, "D")
             
             # 获取指数数据（例如上证指数"000001"）
-            df = ak.stock_zh_index_hist(symbol=symbol, period=ak_tf)
+            df = await provider_executor.run("akshare", ak.stock_zh_index_hist, symbol=symbol, period=ak_tf)
             
             if df.empty:
                 logger.warning(f"AkShare获取指数数据为空: {symbol}")
-                return []
+                return CandleSeries.empty(symbol, MarketType.INDEX, 'akshare', timeframe)
             
             df = df.tail(limit)
             
-            klines = []
-            for _, row in df.iterrows():
-                kline = KlineData(
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    market_type=MarketType.INDEX,
-                    exchange='akshare',
-                    timestamp=row['日期'] if isinstance(row['日期'], datetime) else datetime.strptime(row['日期'], '%Y-%m-%d'),
-                    open=float(row['开盘']),
-                    high=float(row['最高']),
-                    low=float(row['最低']),
-                    close=float(row['收盘']),
-                    volume=float(row['成交量'])
-                )
-                klines.append(kline)
+            klines = CandleSeries.from_frame(
+                df, symbol, MarketType.INDEX, 'akshare', timeframe,
+                columns=AKSHARE_COLUMNS, time_column='日期'
+            )
             
             logger.info(f"AkShare获取指数K线数据成功: {symbol}, 数据点: {len(klines)}")
             return klines
             
         except Exception as e:
             logger.error(f"AkShare获取指数K线数据失败: {symbol}, 错误: {e}")
-            return []
+            return CandleSeries.empty(symbol, MarketType.INDEX, 'akshare', timeframe)
     
     async def get_real_time_quote(self, symbol: str) -> dict:
         """获取实时行情数据"""
         try:
             # 获取A股实时行情
             stock_code = self._format_stock_code(symbol)
-            df = ak.stock_zh_a_spot_em()
+            df = await provider_executor.run("akshare", ak.stock_zh_a_spot_em)
             
             if df.empty:
                 return {}
@@ -164,7 +149,7 @@ class AkShareService:
         """测试AkShare连接"""
         try:
             # 尝试获取上证指数数据来测试连接
-            test_data = ak.stock_zh_index_hist(symbol="000001", period="D")
+            test_data = await provider_executor.run("akshare", ak.stock_zh_index_hist, symbol="000001", period="D")
             return not test_data.empty
         except Exception as e:
             logger.error(f"AkShare连接测试失败: {e}")
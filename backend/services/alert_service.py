@@ -1,16 +1,20 @@
 import asyncio
+import bisect
 import logging
+import time
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Callable, Any, Tuple
+from typing import List, Dict, Optional, Callable, Any, Tuple, NamedTuple
 from enum import Enum
 import json
 from collections import defaultdict, deque
 
 from models.alerts import Alert, AlertTrigger, AlertConditionType, AlertStatus as ModelAlertStatus, NotificationType
-from models.market_data import KlineData, MarketType, Timeframe
+from models.market_data import KlineData, CandleSeries, MarketType, Timeframe
 from services.data_service import data_service
 from services.notification_service import notification_service
 from services.technical_analysis_service import technical_analysis_service
+from services.streaming_indicators import streaming_indicator_service, BarStream
+from services.price_event_bus import price_event_bus, PriceEvent
 from database import SessionLocal
 
 logger = logging.getLogger(__name__)
@@ -20,6 +24,66 @@ class AlertStatus(Enum):
     TRIGGERED = "triggered"
     DISABLED = "disabled"
 
+class AlertSnapshot(NamedTuple):
+    """同一 (symbol, market_type, timeframe) 分组共享的行情快照"""
+    current_price: float
+    klines: Optional[CandleSeries]
+    limit: int
+
+class ThresholdIndex:
+    """单个品种的价格阈值索引
+
+    rising 保存价格上行时触发的阈值（PRICE_ABOVE、多头止盈、空头止损），
+    falling 保存价格下行时触发的阈值（PRICE_BELOW、多头止损、空头止盈），均按价格升序。
+    """
+    
+    def __init__(self):
+        self.rising_levels: List[float] = []
+        self.rising_alerts: List[Alert] = []
+        self.falling_levels: List[float] = []
+        self.falling_alerts: List[Alert] = []
+    
+    def add(self, direction: str, level: float, alert: Alert):
+        if direction == 'rising':
+            i = bisect.bisect_right(self.rising_levels, level)
+            self.rising_levels.insert(i, level)
+            self.rising_alerts.insert(i, alert)
+        else:
+            i = bisect.bisect_right(self.falling_levels, level)
+            self.falling_levels.insert(i, level)
+            self.falling_alerts.insert(i, alert)
+    
+    def remove(self, direction: str, level: float, alert: Alert) -> bool:
+        """按阈值二分定位并移除预警，O(log n)（加上列表删除的内存移动）"""
+        levels, alerts = (
+            (self.rising_levels, self.rising_alerts) if direction == 'rising'
+            else (self.falling_levels, self.falling_alerts)
+        )
+        i = bisect.bisect_left(levels, level)
+        while i < len(levels) and levels[i] == level:
+            if alerts[i] is alert:
+                del levels[i]
+                del alerts[i]
+                return True
+            i += 1
+        return False
+    
+    def crossed(self, price: float) -> List[Alert]:
+        """阈值可能被 price 触及的预警，O(log n + k)；严格/非严格比较由条件评估最终确认"""
+        i = bisect.bisect_right(self.rising_levels, price)
+        j = bisect.bisect_left(self.falling_levels, price)
+        return self.rising_alerts[:i] + self.falling_alerts[j:]
+    
+    def __len__(self) -> int:
+        return len(self.rising_levels) + len(self.falling_levels)
+
+# 依赖流式指标K线流的条件类型
+STREAM_CONDITIONS = (
+    AlertConditionType.RSI_OVERBOUGHT, AlertConditionType.RSI_OVERSOLD,
+    AlertConditionType.MACD_CROSS, AlertConditionType.BOLLINGER_BREAKOUT,
+    AlertConditionType.GOLDEN_CROSS, AlertConditionType.DEATH_CROSS
+)
+
 class AlertPriority(Enum):
     """预警优先级"""
     LOW = "low"
@@ -28,6 +92,13 @@ class AlertPriority(Enum):
     CRITICAL = "critical"
 
 class AlertService:
+    # 创建流式指标K线流时预热使用的历史K线数量
+    STREAM_HISTORY = 300
+    # 并发检查的预警分组数上限
+    MAX_CONCURRENT_BUCKETS = 16
+    # 没有价格事件时的兜底全量检查间隔（秒），用于处理过期和遗漏的行情
+    FALLBACK_SWEEP_SECONDS = 60
+    
     def __init__(self):
         self.active_alerts: Dict[str, Alert] = {}
         self.alert_triggers: List[AlertTrigger] = []
@@ -50,6 +121,22 @@ class AlertService:
         # 预警冷却期管理（防止重复触发）
         self.cooldown_periods: Dict[str, datetime] = {}  # alert_id -> last_trigger_time
         
+        # 当前检查轮次中各分组的行情快照
+        self._snapshots: Dict[Tuple[str, MarketType, Timeframe], AlertSnapshot] = {}
+        
+        # 价格事件驱动：阈值类预警的索引，以及有新价格、待检查的品种
+        self._threshold_indexes: Dict[str, ThresholdIndex] = {}
+        self._symbol_alerts: Dict[str, Dict[str, Alert]] = {}  # symbol -> {预警ID: 活跃预警}
+        self._subscribed_symbols: Dict[str, MarketType] = {}
+        # 预警ID -> 建索引时的 (品种, 阈值项)，预警对象被原地修改后仍能从原位置移除
+        self._indexed_entries: Dict[str, Tuple[str, Optional[Tuple[str, float]]]] = {}
+        # 有新价格、待检查的品种 -> 最新事件价格
+        self._pending_symbols: Dict[str, float] = {}
+        # 价格事件中被触及、等待监控循环确认的阈值类预警：alert_id -> (预警, 事件价格)
+        self._pending_alerts: Dict[str, Tuple[Alert, float]] = {}
+        self._pending_event = asyncio.Event()
+        self._last_full_sweep = 0.0
+        
         # 技术分析服务（延迟初始化）
         self._technical_service = None
     
@@ -59,6 +146,7 @@ class AlertService:
             return
         
         self.is_running = True
+        self._refresh_alert_index()
         self.monitoring_task = asyncio.create_task(self._monitoring_loop())
         logger.info("预警监控服务已启动")
     
@@ -71,33 +159,290 @@ class AlertService:
                 await self.monitoring_task
             except asyncio.CancelledError:
                 pass
+        for symbol in list(self._subscribed_symbols):
+            price_event_bus.unsubscribe(symbol, self._on_price_event)
+        self._subscribed_symbols = {}
         logger.info("预警监控服务已停止")
     
     async def _monitoring_loop(self):
-        """监控循环"""
+        """监控循环：等待价格事件，先确认被触及的阈值类预警，再只检查有新价格的品种；长时间无事件时兜底全量检查"""
         while self.is_running:
             try:
-                await self._check_all_alerts()
-                await asyncio.sleep(1)  # 每秒检查一次
+                timeout = max(self.FALLBACK_SWEEP_SECONDS - (time.time() - self._last_full_sweep), 0)
+                try:
+                    await asyncio.wait_for(self._pending_event.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                
+                self._pending_event.clear()
+                await self._check_pending_alerts()
+                
+                if time.time() - self._last_full_sweep >= self.FALLBACK_SWEEP_SECONDS:
+                    self._pending_symbols = {}
+                    self._last_full_sweep = time.time()
+                    await self._check_all_alerts()
+                    continue
+                
+                symbols, self._pending_symbols = self._pending_symbols, {}
+                if symbols:
+                    await self._check_all_alerts(symbols)
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 logger.error(f"预警监控循环出错: {e}")
                 await asyncio.sleep(5)
     
-    async def _check_all_alerts(self):
-        """检查所有活跃预警"""
-        for alert_id, alert in self.active_alerts.items():
+    @staticmethod
+    def _threshold_entry(alert: Alert) -> Optional[Tuple[str, float]]:
+        """阈值类预警的 (触发方向, 阈值)，非阈值类返回 None"""
+        config = alert.condition_config or {}
+        condition_type = alert.condition_type
+        if condition_type == AlertConditionType.PRICE_ABOVE:
+            level, direction = config.get('threshold'), 'rising'
+        elif condition_type == AlertConditionType.PRICE_BELOW:
+            level, direction = config.get('threshold'), 'falling'
+        elif condition_type == AlertConditionType.STOP_LOSS:
+            level = config.get('stop_price')
+            direction = 'falling' if config.get('position_type', 'long') == 'long' else 'rising'
+        elif condition_type == AlertConditionType.TAKE_PROFIT:
+            level = config.get('target_price')
+            direction = 'rising' if config.get('position_type', 'long') == 'long' else 'falling'
+        else:
+            return None
+        if level is None:
+            return None
+        return direction, float(level)
+    
+    def _refresh_alert_index(self):
+        """重建阈值索引，并同步价格事件订阅（启动监控时调用，单个预警增删改走增量更新）"""
+        indexes: Dict[str, ThresholdIndex] = {}
+        symbols: Dict[str, MarketType] = {}
+        symbol_alerts: Dict[str, Dict[str, Alert]] = {}
+        entries: Dict[str, Tuple[str, Optional[Tuple[str, float]]]] = {}
+        for alert in list(self.active_alerts.values()):
             if alert.status != AlertStatus.ACTIVE.value:
                 continue
-            
-            try:
-                await self._check_alert(alert)
-            except Exception as e:
-                logger.error(f"检查预警 {alert_id} 时出错: {e}")
+            symbols[alert.symbol] = alert.market_type
+            symbol_alerts.setdefault(alert.symbol, {})[str(alert.id)] = alert
+            entry = self._threshold_entry(alert)
+            entries[str(alert.id)] = (alert.symbol, entry)
+            if entry is not None:
+                indexes.setdefault(alert.symbol, ThresholdIndex()).add(entry[0], entry[1], alert)
+        self._threshold_indexes = indexes
+        self._symbol_alerts = symbol_alerts
+        self._indexed_entries = entries
+        self._release_indicator_streams(list(streaming_indicator_service.streams))
+        
+        if not self.is_running:
+            return
+        for symbol in set(self._subscribed_symbols) - set(symbols):
+            price_event_bus.unsubscribe(symbol, self._on_price_event)
+        for symbol, market_type in symbols.items():
+            price_event_bus.subscribe(symbol, self._on_price_event, market_type)
+        self._subscribed_symbols = symbols
+    
+    def _index_alert(self, alert: Alert):
+        """新增或更新的活跃预警加入所属品种的索引，品种第一次出现时订阅价格事件"""
+        if alert.status != AlertStatus.ACTIVE.value:
+            return
+        symbol = alert.symbol
+        entry = self._threshold_entry(alert)
+        self._indexed_entries[str(alert.id)] = (symbol, entry)
+        self._symbol_alerts.setdefault(symbol, {})[str(alert.id)] = alert
+        if entry is not None:
+            self._threshold_indexes.setdefault(symbol, ThresholdIndex()).add(entry[0], entry[1], alert)
+        if self.is_running and symbol not in self._subscribed_symbols:
+            price_event_bus.subscribe(symbol, self._on_price_event, alert.market_type)
+            self._subscribed_symbols[symbol] = alert.market_type
+    
+    def _unindex_alert(self, alert: Alert):
+        """预警不再活跃（触发、过期、修改、删除）时只从所属品种的索引中移除，品种没有活跃预警时才退订"""
+        indexed = self._indexed_entries.pop(str(alert.id), None)
+        if indexed is None:
+            return
+        symbol, entry = indexed
+        index = self._threshold_indexes.get(symbol)
+        if entry is not None and index is not None and index.remove(entry[0], entry[1], alert) and not index:
+            del self._threshold_indexes[symbol]
+        
+        alerts = self._symbol_alerts.get(symbol)
+        if alerts is None:
+            return
+        alerts.pop(str(alert.id), None)
+        if self._uses_indicator_stream(alert):
+            self._release_indicator_streams([(symbol, alert.timeframe)])
+        if alerts:
+            return
+        del self._symbol_alerts[symbol]
+        if self._subscribed_symbols.pop(symbol, None) is not None:
+            price_event_bus.unsubscribe(symbol, self._on_price_event)
+    
+    @staticmethod
+    def _uses_indicator_stream(alert: Alert) -> bool:
+        """预警条件（含组合条件的子条件）是否依赖流式指标K线流"""
+        if alert.condition_type in STREAM_CONDITIONS:
+            return True
+        if alert.condition_type in (AlertConditionType.COMPOSITE_AND, AlertConditionType.COMPOSITE_OR):
+            return any(
+                str(sub_cond.get('type', '')).upper() in AlertConditionType.__members__
+                and AlertConditionType[str(sub_cond['type']).upper()] in STREAM_CONDITIONS
+                for sub_cond in (alert.condition_config or {}).get('conditions', [])
+            )
+        return False
+    
+    def _release_indicator_streams(self, keys: List[Tuple[str, Timeframe]]):
+        """移除不再有活跃预警需要的K线流，避免其随每笔行情继续推进"""
+        for symbol, timeframe in keys:
+            if not any(
+                alert.timeframe == timeframe and self._uses_indicator_stream(alert)
+                for alert in self._symbol_alerts.get(symbol, {}).values()
+            ):
+                streaming_indicator_service.remove_stream(symbol, timeframe)
+    
+    async def _on_price_event(self, event: PriceEvent):
+        """价格事件回调：只登记被索引触及的阈值类预警和有新价格的品种，评估和通知由监控循环执行
+
+        回调运行在行情推送路径上，这里不做任何 I/O，避免慢的通知渠道拖住行情和 WebSocket 推送。
+        """
+        index = self._threshold_indexes.get(event.symbol)
+        if index:
+            for alert in index.crossed(event.price):
+                if alert.status == AlertStatus.ACTIVE.value:
+                    self._pending_alerts[str(alert.id)] = (alert, event.price)
+        
+        self._pending_symbols[event.symbol] = event.price
+        self._pending_event.set()
+    
+    async def _check_pending_alerts(self):
+        """用事件价格确认价格事件中被触及的阈值类预警（各预警并发，单个通知慢不阻塞其他预警）"""
+        if not self._pending_alerts:
+            return
+        pending, self._pending_alerts = self._pending_alerts, {}
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_BUCKETS)
+        
+        async def run(alert, price):
+            async with semaphore:
+                if alert.status != AlertStatus.ACTIVE.value:
+                    return
+                try:
+                    await self._check_alert(alert, current_price=price)
+                except Exception as e:
+                    logger.error(f"检查预警 {alert.id} 时出错: {e}")
+        
+        await asyncio.gather(*(run(alert, price) for alert, price in pending.values()))
+    
+    async def _check_all_alerts(self, symbols: Optional[Dict[str, float]] = None):
+        """检查活跃预警：按 (symbol, market_type, timeframe) 分组，每组只取一次行情，各组并发执行
+
+        指定 symbols（品种 -> 事件价格）时只检查这些品种的非阈值类预警（阈值类已在价格事件中经索引判定），
+        并直接使用事件携带的价格，不再重新查询报价。
+        """
+        buckets = self._plan_alert_buckets(symbols)
+        if not buckets:
+            return
+        
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_BUCKETS)
+        
+        async def run(key, alerts):
+            async with semaphore:
+                await self._check_alert_bucket(key, alerts, symbols.get(key[0]) if symbols else None)
+        
+        await asyncio.gather(*(run(key, alerts) for key, alerts in buckets.items()))
+    
+    def _plan_alert_buckets(self, symbols: Optional[Dict[str, float]] = None) -> Dict[Tuple[str, MarketType, Timeframe], List[Alert]]:
+        """将需要检查的活跃预警按 (symbol, market_type, timeframe) 分组"""
+        buckets: Dict[Tuple[str, MarketType, Timeframe], List[Alert]] = defaultdict(list)
+        for alert in list(self.active_alerts.values()):
+            if alert.status != AlertStatus.ACTIVE.value or not self._can_trigger(alert):
+                continue
+            if symbols is not None and (alert.symbol not in symbols or self._threshold_entry(alert) is not None):
+                continue
+            buckets[(alert.symbol, alert.market_type, alert.timeframe)].append(alert)
+        return buckets
     
-    async def _check_alert(self, alert: Alert):
-        """检查单个预警条件（增强版）"""
+    async def _check_alert_bucket(self, key: Tuple[str, MarketType, Timeframe], alerts: List[Alert],
+                                  current_price: Optional[float] = None):
+        """获取一次分组行情快照，并用它评估组内所有预警；current_price 为价格事件携带的价格"""
+        symbol, market_type, timeframe = key
+        try:
+            if current_price is None:
+                current_price = await data_service.get_current_price(symbol, market_type)
+            limit = max(self._required_klines(alert) for alert in alerts)
+            klines = None
+            if current_price and limit:
+                klines = await data_service.get_kline_data(
+                    symbol=symbol,
+                    timeframe=timeframe,
+                    market_type=market_type,
+                    limit=limit
+                )
+        except Exception as e:
+            logger.error(f"获取预警分组行情失败 {symbol}: {e}")
+            return
+        
+        self._snapshots[key] = AlertSnapshot(current_price, klines, limit)
+        try:
+            for alert in alerts:
+                try:
+                    await self._check_alert(alert)
+                except Exception as e:
+                    logger.error(f"检查预警 {alert.id} 时出错: {e}")
+        finally:
+            self._snapshots.pop(key, None)
+    
+    def _required_klines(self, alert: Alert, condition_type=None, config: Optional[Dict] = None) -> int:
+        """预警条件评估所需的K线数量（0 表示只需要当前价格）"""
+        condition_type = condition_type or alert.condition_type
+        config = alert.condition_config if config is None else config
+        
+        if condition_type in (AlertConditionType.COMPOSITE_AND, AlertConditionType.COMPOSITE_OR):
+            required = [0]
+            for sub_cond in config.get('conditions', []):
+                sub_type = AlertConditionType[sub_cond['type'].upper()]
+                required.append(self._required_klines(alert, sub_type, sub_cond.get('config', {})))
+            return max(required)
+        
+        if condition_type in STREAM_CONDITIONS:
+            # 流式指标只在创建（或过期后重建）K线流时需要历史数据
+            stream = streaming_indicator_service.get_stream(alert.symbol, alert.timeframe)
+            if stream is None or stream.is_stale():
+                return self.STREAM_HISTORY
+            return 0
+        
+        if condition_type == AlertConditionType.VOLUME_ABOVE:
+            return 1
+        if condition_type in (
+            AlertConditionType.PRICE_PERCENT_CHANGE, AlertConditionType.VOLUME_PERCENT_CHANGE,
+            AlertConditionType.PRICE_BREAK_RESISTANCE, AlertConditionType.PRICE_BREAK_SUPPORT
+        ):
+            return 2
+        if condition_type == AlertConditionType.PRICE_CROSS_MA:
+            return config.get('ma_period', 20) + 2
+        if condition_type == AlertConditionType.VOLUME_SPIKE:
+            return config.get('lookback', 20) + 1
+        return 0
+    
+    async def _get_current_price(self, alert: Alert) -> float:
+        """获取当前价格，优先使用分组快照"""
+        snapshot = self._snapshots.get((alert.symbol, alert.market_type, alert.timeframe))
+        if snapshot is not None:
+            return snapshot.current_price
+        return await data_service.get_current_price(alert.symbol, alert.market_type)
+    
+    async def _get_klines(self, symbol: str, timeframe, market_type: MarketType, limit: int):
+        """获取最近 limit 根K线，分组快照足够时直接切片，否则单独请求"""
+        snapshot = self._snapshots.get((symbol, market_type, timeframe))
+        if snapshot is not None and snapshot.klines is not None and snapshot.limit >= limit:
+            return snapshot.klines.tail(limit)
+        return await data_service.get_kline_data(
+            symbol=symbol,
+            timeframe=timeframe,
+            market_type=market_type,
+            limit=limit
+        )
+    
+    async def _check_alert(self, alert: Alert, current_price: Optional[float] = None):
+        """检查单个预警条件（增强版），current_price 为价格事件携带的最新价"""
         # 检查是否在冷却期内
         if not self._can_trigger(alert):
             return
@@ -105,13 +450,13 @@ class AlertService:
         # 检查预警是否过期
         if alert.valid_until and datetime.now() > alert.valid_until:
             alert.status = ModelAlertStatus.EXPIRED.value
+            self._unindex_alert(alert)
             logger.info(f"预警已过期: {alert.name} (ID: {alert.id})")
             return
         
         # 获取当前价格
-        current_price = await data_service.get_current_price(
-            alert.symbol, alert.market_type
-        )
+        if current_price is None:
+            current_price = await self._get_current_price(alert)
         
         if current_price == 0:
             return
@@ -238,7 +583,7 @@ class AlertService:
             use_percentage = condition_config.get('use_percentage', False)
             
             # 获取历史数据来计算变化
-            klines = await data_service.get_kline_data(
+            klines = await self._get_klines(
                 symbol=symbol,
                 timeframe=timeframe,
                 market_type=market_type,
@@ -248,8 +593,8 @@ class AlertService:
             if len(klines) < 2:
                 return False, 0.0, {}
             
-            previous_close = klines[1].close
-            current_close = klines[0].close
+            previous_close = float(klines.close[-2])
+            current_close = float(klines.close[-1])
             
             if previous_close == 0:
                 return False, 0.0, {}
@@ -275,7 +620,7 @@ class AlertService:
             threshold = condition_config.get('threshold')
             
             # 获取成交量数据
-            klines = await data_service.get_kline_data(
+            klines = await self._get_klines(
                 symbol=symbol,
                 timeframe=timeframe,
                 market_type=market_type,
@@ -285,7 +630,7 @@ class AlertService:
             if not klines:
                 return False, 0.0, {}
             
-            current_volume = klines[0].volume
+            current_volume = float(klines.volume[-1])
             is_triggered = current_volume > threshold
             
             return is_triggered, current_volume, {
@@ -303,7 +648,7 @@ class AlertService:
             threshold = condition_config.get('threshold')
             
             # 获取历史成交量数据
-            klines = await data_service.get_kline_data(
+            klines = await self._get_klines(
                 symbol=symbol,
                 timeframe=timeframe,
                 market_type=market_type,
@@ -313,8 +658,8 @@ class AlertService:
             if len(klines) < 2:
                 return False, 0.0, {}
             
-            previous_volume = klines[1].volume
-            current_volume = klines[0].volume
+            previous_volume = float(klines.volume[-2])
+            current_volume = float(klines.volume[-1])
             
             if previous_volume == 0:
                 return False, 0.0, {}
@@ -340,7 +685,7 @@ class AlertService:
             cross_direction = config.get('direction', 'above')  # above或below
             
             # 获取K线数据
-            klines = await data_service.get_kline_data(
+            klines = await self._get_klines(
                 symbol=alert.symbol,
                 timeframe=alert.timeframe,
                 market_type=alert.market_type,
@@ -351,12 +696,12 @@ class AlertService:
                 return False, 0.0, {}
             
             # 计算均线
-            closes = [k.close for k in klines]
-            ma_current = sum(closes[:ma_period]) / ma_period
-            ma_previous = sum(closes[1:ma_period+1]) / ma_period
+            closes = klines.close
+            ma_current = float(closes[-ma_period:].mean())
+            ma_previous = float(closes[-ma_period - 1:-1].mean())
             
-            current_price = closes[0]
-            previous_price = closes[1]
+            current_price = float(closes[-1])
+            previous_price = float(closes[-2])
             
             # 检查穿越
             if cross_direction == 'above':
@@ -383,7 +728,7 @@ class AlertService:
             level = config.get('level')  # 支撑/阻力位价格
             
             # 获取前一个价格
-            klines = await data_service.get_kline_data(
+            klines = await self._get_klines(
                 symbol=alert.symbol,
                 timeframe=alert.timeframe,
                 market_type=alert.market_type,
@@ -393,7 +738,7 @@ class AlertService:
             if len(klines) < 2:
                 return False, 0.0, {}
             
-            previous_price = klines[1].close
+            previous_price = float(klines.close[-2])
             
             if is_resistance:
                 # 突破阻力位：之前在阻力位下方，现在突破
@@ -422,7 +767,7 @@ class AlertService:
             lookback_periods = config.get('lookback', 20)  # 回看周期
             
             # 获取历史成交量数据
-            klines = await data_service.get_kline_data(
+            klines = await self._get_klines(
                 symbol=alert.symbol,
                 timeframe=alert.timeframe,
                 market_type=alert.market_type,
@@ -432,8 +777,8 @@ class AlertService:
             if len(klines) < lookback_periods + 1:
                 return False, 0.0, {}
             
-            current_volume = klines[0].volume
-            average_volume = sum(k.volume for k in klines[1:]) / lookback_periods
+            current_volume = float(klines.volume[-1])
+            average_volume = float(klines.volume[-lookback_periods - 1:-1].mean())
             
             if average_volume == 0:
                 return False, 0.0, {}
@@ -452,41 +797,41 @@ class AlertService:
             logger.error(f"评估成交量激增时出错: {e}")
             return False, 0.0, {}
     
+    async def _get_indicator_stream(self, alert: Alert) -> Optional[BarStream]:
+        """获取预警品种的流式指标K线流，不存在或已漏掉K线时用历史K线（重新）创建并预热"""
+        stream = streaming_indicator_service.get_stream(alert.symbol, alert.timeframe)
+        if stream is not None and stream.is_stale():
+            logger.info(f"流式指标K线流长时间未更新，重新预热: {alert.symbol} {alert.timeframe.value}")
+            streaming_indicator_service.remove_stream(alert.symbol, alert.timeframe)
+            stream = None
+        if stream is None:
+            klines = await self._get_klines(
+                symbol=alert.symbol,
+                timeframe=alert.timeframe,
+                market_type=alert.market_type,
+                limit=self.STREAM_HISTORY
+            )
+            if len(klines) < 2:
+                return None
+            stream = streaming_indicator_service.create_stream(
+                alert.symbol, alert.market_type, alert.timeframe, klines
+            )
+        return stream
+    
     async def _evaluate_rsi_condition(self, alert: Alert, overbought: bool) -> Tuple[bool, float, Dict]:
         """评估RSI超买/超卖"""
         try:
             period = alert.condition_config.get('rsi_period', 14)
             threshold = alert.condition_config.get('threshold', 70 if overbought else 30)
             
-            # 获取K线数据
-            klines = await data_service.get_kline_data(
-                symbol=alert.symbol,
-                timeframe=alert.timeframe,
-                market_type=alert.market_type,
-                limit=period + 10
-            )
-            
-            if len(klines) < period + 1:
+            stream = await self._get_indicator_stream(alert)
+            if stream is None:
                 return False, 0.0, {}
             
-            # 计算RSI（简化版）
-            closes = [k.close for k in reversed(klines)]
-            gains = []
-            losses = []
-            
-            for i in range(1, len(closes)):
-                change = closes[i] - closes[i-1]
-                gains.append(max(change, 0))
-                losses.append(max(-change, 0))
-            
-            avg_gain = sum(gains[-period:]) / period
-            avg_loss = sum(losses[-period:]) / period
-            
-            if avg_loss == 0:
-                rsi = 100
-            else:
-                rs = avg_gain / avg_loss
-                rsi = 100 - (100 / (1 + rs))
+            # 流式RSI（Wilder平滑），包含当前未收盘K线
+            _, rsi = stream.values('RSI', period=period)
+            if rsi is None:
+                return False, 0.0, {}
             
             if overbought:
                 is_triggered = rsi >= threshold
@@ -508,45 +853,19 @@ class AlertService:
         try:
             cross_type = alert.condition_config.get('cross_type', 'golden')  # golden或death
             
-            # 获取K线数据（需要足够的数据计算MACD）
-            klines = await data_service.get_kline_data(
-                symbol=alert.symbol,
-                timeframe=alert.timeframe,
-                market_type=alert.market_type,
-                limit=50
-            )
-            
-            if len(klines) < 30:
+            stream = await self._get_indicator_stream(alert)
+            if stream is None:
                 return False, 0.0, {}
             
-            # 简化的MACD计算（12, 26, 9）
-            closes = [k.close for k in reversed(klines)]
-            
-            # 计算EMA
-            def ema(data, period):
-                multiplier = 2 / (period + 1)
-                ema_values = [sum(data[:period]) / period]
-                for price in data[period:]:
-                    ema_values.append((price - ema_values[-1]) * multiplier + ema_values[-1])
-                return ema_values
-            
-            ema12 = ema(closes, 12)
-            ema26 = ema(closes, 26)
-            
-            # MACD线
-            macd_line = [ema12[i] - ema26[i] for i in range(len(ema26))]
-            
-            # 信号线（MACD的9日EMA）
-            signal_line = ema(macd_line, 9)
-            
-            # 检查交叉
-            if len(signal_line) < 2:
+            # 上一根收盘K线与当前K线的MACD（12, 26, 9）
+            previous, current = stream.values('MACD')
+            if previous is None or current is None:
                 return False, 0.0, {}
             
-            macd_current = macd_line[-1]
-            signal_current = signal_line[-1]
-            macd_previous = macd_line[-2]
-            signal_previous = signal_line[-2]
+            macd_current = current['macd']
+            signal_current = current['signal']
+            macd_previous = previous['macd']
+            signal_previous = previous['signal']
             
             if cross_type == 'golden':
                 # 金叉：MACD从下方穿越信号线
@@ -572,27 +891,18 @@ class AlertService:
             std_dev = alert.condition_config.get('std_dev', 2)
             breakout_direction = alert.condition_config.get('direction', 'upper')  # upper或lower
             
-            # 获取K线数据
-            klines = await data_service.get_kline_data(
-                symbol=alert.symbol,
-                timeframe=alert.timeframe,
-                market_type=alert.market_type,
-                limit=period + 2
-            )
-            
-            if len(klines) < period + 1:
+            stream = await self._get_indicator_stream(alert)
+            if stream is None or stream.forming is None:
                 return False, 0.0, {}
             
-            closes = [k.close for k in klines[:period]]
-            current_price = klines[0].close
-            
-            # 计算布林带
-            middle_band = sum(closes) / period
-            variance = sum((x - middle_band) ** 2 for x in closes) / period
-            std = variance ** 0.5
+            _, bands = stream.values('BOLLINGER', period=period, std_dev=std_dev)
+            if bands is None:
+                return False, 0.0, {}
             
-            upper_band = middle_band + (std_dev * std)
-            lower_band = middle_band - (std_dev * std)
+            current_price = stream.forming.close
+            upper_band = bands['upper']
+            middle_band = bands['middle']
+            lower_band = bands['lower']
             
             # 检查突破
             if breakout_direction == 'upper':
@@ -618,24 +928,15 @@ class AlertService:
             fast_period = alert.condition_config.get('fast_period', 5)
             slow_period = alert.condition_config.get('slow_period', 20)
             
-            # 获取K线数据
-            klines = await data_service.get_kline_data(
-                symbol=alert.symbol,
-                timeframe=alert.timeframe,
-                market_type=alert.market_type,
-                limit=slow_period + 2
-            )
-            
-            if len(klines) < slow_period + 2:
+            stream = await self._get_indicator_stream(alert)
+            if stream is None:
                 return False, 0.0, {}
             
-            closes = [k.close for k in klines]
-            
-            # 计算快慢均线（当前和前一周期）
-            fast_ma_current = sum(closes[:fast_period]) / fast_period
-            fast_ma_previous = sum(closes[1:fast_period+1]) / fast_period
-            slow_ma_current = sum(closes[:slow_period]) / slow_period
-            slow_ma_previous = sum(closes[1:slow_period+1]) / slow_period
+            # 快慢均线（上一根收盘K线与当前K线）
+            fast_ma_previous, fast_ma_current = stream.values('SMA', period=fast_period)
+            slow_ma_previous, slow_ma_current = stream.values('SMA', period=slow_period)
+            if None in (fast_ma_previous, fast_ma_current, slow_ma_previous, slow_ma_current):
+                return False, 0.0, {}
             
             if golden:
                 # 金叉：快线从下方穿越慢线
@@ -727,7 +1028,7 @@ class AlertService:
                         condition_type=condition_type,
                         condition_config=sub_cond.get('config', {})
                     ),
-                    await data_service.get_current_price(alert.symbol, alert.market_type)
+                    await self._get_current_price(alert)
                 )
                 results.append(is_met)
                 details.append({
@@ -801,6 +1102,7 @@ class AlertService:
         if not alert.is_recurring:
             alert.status = ModelAlertStatus.DISABLED.value
             logger.info(f"预警 {alert.name} 触发后已禁用（非重复预警）")
+        self._unindex_alert(alert)
         
         # 调用所有注册的处理程序
         for handler in self.alert_handlers:
@@ -974,7 +1276,11 @@ class AlertService:
     
     def add_alert(self, alert: Alert) -> str:
         """添加预警"""
+        previous = self.active_alerts.get(alert.id)
+        if previous is not None:
+            self._unindex_alert(previous)
         self.active_alerts[alert.id] = alert
+        self._index_alert(alert)
         logger.info(f"添加预警: {alert.name} (ID: {alert.id})")
         return alert.id
     
@@ -983,14 +1289,16 @@ class AlertService:
         if alert_id not in self.active_alerts:
             return False
         
+        self._unindex_alert(self.active_alerts[alert_id])
         self.active_alerts[alert_id] = alert
+        self._index_alert(alert)
         logger.info(f"更新预警: {alert.name} (ID: {alert_id})")
         return True
     
     def delete_alert(self, alert_id: str) -> bool:
         """删除预警"""
         if alert_id in self.active_alerts:
-            del self.active_alerts[alert_id]
+            self._unindex_alert(self.active_alerts.pop(alert_id))
             logger.info(f"删除预警: {alert_id}")
             return True
         return False
@@ -1125,6 +1433,7 @@ class AlertService:
             
             # 添加到活跃预警列表
             self.active_alerts[str(alert.id)] = alert
+            self._index_alert(alert)
             
             logger.info(f"创建预警成功: {alert.name} (ID: {alert.id})")
             db.close()
@@ -3,9 +3,9 @@ import logging
 import aiohttp
 import time
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
 import pandas as pd
-from models.market_data import KlineData, MarketType, Timeframe
+from models.market_data import KlineData, CandleSeries, MarketType, Timeframe
 
 logger = logging.getLogger(__name__)
 
@@ -40,9 +40,13 @@ class AlphaVantageService:
         timeframe: Timeframe,
         limit: int = 1000,
         start_time: Optional[datetime] = None,
-        end_time: Optional[datetime] = None
-    ) -> List[KlineData]:
-        """获取股票K线数据"""
+        end_time: Optional[datetime] = None,
+        mock_on_error: bool = True
+    ) -> Union[CandleSeries, List[KlineData]]:
+        """获取股票K线数据
+        
+        mock_on_error 为 False 时失败返回空序列（由调用方路由到其他数据源），不返回模拟数据
+        """
         try:
             await self._rate_limit()
             
@@ -84,7 +88,7 @@ class AlphaVantageService:
             async with session.get(self.base_url, params=params) as response:
                 if response.status != 200:
                     logger.warning(f"Alpha Vantage API请求失败: {response.status}")
-                    return await self._get_mock_data(symbol, timeframe, limit)
+                    return await self._fallback(symbol, MarketType.STOCK, timeframe, limit, mock_on_error)
                 
                 data = await response.json()
                 
@@ -97,10 +101,10 @@ class AlphaVantageService:
                 
                 if not time_series_key:
                     logger.warning(f"Alpha Vantage返回数据格式异常: {symbol}")
-                    return await self._get_mock_data(symbol, timeframe, limit)
+                    return await self._fallback(symbol, MarketType.STOCK, timeframe, limit, mock_on_error)
                 
                 time_series = data[time_series_key]
-                klines = []
+                rows = []
                 
                 for timestamp_str, values in time_series.items():
                     try:
@@ -110,38 +114,37 @@ class AlphaVantageService:
                         else:
                             timestamp = datetime.strptime(timestamp_str, "%Y-%m-%d")
                         
-                        kline = KlineData(
-                            symbol=symbol,
-                            timeframe=timeframe,
-                            market_type=MarketType.STOCK,
-                            exchange='alpha_vantage',
-                            timestamp=timestamp,
-                            open=float(values["1. open"]),
-                            high=float(values["2. high"]),
-                            low=float(values["3. low"]),
-                            close=float(values["4. close"]),
-                            volume=float(values["5. volume"])
-                        )
-                        klines.append(kline)
+                        rows.append([
+                            timestamp.timestamp() * 1000,
+                            float(values["1. open"]),
+                            float(values["2. high"]),
+                            float(values["3. low"]),
+                            float(values["4. close"]),
+                            float(values["5. volume"])
+                        ])
                     except Exception as e:
                         logger.warning(f"解析Alpha Vantage数据失败: {e}")
                         continue
                 
                 # 按时间排序并限制数量
-                klines.sort(key=lambda x: x.timestamp)
-                return klines[-limit:] if len(klines) > limit else klines
+                klines = CandleSeries.from_ohlcv(rows, symbol, MarketType.STOCK, 'alpha_vantage', timeframe)
+                return klines.tail(limit)
                 
         except Exception as e:
             logger.error(f"获取Alpha Vantage股票K线数据失败: {e}")
-            return await self._get_mock_data(symbol, timeframe, limit)
+            return await self._fallback(symbol, MarketType.STOCK, timeframe, limit, mock_on_error)
     
     async def get_crypto_klines(
         self,
         symbol: str,
         timeframe: Timeframe,
-        limit: int = 1000
-    ) -> List[KlineData]:
-        """获取加密货币K线数据"""
+        limit: int = 1000,
+        mock_on_error: bool = True
+    ) -> Union[CandleSeries, List[KlineData]]:
+        """获取加密货币K线数据
+        
+        mock_on_error 为 False 时失败返回空序列（由调用方路由到其他数据源），不返回模拟数据
+        """
         try:
             await self._rate_limit()
             
@@ -190,7 +193,7 @@ class AlphaVantageService:
             async with session.get(self.base_url, params=params) as response:
                 if response.status != 200:
                     logger.warning(f"Alpha Vantage加密货币API请求失败: {response.status}")
-                    return await self._get_mock_data(symbol, timeframe, limit)
+                    return await self._fallback(symbol, MarketType.CRYPTO, timeframe, limit, mock_on_error)
                 
                 data = await response.json()
                 
@@ -203,10 +206,10 @@ class AlphaVantageService:
                 
                 if not time_series_key:
                     logger.warning(f"Alpha Vantage加密货币返回数据格式异常: {symbol}")
-                    return await self._get_mock_data(symbol, timeframe, limit)
+                    return await self._fallback(symbol, MarketType.CRYPTO, timeframe, limit, mock_on_error)
                 
                 time_series = data[time_series_key]
-                klines = []
+                rows = []
                 
                 for timestamp_str, values in time_series.items():
                     try:
@@ -223,38 +226,37 @@ class AlphaVantageService:
                         close_key = "4. close" if "4. close" in values else "4a. close (USD)"
                         volume_key = "5. volume" if "5. volume" in values else "5. volume"
                         
-                        kline = KlineData(
-                            symbol=symbol,
-                            timeframe=timeframe,
-                            market_type=MarketType.CRYPTO,
-                            exchange='alpha_vantage',
-                            timestamp=timestamp,
-                            open=float(values[open_key]),
-                            high=float(values[high_key]),
-                            low=float(values[low_key]),
-                            close=float(values[close_key]),
-                            volume=float(values[volume_key])
-                        )
-                        klines.append(kline)
+                        rows.append([
+                            timestamp.timestamp() * 1000,
+                            float(values[open_key]),
+                            float(values[high_key]),
+                            float(values[low_key]),
+                            float(values[close_key]),
+                            float(values[volume_key])
+                        ])
                     except Exception as e:
                         logger.warning(f"解析Alpha Vantage加密货币数据失败: {e}")
                         continue
                 
                 # 按时间排序并限制数量
-                klines.sort(key=lambda x: x.timestamp)
-                return klines[-limit:] if len(klines) > limit else klines
+                klines = CandleSeries.from_ohlcv(rows, symbol, MarketType.CRYPTO, 'alpha_vantage', timeframe)
+                return klines.tail(limit)
                 
         except Exception as e:
             logger.error(f"获取Alpha Vantage加密货币K线数据失败: {e}")
-            return await self._get_mock_data(symbol, timeframe, limit)
+            return await self._fallback(symbol, MarketType.CRYPTO, timeframe, limit, mock_on_error)
     
     async def get_forex_klines(
         self,
         symbol: str,
         timeframe: Timeframe,
-        limit: int = 1000
-    ) -> List[KlineData]:
-        """获取外汇K线数据"""
+        limit: int = 1000,
+        mock_on_error: bool = True
+    ) -> Union[CandleSeries, List[KlineData]]:
+        """获取外汇K线数据
+        
+        mock_on_error 为 False 时失败返回空序列（由调用方路由到其他数据源），不返回模拟数据
+        """
         try:
             await self._rate_limit()
             
@@ -304,7 +306,7 @@ class AlphaVantageService:
             async with session.get(self.base_url, params=params) as response:
                 if response.status != 200:
                     logger.warning(f"Alpha Vantage外汇API请求失败: {response.status}")
-                    return await self._get_mock_data(symbol, timeframe, limit)
+                    return await self._fallback(symbol, MarketType.FOREX, timeframe, limit, mock_on_error)
                 
                 data = await response.json()
                 
@@ -317,10 +319,10 @@ class AlphaVantageService:
                 
                 if not time_series_key:
                     logger.warning(f"Alpha Vantage外汇返回数据格式异常: {symbol}")
-                    return await self._get_mock_data(symbol, timeframe, limit)
+                    return await self._fallback(symbol, MarketType.FOREX, timeframe, limit, mock_on_error)
                 
                 time_series = data[time_series_key]
-                klines = []
+                rows = []
                 
                 for timestamp_str, values in time_series.items():
                     try:
@@ -330,30 +332,32 @@ class AlphaVantageService:
                         else:
                             timestamp = datetime.strptime(timestamp_str, "%Y-%m-%d")
                         
-                        kline = KlineData(
-                            symbol=symbol,
-                            timeframe=timeframe,
-                            market_type=MarketType.FOREX,
-                            exchange='alpha_vantage',
-                            timestamp=timestamp,
-                            open=float(values["1. open"]),
-                            high=float(values["2. high"]),
-                            low=float(values["3. low"]),
-                            close=float(values["4. close"]),
-                            volume=0.0  # 外汇数据通常没有交易量
-                        )
-                        klines.append(kline)
+                        rows.append([
+                            timestamp.timestamp() * 1000,
+                            float(values["1. open"]),
+                            float(values["2. high"]),
+                            float(values["3. low"]),
+                            float(values["4. close"]),
+                            0.0  # 外汇数据通常没有交易量
+                        ])
                     except Exception as e:
                         logger.warning(f"解析Alpha Vantage外汇数据失败: {e}")
                         continue
                 
                 # 按时间排序并限制数量
-                klines.sort(key=lambda x: x.timestamp)
-                return klines[-limit:] if len(klines) > limit else klines
+                klines = CandleSeries.from_ohlcv(rows, symbol, MarketType.FOREX, 'alpha_vantage', timeframe)
+                return klines.tail(limit)
                 
         except Exception as e:
             logger.error(f"获取Alpha Vantage外汇K线数据失败: {e}")
-            return await self._get_mock_data(symbol, timeframe, limit)
+            return await self._fallback(symbol, MarketType.FOREX, timeframe, limit, mock_on_error)
+    
+    async def _fallback(self, symbol: str, market_type: MarketType, timeframe: Timeframe, limit: int,
+                        mock_on_error: bool) -> Union[CandleSeries, List[KlineData]]:
+        """请求失败时的返回值：空序列或模拟数据"""
+        if not mock_on_error:
+            return CandleSeries.empty(symbol, market_type, 'alpha_vantage', timeframe)
+        return await self._get_mock_data(symbol, timeframe, limit)
     
     async def _get_mock_data(
         self, 
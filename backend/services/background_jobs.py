@@ -0,0 +1,96 @@
+"""
+后台作业管理
+
+参数扫描和稳健性分析共用的作业簿记：每个作业一条状态记录和一个后台任务，作业内的计算分批提交到
+回测进程池（批次ID为 "作业ID#序号"）。作业完成、失败或被取消时统一更新状态并终止其余批次，
+已结束的作业超过保留数时淘汰最早创建的。
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Callable, Coroutine, Dict, List
+
+from .backtest_executor import BacktestExecutor
+
+logger = logging.getLogger(__name__)
+
+# 作业的结束状态
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+
+class BackgroundJobManager:
+    """后台作业的状态、任务与分批进程池任务管理
+
+    状态记录需有 status、completed_at、logs、error_message 字段。executor 和 history 在使用时才取值，
+    便于测试替换进程池、修改保留数配置。
+    """
+
+    def __init__(self, label: str, executor: Callable[[], BacktestExecutor], history: Callable[[], int]):
+        self.label = label  # 日志中的作业名称
+        self._executor = executor
+        self._history = history
+        # 进行中的作业和最近 history() 个已结束的作业（按创建顺序）
+        self.records: Dict[str, Any] = {}
+        # 作业ID -> 后台任务 / 已提交的分批任务ID
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.batches: Dict[str, List[str]] = {}
+
+    @property
+    def executor(self) -> BacktestExecutor:
+        return self._executor()
+
+    def start(self, job_id: str, record: Any, run: Callable[[], Coroutine]):
+        """登记状态记录并在后台执行 run()"""
+        self.records[job_id] = record
+        self.tasks[job_id] = asyncio.create_task(self._run(job_id, record, run))
+        logger.info(f"启动{self.label}: {job_id}")
+
+    async def _run(self, job_id: str, record: Any, run: Callable[[], Coroutine]):
+        try:
+            await run()
+            record.status = "completed"
+            record.completed_at = datetime.now().isoformat()
+            record.logs.append(f"{self.label}完成")
+            logger.info(f"{self.label}完成: {job_id}")
+        except asyncio.CancelledError:
+            # cancel 已更新状态；进程池关闭等其他原因取消时在这里补记
+            if record.status != "cancelled":
+                record.status = "cancelled"
+                record.completed_at = datetime.now().isoformat()
+        except Exception as e:
+            logger.error(f"{self.label}失败: {job_id}, 错误: {e}")
+            record.status = "failed"
+            record.error_message = str(e)
+            record.completed_at = datetime.now().isoformat()
+        finally:
+            # 失败或取消时终止其余批次
+            executor = self.executor
+            for batch_id in self.batches.pop(job_id, []):
+                executor.cancel(batch_id)
+            self.tasks.pop(job_id, None)
+            self.evict_finished()
+
+    def submit(self, job_id: str, fn: Callable, *args, priority: int = 0) -> asyncio.Future:
+        """把作业的一批计算提交到进程池"""
+        batches = self.batches.setdefault(job_id, [])
+        batch_id = f"{job_id}#{len(batches)}"
+        batches.append(batch_id)
+        return self.executor.submit(batch_id, fn, *args, priority=priority)
+
+    def evict_finished(self):
+        """已结束的作业超过保留数时淘汰最早创建的（结果可能包含上万行）"""
+        finished = [job_id for job_id, record in self.records.items() if record.status in FINISHED_STATUSES]
+        for job_id in finished[:max(0, len(finished) - self._history())]:
+            del self.records[job_id]
+
+    def cancel(self, job_id: str) -> bool:
+        """取消作业：后台任务结束时移出排队的批次并终止正在运行的工作进程"""
+        record = self.records.get(job_id)
+        task = self.tasks.get(job_id)
+        if record is None or task is None:
+            return False
+        record.status = "cancelled"
+        record.completed_at = datetime.now().isoformat()
+        task.cancel()
+        logger.info(f"{self.label}已取消: {job_id}")
+        return True
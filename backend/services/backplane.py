@@ -0,0 +1,312 @@
+"""
+跨进程消息背板与主节点选举
+
+多个 uvicorn worker 各自持有本地 WebSocket 连接。行情只由选举出的一个主节点拉取，
+经背板发布，每个 worker（包括主节点自身）收到后再推送给本进程内的连接，
+这样增加 worker 不会成倍增加数据源的 API 调用。
+
+- InMemoryBackplane：进程内实现，单 worker 部署和测试使用
+- RedisBackplane：基于 Redis pub/sub，主节点租约使用 SET NX PX 并按持有者续期
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# 只有持有者才能续期/释放租约
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if hasattr(value, "item"):  # numpy 标量
+        return value.item()
+    raise TypeError(f"无法序列化: {type(value).__name__}")
+
+
+def encode(message: Dict[str, Any]) -> str:
+    return json.dumps(message, default=_json_default)
+
+
+class Backplane(ABC):
+    """背板接口：按频道发布/订阅 JSON 消息，并提供带过期时间的租约用于选主"""
+
+    def __init__(self):
+        self.handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self.published = 0
+        self.delivered = 0
+        self.errors = 0
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        """向频道发布一条消息"""
+
+    async def subscribe(self, channel: str, handler: Handler):
+        self.handlers[channel].append(handler)
+
+    async def unsubscribe(self, channel: str, handler: Handler):
+        handlers = self.handlers.get(channel)
+        if handlers and handler in handlers:
+            handlers.remove(handler)
+            if not handlers:
+                del self.handlers[channel]
+
+    @abstractmethod
+    async def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """获取或续期租约，返回 owner 当前是否持有"""
+
+    @abstractmethod
+    async def release_lease(self, name: str, owner: str):
+        """释放 owner 持有的租约"""
+
+    async def _dispatch(self, channel: str, raw: str):
+        handlers = list(self.handlers.get(channel, ()))
+        if not handlers:
+            return
+        try:
+            message = json.loads(raw)
+        except (TypeError, ValueError) as e:
+            self.errors += 1
+            logger.error(f"背板消息解析失败 {channel}: {e}")
+            return
+        for handler in handlers:
+            try:
+                await handler(message)
+                self.delivered += 1
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"背板消息处理失败 {channel}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self).__name__,
+            "channels": {channel: len(handlers) for channel, handlers in self.handlers.items()},
+            "published": self.published,
+            "delivered": self.delivered,
+            "errors": self.errors
+        }
+
+
+class InMemoryBackplane(Backplane):
+    """进程内背板：消息同样经过 JSON 编解码，与 Redis 实现的行为一致"""
+
+    def __init__(self):
+        super().__init__()
+        self.leases: Dict[str, Tuple[str, float]] = {}
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        self.published += 1
+        await self._dispatch(channel, encode(message))
+
+    async def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.monotonic()
+        holder = self.leases.get(name)
+        if holder is None or holder[0] == owner or holder[1] <= now:
+            self.leases[name] = (owner, now + ttl)
+            return True
+        return False
+
+    async def release_lease(self, name: str, owner: str):
+        holder = self.leases.get(name)
+        if holder and holder[0] == owner:
+            del self.leases[name]
+
+
+class RedisBackplane(Backplane):
+    """基于 Redis pub/sub 的背板，供多 worker / 多主机部署使用"""
+
+    def __init__(self, url: str, prefix: str = "omnimarket"):
+        super().__init__()
+        self.url = url
+        self.prefix = prefix
+        self.client = None
+        self.pubsub = None
+        self.listener_task: Optional[asyncio.Task] = None
+
+    def _key(self, name: str) -> str:
+        return f"{self.prefix}:{name}"
+
+    async def start(self):
+        if self.client is not None:
+            return
+        import redis.asyncio as aioredis
+        self.client = aioredis.from_url(self.url, decode_responses=True)
+        self.pubsub = self.client.pubsub()
+        if self.handlers:
+            await self.pubsub.subscribe(*(self._key(c) for c in self.handlers))
+        self.listener_task = asyncio.create_task(self._listen())
+        logger.info(f"Redis 背板已连接: {self.url}")
+
+    async def close(self):
+        if self.listener_task:
+            self.listener_task.cancel()
+            try:
+                await self.listener_task
+            except asyncio.CancelledError:
+                pass
+            self.listener_task = None
+        if self.pubsub is not None:
+            await self.pubsub.aclose()
+            self.pubsub = None
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        await self.start()
+        self.published += 1
+        await self.client.publish(self._key(channel), encode(message))
+
+    async def subscribe(self, channel: str, handler: Handler):
+        first = channel not in self.handlers
+        await super().subscribe(channel, handler)
+        if first and self.pubsub is not None:
+            await self.pubsub.subscribe(self._key(channel))
+
+    async def unsubscribe(self, channel: str, handler: Handler):
+        await super().unsubscribe(channel, handler)
+        if channel not in self.handlers and self.pubsub is not None:
+            await self.pubsub.unsubscribe(self._key(channel))
+
+    async def _listen(self):
+        prefix = f"{self.prefix}:"
+        while True:
+            try:
+                if not self.pubsub.subscribed:
+                    await asyncio.sleep(0.5)
+                    continue
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message and message.get("type") == "message":
+                    await self._dispatch(message["channel"][len(prefix):], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Redis 背板接收消息失败: {e}")
+                await asyncio.sleep(1)
+
+    async def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        await self.start()
+        key = self._key(f"lease:{name}")
+        ttl_ms = int(ttl * 1000)
+        if await self.client.set(key, owner, nx=True, px=ttl_ms):
+            return True
+        return bool(await self.client.eval(_RENEW_SCRIPT, 1, key, owner, ttl_ms))
+
+    async def release_lease(self, name: str, owner: str):
+        if self.client is None:
+            return
+        await self.client.eval(_RELEASE_SCRIPT, 1, self._key(f"lease:{name}"), owner)
+
+
+class LeaderElector:
+    """基于背板租约的主节点选举
+
+    每隔 ttl/3 获取或续期一次租约；续期失败（包括背板不可用）立即放弃主节点身份，
+    原主节点失联后租约过期，由其他 worker 接替。
+    """
+
+    def __init__(self, backplane: Backplane, name: str, ttl: float = 15.0, owner: Optional[str] = None):
+        self.backplane = backplane
+        self.name = name
+        self.ttl = ttl
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self.task: Optional[asyncio.Task] = None
+        self.transitions = 0
+
+    async def campaign(self) -> bool:
+        """尝试成为（或继续作为）主节点"""
+        try:
+            acquired = await self.backplane.acquire_lease(self.name, self.owner, self.ttl)
+        except Exception as e:
+            logger.error(f"主节点租约续期失败: {e}")
+            acquired = False
+        if acquired != self.is_leader:
+            self.is_leader = acquired
+            self.transitions += 1
+            logger.info(f"{self.name}: {self.owner} {'成为主节点' if acquired else '不再是主节点'}")
+        return acquired
+
+    async def _run(self):
+        while True:
+            await self.campaign()
+            await asyncio.sleep(self.ttl / 3)
+
+    async def start(self):
+        if self.task is None or self.task.done():
+            await self.campaign()
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if self.is_leader:
+            try:
+                await self.backplane.release_lease(self.name, self.owner)
+            except Exception as e:
+                logger.error(f"释放主节点租约失败: {e}")
+            self.is_leader = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "owner": self.owner,
+            "is_leader": self.is_leader,
+            "ttl": self.ttl,
+            "transitions": self.transitions
+        }
+
+
+def create_backplane(backend: Optional[str] = None) -> Backplane:
+    """按配置创建背板：memory（默认，单进程）或 redis"""
+    backend = (backend or settings.BACKPLANE_BACKEND).lower()
+    if backend == "redis":
+        return RedisBackplane(settings.BACKPLANE_REDIS_URL or settings.REDIS_URL)
+    if backend != "memory":
+        logger.warning(f"未知的背板类型 {backend}，使用进程内背板")
+    return InMemoryBackplane()
+
+
+# 全局背板与行情主节点选举实例
+backplane = create_backplane()
+market_leader = LeaderElector(backplane, "market-producer", ttl=settings.BACKPLANE_LEADER_TTL)
@@ -0,0 +1,245 @@
+"""
+回测进程池
+
+回测是纯 CPU 计算，放在事件循环里会阻塞整个 API。这里维护一组常驻的工作进程：
+任务按优先级（数值越小越先执行，同优先级按提交顺序）排队，同时运行的任务数不超过
+max_workers；工作进程通过管道回传进度和结果。取消正在运行的任务时直接终止对应的
+工作进程，下一个任务到来时再补充新的进程。
+
+任务函数必须是模块级函数（可被 pickle），签名为 fn(*args, report=callable)。
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import multiprocessing
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class BacktestJobError(Exception):
+    """任务在工作进程中抛出的异常"""
+
+
+def _worker_main(conn):
+    """工作进程主循环：逐个执行主进程发来的任务，收到 None 时退出"""
+    # 终端中断由主进程处理
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        job_id, fn, args = message
+
+        def report(text: str, job_id=job_id):
+            conn.send(("progress", job_id, text))
+
+        try:
+            conn.send(("done", job_id, fn(*args, report=report)))
+        except Exception as e:
+            conn.send(("error", job_id, f"{type(e).__name__}: {e}"))
+
+
+@dataclass
+class _Worker:
+    process: Any
+    conn: Any
+
+
+@dataclass
+class _Job:
+    job_id: str
+    fn: Callable
+    args: Tuple
+    priority: int
+    on_progress: Optional[Callable[[str], None]]
+    future: asyncio.Future
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+
+
+class BacktestExecutor:
+    """有界的回测工作进程池"""
+
+    def __init__(self, max_workers: int = 2, start_method: str = "spawn"):
+        self.max_workers = max(1, max_workers)
+        self.start_method = start_method
+        self._queue: List[Tuple[int, int, _Job]] = []
+        self._seq = itertools.count()
+        self._jobs: Dict[str, _Job] = {}
+        self._running: Dict[str, _Worker] = {}
+        self._idle: List[_Worker] = []
+        # 等待工作进程消息的阻塞读取在线程中进行
+        self._readers: Optional[ThreadPoolExecutor] = None
+        self.spawned = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    # ------------------------------------------------------------------
+    # 工作进程
+    # ------------------------------------------------------------------
+
+    def _spawn(self) -> _Worker:
+        ctx = multiprocessing.get_context(self.start_method)
+        parent_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True, name="backtest-worker")
+        process.start()
+        child_conn.close()
+        self.spawned += 1
+        return _Worker(process, parent_conn)
+
+    def _acquire(self) -> _Worker:
+        while self._idle:
+            worker = self._idle.pop()
+            if worker.process.is_alive():
+                return worker
+            self._discard(worker)
+        return self._spawn()
+
+    @staticmethod
+    def _discard(worker: _Worker):
+        if worker.process.is_alive():
+            worker.process.terminate()
+        worker.process.join(timeout=1)
+        worker.conn.close()
+
+    # ------------------------------------------------------------------
+    # 调度
+    # ------------------------------------------------------------------
+
+    def submit(self, job_id: str, fn: Callable, *args, priority: int = 0,
+               on_progress: Optional[Callable[[str], None]] = None) -> asyncio.Future:
+        """提交任务，返回任务结果的 Future（任务被取消时 Future 也被取消）"""
+        if job_id in self._jobs:
+            raise ValueError(f"回测任务已存在: {job_id}")
+        job = _Job(job_id, fn, args, priority, on_progress, asyncio.get_running_loop().create_future())
+        self._jobs[job_id] = job
+        heapq.heappush(self._queue, (priority, next(self._seq), job))
+        self._dispatch()
+        return job.future
+
+    def _dispatch(self):
+        while self._queue and len(self._running) < self.max_workers:
+            _, _, job = heapq.heappop(self._queue)
+            if job.future.done():
+                continue
+            worker = self._acquire()
+            try:
+                worker.conn.send((job.job_id, job.fn, job.args))
+            except Exception as e:
+                # 参数无法序列化等，进程本身可继续使用
+                self._idle.append(worker)
+                self._finish(job, error=BacktestJobError(f"任务提交失败: {e}"))
+                continue
+            job.started_at = time.time()
+            self._running[job.job_id] = worker
+            asyncio.get_running_loop().create_task(self._wait(job, worker))
+
+    async def _wait(self, job: _Job, worker: _Worker):
+        """读取工作进程回传的进度和结果，直到任务结束"""
+        loop = asyncio.get_running_loop()
+        if self._readers is None:
+            self._readers = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="backtest-reader")
+        try:
+            while True:
+                try:
+                    kind, _, payload = await loop.run_in_executor(self._readers, worker.conn.recv)
+                except (EOFError, OSError):
+                    # 进程被终止（取消）或异常退出
+                    self._discard(worker)
+                    self._finish(job, error=BacktestJobError("回测工作进程异常退出"))
+                    return
+                if kind == "progress":
+                    if job.on_progress is not None and not job.future.done():
+                        try:
+                            job.on_progress(payload)
+                        except Exception as e:
+                            logger.error(f"回测进度处理失败: {e}")
+                    continue
+                if self._running.get(job.job_id) is worker:
+                    self._idle.append(worker)
+                if kind == "done":
+                    self._finish(job, result=payload)
+                else:
+                    self._finish(job, error=BacktestJobError(payload))
+                return
+        finally:
+            if self._running.get(job.job_id) is worker:
+                del self._running[job.job_id]
+            self._dispatch()
+
+    def _finish(self, job: _Job, result: Any = None, error: Optional[Exception] = None):
+        self._jobs.pop(job.job_id, None)
+        if job.future.done():
+            return
+        if error is not None:
+            self.failed += 1
+            job.future.set_exception(error)
+        else:
+            self.completed += 1
+            job.future.set_result(result)
+
+    def cancel(self, job_id: str) -> bool:
+        """取消任务：排队中的直接移出，运行中的终止其工作进程"""
+        job = self._jobs.pop(job_id, None)
+        if job is None or job.future.done():
+            return False
+        worker = self._running.pop(job_id, None)
+        if worker is not None:
+            worker.process.terminate()
+            logger.info(f"已终止回测工作进程: {job_id}")
+        job.future.cancel()
+        self.cancelled += 1
+        self._dispatch()
+        return True
+
+    def shutdown(self):
+        """取消全部任务并关闭工作进程"""
+        self._queue.clear()
+        for job_id in list(self._jobs):
+            try:
+                self.cancel(job_id)
+            except RuntimeError:
+                # 任务所在的事件循环已关闭
+                pass
+        for worker in self._idle:
+            try:
+                worker.conn.send(None)
+                worker.process.join(timeout=1)
+            except Exception:
+                pass
+            self._discard(worker)
+        self._idle.clear()
+        if self._readers is not None:
+            self._readers.shutdown(wait=False)
+            self._readers = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "running": list(self._running),
+            "queued": sum(1 for _, _, job in self._queue if not job.future.done()),
+            "idle_workers": len(self._idle),
+            "spawned": self.spawned,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled
+        }
+
+
+# 全局回测进程池实例
+backtest_executor = BacktestExecutor(
+    max_workers=settings.BACKTEST_MAX_WORKERS,
+    start_method=settings.BACKTEST_START_METHOD
+)
@@ -0,0 +1,197 @@
+"""
+回测结果持久化存储
+
+完成（或失败、取消）的回测从内存移入数据库：摘要行（状态、统计指标、时间）单独一张表，
+按 strategy_id/created_at 建索引，列表查询分页且只读摘要行；日志、权益曲线和交易记录放在
+明细表，按回测ID读取。权益曲线和交易记录按列编码：数值列为小端序 int64/float64 原始数组，
+其余列为 JSON 数组，整体 zlib 压缩。
+"""
+import json
+import logging
+import struct
+import threading
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, engine as default_engine
+from models.backtest import BacktestPayload, BacktestRecord
+
+logger = logging.getLogger(__name__)
+
+# 列表查询每页最多返回的条数
+MAX_PAGE_SIZE = 500
+
+_HEADER = struct.Struct("<I")
+
+
+def _column_dtype(values: List[Any]) -> str:
+    """整数列用 int64，数值列用 float64，其余（字符串、None、混合类型）用 JSON"""
+    if all(isinstance(v, (int, np.integer)) and not isinstance(v, (bool, np.bool_)) for v in values):
+        return "<i8"
+    if all(isinstance(v, (int, float, np.integer, np.floating)) and not isinstance(v, (bool, np.bool_))
+           for v in values):
+        return "<f8"
+    return "json"
+
+
+def pack_columns(records: List[Dict[str, Any]]) -> bytes:
+    """把字典列表编码为压缩的列式二进制"""
+    names = list(dict.fromkeys(name for record in records for name in record))
+    columns = []
+    buffers = []
+    for name in names:
+        values = [record.get(name) for record in records]
+        dtype = _column_dtype(values)
+        if dtype == "json":
+            data = json.dumps(values, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        else:
+            data = np.asarray(values, dtype=dtype).tobytes()
+        columns.append([name, dtype, len(data)])
+        buffers.append(data)
+    header = json.dumps({"rows": len(records), "columns": columns}).encode("utf-8")
+    return zlib.compress(_HEADER.pack(len(header)) + header + b"".join(buffers))
+
+
+def unpack_columns(blob: bytes) -> List[Dict[str, Any]]:
+    """pack_columns 的逆过程"""
+    raw = zlib.decompress(blob)
+    (size,) = _HEADER.unpack_from(raw)
+    header = json.loads(raw[_HEADER.size:_HEADER.size + size])
+    offset = _HEADER.size + size
+    names = []
+    columns = []
+    for name, dtype, nbytes in header["columns"]:
+        data = raw[offset:offset + nbytes]
+        offset += nbytes
+        names.append(name)
+        columns.append(json.loads(data) if dtype == "json" else np.frombuffer(data, dtype=dtype).tolist())
+    if not names:
+        return [{} for _ in range(header["rows"])]
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def _summary(record: BacktestRecord) -> Dict[str, Any]:
+    return {
+        "backtest_id": record.backtest_id,
+        "strategy_id": record.strategy_id,
+        "status": record.status,
+        "statistics": record.statistics or {},
+        "error_message": record.error_message,
+        "created_at": record.created_at,
+        "completed_at": record.completed_at
+    }
+
+
+class BacktestStore:
+    """回测结果存储（同步接口，单条读写在毫秒级）"""
+
+    def __init__(self, engine: Optional[Engine] = None):
+        self.engine = engine if engine is not None else default_engine
+        self._session = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self._ready = False
+        self._schema_lock = threading.Lock()
+
+    def _ensure_schema(self):
+        """首次使用时建表（表已存在时跳过）"""
+        if self._ready:
+            return
+        with self._schema_lock:
+            if not self._ready:
+                Base.metadata.create_all(
+                    bind=self.engine, tables=[BacktestRecord.__table__, BacktestPayload.__table__]
+                )
+                self._ready = True
+
+    def save(self, result: Dict[str, Any]):
+        """写入（或覆盖）一条回测结果，result 为 BacktestResult 的字典形式"""
+        self._ensure_schema()
+        db = self._session()
+        try:
+            db.merge(BacktestRecord(
+                backtest_id=result["backtest_id"],
+                strategy_id=result["strategy_id"],
+                status=result["status"],
+                statistics=result.get("statistics") or {},
+                error_message=result.get("error_message"),
+                created_at=result["created_at"],
+                completed_at=result.get("completed_at")
+            ))
+            db.merge(BacktestPayload(
+                backtest_id=result["backtest_id"],
+                logs=zlib.compress(json.dumps(result.get("logs") or [], ensure_ascii=False).encode("utf-8")),
+                equity_curve=pack_columns(result.get("equity_curve") or []),
+                trades=pack_columns(result.get("trades") or [])
+            ))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def get(self, backtest_id: str) -> Optional[Dict[str, Any]]:
+        """读取完整回测结果（含日志、权益曲线和交易记录）"""
+        self._ensure_schema()
+        db = self._session()
+        try:
+            record = db.get(BacktestRecord, backtest_id)
+            if record is None:
+                return None
+            result = _summary(record)
+            payload = db.get(BacktestPayload, backtest_id)
+            if payload is not None:
+                result["logs"] = json.loads(zlib.decompress(payload.logs))
+                result["equity_curve"] = unpack_columns(payload.equity_curve)
+                result["trades"] = unpack_columns(payload.trades)
+            return result
+        finally:
+            db.close()
+
+    def list(self, strategy_id: Optional[str] = None, limit: int = 50,
+             offset: int = 0) -> Tuple[int, List[Dict[str, Any]]]:
+        """按创建时间倒序分页列出摘要，返回 (总数, 当前页)"""
+        self._ensure_schema()
+        limit = max(0, min(limit, MAX_PAGE_SIZE))
+        db = self._session()
+        try:
+            query = db.query(BacktestRecord)
+            if strategy_id:
+                query = query.filter(BacktestRecord.strategy_id == strategy_id)
+            total = query.with_entities(func.count(BacktestRecord.backtest_id)).scalar()
+            rows = query.order_by(BacktestRecord.created_at.desc()).offset(max(0, offset)).limit(limit).all()
+            return total, [_summary(row) for row in rows]
+        finally:
+            db.close()
+
+    def count(self) -> int:
+        """已保存的回测数"""
+        self._ensure_schema()
+        db = self._session()
+        try:
+            return db.query(func.count(BacktestRecord.backtest_id)).scalar()
+        finally:
+            db.close()
+
+    def delete(self, backtest_id: str) -> bool:
+        """删除一条回测结果"""
+        self._ensure_schema()
+        db = self._session()
+        try:
+            db.query(BacktestPayload).filter(BacktestPayload.backtest_id == backtest_id).delete()
+            deleted = db.query(BacktestRecord).filter(BacktestRecord.backtest_id == backtest_id).delete()
+            db.commit()
+            return deleted > 0
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+# 全局回测结果存储实例
+backtest_store = BacktestStore()
@@ -0,0 +1,321 @@
+"""
+回测策略与回测任务
+
+在回测工作进程中执行：按策略ID构造 backtesting 策略类、运行回测，并把统计、权益曲线和
+交易记录整理为可序列化的字典返回。模块只依赖 pandas、backtesting 与指标引擎，
+工作进程启动时不需要加载数据服务等其他模块。
+"""
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from backtesting import Backtest, Strategy
+from backtesting.lib import crossover
+
+from .indicator_engine import bollinger_bands
+from .vectorized_backtest import VECTORIZED_STRATEGIES, backtest_signals
+
+# 进度汇报的粒度（百分比）
+PROGRESS_STEP = 10
+
+# 共享内存中的K线列（时间索引单独以 int64 纳秒存放在最前面）
+FRAME_COLUMNS = ("Open", "High", "Low", "Close", "Volume")
+
+
+def _indicator(cache: Optional[Dict[tuple, np.ndarray]], key: tuple, compute: Callable) -> Callable:
+    """参数扫描时按 key 缓存指标数组，周期相同的多次运行只计算一次；cache 为空时原样计算"""
+    if cache is None:
+        return compute
+
+    def cached(*args):
+        value = cache.get(key)
+        if value is None:
+            value = cache[key] = np.asarray(compute(*args), dtype=np.float64)
+        return value
+
+    cached.__name__ = getattr(compute, "__name__", key[0])
+    return cached
+
+
+def create_moving_average_crossover_strategy(parameters: Dict[str, Any],
+                                            cache: Optional[Dict[tuple, np.ndarray]] = None) -> type:
+    """创建移动平均线交叉策略类"""
+    fast_period = parameters.get('fast_period', 10)
+    slow_period = parameters.get('slow_period', 30)
+
+    class MovingAverageCross(Strategy):
+        def init(self):
+            # 使用pandas计算移动平均线
+            self.fast_ma = self.I(_indicator(cache, ("sma", fast_period),
+                                             lambda x: pd.Series(x).rolling(fast_period).mean()), self.data.Close)
+            self.slow_ma = self.I(_indicator(cache, ("sma", slow_period),
+                                             lambda x: pd.Series(x).rolling(slow_period).mean()), self.data.Close)
+
+        def next(self):
+            # 满仓时 sell() 的下单数量为 0，持仓永远不会被平掉，需用 position.close() 平仓
+            if crossover(self.fast_ma, self.slow_ma) and not self.position:
+                self.buy()
+            elif crossover(self.slow_ma, self.fast_ma) and self.position:
+                self.position.close()
+
+    return MovingAverageCross
+
+
+def create_rsi_strategy(parameters: Dict[str, Any],
+                        cache: Optional[Dict[tuple, np.ndarray]] = None) -> type:
+    """创建RSI策略类"""
+    def compute_rsi(prices, period):
+        """计算RSI指标"""
+        delta = prices.diff()
+        gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
+        loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
+        rs = gain / loss
+        rsi = 100 - (100 / (1 + rs))
+        return rsi
+
+    class RsiStrategy(Strategy):
+        # 类属性直接取自 parameters（类体内同名赋值无法引用外层函数的局部变量）
+        rsi_period = parameters.get('rsi_period', 14)
+        oversold = parameters.get('oversold', 30)
+        overbought = parameters.get('overbought', 70)
+
+        def init(self):
+            self.rsi = self.I(_indicator(cache, ("rsi", self.rsi_period),
+                                         lambda x: compute_rsi(pd.Series(x), self.rsi_period)), self.data.Close)
+
+        def next(self):
+            if self.rsi[-1] < self.oversold and not self.position:
+                self.buy()
+            elif self.rsi[-1] > self.overbought and self.position:
+                self.position.close()
+
+    return RsiStrategy
+
+
+def create_mean_reversion_strategy(parameters: Dict[str, Any],
+                                   cache: Optional[Dict[tuple, np.ndarray]] = None) -> type:
+    """创建均值回归策略类"""
+    class MeanReversion(Strategy):
+        bb_period = parameters.get('bb_period', 20)
+        std_dev = parameters.get('std_dev', 2.0)
+
+        def init(self):
+            bands = _indicator(cache, ("bollinger", self.bb_period, self.std_dev),
+                               lambda x: np.vstack(bollinger_bands(x, self.bb_period, self.std_dev)))
+            self.bb_upper, self.bb_mid, self.bb_lower = self.I(bands, self.data.Close)
+
+        def next(self):
+            if self.data.Close[-1] < self.bb_lower[-1] and not self.position:
+                self.buy()
+            elif self.data.Close[-1] > self.bb_upper[-1] and self.position:
+                self.position.close()
+
+    return MeanReversion
+
+
+STRATEGY_FACTORIES: Dict[str, Callable[..., type]] = {
+    "moving_average_crossover": create_moving_average_crossover_strategy,
+    "rsi_strategy": create_rsi_strategy,
+    "mean_reversion": create_mean_reversion_strategy,
+}
+
+# 参数组合的有效性约束（参数扫描时跳过无意义的组合）
+STRATEGY_CONSTRAINTS: Dict[str, Callable[[Dict[str, Any]], bool]] = {
+    "moving_average_crossover": lambda p: p.get('fast_period', 10) < p.get('slow_period', 30),
+    "rsi_strategy": lambda p: p.get('oversold', 30) < p.get('overbought', 70),
+}
+
+
+def create_strategy(strategy_id: str, parameters: Dict[str, Any],
+                    cache: Optional[Dict[tuple, np.ndarray]] = None) -> type:
+    """按策略ID创建策略类，未知ID默认使用移动平均线交叉策略"""
+    factory = STRATEGY_FACTORIES.get(strategy_id, create_moving_average_crossover_strategy)
+    return factory(parameters or {}, cache)
+
+
+def is_valid_parameters(strategy_id: str, parameters: Dict[str, Any]) -> bool:
+    constraint = STRATEGY_CONSTRAINTS.get(strategy_id)
+    return constraint is None or bool(constraint(parameters))
+
+
+def _with_progress(strategy_class: type, total: int, report: Callable[[str], None]) -> type:
+    """包装策略类，每推进 PROGRESS_STEP% 的K线汇报一次进度"""
+    step = max(total * PROGRESS_STEP // 100, 1)
+
+    class Tracked(strategy_class):
+        def next(self):
+            super().next()
+            bars = len(self.data)
+            if bars % step == 0:
+                report(f"回测进度 {min(bars * 100 // total, 100)}%")
+
+    Tracked.__name__ = Tracked.__qualname__ = strategy_class.__name__
+    return Tracked
+
+
+def extract_statistics(output: pd.Series) -> Dict[str, Any]:
+    """回测输出中的统计指标"""
+    return {
+        "total_return": output['Return [%]'],
+        "annual_return": output['Return (Ann.) [%]'],
+        "sharpe_ratio": output['Sharpe Ratio'],
+        "max_drawdown": output['Max. Drawdown [%]'],
+        "win_rate": output['Win Rate [%]'],
+        "total_trades": output['# Trades'],
+        "profit_factor": output['Profit Factor'],
+        "calmar_ratio": output['Calmar Ratio'],
+        "alpha": 0.0,  # 暂时设为0，后续可计算
+        "beta": 1.0,   # 暂时设为1，后续可计算
+        "volatility": output['Volatility (Ann.) [%]']
+    }
+
+
+def _plain(value: Any) -> Any:
+    """numpy 标量转为 Python 类型，NaN 转为 None（便于 JSON 序列化和排序）"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def summarize(output: pd.Series, initial_capital: float) -> Dict[str, Any]:
+    """把 backtesting 的回测输出整理为统计、权益曲线（最多约100个点）和交易记录"""
+    statistics = extract_statistics(output)
+
+    # 生成权益曲线
+    equity_curve = []
+    curve = output['_equity_curve']
+    if curve is not None and not curve.empty:
+        equity_values = curve.Equity if hasattr(curve, 'Equity') else curve
+        equity_index = curve.index
+
+        # 采样，最多100个点
+        step = max(1, len(equity_values) // 100)
+        for i in range(0, len(equity_values), step):
+            equity = equity_values.iloc[i] if hasattr(equity_values, 'iloc') else equity_values[i]
+            date_index = equity_index[i] if hasattr(equity_index, '__getitem__') else i
+
+            equity_curve.append({
+                "date": date_index.strftime("%Y-%m-%d") if hasattr(date_index, 'strftime') else str(date_index),
+                "equity": round(float(equity), 2),
+                "return": round((float(equity) / initial_capital - 1) * 100, 2) if i > 0 else 0
+            })
+
+    # 生成交易记录
+    trades = []
+    trade_frame = output['_trades']
+    if trade_frame is not None and not trade_frame.empty:
+        for i, trade in trade_frame.iterrows():
+            trades.append({
+                "id": f"trade_{i}",
+                "date": trade['EntryTime'].strftime("%Y-%m-%d") if hasattr(trade['EntryTime'], 'strftime') else str(trade['EntryTime']),
+                "direction": "BUY" if trade['Size'] > 0 else "SELL",
+                "quantity": abs(trade['Size']),
+                "entry_price": trade['EntryPrice'],
+                "exit_price": trade['ExitPrice'],
+                "profit_loss": trade['PnL'],
+                "return_pct": trade['ReturnPct']
+            })
+
+    return {"statistics": statistics, "equity_curve": equity_curve, "trades": trades}
+
+
+def run_backtest(strategy_id: str, parameters: Dict[str, Any], data: pd.DataFrame,
+                 initial_capital: float, commission: float = .002,
+                 report: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """运行一次回测（在工作进程中调用），report 用于向主进程汇报进度"""
+    report = report or (lambda text: None)
+    strategy_class = create_strategy(strategy_id, parameters)
+    report(f"开始运行策略 {strategy_class.__name__}，共 {len(data)} 根K线")
+
+    bt = Backtest(data, _with_progress(strategy_class, len(data), report), cash=initial_capital, commission=commission)
+    output = bt.run()
+
+    report("策略运行完成，整理回测结果")
+    return summarize(output, initial_capital)
+
+
+# ----------------------------------------------------------------------
+# 参数扫描
+# ----------------------------------------------------------------------
+
+
+def share_frame(data: pd.DataFrame) -> Tuple[shared_memory.SharedMemory, Dict[str, Any]]:
+    """把K线数据复制到一块共享内存，返回共享内存对象（由调用方负责释放）和供工作进程挂载的描述"""
+    rows = len(data)
+    shm = shared_memory.SharedMemory(create=True, size=max(rows * 8 * (1 + len(FRAME_COLUMNS)), 1))
+    index = pd.DatetimeIndex(data.index)
+    np.ndarray((rows,), dtype=np.int64, buffer=shm.buf)[:] = index.asi8
+    values = np.ndarray((len(FRAME_COLUMNS), rows), dtype=np.float64, buffer=shm.buf, offset=rows * 8)
+    for i, column in enumerate(FRAME_COLUMNS):
+        values[i] = data[column].to_numpy(dtype=np.float64)
+    spec = {"name": shm.name, "rows": rows, "tz": str(index.tz) if index.tz is not None else None}
+    return shm, spec
+
+
+def attach_frame(spec: Dict[str, Any]) -> pd.DataFrame:
+    """在工作进程中挂载共享内存并重建 DataFrame（数据只复制一次，随后即可断开共享内存）"""
+    shm = shared_memory.SharedMemory(name=spec["name"])
+    try:
+        rows = spec["rows"]
+        index = pd.to_datetime(np.ndarray((rows,), dtype=np.int64, buffer=shm.buf).copy(), utc=spec["tz"] is not None)
+        if spec["tz"] is not None:
+            index = index.tz_convert(spec["tz"])
+        values = np.ndarray((len(FRAME_COLUMNS), rows), dtype=np.float64, buffer=shm.buf, offset=rows * 8)
+        return pd.DataFrame({column: values[i].copy() for i, column in enumerate(FRAME_COLUMNS)}, index=index)
+    finally:
+        shm.close()
+
+
+def evaluate(strategy_id: str, parameters: Dict[str, Any], data: pd.DataFrame, initial_capital: float,
+             engine: str = "backtesting", commission: float = .002,
+             cache: Optional[Dict[tuple, np.ndarray]] = None,
+             window: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+    """回测一组参数，返回统计指标、逐K线权益和逐笔收益率（参数扫描与稳健性分析共用）
+
+    window=(start, end) 只回测这一段K线。向量化引擎在整段数据上计算指标后截取；
+    backtesting 引擎只拿到这一段数据，指标在窗口内重新预热。
+    """
+    if engine == "vectorized" and strategy_id in VECTORIZED_STRATEGIES:
+        simulation, statistics = backtest_signals(strategy_id, parameters, data, initial_capital,
+                                                  commission, cache, window)
+        return {"statistics": statistics, "equity": simulation["equity"],
+                "trade_returns": simulation["trade_returns"]}
+
+    if window is not None:
+        data = data.iloc[window[0]:window[1]]
+        if cache is not None:
+            # 指标在窗口内计算，缓存按窗口区分
+            cache = cache.setdefault(("window", *window), {})
+    output = Backtest(data, create_strategy(strategy_id, parameters, cache),
+                      cash=initial_capital, commission=commission).run()
+    return {
+        "statistics": {key: _plain(value) for key, value in extract_statistics(output).items()},
+        "equity": output['_equity_curve'].Equity.to_numpy(),
+        "trade_returns": output['_trades'].ReturnPct.to_numpy()
+    }
+
+
+def run_sweep_chunk(spec: Dict[str, Any], strategy_id: str, combinations: List[Dict[str, Any]],
+                    initial_capital: float, engine: str = "backtesting", commission: float = .002,
+                    report: Optional[Callable[[str], None]] = None) -> List[Dict[str, Any]]:
+    """在工作进程中依次回测一批参数组合
+
+    数据从共享内存挂载一次；同一批内周期相同的指标只计算一次（组合按参数顺序连续分批，
+    相邻组合的前几个参数相同）。单个组合失败时记录错误并继续。
+    engine 为 vectorized 且策略是内置模板时使用向量化引擎。
+    """
+    data = attach_frame(spec)
+    cache: Dict[tuple, np.ndarray] = {}
+    results = []
+    for parameters in combinations:
+        try:
+            statistics = evaluate(strategy_id, parameters, data, initial_capital, engine, commission, cache)["statistics"]
+            results.append({"parameters": parameters, "statistics": statistics})
+        except Exception as e:
+            results.append({"parameters": parameters, "statistics": {}, "error": f"{type(e).__name__}: {e}"})
+    if report is not None:
+        report(f"完成 {len(combinations)} 组参数")
+    return results
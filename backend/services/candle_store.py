@@ -0,0 +1,337 @@
+"""
+本地K线历史库
+
+按 市场/交易所/品种/周期/月份 分区，把K线以列式原始数组保存在磁盘上：
+每个分区每列一个小端序二进制文件（timestamp 为 int64 毫秒，OHLCV 为 float64），
+读取时内存映射后二分切片；新K线晚于分区最后一根时直接追加，刷新尾部（与最后几根重叠）时
+从重叠处原地覆盖，只有补写更早的历史或乱序数据时才按新的"代"重写该分区。
+每个品种/周期一个 manifest.json，记录各分区的行数、代号和已完整获取过的时间区间（coverage），
+行数以 manifest 为准，追加到一半中断时多出的字节会被忽略。
+
+DataService 和回测在访问网络数据源之前先读这里，重启后的预热和重复回测只需读盘。
+"""
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import numpy as np
+
+from config import settings
+from models.market_data import CandleSeries, MarketType, Timeframe
+from .provider_executor import provider_executor
+
+logger = logging.getLogger(__name__)
+
+StoreKey = Tuple[str, MarketType, str, Timeframe]
+
+_DTYPES = {"timestamp": "<i8", **{name: "<f8" for name in CandleSeries._COLUMNS}}
+MANIFEST = "manifest.json"
+
+
+def _month_of(ms: np.ndarray) -> np.ndarray:
+    return ms.astype("datetime64[ms]").astype("datetime64[M]")
+
+
+class CandleDiskStore:
+    """磁盘列式K线存储"""
+
+    def __init__(self, root: str, enabled: bool = True):
+        self.root = Path(root)
+        self.enabled = enabled
+        self._locks: Dict[StoreKey, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self.reads = 0
+        self.hits = 0
+        self.rows_written = 0
+        self.rewrites = 0
+        self.tail_overwrites = 0
+        self.read_retries = 0
+
+    # ------------------------------------------------------------------
+    # 路径与 manifest
+    # ------------------------------------------------------------------
+
+    def _dir(self, key: StoreKey) -> Path:
+        symbol, market_type, exchange, timeframe = key
+        return self.root / market_type.value / quote(exchange or "_", safe="") / quote(symbol, safe="") / timeframe.value
+
+    def _lock(self, key: StoreKey) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _load_manifest(self, key: StoreKey) -> Dict[str, Any]:
+        path = self._dir(key) / MANIFEST
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"partitions": {}, "coverage": [], "updated_at": 0}
+
+    def _save_manifest(self, key: StoreKey, manifest: Dict[str, Any]):
+        path = self._dir(key) / MANIFEST
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _column_path(part_dir: Path, name: str, generation: int) -> Path:
+        return part_dir / f"{name}.{generation}.bin"
+
+    def _read_partition(self, part_dir: Path, part: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        """内存映射读取分区各列（只读前 rows 行）"""
+        rows = part["rows"]
+        return {
+            name: np.memmap(self._column_path(part_dir, name, part["gen"]), dtype=dtype, mode="r", shape=(rows,))
+            for name, dtype in _DTYPES.items()
+        }
+
+    # ------------------------------------------------------------------
+    # 覆盖区间
+    # ------------------------------------------------------------------
+
+    def coverage(self, key: StoreKey) -> List[Tuple[int, int]]:
+        return [tuple(span) for span in self._load_manifest(key)["coverage"]]
+
+    def covers(self, key: StoreKey, start_ms: int, end_ms: int) -> bool:
+        """[start_ms, end_ms] 是否完整获取过"""
+        if not self.enabled:
+            return False
+        return any(s <= start_ms and end_ms <= e for s, e in self.coverage(key))
+
+    @staticmethod
+    def _merge_spans(spans: List[List[int]], start: int, end: int, interval_ms: int) -> List[List[int]]:
+        spans = sorted(spans + [[start, end]])
+        merged = [spans[0]]
+        for s, e in spans[1:]:
+            if s <= merged[-1][1] + interval_ms:
+                merged[-1][1] = max(merged[-1][1], e)
+            else:
+                merged.append([s, e])
+        return merged
+
+    # ------------------------------------------------------------------
+    # 读写（同步，在线程池中执行）
+    # ------------------------------------------------------------------
+
+    def write(self, key: StoreKey, series: CandleSeries, covered: Optional[Tuple[int, int]] = None,
+              interval_ms: int = 0) -> int:
+        """写入K线并记录覆盖区间（默认为序列首尾），返回写入行数"""
+        if not self.enabled or len(series) == 0:
+            return 0
+        with self._lock(key):
+            base = self._dir(key)
+            base.mkdir(parents=True, exist_ok=True)
+            manifest = self._load_manifest(key)
+            partitions = manifest["partitions"]
+            stale: List[Path] = []
+
+            months = _month_of(series.timestamp)
+            bounds = np.flatnonzero(months[1:] != months[:-1]) + 1
+            for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, len(series)]):
+                month = str(months[lo])
+                chunk = series[int(lo):int(hi)]
+                part = partitions.get(month)
+                part_dir = base / month
+                if part is None or int(chunk.timestamp[0]) > part["last"]:
+                    partitions[month] = self._append(part_dir, part, chunk)
+                    continue
+                row = self._tail_row(part_dir, part, chunk)
+                if row is not None:
+                    partitions[month] = self._append(part_dir, part, chunk, row)
+                    self.tail_overwrites += 1
+                else:
+                    partitions[month] = self._rewrite(part_dir, part, chunk)
+                    stale.extend(self._column_path(part_dir, name, part["gen"]) for name in _DTYPES)
+
+            start, end = covered or (int(series.timestamp[0]), int(series.timestamp[-1]))
+            manifest["coverage"] = self._merge_spans(manifest["coverage"], int(start), int(end), interval_ms)
+            manifest["updated_at"] = time.time()
+            self._save_manifest(key, manifest)
+            # manifest 指向新的一代之后再删除旧文件
+            for path in stale:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self.rows_written += len(series)
+            return len(series)
+
+    def _tail_row(self, part_dir: Path, part: Dict[str, Any], chunk: CandleSeries) -> Optional[int]:
+        """新数据只是刷新分区尾部时返回开始覆盖的行号，否则返回 None
+
+        条件：新数据严格升序，且分区中不早于其第一根的K线全部出现在新数据中，
+        覆盖后的结果与合并重写相同。
+        """
+        new_ts = chunk.timestamp
+        if len(new_ts) > 1 and not np.all(new_ts[1:] > new_ts[:-1]):
+            return None
+        ts = np.memmap(self._column_path(part_dir, "timestamp", part["gen"]), dtype=_DTYPES["timestamp"],
+                       mode="r", shape=(part["rows"],))
+        row = int(np.searchsorted(ts, new_ts[0], side="left"))
+        tail = np.array(ts[row:])
+        del ts
+        if len(tail) > len(new_ts) or not np.isin(tail, new_ts).all():
+            return None
+        return row
+
+    def _append(self, part_dir: Path, part: Optional[Dict[str, Any]], chunk: CandleSeries,
+                row: Optional[int] = None) -> Dict[str, Any]:
+        """从第 row 行（默认为 manifest 记录的行尾）开始写入，之后的旧数据被覆盖"""
+        if part is None:
+            part_dir.mkdir(parents=True, exist_ok=True)
+            part = {"rows": 0, "gen": 0, "first": int(chunk.timestamp[0]), "last": 0}
+        row = part["rows"] if row is None else row
+        for name, dtype in _DTYPES.items():
+            path = self._column_path(part_dir, name, part["gen"])
+            with open(path, "r+b" if path.exists() else "wb") as f:
+                # 从指定行开始写，并截掉其后的字节（包括上次中断时多出的部分）
+                f.seek(row * np.dtype(dtype).itemsize)
+                f.write(getattr(chunk, name).astype(dtype, copy=False).tobytes())
+                f.truncate()
+        return {**part, "rows": row + len(chunk), "first": min(part["first"], int(chunk.timestamp[0])),
+                "last": int(chunk.timestamp[-1])}
+
+    def _rewrite(self, part_dir: Path, part: Dict[str, Any], chunk: CandleSeries) -> Dict[str, Any]:
+        """与已有数据重叠或更早：合并后写为新的一代（同一时间戳以新数据为准）"""
+        old = self._read_partition(part_dir, part)
+        merged = {name: np.concatenate([np.asarray(old[name]), getattr(chunk, name)]) for name in _DTYPES}
+        order = np.argsort(merged["timestamp"], kind="stable")
+        ts = merged["timestamp"][order]
+        keep = order[np.append(ts[1:] != ts[:-1], True)]
+        generation = part["gen"] + 1
+        for name, dtype in _DTYPES.items():
+            merged[name][keep].astype(dtype, copy=False).tofile(self._column_path(part_dir, name, generation))
+        del old
+        self.rewrites += 1
+        timestamps = merged["timestamp"][keep]
+        return {"rows": len(keep), "gen": generation, "first": int(timestamps[0]), "last": int(timestamps[-1])}
+
+    def read(self, key: StoreKey, start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+             limit: Optional[int] = None) -> CandleSeries:
+        """读取 [start_ms, end_ms] 内的K线，指定 limit 时取最近 limit 根
+
+        读取不加锁：并发写入换代后会删除旧一代文件，按读到的旧 manifest 打开时文件可能已不存在，
+        此时重新读取 manifest 后重试一次。
+        """
+        if not self.enabled:
+            symbol, market_type, exchange, timeframe = key
+            return CandleSeries.empty(symbol, market_type, exchange, timeframe)
+        self.reads += 1
+        try:
+            return self._read(key, start_ms, end_ms, limit)
+        except FileNotFoundError:
+            self.read_retries += 1
+            return self._read(key, start_ms, end_ms, limit)
+
+    def _read(self, key: StoreKey, start_ms: Optional[int], end_ms: Optional[int],
+              limit: Optional[int]) -> CandleSeries:
+        symbol, market_type, exchange, timeframe = key
+        empty = CandleSeries.empty(symbol, market_type, exchange, timeframe)
+        manifest = self._load_manifest(key)
+        base = self._dir(key)
+        chunks = []
+        total = 0
+        # 从最近的分区往前读，有 limit 时读够即止
+        for month in sorted(manifest["partitions"], reverse=True):
+            part = manifest["partitions"][month]
+            if part["rows"] == 0 or (start_ms is not None and part["last"] < start_ms) \
+                    or (end_ms is not None and part["first"] > end_ms):
+                continue
+            columns = self._read_partition(base / month, part)
+            ts = columns["timestamp"]
+            lo = 0 if start_ms is None else int(np.searchsorted(ts, start_ms, side="left"))
+            hi = len(ts) if end_ms is None else int(np.searchsorted(ts, end_ms, side="right"))
+            if hi > lo:
+                chunks.append({name: np.array(values[lo:hi]) for name, values in columns.items()})
+                total += hi - lo
+            if limit is not None and total >= limit:
+                break
+        if not chunks:
+            return empty
+        self.hits += 1
+        chunks.reverse()
+        series = CandleSeries(symbol, market_type, exchange, timeframe,
+                              **{name: np.concatenate([c[name] for c in chunks]) for name in _DTYPES})
+        return series.tail(limit) if limit is not None else series
+
+    def read_span(self, key: StoreKey, at_ms: Optional[int] = None,
+                  limit: Optional[int] = None) -> Tuple[CandleSeries, float]:
+        """读取一段连续覆盖区间内的K线：包含 at_ms 的区间，未指定时为最新的区间
+
+        返回 (K线, 最新K线的获取时间)；不是最新区间时获取时间为 0（视为需要补取尾部）。
+        """
+        symbol, market_type, exchange, timeframe = key
+        manifest = self._load_manifest(key) if self.enabled else {"coverage": []}
+        spans = manifest["coverage"]
+        span = None
+        if at_ms is None:
+            span = spans[-1] if spans else None
+        else:
+            span = next((s for s in spans if s[0] <= at_ms <= s[1]), None)
+        if span is None:
+            return CandleSeries.empty(symbol, market_type, exchange, timeframe), 0.0
+        updated_at = manifest["updated_at"] if span is spans[-1] else 0.0
+        return self.read(key, span[0], span[1], limit), updated_at
+
+    def read_covered(self, key: StoreKey, start_ms: int, end_ms: int) -> Optional[CandleSeries]:
+        """[start_ms, end_ms] 完整获取过时返回其中的K线，否则返回 None"""
+        if not self.covers(key, start_ms, end_ms):
+            return None
+        return self.read(key, start_ms, end_ms)
+
+    # ------------------------------------------------------------------
+    # 异步接口
+    # ------------------------------------------------------------------
+
+    async def load(self, key: StoreKey, start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+                   limit: Optional[int] = None) -> CandleSeries:
+        return await provider_executor.run("candle_store", self.read, key, start_ms, end_ms, limit)
+
+    async def load_covered(self, key: StoreKey, start_ms: int, end_ms: int) -> Optional[CandleSeries]:
+        try:
+            return await provider_executor.run("candle_store", self.read_covered, key, start_ms, end_ms)
+        except Exception as e:
+            logger.error(f"读取本地K线库失败: {key[0]} {key[3].value} - {e}")
+            return None
+
+    async def load_span(self, key: StoreKey, at_ms: Optional[int] = None,
+                        limit: Optional[int] = None) -> Tuple[CandleSeries, float]:
+        try:
+            return await provider_executor.run("candle_store", self.read_span, key, at_ms, limit)
+        except Exception as e:
+            logger.error(f"读取本地K线库失败: {key[0]} {key[3].value} - {e}")
+            symbol, market_type, exchange, timeframe = key
+            return CandleSeries.empty(symbol, market_type, exchange, timeframe), 0.0
+
+    async def save(self, key: StoreKey, series: CandleSeries, covered: Optional[Tuple[int, int]] = None,
+                   interval_ms: int = 0) -> int:
+        """写入磁盘，失败只记录日志（历史库是缓存，不影响请求）"""
+        if not self.enabled or len(series) == 0:
+            return 0
+        try:
+            return await provider_executor.run("candle_store", self.write, key, series, covered, interval_ms)
+        except Exception as e:
+            logger.error(f"写入本地K线库失败: {key[0]} {key[3].value} - {e}")
+            return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "root": str(self.root),
+            "reads": self.reads,
+            "hits": self.hits,
+            "rows_written": self.rows_written,
+            "rewrites": self.rewrites,
+            "tail_overwrites": self.tail_overwrites,
+            "read_retries": self.read_retries
+        }
+
+
+# 全局本地K线库实例
+candle_store = CandleDiskStore(settings.CANDLE_STORE_DIR, enabled=settings.CANDLE_STORE_ENABLED)
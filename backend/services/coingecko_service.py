@@ -3,9 +3,9 @@ import logging
 import aiohttp
 import time
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
 import pandas as pd
-from models.market_data import KlineData, MarketType, Timeframe
+from models.market_data import KlineData, CandleSeries, MarketType, Timeframe
 
 logger = logging.getLogger(__name__)
 
@@ -56,9 +56,13 @@ class CoinGeckoService:
         self,
         symbol: str,
         timeframe: Timeframe,
-        limit: int = 1000
-    ) -> List[KlineData]:
-        """获取加密货币K线数据"""
+        limit: int = 1000,
+        mock_on_error: bool = True
+    ) -> Union[CandleSeries, List[KlineData]]:
+        """获取加密货币K线数据
+        
+        mock_on_error 为 False 时失败返回空序列（由调用方路由到其他数据源），不返回模拟数据
+        """
         try:
             await self._rate_limit()
             
@@ -66,7 +70,7 @@ class CoinGeckoService:
             coin_id = self._get_coin_id(symbol)
             if not coin_id:
                 logger.warning(f"未找到加密货币映射: {symbol}")
-                return await self._get_mock_data(symbol, timeframe, limit)
+                return await self._fallback(symbol, timeframe, limit, mock_on_error)
             
             # 时间框架映射到天数
             days_mapping = {
@@ -84,7 +88,7 @@ class CoinGeckoService:
             
             # 对于分钟级数据，使用更精确的端点
             if timeframe in [Timeframe.MINUTE_1, Timeframe.MINUTE_5, Timeframe.MINUTE_15]:
-                return await self._get_intraday_data(coin_id, symbol, timeframe, limit)
+                return await self._get_intraday_data(coin_id, symbol, timeframe, limit, mock_on_error)
             
             params = {
                 "vs_currency": "usd",
@@ -96,47 +100,34 @@ class CoinGeckoService:
             async with session.get(f"{self.base_url}/coins/{coin_id}/market_chart", params=params) as response:
                 if response.status != 200:
                     logger.warning(f"CoinGecko API请求失败: {response.status}")
-                    return await self._get_mock_data(symbol, timeframe, limit)
+                    return await self._fallback(symbol, timeframe, limit, mock_on_error)
                 
                 data = await response.json()
                 
                 # 解析价格数据
                 prices = data.get("prices", [])
-                klines = []
                 
-                for price_data in prices:
-                    timestamp = datetime.fromtimestamp(price_data[0] / 1000)
-                    price = price_data[1]
-                    
-                    # 对于OHLC数据，使用相同价格（CoinGecko只提供价格）
-                    kline = KlineData(
-                        symbol=symbol,
-                        timeframe=timeframe,
-                        market_type=MarketType.CRYPTO,
-                        exchange='coingecko',
-                        timestamp=timestamp,
-                        open=price,
-                        high=price,
-                        low=price,
-                        close=price,
-                        volume=0.0  # CoinGecko不提供交易量数据
-                    )
-                    klines.append(kline)
+                # 对于OHLC数据，使用相同价格（CoinGecko只提供价格，不提供交易量数据）
+                klines = CandleSeries.from_ohlcv(
+                    ([ts, price, price, price, price, 0.0] for ts, price in prices),
+                    symbol, MarketType.CRYPTO, 'coingecko', timeframe
+                )
                 
                 # 限制返回数量
-                return klines[-limit:] if len(klines) > limit else klines
+                return klines.tail(limit)
                 
         except Exception as e:
             logger.error(f"获取CoinGecko加密货币K线数据失败: {e}")
-            return await self._get_mock_data(symbol, timeframe, limit)
+            return await self._fallback(symbol, timeframe, limit, mock_on_error)
     
     async def _get_intraday_data(
         self,
         coin_id: str,
         symbol: str,
         timeframe: Timeframe,
-        limit: int
-    ) -> List[KlineData]:
+        limit: int,
+        mock_on_error: bool = True
+    ) -> Union[CandleSeries, List[KlineData]]:
         """获取日内数据"""
         try:
             # 对于分钟级数据，使用OHLC端点
@@ -149,34 +140,20 @@ class CoinGeckoService:
             async with session.get(f"{self.base_url}/coins/{coin_id}/ohlc", params=params) as response:
                 if response.status != 200:
                     logger.warning(f"CoinGecko OHLC API请求失败: {response.status}")
-                    return await self._get_mock_data(symbol, timeframe, limit)
+                    return await self._fallback(symbol, timeframe, limit, mock_on_error)
                 
                 data = await response.json()
-                klines = []
-                
-                for ohlc_data in data:
-                    timestamp = datetime.fromtimestamp(ohlc_data[0] / 1000)
-                    
-                    kline = KlineData(
-                        symbol=symbol,
-                        timeframe=timeframe,
-                        market_type=MarketType.CRYPTO,
-                        exchange='coingecko',
-                        timestamp=timestamp,
-                        open=ohlc_data[1],
-                        high=ohlc_data[2],
-                        low=ohlc_data[3],
-                        close=ohlc_data[4],
-                        volume=0.0
-                    )
-                    klines.append(kline)
+                klines = CandleSeries.from_ohlcv(
+                    ([*ohlc_data[:5], 0.0] for ohlc_data in data),
+                    symbol, MarketType.CRYPTO, 'coingecko', timeframe
+                )
                 
                 # 限制返回数量
-                return klines[-limit:] if len(klines) > limit else klines
+                return klines.tail(limit)
                 
         except Exception as e:
             logger.error(f"获取CoinGecko日内数据失败: {e}")
-            return await self._get_mock_data(symbol, timeframe, limit)
+            return await self._fallback(symbol, timeframe, limit, mock_on_error)
     
     def _get_coin_id(self, symbol: str) -> Optional[str]:
         """获取CoinGecko币种ID"""
@@ -366,6 +343,13 @@ class CoinGeckoService:
             logger.error(f"CoinGecko获取报价出错: {e}")
             return None
     
+    async def _fallback(self, symbol: str, timeframe: Timeframe, limit: int,
+                        mock_on_error: bool) -> Union[CandleSeries, List[KlineData]]:
+        """请求失败时的返回值：空序列或模拟数据"""
+        if not mock_on_error:
+            return CandleSeries.empty(symbol, MarketType.CRYPTO, 'coingecko', timeframe)
+        return await self._get_mock_data(symbol, timeframe, limit)
+    
     async def _get_mock_data(
         self, 
         symbol: str, 
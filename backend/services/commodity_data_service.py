@@ -9,6 +9,7 @@ from typing import List, Optional, Dict
 import aiohttp
 from models.market_data import KlineData, MarketType, Timeframe
 from config import settings
+from .provider_executor import provider_executor
 
 logger = logging.getLogger(__name__)
 
@@ -235,9 +236,10 @@ class CommodityDataService:
             interval = interval_map.get(timeframe, "1d")
             period = period_map.get(timeframe, "1y")
             
-            # 获取数据
-            ticker = yf.Ticker(yahoo_symbol)
-            df = ticker.history(period=period, interval=interval)
+            # 获取数据（yfinance 为阻塞调用，在数据源线程池中执行）
+            df = await provider_executor.run(
+                "yfinance", lambda: yf.Ticker(yahoo_symbol).history(period=period, interval=interval)
+            )
             
             if df.empty:
                 logger.warning(f"Yahoo Finance未返回{yahoo_symbol}数据")
@@ -311,8 +313,7 @@ class CommodityDataService:
             
             # 如果Alpha Vantage失败,尝试Yahoo Finance
             import yfinance as yf
-            ticker = yf.Ticker(commodity_info['yahoo'])
-            info = ticker.info
+            info = await provider_executor.run("yfinance", lambda: yf.Ticker(commodity_info['yahoo']).info)
             
             return {
                 "symbol": symbol,
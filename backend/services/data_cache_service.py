@@ -1,41 +1,146 @@
 import asyncio
+import fnmatch
 import logging
+import sys
 import time
 import threading
-from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+from collections import OrderedDict
+from datetime import datetime, date
+from typing import Dict, Any, Optional, Tuple, Callable, Awaitable
 import json
 
+import numpy as np
+
+import database
+from config import settings
+from models.market_data import CandleSeries
+
 logger = logging.getLogger(__name__)
 
+# Redis 中缓存键的前缀，避免与其他数据冲突
+REDIS_KEY_PREFIX = "omnimarket:cache:"
+
+# L2 序列化格式标记：K线序列使用紧凑二进制，其余可 JSON 化的值使用 JSON
+_TAG_CANDLES = b"C"
+_TAG_JSON = b"J"
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"无法序列化类型 {type(value).__name__}")
+
+
+def _json_object_hook(obj):
+    if len(obj) == 1:
+        if "__datetime__" in obj:
+            return datetime.fromisoformat(obj["__datetime__"])
+        if "__date__" in obj:
+            return date.fromisoformat(obj["__date__"])
+    return obj
+
+
+def encode_value(value: Any) -> bytes:
+    """将缓存值编码为 L2 存储的字节串，不支持的类型抛出 TypeError"""
+    if isinstance(value, CandleSeries):
+        return _TAG_CANDLES + value.to_bytes()
+    return _TAG_JSON + json.dumps(value, default=_json_default, ensure_ascii=False).encode("utf-8")
+
+
+def decode_value(data: bytes) -> Any:
+    """还原 encode_value 编码的值"""
+    tag, payload = data[:1], data[1:]
+    if tag == _TAG_CANDLES:
+        return CandleSeries.from_bytes(payload)
+    if tag == _TAG_JSON:
+        return json.loads(payload.decode("utf-8"), object_hook=_json_object_hook)
+    raise ValueError("未知的缓存数据格式")
+
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """估算缓存值占用的内存字节数（写入时计算一次，不做序列化）"""
+    if isinstance(value, CandleSeries):
+        return sys.getsizeof(value) + value.nbytes
+    if isinstance(value, np.ndarray):
+        return sys.getsizeof(value) + (0 if value.base is None else value.nbytes)
+    size = sys.getsizeof(value)
+    if _depth >= 4 or isinstance(value, (str, bytes, int, float, bool, type(None))):
+        return size
+    if isinstance(value, dict):
+        return size + sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(estimate_size(v, _depth + 1) for v in value)
+    attributes = getattr(value, "__dict__", None)
+    if attributes:
+        return size + sum(estimate_size(v, _depth + 1) for k, v in attributes.items() if not k.startswith("_"))
+    return size
+
+
+class _CacheEntry:
+    """L1 缓存条目，过期后在 stale_until 之前仍可作为陈旧值返回"""
+    __slots__ = ("value", "size", "ttl", "expires_at", "stale_until", "refresh", "created_at", "hits")
+
+    def __init__(self, value: Any, size: int, ttl: float, stale_ttl: float = 0,
+                 refresh: Optional[Callable[[], Awaitable[Any]]] = None):
+        self.value = value
+        self.size = size
+        self.ttl = ttl
+        self.created_at = time.time()
+        self.expires_at = self.created_at + ttl
+        self.stale_until = self.expires_at + stale_ttl
+        self.refresh = refresh
+        self.hits = 0
+
+
 class DataCacheService:
-    """数据缓存服务 - 由于Redis连接失败，使用内存缓存作为临时方案
+    """数据缓存服务 - 分层缓存
     
-    性能优化：
-    - 缓存命中率监控
-    - TTL调整为180秒（更新鲜的市场数据）
-    - 线程安全的统计计数器
+    - L1：进程内缓存，按写入时估算的字节数计量，超过内存上限时按 LRU/LFU 淘汰
+    - L2：可选的 Redis 缓存（database.redis_client 可用时启用），多个 worker 共享；
+      K线序列使用紧凑二进制序列化
+    - 可选的 stale-while-revalidate：过期后的宽限期内立即返回旧值，并在后台刷新一次
+    - 缓存命中率监控，线程安全的统计计数器
     """
     
-    def __init__(self):
-        self.cache: Dict[str, Dict[str, Any]] = {}
-        self.cache_ttl: Dict[str, float] = {}  # TTL时间戳
+    # LFU 淘汰时从最久未访问的若干条目中抽样，选择访问次数最少者
+    LFU_SAMPLE_SIZE = 16
+    
+    def __init__(self, max_memory_bytes: Optional[int] = None, eviction_policy: Optional[str] = None,
+                 redis_enabled: Optional[bool] = None):
+        # 按访问顺序排列（最久未访问在前）
+        self.cache: "OrderedDict[str, _CacheEntry]" = OrderedDict()
         self.default_ttl = 180  # 默认缓存时间3分钟（优化：从300s降低到180s以获取更新鲜数据）
         self.cleanup_interval = 60  # 清理间隔60秒
         self.is_running = False
         self.cleanup_task = None
         
+        # L1 容量与淘汰策略
+        self.max_memory_bytes = max_memory_bytes if max_memory_bytes is not None else settings.CACHE_MAX_MEMORY_MB * 1024 * 1024
+        self.eviction_policy = (eviction_policy or settings.CACHE_EVICTION_POLICY).lower()
+        self.redis_enabled = settings.CACHE_REDIS_ENABLED if redis_enabled is None else redis_enabled
+        self.memory_bytes = 0
+        
         # 性能监控统计（线程安全）
         self._stats_lock = threading.Lock()
         self._cache_hits = 0
         self._cache_misses = 0
         self._total_requests = 0
+        self._l2_hits = 0
+        self._stale_hits = 0
+        self._evictions = 0
+        
+        # 正在后台刷新的键
+        self._revalidating: set = set()
     
     async def start(self):
         """启动缓存服务"""
         self.is_running = True
         self.cleanup_task = asyncio.create_task(self._cleanup_loop())
-        logger.info("数据缓存服务已启动（内存缓存）")
+        logger.info(f"数据缓存服务已启动（L1内存缓存，L2 Redis: {'启用' if self._redis() else '不可用'}）")
     
     async def stop(self):
         """停止缓存服务"""
@@ -48,39 +153,99 @@ class DataCacheService:
                 pass
         logger.info("数据缓存服务已停止")
     
-    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
-        """设置缓存"""
+    def _redis(self):
+        """当前可用的 Redis 客户端（init_db 之后才会建立连接）"""
+        if not self.redis_enabled:
+            return None
+        return database.get_redis()
+    
+    def _store(self, key: str, value: Any, ttl: float, stale_ttl: float = 0,
+               refresh: Optional[Callable[[], Awaitable[Any]]] = None):
+        """写入 L1 并按内存上限淘汰"""
+        self._delete_key(key)
+        size = estimate_size(value)
+        if size > self.max_memory_bytes:
+            logger.debug(f"缓存值过大，不写入内存缓存: {key} ({size} bytes)")
+            return
+        self.cache[key] = _CacheEntry(value, size, ttl, stale_ttl, refresh)
+        self.memory_bytes += size
+        while self.memory_bytes > self.max_memory_bytes and len(self.cache) > 1:
+            self._evict_one(exclude=key)
+    
+    def _evict_one(self, exclude: str):
+        """按淘汰策略移除一个条目"""
+        victim = None
+        if self.eviction_policy == "lfu":
+            fewest = None
+            for i, (key, entry) in enumerate(self.cache.items()):
+                if i >= self.LFU_SAMPLE_SIZE:
+                    break
+                if key != exclude and (fewest is None or entry.hits < fewest):
+                    victim, fewest = key, entry.hits
+        else:
+            victim = next((key for key in self.cache if key != exclude), None)
+        if victim is None:
+            return
+        self._delete_key(victim)
+        with self._stats_lock:
+            self._evictions += 1
+    
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None, stale_ttl: float = 0,
+                  refresh: Optional[Callable[[], Awaitable[Any]]] = None) -> bool:
+        """设置缓存（同时写入 L1 和可用的 L2）
+        
+        Args:
+            stale_ttl: 过期后仍可返回旧值的宽限时间（秒），需同时提供 refresh
+            refresh: 宽限期内被读取时在后台调用的协程函数，负责重新获取数据并写回缓存
+        """
         try:
             cache_ttl = ttl if ttl is not None else self.default_ttl
-            self.cache[key] = {
-                'value': value,
-                'timestamp': time.time()
-            }
-            self.cache_ttl[key] = time.time() + cache_ttl
+            self._store(key, value, cache_ttl, stale_ttl if refresh else 0, refresh)
+            await self._l2_set(key, value, cache_ttl)
             return True
         except Exception as e:
             logger.error(f"设置缓存失败: {e}")
             return False
     
     async def get(self, key: str) -> Optional[Any]:
-        """获取缓存"""
+        """获取缓存，L1 未命中时查询 L2 并回填 L1"""
         try:
             with self._stats_lock:
                 self._total_requests += 1
             
-            # 检查是否过期
-            if key in self.cache_ttl and time.time() > self.cache_ttl[key]:
-                self._delete_key(key)
-                with self._stats_lock:
-                    self._cache_misses += 1
-                logger.debug(f"缓存过期: {key}")
-                return None
+            entry = self.cache.get(key)
+            if entry is not None:
+                current_time = time.time()
+                if current_time > entry.expires_at:
+                    if current_time <= entry.stale_until:
+                        # 宽限期内：立即返回旧值，后台刷新
+                        self._schedule_revalidate(key, entry.refresh)
+                        entry.hits += 1
+                        self.cache.move_to_end(key)
+                        with self._stats_lock:
+                            self._cache_hits += 1
+                            self._stale_hits += 1
+                        logger.debug(f"返回陈旧缓存并后台刷新: {key}")
+                        return entry.value
+                    self._delete_key(key)
+                    logger.debug(f"缓存过期: {key}")
+                else:
+                    entry.hits += 1
+                    self.cache.move_to_end(key)
+                    with self._stats_lock:
+                        self._cache_hits += 1
+                    logger.debug(f"缓存命中: {key}")
+                    return entry.value
             
-            if key in self.cache:
+            l2_result = await self._l2_get(key)
+            if l2_result is not None:
+                value, remaining = l2_result
+                self._store(key, value, remaining)
                 with self._stats_lock:
                     self._cache_hits += 1
-                logger.debug(f"缓存命中: {key}")
-                return self.cache[key]['value']
+                    self._l2_hits += 1
+                logger.debug(f"二级缓存命中: {key}")
+                return value
             
             with self._stats_lock:
                 self._cache_misses += 1
@@ -92,31 +257,86 @@ class DataCacheService:
                 self._cache_misses += 1
             return None
     
+    def _schedule_revalidate(self, key: str, refresh: Callable[[], Awaitable[Any]]):
+        """为陈旧条目启动一次后台刷新，同一键同时只有一个刷新任务"""
+        if key in self._revalidating:
+            return
+        self._revalidating.add(key)
+        
+        async def revalidate():
+            try:
+                await refresh()
+            except Exception as e:
+                logger.error(f"后台刷新缓存失败 {key}: {e}")
+            finally:
+                self._revalidating.discard(key)
+        
+        asyncio.create_task(revalidate())
+    
+    async def _l2_set(self, key: str, value: Any, ttl: float):
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            data = encode_value(value)
+        except (TypeError, ValueError) as e:
+            logger.debug(f"缓存值不支持写入Redis: {key} ({e})")
+            return
+        try:
+            await asyncio.to_thread(client.set, REDIS_KEY_PREFIX + key, data, px=max(int(ttl * 1000), 1))
+        except Exception as e:
+            logger.error(f"写入Redis缓存失败: {e}")
+    
+    async def _l2_get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """返回 (值, 剩余秒数)，不存在或不可用时返回 None"""
+        client = self._redis()
+        if client is None:
+            return None
+        try:
+            def fetch():
+                pipe = client.pipeline()
+                pipe.get(REDIS_KEY_PREFIX + key)
+                pipe.pttl(REDIS_KEY_PREFIX + key)
+                return pipe.execute()
+            data, remaining_ms = await asyncio.to_thread(fetch)
+            if data is None:
+                return None
+            remaining = remaining_ms / 1000 if remaining_ms and remaining_ms > 0 else self.default_ttl
+            return decode_value(data), remaining
+        except Exception as e:
+            logger.error(f"读取Redis缓存失败: {e}")
+            return None
+    
     async def delete(self, key: str) -> bool:
         """删除缓存"""
         try:
             self._delete_key(key)
+            client = self._redis()
+            if client is not None:
+                await asyncio.to_thread(client.delete, REDIS_KEY_PREFIX + key)
             return True
         except Exception as e:
             logger.error(f"删除缓存失败: {e}")
             return False
     
     def _delete_key(self, key: str):
-        """删除缓存键"""
-        if key in self.cache:
-            del self.cache[key]
-        if key in self.cache_ttl:
-            del self.cache_ttl[key]
+        """删除 L1 缓存键"""
+        entry = self.cache.pop(key, None)
+        if entry is not None:
+            self.memory_bytes -= entry.size
     
     async def exists(self, key: str) -> bool:
-        """检查缓存是否存在"""
+        """检查缓存是否存在（仅 L1）"""
         try:
-            if key not in self.cache:
+            entry = self.cache.get(key)
+            if entry is None:
                 return False
             
-            # 检查是否过期
-            if key in self.cache_ttl and time.time() > self.cache_ttl[key]:
-                self._delete_key(key)
+            # 检查是否过期（宽限期内的陈旧条目保留，但不视为存在）
+            current_time = time.time()
+            if current_time > entry.expires_at:
+                if current_time > entry.stale_until:
+                    self._delete_key(key)
                 return False
             
             return True
@@ -127,26 +347,27 @@ class DataCacheService:
     async def ttl(self, key: str) -> Optional[int]:
         """获取缓存剩余时间"""
         try:
-            if key not in self.cache_ttl:
+            entry = self.cache.get(key)
+            if entry is None:
                 return None
             
-            remaining = self.cache_ttl[key] - time.time()
+            remaining = entry.expires_at - time.time()
             return max(0, int(remaining))
         except Exception as e:
             logger.error(f"获取缓存TTL失败: {e}")
             return None
     
     async def keys(self, pattern: str = "*") -> list:
-        """获取匹配模式的缓存键"""
+        """获取匹配模式的缓存键（仅 L1）"""
         try:
-            import fnmatch
-            current_keys = list(self.cache.keys())
+            current_time = time.time()
             matching_keys = []
             
-            for key in current_keys:
+            for key, entry in list(self.cache.items()):
                 # 检查是否过期
-                if key in self.cache_ttl and time.time() > self.cache_ttl[key]:
-                    self._delete_key(key)
+                if current_time > entry.expires_at:
+                    if current_time > entry.stale_until:
+                        self._delete_key(key)
                     continue
                 
                 if fnmatch.fnmatch(key, pattern):
@@ -158,10 +379,17 @@ class DataCacheService:
             return []
     
     async def flush_all(self) -> bool:
-        """清空所有缓存"""
+        """清空所有缓存（包括 L2 中本服务写入的键）"""
         try:
             self.cache.clear()
-            self.cache_ttl.clear()
+            self.memory_bytes = 0
+            client = self._redis()
+            if client is not None:
+                def flush():
+                    keys = list(client.scan_iter(match=REDIS_KEY_PREFIX + "*"))
+                    if keys:
+                        client.delete(*keys)
+                await asyncio.to_thread(flush)
             return True
         except Exception as e:
             logger.error(f"清空缓存失败: {e}")
@@ -180,40 +408,33 @@ class DataCacheService:
                 await asyncio.sleep(10)
     
     async def _cleanup_expired(self):
-        """清理过期缓存"""
+        """清理过期缓存（L2 由 Redis 自身过期）"""
         try:
             current_time = time.time()
-            expired_keys = []
-            
-            for key, expiry in self.cache_ttl.items():
-                if current_time > expiry:
-                    expired_keys.append(key)
+            expired_keys = [key for key, entry in self.cache.items() if current_time > entry.stale_until]
             
             for key in expired_keys:
                 self._delete_key(key)
             
             if expired_keys:
                 logger.debug(f"清理了 {len(expired_keys)} 个过期缓存")
-                
+        
         except Exception as e:
             logger.error(f"清理过期缓存失败: {e}")
     
     def get_stats(self) -> Dict[str, Any]:
-        """获取缓存统计信息（包括命中率监控）"""
+        """获取缓存统计信息（包括命中率监控），内存用量来自写入时的字节计数"""
         current_time = time.time()
-        valid_keys = 0
-        expired_keys = 0
-        
-        for key in list(self.cache.keys()):
-            if key in self.cache_ttl and current_time > self.cache_ttl[key]:
-                expired_keys += 1
-            else:
-                valid_keys += 1
+        expired_keys = sum(1 for entry in list(self.cache.values()) if current_time > entry.expires_at)
+        valid_keys = len(self.cache) - expired_keys
         
         with self._stats_lock:
             total_requests = self._total_requests
             cache_hits = self._cache_hits
             cache_misses = self._cache_misses
+            l2_hits = self._l2_hits
+            stale_hits = self._stale_hits
+            evictions = self._evictions
             hit_rate = (cache_hits / total_requests * 100) if total_requests > 0 else 0.0
         
         return {
@@ -221,7 +442,16 @@ class DataCacheService:
             'valid_keys': valid_keys,
             'expired_keys': expired_keys,
             'cache_size': len(self.cache),
-            'memory_usage': f"{len(str(self.cache))} bytes",
+            'memory_usage': f"{self.memory_bytes} bytes",
+            'memory_bytes': self.memory_bytes,
+            'max_memory_bytes': self.max_memory_bytes,
+            'eviction_policy': self.eviction_policy,
+            'evictions': evictions,
+            'stale_hits': stale_hits,
+            'l2': {
+                'enabled': self._redis() is not None,
+                'hits': l2_hits
+            },
             # 性能监控指标
             'performance': {
                 'total_requests': total_requests,
@@ -238,6 +468,9 @@ class DataCacheService:
             self._cache_hits = 0
             self._cache_misses = 0
             self._total_requests = 0
+            self._l2_hits = 0
+            self._stale_hits = 0
+            self._evictions = 0
         logger.info("缓存性能统计已重置")
 
 
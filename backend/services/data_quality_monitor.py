@@ -4,6 +4,7 @@ from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
 from enum import Enum
 import statistics
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
@@ -32,11 +33,23 @@ class DataQualityMetrics:
         self.success_count += 1
         self.last_success_time = datetime.now()
         
+    def record_latency(self, response_time: float):
+        """只记录响应时间样本（被取消的请求），不计入成功次数"""
+        self.response_times.append(response_time)
+        if len(self.response_times) > 100:
+            self.response_times = self.response_times[-100:]
+
     def record_error(self):
         """记录错误请求"""
         self.error_count += 1
         self.last_error_time = datetime.now()
         
+    def get_latency_percentile(self, percentile: float) -> Optional[float]:
+        """最近100次成功请求响应时间的分位数（秒），没有样本时返回 None"""
+        if not self.response_times:
+            return None
+        return float(np.percentile(self.response_times[-100:], percentile))
+        
     def get_metrics(self) -> Dict[str, Any]:
         """获取质量指标"""
         total_requests = self.success_count + self.error_count
@@ -117,6 +130,11 @@ class DataQualityMonitor:
         if source_name in self.sources:
             self.sources[source_name].metrics.record_success(response_time, data_freshness)
             
+    def record_latency(self, source_name: str, response_time: float):
+        """记录未完成请求已等待的时长"""
+        if source_name in self.sources:
+            self.sources[source_name].metrics.record_latency(response_time)
+
     def record_error(self, source_name: str):
         """记录错误请求"""
         if source_name in self.sources:
@@ -159,6 +177,33 @@ class DataQualityMonitor:
                 
         return best_source
         
+    def get_latency_percentile(self, source_name: str, percentile: float) -> Optional[float]:
+        """获取数据源响应时间分位数（秒）"""
+        if source_name in self.sources:
+            return self.sources[source_name].metrics.get_latency_percentile(percentile)
+        return None
+        
+    def rank_sources(self, source_names: List[str]) -> List[str]:
+        """按健康状态、再按响应时间中位数对数据源排序
+        
+        没有响应时间样本的数据源排在有样本的之后，同等条件下保持传入的优先级顺序；
+        离线的数据源排在最后，仍可作为最终后备。
+        """
+        status_rank = {
+            DataSourceStatus.HEALTHY: 0,
+            DataSourceStatus.DEGRADED: 1,
+            DataSourceStatus.UNRELIABLE: 2,
+            DataSourceStatus.OFFLINE: 3
+        }
+        
+        def sort_key(item):
+            index, source_name = item
+            status = self.get_source_status(source_name) or DataSourceStatus.HEALTHY
+            p50 = self.get_latency_percentile(source_name, 50)
+            return (status_rank[status], p50 is None, p50 or 0.0, index)
+            
+        return [name for _, name in sorted(enumerate(source_names), key=sort_key)]
+        
     async def start_monitoring(self):
         """开始监控"""
         self.is_running = True
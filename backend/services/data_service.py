@@ -1,12 +1,11 @@
 import asyncio
 import logging
+import math
 import time
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
 import pandas as pd
-import ccxt
-from models.market_data import KlineData, MarketType, Timeframe
-from database import get_influxdb
+from models.market_data import KlineData, CandleSeries, MarketType, Timeframe
 from .websocket_manager import websocket_manager
 from .yfinance_data_service import yfinance_data_service
 from .alpha_vantage_service import alpha_vantage_service
@@ -15,12 +14,38 @@ from .akshare_service import akshare_service
 from .commodity_data_service import commodity_data_service
 from .data_cache_service import data_cache_service
 from .data_quality_monitor import data_quality_monitor
+from .streaming_indicators import streaming_indicator_service
+from .price_event_bus import price_event_bus
+from .single_flight import SingleFlight
+from .kline_segment_store import KlineSegmentStore
+from .provider_router import provider_router
+from .exchange_pool import exchange_pool
+from .backplane import backplane, market_leader
+from .influx_writer import influx_writer
+from .candle_store import candle_store
+from .synthetic_market import synthetic_market
 
 logger = logging.getLogger(__name__)
 
+# 背板频道：主节点发布的行情，以及其他 worker 需要主节点补取的品种
+TICKER_CHANNEL = "market:tickers"
+INTEREST_CHANNEL = "market:interest"
+# 其他 worker 登记的补取品种的有效期（秒）
+INTEREST_TTL = 30
+
 class DataService:
     def __init__(self):
         self.exchanges = {}
+        # 合并同一缓存键上并发的数据源请求
+        self._single_flight = SingleFlight()
+        # stale-while-revalidate 宽限期（秒），0 表示过期即重新获取
+        self.kline_stale_ttl = 120
+        self.quote_stale_ttl = 0
+        # 按品种/周期记录已持有的K线区间，任意 limit/start/end 都从中切片
+        self.kline_store = KlineSegmentStore()
+        # 多 worker 部署：最近一轮经背板收到的行情品种，以及其他 worker 登记的补取品种
+        self._last_covered: set = set()
+        self._remote_interest: Dict[MarketType, Dict[str, float]] = {}
         self.setup_exchanges()
         self._register_data_sources()
         
@@ -39,19 +64,12 @@ class DataService:
             data_quality_monitor.register_source(source)
     
     def setup_exchanges(self):
-        """初始化交易所连接"""
-        try:
-            # 加密货币交易所
-            self.exchanges['binance'] = ccxt.binance({
-                'enableRateLimit': True,
-                'timeout': 30000,
-            })
-            # 可以添加更多交易所
-            # self.exchanges['okx'] = ccxt.okx()
-            # self.exchanges['bybit'] = ccxt.bybit()
-            
-        except Exception as e:
-            logger.error(f"初始化交易所失败: {e}")
+        """初始化交易所连接（ccxt 异步实例由全局连接池管理，共享HTTP连接）"""
+        for exchange_id in exchange_pool.exchange_ids:
+            try:
+                self.exchanges[exchange_id] = exchange_pool.get_exchange(exchange_id)
+            except Exception as e:
+                logger.error(f"初始化交易所失败: {exchange_id} - {e}")
     
     async def get_klines(
         self, 
@@ -62,11 +80,16 @@ class DataService:
         limit: int = 1000,
         start_time: Optional[datetime] = None,
         end_time: Optional[datetime] = None
-    ) -> List[KlineData]:
-        """获取K线数据 - 集成多个免费数据源"""
+    ) -> CandleSeries:
+        """获取K线数据 - 集成多个免费数据源
+
+        返回按时间升序排列的列式 CandleSeries，各数据源返回的对象列表会在此统一转换。
+        """
         try:
             # 生成缓存键
             cache_key = f"klines_{symbol}_{market_type.value}_{timeframe.value}_{limit}"
+            if start_time or end_time:
+                cache_key += f"_{start_time.isoformat() if start_time else ''}_{end_time.isoformat() if end_time else ''}"
             
             # 尝试从缓存获取
             cached_data = await data_cache_service.get(cache_key)
@@ -74,152 +97,10 @@ class DataService:
                 logger.debug(f"从缓存获取K线数据: {symbol}")
                 return cached_data
             
-            klines = []
-            
-            if market_type == MarketType.CRYPTO:
-                # 优先使用CoinGecko，其次是Alpha Vantage，最后是交易所
-                start_time = time.time()
-                try:
-                    klines = await coingecko_service.get_crypto_klines(symbol, timeframe, limit)
-                    if klines:
-                        response_time = time.time() - start_time
-                        data_quality_monitor.record_success("coingecko", response_time)
-                        logger.info(f"使用CoinGecko获取加密货币K线数据: {symbol}")
-                except Exception as e1:
-                    data_quality_monitor.record_error("coingecko")
-                    logger.warning(f"CoinGecko获取失败，尝试Alpha Vantage: {e1}")
-                    start_time_av = time.time()
-                    try:
-                        klines = await alpha_vantage_service.get_crypto_klines(symbol, timeframe, limit)
-                        if klines:
-                            response_time = time.time() - start_time_av
-                            data_quality_monitor.record_success("alpha_vantage", response_time)
-                            logger.info(f"使用Alpha Vantage获取加密货币K线数据: {symbol}")
-                    except Exception as e2:
-                        data_quality_monitor.record_error("alpha_vantage")
-                        logger.warning(f"Alpha Vantage获取失败，尝试交易所: {e2}")
-                        start_time_ex = time.time()
-                        try:
-                            exchange_instance = self.exchanges.get('binance')
-                            if exchange_instance:
-                                # 转换时间框架到ccxt格式
-                                tf_mapping = {
-                                    Timeframe.M1: '1m',
-                                    Timeframe.M5: '5m',
-                                    Timeframe.M15: '15m',
-                                    Timeframe.H1: '1h',
-                                    Timeframe.H4: '4h',
-                                    Timeframe.D1: '1d',
-                                    Timeframe.W1: '1w',
-                                    Timeframe.MN1: '1M'
-                                }
-                                ccxt_tf = tf_mapping.get(timeframe, '1h')
-                                
-                                ohlcv = exchange_instance.fetch_ohlcv(symbol, ccxt_tf, limit=limit)
-                                klines = []
-                                for data in ohlcv:
-                                    kline = KlineData(
-                                        symbol=symbol,
-                                        timeframe=timeframe,
-                                        market_type=market_type,
-                                        exchange='binance',
-                                        timestamp=datetime.fromtimestamp(data[0] / 1000),
-                                        open=data[1],
-                                        high=data[2],
-                                        low=data[3],
-                                        close=data[4],
-                                        volume=data[5]
-                                    )
-                                    klines.append(kline)
-                                response_time = time.time() - start_time_ex
-                                data_quality_monitor.record_success("ccxt_binance", response_time)
-                                logger.info(f"使用交易所获取加密货币K线数据: {symbol}")
-                        except Exception as e3:
-                            data_quality_monitor.record_error("ccxt_binance")
-                            logger.error(f"所有加密货币数据源都失败: {e3}")
-                
-            elif market_type == MarketType.STOCK:
-                # 优先使用Alpha Vantage，其次是Yahoo Finance，最后是AkShare
-                start_time_av = time.time()
-                try:
-                    klines = await alpha_vantage_service.get_stock_klines(symbol, timeframe, limit, start_time, end_time)
-                    if klines:
-                        response_time = time.time() - start_time_av
-                        data_quality_monitor.record_success("alpha_vantage", response_time)
-                        logger.info(f"使用Alpha Vantage获取股票K线数据: {symbol}")
-                except Exception as e1:
-                    data_quality_monitor.record_error("alpha_vantage")
-                    logger.warning(f"Alpha Vantage获取失败，尝试Yahoo Finance: {e1}")
-                    start_time_yf = time.time()
-                    try:
-                        klines = await yfinance_data_service.get_stock_klines(symbol, timeframe, limit, start_time, end_time)
-                        if klines:
-                            response_time = time.time() - start_time_yf
-                            data_quality_monitor.record_success("yfinance", response_time)
-                            logger.info(f"使用Yahoo Finance获取股票K线数据: {symbol}")
-                    except Exception as e2:
-                        data_quality_monitor.record_error("yfinance")
-                        logger.warning(f"Yahoo Finance获取失败，尝试AkShare: {e2}")
-                        start_time_ak = time.time()
-                        try:
-                            klines = await akshare_service.get_stock_klines(symbol, timeframe, limit, start_time, end_time)
-                            if klines:
-                                response_time = time.time() - start_time_ak
-                                data_quality_monitor.record_success("akshare", response_time)
-                                logger.info(f"使用AkShare获取股票K线数据: {symbol}")
-                        except Exception as e3:
-                            data_quality_monitor.record_error("akshare")
-                            logger.error(f"所有股票数据源都失败: {e3}")
-            
-            elif market_type == MarketType.FOREX:
-                # 使用Alpha Vantage获取外汇数据
-                start_time_av = time.time()
-                try:
-                    klines = await alpha_vantage_service.get_forex_klines(symbol, timeframe, limit)
-                    if klines:
-                        response_time = time.time() - start_time_av
-                        data_quality_monitor.record_success("alpha_vantage", response_time)
-                        logger.info(f"使用Alpha Vantage获取外汇K线数据: {symbol}")
-                except Exception as e:
-                    data_quality_monitor.record_error("alpha_vantage")
-                    logger.error(f"外汇数据获取失败: {e}")
-            
-            elif market_type == MarketType.COMMODITY:
-                # 商品期货数据
-                start_time_commodity = time.time()
-                try:
-                    klines = await commodity_data_service.get_commodity_klines(symbol, timeframe, limit)
-                    if klines:
-                        response_time = time.time() - start_time_commodity
-                        data_quality_monitor.record_success("commodity", response_time)
-                        logger.info(f"获取商品期货K线数据: {symbol}")
-                except Exception as e:
-                    data_quality_monitor.record_error("commodity")
-                    logger.error(f"商品期货数据获取失败: {e}")
-            
-            else:
-                # 其他市场类型使用模拟数据
-                start_time_mock = time.time()
-                klines = await self._get_mock_data(symbol, timeframe, market_type, limit)
-                response_time = time.time() - start_time_mock
-                data_quality_monitor.record_success("mock", response_time)
-                logger.info(f"使用模拟数据: {symbol}")
-            
-            # 如果获取到数据，保存到缓存
-            if klines:
-                await data_cache_service.set(cache_key, klines, ttl=300)  # 缓存5分钟
-                # 保存到InfluxDB
-                await self._save_to_influxdb(klines)
-            
-            if not klines:
-                # 如果所有数据源都失败，使用模拟数据作为后备
-                start_time_mock = time.time()
-                klines = await self._get_mock_data(symbol, timeframe, market_type, limit)
-                response_time = time.time() - start_time_mock
-                data_quality_monitor.record_success("mock", response_time)
-                logger.info(f"所有数据源失败，使用模拟数据: {symbol}")
-                
-            return klines
+            return await self._single_flight.do(
+                cache_key,
+                lambda: self._fetch_klines(symbol, market_type, exchange, timeframe, limit, start_time, end_time, cache_key)
+            )
                 
         except Exception as e:
             logger.error(f"获取K线数据失败: {e}")
@@ -229,39 +110,173 @@ class DataService:
             data_quality_monitor.record_success("mock", response_time)
             return mock_data
     
-    async def _save_to_influxdb(self, klines: List[KlineData]):
-        """保存数据到InfluxDB"""
-        try:
-            influx_client, influx_write_api, influx_query_api = get_influxdb()
-            if not influx_client:
-                return
-            
-            points = []
-            for kline in klines:
-                point = {
-                    "measurement": "kline_data",
-                    "tags": {
-                        "symbol": kline.symbol,
-                        "timeframe": kline.timeframe.value,
-                        "market_type": kline.market_type.value
-                    },
-                    "time": kline.timestamp,
-                    "fields": {
-                        "open": kline.open,
-                        "high": kline.high,
-                        "low": kline.low,
-                        "close": kline.close,
-                        "volume": kline.volume
-                    }
-                }
-                points.append(point)
-            
-            # 写入数据
-            # 注意：这里需要根据实际的InfluxDB客户端API调整
-            # influx_write_api.write(bucket=settings.INFLUXDB_BUCKET, record=points)
+    async def _fetch_klines(
+        self,
+        symbol: str,
+        market_type: MarketType,
+        exchange: str,
+        timeframe: Timeframe,
+        limit: int,
+        start_time: Optional[datetime],
+        end_time: Optional[datetime],
+        cache_key: str
+    ) -> CandleSeries:
+        """从K线区间存储切片返回，只向数据源补取缺失的头部/尾部，并写入缓存（由 get_klines 经 single-flight 调用）"""
+        store_key = (symbol, market_type, timeframe)
+        disk_key = (symbol, market_type, exchange, timeframe)
+        interval_ms = self._get_timeframe_minutes(timeframe) * 60_000
+        fetch_limit = self.kline_store.plan(store_key, interval_ms, limit, start_time, end_time)
+        
+        if fetch_limit and self.kline_store.get_segment(store_key) is None:
+            # 冷启动：先用本地历史库建立区间，之后只向数据源补取缺失的部分
+            at_ms = int(start_time.timestamp() * 1000) if start_time else None
+            cached, updated_at = await candle_store.load_span(disk_key, at_ms, self.kline_store.max_bars)
+            if cached:
+                self.kline_store.load(store_key, cached, updated_at)
+                fetch_limit = self.kline_store.plan(store_key, interval_ms, limit, start_time, end_time)
+        
+        if fetch_limit:
+            fetched = await self._fetch_from_providers(
+                symbol, market_type, exchange, timeframe, fetch_limit, start_time, end_time
+            )
+            if fetched:
+                self.kline_store.merge(store_key, fetched, fetch_limit, interval_ms)
+                # 追加到本地历史库；保存到InfluxDB（只提交新获取的部分，由后台批量写入）
+                # 模拟数据只在内存中使用，不能在下次冷启动时被当作历史数据读出
+                if not fetched.is_mock:
+                    await candle_store.save(disk_key, fetched, interval_ms=interval_ms)
+                    influx_writer.submit(fetched)
+        
+        klines = self.kline_store.query(store_key, limit, start_time, end_time)
+        
+        # 如果获取到数据，保存到缓存
+        if klines:
+            # 缓存5分钟；过期后的宽限期内先返回旧数据，由后台单次刷新
+            await data_cache_service.set(
+                cache_key, klines, ttl=300, stale_ttl=self.kline_stale_ttl,
+                refresh=lambda: self._single_flight.do(
+                    cache_key,
+                    lambda: self._fetch_klines(symbol, market_type, exchange, timeframe, limit, start_time, end_time, cache_key)
+                )
+            )
+        
+        if not klines:
+            # 如果所有数据源都失败，使用模拟数据作为后备
+            start_time_mock = time.time()
+            klines = await self._get_mock_data(symbol, timeframe, market_type, limit)
+            response_time = time.time() - start_time_mock
+            data_quality_monitor.record_success("mock", response_time)
+            logger.info(f"所有数据源失败，使用模拟数据: {symbol}")
             
-        except Exception as e:
-            logger.error(f"保存数据到InfluxDB失败: {e}")
+        return klines
+    
+    async def _fetch_from_providers(
+        self,
+        symbol: str,
+        market_type: MarketType,
+        exchange: str,
+        timeframe: Timeframe,
+        limit: int,
+        start_time: Optional[datetime],
+        end_time: Optional[datetime]
+    ) -> CandleSeries:
+        """按数据源优先级获取最近 limit 根K线，全部失败时返回空序列"""
+        klines = []
+        
+        if market_type == MarketType.CRYPTO:
+            # 按观测延迟在 CoinGecko、Alpha Vantage、交易所之间路由，慢时对冲请求
+            source, klines = await provider_router.route({
+                "coingecko": lambda: coingecko_service.get_crypto_klines(symbol, timeframe, limit, mock_on_error=False),
+                "alpha_vantage": lambda: alpha_vantage_service.get_crypto_klines(symbol, timeframe, limit, mock_on_error=False),
+                "ccxt_binance": lambda: self._fetch_exchange_klines(symbol, market_type, timeframe, limit)
+            })
+            if source:
+                logger.info(f"使用{source}获取加密货币K线数据: {symbol}")
+            else:
+                logger.error(f"所有加密货币数据源都失败: {symbol}")
+            
+        elif market_type == MarketType.STOCK:
+            # 按观测延迟在 Alpha Vantage、Yahoo Finance、AkShare 之间路由，慢时对冲请求
+            source, klines = await provider_router.route({
+                "alpha_vantage": lambda: alpha_vantage_service.get_stock_klines(symbol, timeframe, limit, start_time, end_time,
+                                                                              mock_on_error=False),
+                "yfinance": lambda: yfinance_data_service.get_stock_klines(symbol, timeframe, limit, start_time, end_time,
+                                                                        mock_on_error=False),
+                "akshare": lambda: akshare_service.get_stock_klines(symbol, timeframe, limit, start_time, end_time)
+            })
+            if source:
+                logger.info(f"使用{source}获取股票K线数据: {symbol}")
+            else:
+                logger.error(f"所有股票数据源都失败: {symbol}")
+        
+        elif market_type == MarketType.FOREX:
+            # 使用Alpha Vantage获取外汇数据
+            start_time_av = time.time()
+            try:
+                klines = await alpha_vantage_service.get_forex_klines(symbol, timeframe, limit, mock_on_error=False)
+                if klines:
+                    response_time = time.time() - start_time_av
+                    data_quality_monitor.record_success("alpha_vantage", response_time)
+                    logger.info(f"使用Alpha Vantage获取外汇K线数据: {symbol}")
+            except Exception as e:
+                data_quality_monitor.record_error("alpha_vantage")
+                logger.error(f"外汇数据获取失败: {e}")
+        
+        elif market_type == MarketType.COMMODITY:
+            # 商品期货数据
+            start_time_commodity = time.time()
+            try:
+                klines = await commodity_data_service.get_commodity_klines(symbol, timeframe, limit)
+                if klines:
+                    response_time = time.time() - start_time_commodity
+                    data_quality_monitor.record_success("commodity", response_time)
+                    logger.info(f"获取商品期货K线数据: {symbol}")
+            except Exception as e:
+                data_quality_monitor.record_error("commodity")
+                logger.error(f"商品期货数据获取失败: {e}")
+        
+        else:
+            # 其他市场类型使用模拟数据
+            start_time_mock = time.time()
+            klines = await self._get_mock_data(symbol, timeframe, market_type, limit)
+            response_time = time.time() - start_time_mock
+            data_quality_monitor.record_success("mock", response_time)
+            logger.info(f"使用模拟数据: {symbol}")
+        
+        # 统一转换为列式序列
+        if klines and not isinstance(klines, CandleSeries):
+            klines = CandleSeries.from_klines(
+                klines, symbol=symbol, market_type=market_type, timeframe=timeframe
+            )
+        if not klines:
+            return CandleSeries.empty(symbol, market_type, exchange, timeframe)
+        return klines
+    
+    async def _fetch_exchange_klines(
+        self,
+        symbol: str,
+        market_type: MarketType,
+        timeframe: Timeframe,
+        limit: int
+    ) -> Optional[CandleSeries]:
+        """从交易所获取K线"""
+        if 'binance' not in self.exchanges:
+            return None
+        # 转换时间框架到ccxt格式
+        tf_mapping = {
+            Timeframe.M1: '1m',
+            Timeframe.M5: '5m',
+            Timeframe.M15: '15m',
+            Timeframe.H1: '1h',
+            Timeframe.H4: '4h',
+            Timeframe.D1: '1d',
+            Timeframe.W1: '1w',
+            Timeframe.MN1: '1M'
+        }
+        ccxt_tf = tf_mapping.get(timeframe, '1h')
+        
+        ohlcv = await exchange_pool.fetch_ohlcv('binance', symbol, ccxt_tf, limit=limit)
+        return CandleSeries.from_ohlcv(ohlcv, symbol, market_type, 'binance', timeframe)
     
     async def _get_mock_data(
         self, 
@@ -269,12 +284,8 @@ class DataService:
         timeframe: Timeframe,
         market_type: MarketType,
         limit: int
-    ) -> List[KlineData]:
+    ) -> CandleSeries:
         """生成模拟数据（用于开发和测试）"""
-        klines = []
-        base_price = 100.0
-        current_time = datetime.now()
-        
         # 根据市场类型确定交易所
         exchange_mapping = {
             MarketType.CRYPTO: "binance",
@@ -285,34 +296,7 @@ class DataService:
             MarketType.FUND: "mock_fund"
         }
         exchange = exchange_mapping.get(market_type, "mock_exchange")
-        
-        for i in range(limit):
-            timestamp = current_time - timedelta(minutes=i * self._get_timeframe_minutes(timeframe))
-            
-            # 生成随机价格波动
-            import random
-            change = random.uniform(-2.0, 2.0)
-            open_price = base_price + change
-            high = open_price + random.uniform(0, 3.0)
-            low = open_price - random.uniform(0, 3.0)
-            close_price = (high + low) / 2 + random.uniform(-1.0, 1.0)
-            volume = random.uniform(1000, 10000)
-            
-            kline = KlineData(
-                symbol=symbol,
-                timeframe=timeframe,
-                market_type=market_type,
-                exchange=exchange,
-                timestamp=timestamp,
-                open=open_price,
-                high=high,
-                low=low,
-                close=close_price,
-                volume=volume
-            )
-            klines.append(kline)
-        
-        return klines
+        return synthetic_market.candles(symbol, market_type, exchange, timeframe, limit)
     
     def _get_timeframe_minutes(self, timeframe: Timeframe) -> int:
         """获取时间框架对应的分钟数"""
@@ -332,9 +316,8 @@ class DataService:
         """获取当前价格"""
         try:
             if market_type == MarketType.CRYPTO:
-                exchange = self.exchanges.get('binance')
-                if exchange:
-                    ticker = exchange.fetch_ticker(symbol)
+                if 'binance' in self.exchanges:
+                    ticker = await exchange_pool.fetch_ticker('binance', symbol)
                     return ticker['last']
             elif market_type == MarketType.STOCK:
                 # 使用Yahoo Finance获取股票实时价格
@@ -349,10 +332,8 @@ class DataService:
         """获取订单簿数据"""
         try:
             if market_type == MarketType.CRYPTO:
-                exchange_instance = self.exchanges.get(exchange)
-                if exchange_instance:
-                    order_book = exchange_instance.fetch_order_book(symbol, depth)
-                    return order_book
+                if exchange in self.exchanges:
+                    return await exchange_pool.fetch_order_book(exchange, symbol, depth)
             return {'bids': [], 'asks': []}
         except Exception as e:
             logger.error(f"获取订单簿失败: {e}")
@@ -363,41 +344,12 @@ class DataService:
         try:
             # 如果指定了市场类型为加密货币，尝试从交易所获取数据
             if market_type == MarketType.CRYPTO:
-                exchange_instance = self.exchanges.get(exchange or 'binance')
-                if exchange_instance:
+                exchange_id = exchange or 'binance'
+                if exchange_id in self.exchanges:
                     try:
-                        if symbols:
-                            tickers = []
-                            for symbol in symbols:
-                                ticker = exchange_instance.fetch_ticker(symbol)
-                                tickers.append({
-                                    'symbol': symbol,
-                                    'last': ticker['last'],
-                                    'open': ticker['open'],
-                                    'high': ticker['high'],
-                                    'low': ticker['low'],
-                                    'close': ticker['close'],
-                                    'volume': ticker['baseVolume'],
-                                    'timestamp': datetime.fromtimestamp(ticker['timestamp'] / 1000),
-                                    'change': ticker['last'] - ticker['open'],
-                                    'change_percent': ((ticker['last'] - ticker['open']) / ticker['open']) * 100 if ticker['open'] else 0
-                                })
-                            return tickers
-                        else:
-                            # 获取所有交易对的ticker
-                            tickers = exchange_instance.fetch_tickers()
-                            return [{
-                                'symbol': symbol,
-                                'last': ticker['last'],
-                                'open': ticker['open'],
-                                'high': ticker['high'],
-                                'low': ticker['low'],
-                                'close': ticker['close'],
-                                'volume': ticker['baseVolume'],
-                                'timestamp': datetime.fromtimestamp(ticker['timestamp'] / 1000),
-                                'change': ticker['last'] - ticker['open'],
-                                'change_percent': ((ticker['last'] - ticker['open']) / ticker['open']) * 100 if ticker['open'] else 0
-                            } for symbol, ticker in tickers.items()]
+                        # 指定品种时由连接池批量获取（交易所支持时只发一次请求）
+                        tickers = await exchange_pool.fetch_tickers(exchange_id, symbols or None)
+                        return [self._format_ticker(symbol, ticker) for symbol, ticker in tickers.items()]
                     except Exception as exchange_error:
                         logger.warning(f"从交易所获取数据失败，使用模拟数据: {exchange_error}")
                         # 如果交易所获取失败，使用模拟数据
@@ -409,11 +361,27 @@ class DataService:
             logger.error(f"获取行情数据失败: {e}")
             return await self._get_mock_tickers(symbols, market_type)
     
+    @staticmethod
+    def _format_ticker(symbol: str, ticker: Dict) -> Dict:
+        """把 ccxt 行情转换为推送使用的格式"""
+        last = ticker['last']
+        open_price = ticker.get('open') or last
+        timestamp = ticker.get('timestamp')
+        return {
+            'symbol': symbol,
+            'last': last,
+            'open': open_price,
+            'high': ticker['high'],
+            'low': ticker['low'],
+            'close': ticker['close'],
+            'volume': ticker['baseVolume'],
+            'timestamp': datetime.fromtimestamp(timestamp / 1000) if timestamp else datetime.now(),
+            'change': last - open_price,
+            'change_percent': ((last - open_price) / open_price) * 100 if open_price else 0
+        }
+    
     async def _get_mock_tickers(self, symbols: Optional[List[str]] = None, market_type: Optional[MarketType] = None) -> List[Dict]:
-        """生成模拟行情数据"""
-        import random
-        from datetime import datetime
-        
+        """生成模拟行情数据（各品种沿各自的价格路径连续变化）"""
         # 默认的模拟交易对
         default_symbols = [
             "BTC/USDT", "ETH/USDT", "BNB/USDT", "ADA/USDT", "DOT/USDT",
@@ -427,69 +395,18 @@ class DataService:
         else:
             target_symbols = default_symbols
         
-        tickers = []
-        for symbol in target_symbols:
-            # 根据符号类型设置基础价格
-            if "BTC" in symbol:
-                base_price = 42567.39
-            elif "ETH" in symbol:
-                base_price = 2345.67
-            elif "AAPL" in symbol:
-                base_price = 182.45
-            elif "MSFT" in symbol:
-                base_price = 345.67
-            elif "GOOGL" in symbol:
-                base_price = 2789.12
-            elif "AMZN" in symbol:
-                base_price = 3456.78
-            elif "TSLA" in symbol:
-                base_price = 245.67
-            elif "EUR" in symbol:
-                base_price = 1.0850
-            elif "GBP" in symbol:
-                base_price = 1.2650
-            elif "JPY" in symbol:
-                base_price = 150.25
-            elif "CNY" in symbol:
-                base_price = 7.1987
-            elif "AUD" in symbol:
-                base_price = 0.6580
-            else:
-                base_price = 100.0
-            
-            # 生成随机价格波动
-            change_percent = random.uniform(-5.0, 5.0)
-            change_amount = base_price * (change_percent / 100)
-            last_price = base_price + change_amount
-            
-            open_price = base_price
-            high = max(base_price, last_price) + random.uniform(0, base_price * 0.02)
-            low = min(base_price, last_price) - random.uniform(0, base_price * 0.02)
-            volume = random.uniform(1000, 1000000)
-            
-            ticker = {
-                'symbol': symbol,
-                'last': round(last_price, 4),
-                'open': round(open_price, 4),
-                'high': round(high, 4),
-                'low': round(low, 4),
-                'close': round(last_price, 4),
-                'volume': round(volume, 2),
-                'timestamp': datetime.now(),
-                'change': round(change_amount, 4),
-                'change_percent': round(change_percent, 2)
-            }
-            tickers.append(ticker)
-        
+        tickers = synthetic_market.tickers(target_symbols, market_type)
+        for ticker in tickers:
+            ticker['is_mock'] = True
         return tickers
     
     async def get_symbols(self, market_type: Optional[MarketType] = None, exchange: Optional[str] = None) -> List[str]:
         """获取可交易符号列表"""
         try:
             if market_type == MarketType.CRYPTO:
-                exchange_instance = self.exchanges.get(exchange or 'binance')
-                if exchange_instance:
-                    markets = exchange_instance.load_markets()
+                exchange_id = exchange or 'binance'
+                if exchange_id in self.exchanges:
+                    markets = await exchange_pool.load_markets(exchange_id)
                     return list(markets.keys())
             return []
         except Exception as e:
@@ -551,85 +468,9 @@ class DataService:
                 logger.debug(f"从缓存获取报价: {symbol}")
                 return cached_data
             
-            quote = None
-            
-            if market_type == MarketType.CRYPTO:
-                # 加密货币报价
-                try:
-                    # 优先使用 CoinGecko
-                    quote = await coingecko_service.get_crypto_quote(symbol)
-                    if quote:
-                        logger.info(f"使用CoinGecko获取加密货币报价: {symbol}")
-                except Exception as e1:
-                    logger.warning(f"CoinGecko获取报价失败，尝试交易所: {e1}")
-                    try:
-                        # 使用交易所API
-                        if exchange in self.exchanges:
-                            ex = self.exchanges[exchange]
-                            ticker = await asyncio.to_thread(ex.fetch_ticker, symbol)
-                            quote = {
-                                'symbol': symbol,
-                                'price': ticker.get('last', 0),
-                                'bid': ticker.get('bid', 0),
-                                'ask': ticker.get('ask', 0),
-                                'high': ticker.get('high', 0),
-                                'low': ticker.get('low', 0),
-                                'volume': ticker.get('quoteVolume', 0),
-                                'change': ticker.get('change', 0),
-                                'change_percent': ticker.get('percentage', 0),
-                                'timestamp': datetime.now().isoformat()
-                            }
-                            logger.info(f"使用{exchange}交易所获取报价: {symbol}")
-                    except Exception as e2:
-                        logger.warning(f"交易所获取报价失败: {e2}")
-            
-            elif market_type == MarketType.STOCK:
-                # 股票报价
-                try:
-                    # 优先使用 yfinance
-                    quote = await yfinance_data_service.get_stock_quote(symbol)
-                    if quote:
-                        logger.info(f"使用yfinance获取股票报价: {symbol}")
-                except Exception as e1:
-                    logger.warning(f"yfinance获取报价失败，尝试Alpha Vantage: {e1}")
-                    try:
-                        quote = await alpha_vantage_service.get_stock_quote(symbol)
-                        if quote:
-                            logger.info(f"使用Alpha Vantage获取股票报价: {symbol}")
-                    except Exception as e2:
-                        logger.warning(f"Alpha Vantage获取报价失败: {e2}")
-            
-            elif market_type == MarketType.FOREX:
-                # 外汇报价
-                try:
-                    quote = await alpha_vantage_service.get_forex_quote(symbol)
-                    if quote:
-                        logger.info(f"使用Alpha Vantage获取外汇报价: {symbol}")
-                except Exception as e:
-                    logger.warning(f"获取外汇报价失败: {e}")
-            
-            # 如果所有数据源都失败，返回模拟数据
-            if not quote:
-                import random
-                quote = {
-                    'symbol': symbol,
-                    'price': round(random.uniform(90, 110), 2),
-                    'bid': round(random.uniform(89, 99), 2),
-                    'ask': round(random.uniform(91, 101), 2),
-                    'high': round(random.uniform(100, 120), 2),
-                    'low': round(random.uniform(80, 100), 2),
-                    'volume': round(random.uniform(1000000, 10000000), 2),
-                    'change': round(random.uniform(-5, 5), 2),
-                    'change_percent': round(random.uniform(-5, 5), 2),
-                    'timestamp': datetime.now().isoformat()
-                }
-                logger.info(f"所有数据源失败，返回模拟报价: {symbol}")
-            
-            # 缓存报价数据（TTL=10秒）
-            if quote:
-                await data_cache_service.set(cache_key, quote, ttl=10)
-            
-            return quote
+            return await self._single_flight.do(
+                cache_key, lambda: self._fetch_quote(symbol, market_type, exchange, cache_key)
+            )
             
         except Exception as e:
             logger.error(f"获取报价失败: {e}")
@@ -640,9 +481,103 @@ class DataService:
                 'timestamp': datetime.now().isoformat()
             }
     
+    async def _fetch_quote(self, symbol: str, market_type: MarketType, exchange: str, cache_key: str) -> Optional[Dict]:
+        """从数据源获取报价并写入缓存（由 get_quote 经 single-flight 调用）"""
+        quote = None
+        
+        if market_type == MarketType.CRYPTO:
+            # 加密货币报价
+            try:
+                # 优先使用 CoinGecko
+                quote = await coingecko_service.get_crypto_quote(symbol)
+                if quote:
+                    logger.info(f"使用CoinGecko获取加密货币报价: {symbol}")
+            except Exception as e1:
+                logger.warning(f"CoinGecko获取报价失败，尝试交易所: {e1}")
+                try:
+                    # 使用交易所API
+                    if exchange in self.exchanges:
+                        ticker = await exchange_pool.fetch_ticker(exchange, symbol)
+                        quote = {
+                            'symbol': symbol,
+                            'price': ticker.get('last', 0),
+                            'bid': ticker.get('bid', 0),
+                            'ask': ticker.get('ask', 0),
+                            'high': ticker.get('high', 0),
+                            'low': ticker.get('low', 0),
+                            'volume': ticker.get('quoteVolume', 0),
+                            'change': ticker.get('change', 0),
+                            'change_percent': ticker.get('percentage', 0),
+                            'timestamp': datetime.now().isoformat()
+                        }
+                        logger.info(f"使用{exchange}交易所获取报价: {symbol}")
+                except Exception as e2:
+                    logger.warning(f"交易所获取报价失败: {e2}")
+        
+        elif market_type == MarketType.STOCK:
+            # 股票报价
+            try:
+                # 优先使用 yfinance
+                quote = await yfinance_data_service.get_stock_quote(symbol)
+                if quote:
+                    logger.info(f"使用yfinance获取股票报价: {symbol}")
+            except Exception as e1:
+                logger.warning(f"yfinance获取报价失败，尝试Alpha Vantage: {e1}")
+                try:
+                    quote = await alpha_vantage_service.get_stock_quote(symbol)
+                    if quote:
+                        logger.info(f"使用Alpha Vantage获取股票报价: {symbol}")
+                except Exception as e2:
+                    logger.warning(f"Alpha Vantage获取报价失败: {e2}")
+        
+        elif market_type == MarketType.FOREX:
+            # 外汇报价
+            try:
+                quote = await alpha_vantage_service.get_forex_quote(symbol)
+                if quote:
+                    logger.info(f"使用Alpha Vantage获取外汇报价: {symbol}")
+            except Exception as e:
+                logger.warning(f"获取外汇报价失败: {e}")
+        
+        # 如果所有数据源都失败，返回模拟数据
+        if not quote:
+            import random
+            quote = {
+                'symbol': symbol,
+                'price': round(random.uniform(90, 110), 2),
+                'bid': round(random.uniform(89, 99), 2),
+                'ask': round(random.uniform(91, 101), 2),
+                'high': round(random.uniform(100, 120), 2),
+                'low': round(random.uniform(80, 100), 2),
+                'volume': round(random.uniform(1000000, 10000000), 2),
+                'change': round(random.uniform(-5, 5), 2),
+                'change_percent': round(random.uniform(-5, 5), 2),
+                'timestamp': datetime.now().isoformat()
+            }
+            logger.info(f"所有数据源失败，返回模拟报价: {symbol}")
+        
+        # 缓存报价数据（TTL=10秒）
+        if quote:
+            await data_cache_service.set(
+                cache_key, quote, ttl=10, stale_ttl=self.quote_stale_ttl,
+                refresh=lambda: self._single_flight.do(
+                    cache_key, lambda: self._fetch_quote(symbol, market_type, exchange, cache_key)
+                )
+            )
+        
+        return quote
+    
     async def start_real_time_updates(self):
-        """启动实时数据更新服务"""
+        """启动实时数据更新服务
+        
+        只有选举出的主节点拉取行情并发布到背板；每个 worker（包括主节点）从背板接收后
+        推送给本进程的 WebSocket 连接和流式指标/价格事件订阅方。
+        """
         logger.info("启动实时数据更新服务")
+        await backplane.subscribe(TICKER_CHANNEL, self._on_backplane_tickers)
+        await backplane.subscribe(INTEREST_CHANNEL, self._on_backplane_interest)
+        await backplane.start()
+        await market_leader.start()
         # 启动定时任务，定期推送实时数据
         asyncio.create_task(self._real_time_update_loop())
     
@@ -650,23 +585,10 @@ class DataService:
         """实时数据更新循环"""
         while True:
             try:
-                # 获取最新的行情数据
-                tickers = await self.get_tickers()
-                
-                # 向所有订阅者广播实时数据
-                for ticker in tickers:
-                    await websocket_manager.broadcast_to_subscribers(
-                        ticker['symbol'],
-                        {
-                            'type': 'price_update',
-                            'symbol': ticker['symbol'],
-                            'price': ticker['last'],
-                            'change': ticker['change'],
-                            'change_percent': ticker['change_percent'],
-                            'volume': ticker['volume'],
-                            'timestamp': datetime.now().isoformat()
-                        }
-                    )
+                if market_leader.is_leader:
+                    await self._produce_tickers()
+                else:
+                    await self._publish_interest()
                 
                 # 每5秒更新一次
                 await asyncio.sleep(5)
@@ -675,6 +597,77 @@ class DataService:
                 logger.error(f"实时数据更新循环出错: {e}")
                 await asyncio.sleep(10)  # 出错时等待更长时间
     
+    def _local_missing(self, covered: set) -> Dict[MarketType, set]:
+        """本进程跟踪了、但未出现在本轮行情中的品种"""
+        missing = streaming_indicator_service.missing_symbols(covered)
+        for market_type, symbols in price_event_bus.missing_symbols(covered).items():
+            missing.setdefault(market_type, set()).update(symbols)
+        return missing
+    
+    async def _produce_tickers(self):
+        """主节点：拉取一轮行情并发布到背板"""
+        tickers = await self.get_tickers()
+        await backplane.publish(TICKER_CHANNEL, {'tickers': tickers, 'push': True})
+        influx_writer.submit_tickers(tickers)
+        
+        # 本进程和其他 worker 跟踪、但未出现在本轮行情中的品种单独补取（只推给流式指标/价格事件）
+        covered = {ticker['symbol'] for ticker in tickers}
+        missing = self._local_missing(covered)
+        now = time.time()
+        for market_type, symbols in self._remote_interest.items():
+            for symbol, expires_at in list(symbols.items()):
+                if expires_at <= now:
+                    del symbols[symbol]
+                elif symbol not in covered:
+                    missing.setdefault(market_type, set()).add(symbol)
+        for market_type, symbols in missing.items():
+            extra = await self.get_tickers(symbols=sorted(symbols), market_type=market_type)
+            await backplane.publish(TICKER_CHANNEL, {'tickers': extra, 'push': False})
+    
+    async def _publish_interest(self):
+        """非主节点：登记本进程需要补取的品种"""
+        missing = self._local_missing(self._last_covered)
+        if missing:
+            await backplane.publish(INTEREST_CHANNEL, {
+                'symbols': {market_type.value: sorted(symbols) for market_type, symbols in missing.items()}
+            })
+    
+    async def _on_backplane_interest(self, message: Dict):
+        if not market_leader.is_leader:
+            return
+        expires_at = time.time() + INTEREST_TTL
+        for market_type, symbols in message.get('symbols', {}).items():
+            registered = self._remote_interest.setdefault(MarketType(market_type), {})
+            for symbol in symbols:
+                registered[symbol] = expires_at
+    
+    async def _on_backplane_tickers(self, message: Dict):
+        """从背板收到行情：推送给本进程的订阅方"""
+        tickers = message.get('tickers', [])
+        for ticker in tickers:
+            timestamp = ticker.get('timestamp')
+            if isinstance(timestamp, str):
+                ticker['timestamp'] = datetime.fromisoformat(timestamp)
+        
+        if message.get('push'):
+            self._last_covered = {ticker['symbol'] for ticker in tickers}
+            # 提交最新行情，由合并推送按固定间隔批量发给订阅者
+            for ticker in tickers:
+                websocket_manager.publish_tick(ticker['symbol'], {
+                    'price': ticker['last'],
+                    'change': ticker['change'],
+                    'change_percent': ticker['change_percent'],
+                    'volume': ticker['volume']
+                })
+        
+        # 推进流式指标并发布价格事件
+        await self._publish_tickers(tickers)
+    
+    async def _publish_tickers(self, tickers: List[Dict]):
+        """将实时行情推送给流式指标和价格事件订阅方"""
+        streaming_indicator_service.on_tickers(tickers)
+        await price_event_bus.publish_tickers(tickers)
+    
     async def start(self):
         """启动数据服务"""
         logger.info("数据服务已启动")
@@ -684,7 +677,11 @@ class DataService:
     async def stop(self):
         """停止数据服务"""
         logger.info("数据服务已停止")
-        # 这里可以添加数据服务停止时的清理逻辑
+        await market_leader.stop()
+        await backplane.unsubscribe(TICKER_CHANNEL, self._on_backplane_tickers)
+        await backplane.unsubscribe(INTEREST_CHANNEL, self._on_backplane_interest)
+        await backplane.close()
+        await exchange_pool.close()
     
     async def get_market_symbols(
         self,
@@ -708,7 +705,7 @@ class DataService:
                 # 加密货币市场
                 if exchange in self.exchanges:
                     try:
-                        markets = self.exchanges[exchange].load_markets()
+                        markets = await exchange_pool.load_markets(exchange)
                         symbols_list = []
                         
                         for symbol, market in list(markets.items())[:limit]:
@@ -753,6 +750,32 @@ class DataService:
             logger.error(f"获取市场品种列表失败: {e}")
             return []
     
+    async def get_kline_data(
+        self,
+        symbol: str,
+        timeframe: Union[Timeframe, str],
+        market_type: MarketType = MarketType.CRYPTO,
+        limit: int = 100,
+        exchange: Optional[str] = None
+    ) -> CandleSeries:
+        """
+        获取最近 limit 根K线（升序，最后一根为最新）
+        
+        供预警、形态识别等分析服务使用，时间周期可以直接传入字符串（如 "1h"）。
+        """
+        if isinstance(timeframe, str):
+            timeframe = Timeframe(timeframe)
+        if exchange is None:
+            exchange = "binance" if market_type == MarketType.CRYPTO else "nasdaq"
+        klines = await self.get_klines(
+            symbol=symbol,
+            market_type=market_type,
+            exchange=exchange,
+            timeframe=timeframe,
+            limit=limit
+        )
+        return CandleSeries.from_klines(klines).tail(limit)
+    
     async def get_historical_data(
         self,
         symbol: str,
@@ -760,7 +783,7 @@ class DataService:
         start_date: datetime,
         end_date: datetime,
         timeframe: Timeframe = Timeframe.D1
-    ) -> List[KlineData]:
+    ) -> CandleSeries:
         """
         获取历史数据
         
@@ -778,29 +801,26 @@ class DataService:
             # 复用 get_klines 方法
             exchange = "binance" if market_type == MarketType.CRYPTO else "nasdaq"
             
-            # 计算需要的数据量
-            days_diff = (end_date - start_date).days
-            limit = max(days_diff, 100)
+            # 按周期计算区间内的K线根数，由区间存储只补取缺失部分
+            interval = timedelta(minutes=self._get_timeframe_minutes(timeframe))
+            limit = max(math.ceil((end_date - start_date) / interval) + 1, 1)
             
             klines = await self.get_klines(
                 symbol=symbol,
                 market_type=market_type,
                 exchange=exchange,
                 timeframe=timeframe,
-                limit=limit
+                limit=limit,
+                start_time=start_date,
+                end_time=end_date
             )
             
             # 过滤日期范围
-            filtered_klines = [
-                k for k in klines
-                if start_date <= k.timestamp <= end_date
-            ]
-            
-            return filtered_klines
+            return CandleSeries.from_klines(klines).between(start_date, end_date)
             
         except Exception as e:
             logger.error(f"获取历史数据失败: {e}")
-            return []
+            return CandleSeries.empty(symbol, market_type, "", timeframe)
     
     async def search_symbols(
         self,
@@ -867,7 +887,7 @@ class DataService:
         try:
             if market_type == MarketType.CRYPTO:
                 if exchange in self.exchanges:
-                    markets = self.exchanges[exchange].load_markets()
+                    markets = await exchange_pool.load_markets(exchange)
                     return symbol in markets
                 else:
                     # 基本验证格式
@@ -905,7 +925,7 @@ class DataService:
         try:
             if market_type == MarketType.CRYPTO:
                 if exchange in self.exchanges:
-                    markets = self.exchanges[exchange].load_markets()
+                    markets = await exchange_pool.load_markets(exchange)
                     if symbol in markets:
                         market = markets[symbol]
                         return {
@@ -0,0 +1,224 @@
+"""
+异步交易所连接池
+
+基于 ccxt 的 asyncio 版本，按交易所 id 懒加载实例并缓存其市场信息，所有实例共享同一个
+aiohttp 连接池。提供跨品种的批量 fetch_tickers / fetch_ohlcv：单个交易所内的请求由
+ccxt 自带的令牌桶限速排队，并用信号量限制同时进行的请求数，多个交易所之间并行。
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+import ccxt.async_support as ccxt_async
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+MARKETS_TTL = 3600  # 市场信息缓存时间（秒）
+
+
+def _credentials(exchange_id: str) -> Dict[str, str]:
+    """从配置中读取交易所API密钥（未配置时只访问公开接口）"""
+    api_key = getattr(settings, f"{exchange_id.upper()}_API_KEY", "")
+    secret = getattr(settings, f"{exchange_id.upper()}_SECRET_KEY", "")
+    return {"apiKey": api_key, "secret": secret} if api_key and secret else {}
+
+
+class ExchangePool:
+    """按交易所 id 管理 ccxt 异步实例"""
+
+    def __init__(self, exchange_ids: Optional[List[str]] = None, max_connections: int = 100,
+                 max_concurrency: int = 10, timeout_ms: int = 30000):
+        self.exchange_ids = list(exchange_ids or [])
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency  # 单个交易所同时进行的请求数
+        self.timeout_ms = timeout_ms
+        self.exchanges: Dict[str, Any] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._market_locks: Dict[str, asyncio.Lock] = {}
+        self._markets_loaded_at: Dict[str, float] = {}
+        self.requests = 0
+        self.errors = 0
+
+    def _create_exchange(self, exchange_id: str):
+        exchange_class = getattr(ccxt_async, exchange_id, None)
+        if exchange_class is None:
+            raise ValueError(f"不支持的交易所: {exchange_id}")
+        return exchange_class({
+            'enableRateLimit': True,
+            'timeout': self.timeout_ms,
+            **_credentials(exchange_id)
+        })
+
+    def get_exchange(self, exchange_id: str):
+        """获取（必要时创建）交易所实例，不支持的 id 抛出 ValueError"""
+        exchange = self.exchanges.get(exchange_id)
+        if exchange is None:
+            exchange = self.exchanges[exchange_id] = self._create_exchange(exchange_id)
+        return exchange
+
+    async def _bind_loop(self):
+        """ccxt 实例和 aiohttp 会话都绑定事件循环，循环变化时（如测试）关闭旧的并重新创建"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        old_loop, stale, session = self._loop, self.exchanges, self._session
+        if old_loop is not None:
+            self.exchanges = {exchange_id: self._create_exchange(exchange_id) for exchange_id in stale}
+        self._loop = loop
+        self._session = None
+        self._semaphores.clear()
+        self._market_locks.clear()
+        self._markets_loaded_at.clear()
+        if old_loop is None:
+            return
+        closing = self._close_resources(stale, session)
+        if old_loop.is_running() and not old_loop.is_closed():
+            # 旧循环仍在其他线程运行：在它上面关闭
+            asyncio.run_coroutine_threadsafe(closing, old_loop)
+        else:
+            await closing
+
+    async def _close_resources(self, exchanges: Dict[str, Any], session: Optional[aiohttp.ClientSession]):
+        """关闭交易所实例和 HTTP 会话，单个失败只记录日志"""
+        for exchange_id, exchange in exchanges.items():
+            try:
+                await exchange.close()
+            except Exception as e:
+                logger.error(f"关闭交易所 {exchange_id} 失败: {e}")
+        if session is not None and not session.closed:
+            try:
+                await session.close()
+            except Exception as e:
+                logger.error(f"关闭HTTP会话失败: {e}")
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, ttl_dns_cache=300, enable_cleanup_closed=True)
+            self._session = aiohttp.ClientSession(connector=connector, trust_env=True)
+        return self._session
+
+    async def _prepare(self, exchange_id: str):
+        """取得实例并注入共享的 HTTP 会话"""
+        await self._bind_loop()
+        exchange = self.get_exchange(exchange_id)
+        if exchange.session is None:
+            exchange.session = await self._get_session()
+            exchange.own_session = False
+        return exchange
+
+    def _semaphore(self, exchange_id: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(exchange_id)
+        if semaphore is None:
+            semaphore = self._semaphores[exchange_id] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    async def _call(self, exchange_id: str, method: str, *args, **kwargs) -> Any:
+        """限制并发后调用交易所方法（请求间隔由 ccxt 的限速器控制）"""
+        exchange = await self._prepare(exchange_id)
+        async with self._semaphore(exchange_id):
+            self.requests += 1
+            try:
+                return await getattr(exchange, method)(*args, **kwargs)
+            except Exception:
+                self.errors += 1
+                raise
+
+    async def load_markets(self, exchange_id: str, reload: bool = False) -> Dict[str, Dict]:
+        """加载市场信息，缓存 MARKETS_TTL 秒；并发调用只加载一次"""
+        await self._bind_loop()
+        lock = self._market_locks.get(exchange_id)
+        if lock is None:
+            lock = self._market_locks[exchange_id] = asyncio.Lock()
+        async with lock:
+            exchange = await self._prepare(exchange_id)
+            loaded_at = self._markets_loaded_at.get(exchange_id)
+            stale = loaded_at is None or time.time() - loaded_at > MARKETS_TTL
+            if reload or stale or not exchange.markets:
+                await self._call(exchange_id, "load_markets", reload or loaded_at is not None)
+                self._markets_loaded_at[exchange_id] = time.time()
+            return exchange.markets
+
+    async def fetch_ticker(self, exchange_id: str, symbol: str) -> Dict:
+        return await self._call(exchange_id, "fetch_ticker", symbol)
+
+    async def fetch_tickers(self, exchange_id: str, symbols: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """批量获取行情：交易所支持时一次请求取回，否则逐个品种并发请求，失败的品种被跳过"""
+        exchange = await self._prepare(exchange_id)
+        if symbols is None or exchange.has.get('fetchTickers'):
+            tickers = await self._call(exchange_id, "fetch_tickers", symbols)
+            if symbols is None:
+                return tickers
+            return {symbol: tickers[symbol] for symbol in symbols if symbol in tickers}
+
+        results = await asyncio.gather(
+            *(self.fetch_ticker(exchange_id, symbol) for symbol in symbols), return_exceptions=True
+        )
+        tickers = {}
+        for symbol, result in zip(symbols, results):
+            if isinstance(result, Exception):
+                logger.warning(f"获取 {exchange_id} {symbol} 行情失败: {result}")
+            else:
+                tickers[symbol] = result
+        return tickers
+
+    async def fetch_tickers_across(self, requests: Dict[str, Optional[List[str]]]) -> Dict[str, Dict[str, Dict]]:
+        """多个交易所并行批量获取行情，返回 {交易所: {品种: 行情}}"""
+        exchange_ids = list(requests)
+        results = await asyncio.gather(
+            *(self.fetch_tickers(exchange_id, requests[exchange_id]) for exchange_id in exchange_ids),
+            return_exceptions=True
+        )
+        tickers = {}
+        for exchange_id, result in zip(exchange_ids, results):
+            if isinstance(result, Exception):
+                logger.error(f"获取 {exchange_id} 行情失败: {result}")
+                tickers[exchange_id] = {}
+            else:
+                tickers[exchange_id] = result
+        return tickers
+
+    async def fetch_ohlcv(self, exchange_id: str, symbol: str, timeframe: str = '1h', limit: Optional[int] = None) -> List[List]:
+        return await self._call(exchange_id, "fetch_ohlcv", symbol, timeframe, limit=limit)
+
+    async def fetch_ohlcv_batch(self, exchange_id: str, symbols: List[str], timeframe: str = '1h',
+                                limit: Optional[int] = None) -> Dict[str, List[List]]:
+        """多个品种并发获取K线，失败的品种被跳过"""
+        results = await asyncio.gather(
+            *(self.fetch_ohlcv(exchange_id, symbol, timeframe, limit) for symbol in symbols), return_exceptions=True
+        )
+        ohlcv = {}
+        for symbol, result in zip(symbols, results):
+            if isinstance(result, Exception):
+                logger.warning(f"获取 {exchange_id} {symbol} K线失败: {result}")
+            else:
+                ohlcv[symbol] = result
+        return ohlcv
+
+    async def fetch_order_book(self, exchange_id: str, symbol: str, limit: Optional[int] = None) -> Dict:
+        return await self._call(exchange_id, "fetch_order_book", symbol, limit)
+
+    async def close(self):
+        """关闭所有交易所实例和共享连接池"""
+        await self._close_resources(self.exchanges, self._session)
+        self._session = None
+        self._semaphores.clear()
+        self._market_locks.clear()
+        self._markets_loaded_at.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "exchanges": list(self.exchanges),
+            "markets_loaded": list(self._markets_loaded_at),
+            "requests": self.requests,
+            "errors": self.errors
+        }
+
+
+# 全局交易所连接池实例
+exchange_pool = ExchangePool(settings.CRYPTO_EXCHANGES)
@@ -0,0 +1,113 @@
+"""
+向量化局部极值与枢轴点
+
+局部峰值/谷底按居中滑动窗口的最大/最小值一次比较得到（复用 indicator_engine 的
+O(n) 滑动极值），不再对每个位置逐个比较邻居。SeriesExtrema 按（价格列, 类型, 距离）
+缓存一根序列上的枢轴点和滚动趋势线斜率，形态识别的各个检测器共享同一份结果。
+
+判定规则与原逐点实现一致：位置 i 的值不小于（峰值）/不大于（谷底）前后 distance 根内
+的所有值即为极值，相等的平台也计入；前后不足 distance 根的位置、以及窗口内含 NaN 的位置不计。
+"""
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from models.market_data import CandleSeries
+from .indicator_engine import as_array, rolling_max, rolling_min
+
+
+def _centered(extremes: np.ndarray, distance: int) -> np.ndarray:
+    """把以窗口末端对齐的滑动极值，转换为以窗口中心对齐（两端不足的位置为 NaN）"""
+    n = len(extremes)
+    out = np.full(n, np.nan)
+    if n > 2 * distance:
+        out[distance:n - distance] = extremes[2 * distance:]
+    return out
+
+
+def peak_mask(values, distance: int = 5) -> np.ndarray:
+    """局部峰值的布尔掩码"""
+    x = as_array(values)
+    if distance <= 0:
+        # 没有需要比较的邻居，每个位置都是极值
+        return np.ones(len(x), dtype=bool)
+    with np.errstate(invalid="ignore"):
+        return x >= _centered(rolling_max(x, 2 * distance + 1), distance)
+
+
+def valley_mask(values, distance: int = 5) -> np.ndarray:
+    """局部谷底的布尔掩码"""
+    x = as_array(values)
+    if distance <= 0:
+        # 没有需要比较的邻居，每个位置都是极值
+        return np.ones(len(x), dtype=bool)
+    with np.errstate(invalid="ignore"):
+        return x <= _centered(rolling_min(x, 2 * distance + 1), distance)
+
+
+def find_peaks(values, distance: int = 5) -> np.ndarray:
+    """局部峰值的位置（升序）"""
+    return np.flatnonzero(peak_mask(values, distance))
+
+
+def find_valleys(values, distance: int = 5) -> np.ndarray:
+    """局部谷底的位置（升序）"""
+    return np.flatnonzero(valley_mask(values, distance))
+
+
+def as_points(values, indices: np.ndarray) -> List[Tuple[int, float]]:
+    """位置数组转换为 (位置, 价格) 列表"""
+    x = as_array(values)
+    return list(zip(indices.tolist(), x[indices].tolist()))
+
+
+def rolling_slope(values, window: int) -> np.ndarray:
+    """每个长度为 window 的窗口的线性回归斜率，按窗口均值归一化
+
+    结果第 s 项对应窗口 [s, s + window)，长度为 n - window + 1；窗口均值为 0 时斜率记为 0。
+    """
+    x = as_array(values)
+    if window < 2 or len(x) < window:
+        return np.zeros(max(len(x) - window + 1, 0))
+    windows = sliding_window_view(x, window)
+    t = np.arange(window, dtype=np.float64)
+    t -= t.mean()
+    slopes = windows @ t / float(t @ t)
+    means = windows.mean(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        normalized = slopes / means
+    normalized[means == 0] = 0.0
+    return normalized
+
+
+class SeriesExtrema:
+    """一根K线序列上的枢轴点与趋势线斜率缓存，每种参数只计算一次"""
+
+    def __init__(self, series: CandleSeries):
+        self.series = series
+        self._cache: Dict[tuple, Any] = {}
+
+    def _node(self, key: tuple, builder: Callable[[], Any]) -> Any:
+        value = self._cache.get(key)
+        if value is None:
+            value = self._cache[key] = builder()
+        return value
+
+    def column(self, field: str) -> np.ndarray:
+        return getattr(self.series, field)
+
+    def peaks(self, field: str, distance: int) -> np.ndarray:
+        """field 列的局部峰值位置"""
+        return self._node(("peaks", field, distance), lambda: find_peaks(self.column(field), distance))
+
+    def valleys(self, field: str, distance: int) -> np.ndarray:
+        """field 列的局部谷底位置"""
+        return self._node(("valleys", field, distance), lambda: find_valleys(self.column(field), distance))
+
+    def slopes(self, field: str, window: int) -> np.ndarray:
+        """field 列的滚动归一化趋势线斜率（见 rolling_slope）"""
+        return self._node(("slope", field, window), lambda: rolling_slope(self.column(field), window))
+
+    def stats(self) -> Dict[str, int]:
+        return {"nodes": len(self._cache)}
@@ -4,7 +4,8 @@ import time
 from datetime import datetime
 from typing import List, Dict, Optional
 import pandas as pd
-from models.market_data import KlineData, MarketType, Timeframe
+from models.market_data import KlineData, CandleSeries, MarketType, Timeframe
+from .synthetic_market import synthetic_market
 
 logger = logging.getLogger(__name__)
 
@@ -46,13 +47,13 @@ class FutuDataService:
         try:
             # 时间框架映射
             tf_mapping = {
-                Timeframe.MINUTE_1: "K_1M",
-                Timeframe.MINUTE_5: "K_5M",
-                Timeframe.MINUTE_15: "K_15M",
-                Timeframe.HOUR_1: "K_60M",
-                Timeframe.DAILY: "K_DAY",
-                Timeframe.WEEKLY: "K_WEEK",
-                Timeframe.MONTHLY: "K_MON"
+                Timeframe.M1: "K_1M",
+                Timeframe.M5: "K_5M",
+                Timeframe.M15: "K_15M",
+                Timeframe.H1: "K_60M",
+                Timeframe.D1: "K_DAY",
+                Timeframe.W1: "K_WEEK",
+                Timeframe.MN1: "K_MON"
             }
             
             futu_tf = tf_mapping.get(timeframe, "K_DAY")
@@ -95,54 +96,11 @@ class FutuDataService:
         symbol: str, 
         timeframe: Timeframe,
         limit: int
-    ) -> List[KlineData]:
-        """生成港股模拟数据"""
-        klines = []
-        base_price = 50.0  # 港股典型价格
-        current_time = datetime.now()
-        
-        for i in range(limit):
-            timestamp = current_time - self._get_timeframe_delta(timeframe) * i
-            
-            # 生成随机价格波动（港股波动较小）
-            import random
-            change = random.uniform(-1.0, 1.0)
-            open_price = base_price + change
-            high = open_price + random.uniform(0, 2.0)
-            low = open_price - random.uniform(0, 2.0)
-            close_price = (high + low) / 2 + random.uniform(-0.5, 0.5)
-            volume = random.uniform(100000, 1000000)  # 港股交易量较大
-            
-            kline = KlineData(
-                symbol=symbol,
-                timeframe=timeframe,
-                market_type=MarketType.STOCK,
-                exchange='futu',
-                timestamp=timestamp,
-                open=open_price,
-                high=high,
-                low=low,
-                close=close_price,
-                volume=volume
-            )
-            klines.append(kline)
-        
-        return klines
-    
-    def _get_timeframe_delta(self, timeframe: Timeframe):
-        """获取时间框架对应的时间差"""
-        from datetime import timedelta
-        timeframe_delta = {
-            Timeframe.MINUTE_1: timedelta(minutes=1),
-            Timeframe.MINUTE_5: timedelta(minutes=5),
-            Timeframe.MINUTE_15: timedelta(minutes=15),
-            Timeframe.HOUR_1: timedelta(hours=1),
-            Timeframe.HOUR_4: timedelta(hours=4),
-            Timeframe.DAILY: timedelta(days=1),
-            Timeframe.WEEKLY: timedelta(weeks=1),
-            Timeframe.MONTHLY: timedelta(days=30)
-        }
-        return timeframe_delta.get(timeframe, timedelta(hours=1))
+    ) -> CandleSeries:
+        """生成港股模拟数据（几何布朗运动路径）"""
+        return synthetic_market.candles(
+            symbol, MarketType.STOCK, 'futu', timeframe, limit, base_price=50.0, base_volume=500_000
+        )
     
     async def get_stock_quote(self, symbol: str) -> Dict:
         """获取股票实时报价 - 使用真实富途API"""
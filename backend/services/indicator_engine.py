@@ -0,0 +1,501 @@
+"""
+向量化技术指标引擎
+
+所有函数均为数组输入、数组输出（float64），长度与输入一致，
+预热期及无法计算的位置用 NaN 表示。实现全部基于 NumPy，时间复杂度 O(n)：
+
+- 滑动求和/均值：前缀和相减
+- 滑动方差：中心化后的前缀和 E[x²] - E[x]²
+- 滑动最大/最小值：van Herk/Gil-Werman 分块前缀/后缀极值
+- EMA / Wilder 平滑：分块闭式解，避免逐根 Python 递推
+
+TechnicalAnalysisService 的列表接口是这些函数的薄封装；
+IndicatorGraph 用于一次请求内批量计算多个指标并复用共享的中间结果。
+"""
+import math
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# 分块递推时每块允许的最大衰减指数，保证 w^-L 不溢出且精度可控
+_MAX_BLOCK_EXPONENT = 200.0
+
+
+def as_array(values) -> np.ndarray:
+    """转换为 float64 数组，None 转为 NaN"""
+    if isinstance(values, np.ndarray) and values.dtype == np.float64:
+        return values
+    return np.asarray(values, dtype=np.float64)
+
+
+def to_optional_list(values: np.ndarray) -> List[Optional[float]]:
+    """数组转换为列表，NaN 转为 None（与原有列表接口保持一致）"""
+    return [None if v != v else v for v in values.tolist()]
+
+
+def _nan_array(n: int) -> np.ndarray:
+    return np.full(n, np.nan, dtype=np.float64)
+
+
+def _reference(x: np.ndarray) -> float:
+    """用于中心化的参考值，降低前缀和的数值误差"""
+    finite = x[np.isfinite(x)]
+    return float(finite[0]) if finite.size else 0.0
+
+
+def prefix_sums(values) -> Tuple[float, np.ndarray, np.ndarray]:
+    """中心化前缀和 (ref, Σ(x-ref), Σ(x-ref)²)，首位补 0
+
+    同一序列的任意周期 SMA / 滑动标准差都可以由这组前缀和 O(n) 得到。
+    """
+    x = as_array(values)
+    ref = _reference(x)
+    c = x - ref
+    cs = np.concatenate(([0.0], np.cumsum(c)))
+    cs2 = np.concatenate(([0.0], np.cumsum(c * c)))
+    return ref, cs, cs2
+
+
+def sma_from_prefix(prefix: Tuple[float, np.ndarray, np.ndarray], period: int) -> np.ndarray:
+    """由 prefix_sums 的结果计算 SMA"""
+    ref, cs, _ = prefix
+    n = len(cs) - 1
+    out = _nan_array(n)
+    if period <= 0 or n < period:
+        return out
+    out[period - 1:] = (cs[period:] - cs[:-period]) / period + ref
+    return out
+
+
+def std_from_prefix(prefix: Tuple[float, np.ndarray, np.ndarray], period: int, ddof: int = 0) -> np.ndarray:
+    """由 prefix_sums 的结果计算滑动标准差"""
+    _, cs, cs2 = prefix
+    n = len(cs) - 1
+    out = _nan_array(n)
+    if period <= ddof or n < period:
+        return out
+    window_sum = cs[period:] - cs[:-period]
+    window_sum2 = cs2[period:] - cs2[:-period]
+    var = (window_sum2 - window_sum * window_sum / period) / (period - ddof)
+    out[period - 1:] = np.sqrt(np.maximum(var, 0.0))
+    return out
+
+
+def rolling_sum(values, period: int) -> np.ndarray:
+    """滑动窗口求和，前 period-1 个位置为 NaN"""
+    return sma(values, period) * period
+
+
+def sma(values, period: int) -> np.ndarray:
+    """简单移动平均"""
+    return sma_from_prefix(prefix_sums(values), period)
+
+
+def rolling_std(values, period: int, ddof: int = 0) -> np.ndarray:
+    """滑动标准差（默认总体标准差，与 np.std 一致）"""
+    return std_from_prefix(prefix_sums(values), period, ddof)
+
+
+def rolling_max(values, period: int) -> np.ndarray:
+    """滑动窗口最大值（van Herk/Gil-Werman，O(n) 且无逐根循环）"""
+    x = as_array(values)
+    n = len(x)
+    out = _nan_array(n)
+    if period <= 0 or n < period:
+        return out
+    if period == 1:
+        return x.copy()
+    padded_len = -(-n // period) * period
+    padded = np.full(padded_len, -np.inf)
+    padded[:n] = x
+    blocks = padded.reshape(-1, period)
+    prefix = np.maximum.accumulate(blocks, axis=1).ravel()
+    suffix = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    start = np.arange(n - period + 1)
+    out[period - 1:] = np.maximum(suffix[start], prefix[start + period - 1])
+    return out
+
+
+def rolling_min(values, period: int) -> np.ndarray:
+    """滑动窗口最小值"""
+    return -rolling_max(-as_array(values), period)
+
+
+def _smooth_from(x: np.ndarray, alpha: float, start: int, seed: float) -> np.ndarray:
+    """从 start 位置的种子值开始做一阶递推 y[t] = (1 - alpha) * y[t-1] + alpha * x[t]
+
+    按块使用闭式解 y[t0+j] = w^j * (y[t0] + alpha * Σ w^-m * x[t0+m])，
+    块长度受 _MAX_BLOCK_EXPONENT 限制以避免溢出。
+    """
+    n = len(x)
+    out = _nan_array(n)
+    out[start] = seed
+    if start + 1 >= n:
+        return out
+    w = 1.0 - alpha
+    if w <= 0.0:
+        out[start + 1:] = x[start + 1:]
+        return out
+    block = max(1, int(_MAX_BLOCK_EXPONENT / -math.log(w)))
+    powers = w ** np.arange(1, block + 1, dtype=np.float64)
+    last = seed
+    pos = start + 1
+    while pos < n:
+        end = min(pos + block, n)
+        length = end - pos
+        pw = powers[:length]
+        acc = np.cumsum(x[pos:end] / pw)
+        segment = pw * (last + alpha * acc)
+        out[pos:end] = segment
+        last = segment[-1]
+        pos = end
+    return out
+
+
+def ema(values, period: int) -> np.ndarray:
+    """指数移动平均，以前 period 个值的 SMA 作为种子"""
+    x = as_array(values)
+    n = len(x)
+    if period <= 0 or n < period:
+        return _nan_array(n)
+    seed = float(np.mean(x[:period]))
+    return _smooth_from(x, 2.0 / (period + 1), period - 1, seed)
+
+
+def wilder(values, period: int, offset: int = 0) -> np.ndarray:
+    """Wilder 平滑（alpha = 1/period），以 values[offset:offset+period] 的均值作为种子"""
+    x = as_array(values)
+    n = len(x)
+    if period <= 0 or n < offset + period:
+        return _nan_array(n)
+    seed = float(np.mean(x[offset:offset + period]))
+    return _smooth_from(x, 1.0 / period, offset + period - 1, seed)
+
+
+def macd(values, fast_period: int = 12, slow_period: int = 26,
+         signal_period: int = 9) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """MACD，返回 (macd, signal, histogram)
+
+    与原有实现保持一致：信号线对 MACD 线做 EMA 时预热期按 0 填充。
+    """
+    x = as_array(values)
+    n = len(x)
+    if n < slow_period + signal_period:
+        return _nan_array(n), _nan_array(n), _nan_array(n)
+    macd_line = ema(x, fast_period) - ema(x, slow_period)
+    signal_line = ema(np.nan_to_num(macd_line, nan=0.0), signal_period)
+    histogram = macd_line - signal_line
+    return macd_line, signal_line, histogram
+
+
+def rsi(values, period: int = 14) -> np.ndarray:
+    """RSI（Wilder 平滑），第一个有效值位于索引 period"""
+    x = as_array(values)
+    n = len(x)
+    out = _nan_array(n)
+    if n <= period:
+        return out
+    changes = np.diff(x)
+    avg_gain = wilder(np.maximum(changes, 0.0), period)
+    avg_loss = wilder(np.maximum(-changes, 0.0), period)
+    return rsi_from_averages(avg_gain, avg_loss, period)
+
+
+def rsi_from_averages(avg_gain: np.ndarray, avg_loss: np.ndarray, period: int) -> np.ndarray:
+    """由价格变化序列（长度 n-1）的平均涨幅/跌幅计算 RSI（长度 n）"""
+    out = _nan_array(len(avg_gain) + 1)
+    if len(avg_gain) < period:
+        return out
+    valid = slice(period - 1, None)
+    gain, loss = avg_gain[valid], avg_loss[valid]
+    rs = np.divide(gain, loss, out=np.zeros_like(gain), where=loss != 0)
+    out[period:] = np.where(loss == 0, 100.0, 100.0 - 100.0 / (1.0 + rs))
+    return out
+
+
+def bollinger_bands(values, period: int = 20,
+                    std_dev: float = 2) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """布林带，返回 (upper, middle, lower)，标准差为总体标准差"""
+    middle = sma(values, period)
+    std = rolling_std(values, period)
+    return middle + std_dev * std, middle, middle - std_dev * std
+
+
+def true_range(high, low, close) -> np.ndarray:
+    """真实波幅，索引 0 没有前收盘价，记为 NaN"""
+    h, l, c = as_array(high), as_array(low), as_array(close)
+    out = _nan_array(len(h))
+    if len(h) < 2:
+        return out
+    prev_close = c[:-1]
+    out[1:] = np.maximum.reduce([
+        h[1:] - l[1:],
+        np.abs(h[1:] - prev_close),
+        np.abs(l[1:] - prev_close),
+    ])
+    return out
+
+
+def atr(high, low, close, period: int = 14) -> np.ndarray:
+    """平均真实波幅（Wilder 平滑），第一个有效值位于索引 period"""
+    h = as_array(high)
+    if len(h) < period + 1:
+        return _nan_array(len(h))
+    return wilder(true_range(h, low, close), period, offset=1)
+
+
+def stochastic(high, low, close, k_period: int = 14,
+               d_period: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+    """随机指标，返回 (%K, %D)；最高价等于最低价时 %K 记为 50"""
+    h, l, c = as_array(high), as_array(low), as_array(close)
+    n = len(h)
+    if n < k_period:
+        return _nan_array(n), _nan_array(n)
+    return stochastic_from_extrema(c, rolling_max(h, k_period), rolling_min(l, k_period), k_period, d_period)
+
+
+def stochastic_from_extrema(close, highest: np.ndarray, lowest: np.ndarray, k_period: int,
+                            d_period: int) -> Tuple[np.ndarray, np.ndarray]:
+    """由滑动最高价/最低价计算 (%K, %D)"""
+    c = as_array(close)
+    n = len(c)
+    if n < k_period:
+        return _nan_array(n), _nan_array(n)
+    span = highest - lowest
+    k = np.divide((c - lowest) * 100.0, span, out=np.full(n, 50.0), where=span != 0)
+    k[:k_period - 1] = np.nan
+    d = _nan_array(n)
+    if n >= k_period + d_period - 1:
+        d[k_period - 1:] = sma(k[k_period - 1:], d_period)
+    return k, d
+
+
+def cci(high, low, close, period: int = 20) -> np.ndarray:
+    """商品通道指数；平均偏差为 0 时记为 0
+
+    平均绝对偏差依赖每个窗口自身的均值，无法用前缀和得到，
+    这里用 sliding_window_view 一次性在 C 层完成。
+    """
+    h, l, c = as_array(high), as_array(low), as_array(close)
+    n = len(h)
+    out = _nan_array(n)
+    if n < period:
+        return out
+    return cci_from_typical((h + l + c) / 3, period)
+
+
+def cci_from_typical(typical, period: int = 20) -> np.ndarray:
+    """由典型价格计算 CCI"""
+    tp = as_array(typical)
+    n = len(tp)
+    out = _nan_array(n)
+    if n < period:
+        return out
+    windows = np.lib.stride_tricks.sliding_window_view(tp, period)
+    mean = windows.mean(axis=1)
+    mean_dev = np.abs(windows - mean[:, None]).mean(axis=1)
+    current = tp[period - 1:]
+    out[period - 1:] = np.divide(current - mean, 0.015 * mean_dev,
+                                 out=np.zeros_like(mean), where=mean_dev != 0)
+    return out
+
+
+def momentum(values, period: int = 10) -> np.ndarray:
+    """动量：values[i] - values[i - period]"""
+    x = as_array(values)
+    out = _nan_array(len(x))
+    if period <= 0 or len(x) <= period:
+        return out
+    out[period:] = x[period:] - x[:-period]
+    return out
+
+
+def vwap(high, low, close, volume) -> np.ndarray:
+    """累计成交量加权平均价，累计成交量为 0 时为 NaN"""
+    h, l, c = as_array(high), as_array(low), as_array(close)
+    return vwap_from_typical((h + l + c) / 3, volume)
+
+
+def vwap_from_typical(typical, volume) -> np.ndarray:
+    """由典型价格与成交量计算累计 VWAP"""
+    tp, v = as_array(typical), as_array(volume)
+    cum_volume = np.cumsum(v)
+    cum_pv = np.cumsum(tp * v)
+    return np.divide(cum_pv, cum_volume, out=_nan_array(len(tp)), where=cum_volume != 0)
+
+
+class IndicatorGraph:
+    """共享中间结果的指标计算图
+
+    每个中间量（前缀和、EMA、滑动极值、真实波幅、Wilder 平均等）是图中的一个节点，
+    以 (类型, 数据源, 参数...) 为键，首次被依赖时计算并缓存，之后直接复用。
+    例如 MACD(12,26) 与 EMA(12) 共享同一条 EMA，BOLL(20) 与 SMA(50) 共享 close 的前缀和，
+    ATR 与 ATR 的不同周期共享真实波幅。
+    """
+
+    PRICE_SOURCES = ("open", "high", "low", "close", "volume")
+    DERIVED_SOURCES = ("typical", "hl2")
+
+    def __init__(self, **sources):
+        self._sources: Dict[str, np.ndarray] = {}
+        for name, values in sources.items():
+            if values is None:
+                continue
+            if name not in self.PRICE_SOURCES:
+                raise ValueError(f"未知数据源: {name}")
+            self._sources[name] = as_array(values)
+        lengths = {len(v) for v in self._sources.values()}
+        if len(lengths) > 1:
+            raise ValueError("各价格序列长度不一致")
+        if "close" not in self._sources:
+            raise ValueError("缺少收盘价序列")
+        self.length = lengths.pop()
+        self._nodes: Dict[tuple, Any] = {}
+        self.reused = 0
+
+    def _node(self, key: tuple, builder: Callable[[], Any]) -> Any:
+        if key in self._nodes:
+            self.reused += 1
+            return self._nodes[key]
+        value = builder()
+        self._nodes[key] = value
+        return value
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """计算图统计：已计算节点数与复用次数"""
+        return {"nodes": len(self._nodes), "reused": self.reused}
+
+    def source(self, name: str) -> np.ndarray:
+        """价格序列或派生序列（typical = (H+L+C)/3，hl2 = (H+L)/2）"""
+        if name in self._sources:
+            return self._sources[name]
+        if name == "typical":
+            return self._node(("typical",), lambda: (self.source("high") + self.source("low") + self.source("close")) / 3)
+        if name == "hl2":
+            return self._node(("hl2",), lambda: (self.source("high") + self.source("low")) / 2)
+        if name in self.PRICE_SOURCES:
+            raise ValueError(f"缺少 {name} 序列")
+        raise ValueError(f"未知数据源: {name}")
+
+    def prefix(self, src: str) -> Tuple[float, np.ndarray, np.ndarray]:
+        return self._node(("prefix", src), lambda: prefix_sums(self.source(src)))
+
+    def sma(self, src: str, period: int) -> np.ndarray:
+        return self._node(("sma", src, period), lambda: sma_from_prefix(self.prefix(src), period))
+
+    def std(self, src: str, period: int) -> np.ndarray:
+        return self._node(("std", src, period), lambda: std_from_prefix(self.prefix(src), period))
+
+    def ema(self, src: str, period: int) -> np.ndarray:
+        return self._node(("ema", src, period), lambda: ema(self.source(src), period))
+
+    def rolling_max(self, src: str, period: int) -> np.ndarray:
+        return self._node(("max", src, period), lambda: rolling_max(self.source(src), period))
+
+    def rolling_min(self, src: str, period: int) -> np.ndarray:
+        return self._node(("min", src, period), lambda: rolling_min(self.source(src), period))
+
+    def changes(self, src: str) -> np.ndarray:
+        return self._node(("diff", src), lambda: np.diff(self.source(src)))
+
+    def avg_gain(self, src: str, period: int) -> np.ndarray:
+        return self._node(("avg_gain", src, period),
+                          lambda: wilder(np.maximum(self.changes(src), 0.0), period))
+
+    def avg_loss(self, src: str, period: int) -> np.ndarray:
+        return self._node(("avg_loss", src, period),
+                          lambda: wilder(np.maximum(-self.changes(src), 0.0), period))
+
+    def true_range(self) -> np.ndarray:
+        return self._node(("true_range",), lambda: true_range(
+            self.source("high"), self.source("low"), self.source("close")))
+
+    def atr(self, period: int) -> np.ndarray:
+        def build():
+            if self.length < period + 1:
+                return _nan_array(self.length)
+            return wilder(self.true_range(), period, offset=1)
+        return self._node(("atr", period), build)
+
+    def macd_line(self, src: str, fast_period: int, slow_period: int) -> np.ndarray:
+        return self._node(("macd", src, fast_period, slow_period),
+                          lambda: self.ema(src, fast_period) - self.ema(src, slow_period))
+
+    def macd_signal(self, src: str, fast_period: int, slow_period: int, signal_period: int) -> np.ndarray:
+        return self._node(("macd_signal", src, fast_period, slow_period, signal_period),
+                          lambda: ema(np.nan_to_num(self.macd_line(src, fast_period, slow_period), nan=0.0),
+                                      signal_period))
+
+
+def _batch_sma(graph: IndicatorGraph, period: int = 20, source: str = "close"):
+    return graph.sma(source, period)
+
+
+def _batch_ema(graph: IndicatorGraph, period: int = 20, source: str = "close"):
+    return graph.ema(source, period)
+
+
+def _batch_macd(graph: IndicatorGraph, fast_period: int = 12, slow_period: int = 26,
+                signal_period: int = 9, source: str = "close"):
+    if graph.length < slow_period + signal_period:
+        empty = _nan_array(graph.length)
+        return {"macd": empty, "signal": empty, "histogram": empty}
+    line = graph.macd_line(source, fast_period, slow_period)
+    signal = graph.macd_signal(source, fast_period, slow_period, signal_period)
+    return {"macd": line, "signal": signal, "histogram": line - signal}
+
+
+def _batch_rsi(graph: IndicatorGraph, period: int = 14, source: str = "close"):
+    if graph.length <= period:
+        return _nan_array(graph.length)
+    return rsi_from_averages(graph.avg_gain(source, period), graph.avg_loss(source, period), period)
+
+
+def _batch_bollinger(graph: IndicatorGraph, period: int = 20, std_dev: float = 2, source: str = "close"):
+    middle = graph.sma(source, period)
+    std = graph.std(source, period)
+    return {"upper": middle + std_dev * std, "middle": middle, "lower": middle - std_dev * std}
+
+
+def _batch_atr(graph: IndicatorGraph, period: int = 14):
+    return graph.atr(period)
+
+
+def _batch_stochastic(graph: IndicatorGraph, k_period: int = 14, d_period: int = 3):
+    k, d = stochastic_from_extrema(graph.source("close"), graph.rolling_max("high", k_period),
+                                   graph.rolling_min("low", k_period), k_period, d_period)
+    return {"k": k, "d": d}
+
+
+def _batch_cci(graph: IndicatorGraph, period: int = 20):
+    return cci_from_typical(graph.source("typical"), period)
+
+
+def _batch_momentum(graph: IndicatorGraph, period: int = 10, source: str = "close"):
+    return momentum(graph.source(source), period)
+
+
+def _batch_vwap(graph: IndicatorGraph):
+    return vwap_from_typical(graph.source("typical"), graph.source("volume"))
+
+
+# 批量接口支持的指标；键为去掉空格/下划线后的大写名称
+BATCH_INDICATORS: Dict[str, Callable[..., Any]] = {
+    "SMA": _batch_sma,
+    "EMA": _batch_ema,
+    "MACD": _batch_macd,
+    "RSI": _batch_rsi,
+    "BOLLINGER": _batch_bollinger,
+    "BOLLINGERBANDS": _batch_bollinger,
+    "ATR": _batch_atr,
+    "STOCHASTIC": _batch_stochastic,
+    "CCI": _batch_cci,
+    "MOMENTUM": _batch_momentum,
+    "VWAP": _batch_vwap,
+}
+
+
+def normalize_indicator_name(name: str) -> str:
+    """指标名称归一化，例如 "Bollinger Bands" -> "BOLLINGERBANDS" """
+    return name.upper().replace(" ", "").replace("_", "").replace("-", "")
@@ -0,0 +1,300 @@
+"""
+InfluxDB 异步批量写入
+
+请求路径只把新获取的K线/行情放入有界队列（不等待写入），后台任务按条数或时间间隔
+批量编码为 line protocol，经异步客户端写入；失败按指数退避重试，已写入的K线区间不重复写。
+队列超过上限时丢弃新提交的数据，不影响用户请求。
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from models.market_data import CandleSeries
+from .performance_monitor import performance_monitor
+
+logger = logging.getLogger(__name__)
+
+KLINE_MEASUREMENT = "kline_data"
+TICKER_MEASUREMENT = "ticker_data"
+# 每个品种/周期最多记录的已写入区间数，以及最多跟踪的品种/周期数
+MAX_SPANS_PER_KEY = 16
+MAX_TRACKED_KEYS = 4096
+
+_TAG_ESCAPES = str.maketrans({",": r"\,", " ": r"\ ", "=": r"\="})
+
+
+def _tag_set(tags: Dict[str, Any]) -> str:
+    """line protocol 标签部分，空值标签省略"""
+    return "".join(f",{k}={str(v).translate(_TAG_ESCAPES)}" for k, v in tags.items() if v not in (None, ""))
+
+
+def encode_candles(series: CandleSeries, measurement: str = KLINE_MEASUREMENT) -> List[str]:
+    """把K线序列直接按列编码为 line protocol（毫秒精度），NaN 字段省略"""
+    if len(series) == 0:
+        return []
+    prefix = measurement + _tag_set({
+        "symbol": series.symbol,
+        "market_type": series.market_type.value if series.market_type is not None else None,
+        "exchange": series.exchange,
+        "timeframe": series.timeframe.value if series.timeframe is not None else None,
+    }) + " "
+    columns = [(name, getattr(series, name)) for name in CandleSeries._COLUMNS]
+    if not any(np.isnan(values).any() for _, values in columns):
+        return [
+            f"{prefix}open={o!r},high={h!r},low={l!r},close={c!r},volume={v!r} {ts}"
+            for ts, o, h, l, c, v in zip(series.timestamp.tolist(), *(values.tolist() for _, values in columns))
+        ]
+    lines = []
+    for i, ts in enumerate(series.timestamp.tolist()):
+        fields = ",".join(f"{name}={values[i]!r}" for name, values in columns if not np.isnan(values[i]))
+        if fields:
+            lines.append(f"{prefix}{fields} {ts}")
+    return lines
+
+
+@dataclass
+class _Pending:
+    """队列中待写入的一项"""
+    key: Optional[tuple]  # K线的品种/周期键，行情为 None
+    payload: Any  # CandleSeries 或已编码的行列表
+    size: int
+    enqueued_at: float
+
+
+class InfluxKlineWriter:
+    """K线与行情的后台批量写入器"""
+
+    def __init__(self, batch_size: int = 5000, flush_interval: float = 1.0,
+                 max_pending: int = 100000, max_retries: int = 3, backoff: float = 0.5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.queue: Deque[_Pending] = deque()
+        self.pending = 0
+        # 已写入的K线区间 [start_ms, end_ms]，按品种/周期键记录
+        self.written: "OrderedDict[tuple, List[Tuple[int, int]]]" = OrderedDict()
+        self._last_ticks: Dict[str, int] = {}
+        self.client = None
+        self.task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.is_running = False
+        self.written_points = 0
+        self.skipped_points = 0
+        self.dropped_points = 0
+        self.failed_points = 0
+        self.retries = 0
+        self.batches = 0
+        self.last_lag = 0.0
+
+    # ------------------------------------------------------------------
+    # 提交（请求路径，不等待写入）
+    # ------------------------------------------------------------------
+
+    def _enqueue(self, item: _Pending) -> bool:
+        if not self.is_running or item.size == 0:
+            return False
+        if self.pending + item.size > self.max_pending:
+            self.dropped_points += item.size
+            logger.warning(f"InfluxDB写入队列已满，丢弃 {item.size} 条数据")
+            return False
+        self.queue.append(item)
+        self.pending += item.size
+        if self.pending >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def submit(self, series: CandleSeries) -> bool:
+        """提交K线序列，返回是否已入队"""
+        key = (series.symbol, series.market_type, series.exchange, series.timeframe)
+        return self._enqueue(_Pending(key, series, len(series), time.time()))
+
+    def submit_tickers(self, tickers: Iterable[Dict[str, Any]], exchange: str = "") -> bool:
+        """提交实时行情（每个品种同一时间戳只写一次）"""
+        lines = []
+        for ticker in tickers:
+            timestamp = ticker.get("timestamp")
+            ts = int(timestamp.timestamp() * 1000) if isinstance(timestamp, datetime) else int(timestamp or time.time() * 1000)
+            symbol = ticker.get("symbol")
+            # 模拟行情不写入历史库
+            if ticker.get("is_mock") or ticker.get("last") is None or self._last_ticks.get(symbol) == ts:
+                continue
+            self._last_ticks[symbol] = ts
+            fields = {"price": ticker.get("last"), "volume": ticker.get("volume"),
+                      "change_percent": ticker.get("change_percent")}
+            field_set = ",".join(f"{k}={float(v)!r}" for k, v in fields.items() if v is not None)
+            lines.append(f"{TICKER_MEASUREMENT}{_tag_set({'symbol': symbol, 'exchange': exchange})} {field_set} {ts}")
+        return self._enqueue(_Pending(None, lines, len(lines), time.time()))
+
+    # ------------------------------------------------------------------
+    # 去重
+    # ------------------------------------------------------------------
+
+    def _unwritten(self, key: tuple, series: CandleSeries) -> CandleSeries:
+        """去掉已写入区间内的K线；区间的最后一根可能尚未收盘，总是重写（写入是幂等的）"""
+        spans = self.written.get(key)
+        if not spans:
+            return series
+        mask = np.ones(len(series), dtype=bool)
+        for start, end in spans:
+            mask &= ~((series.timestamp >= start) & (series.timestamp < end))
+        if mask.all():
+            return series
+        return CandleSeries(series.symbol, series.market_type, series.exchange, series.timeframe,
+                            series.timestamp[mask], **{name: getattr(series, name)[mask] for name in CandleSeries._COLUMNS})
+
+    def _mark_written(self, key: tuple, start: int, end: int):
+        spans = self.written.pop(key, [])
+        spans.append((start, end))
+        spans.sort()
+        merged = [spans[0]]
+        for s, e in spans[1:]:
+            if s <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+            else:
+                merged.append((s, e))
+        self.written[key] = merged[-MAX_SPANS_PER_KEY:]
+        while len(self.written) > MAX_TRACKED_KEYS:
+            self.written.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def _take_batch(self) -> List[_Pending]:
+        batch, size = [], 0
+        while self.queue and (not batch or size + self.queue[0].size <= self.batch_size):
+            item = self.queue.popleft()
+            self.pending -= item.size
+            size += item.size
+            batch.append(item)
+        return batch
+
+    async def _write(self, lines: List[str]):
+        if self.client is None:
+            from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
+            self.client = InfluxDBClientAsync(url=settings.INFLUXDB_URL, token=settings.INFLUXDB_TOKEN,
+                                              org=settings.INFLUXDB_ORG)
+        await self.client.write_api().write(bucket=settings.INFLUXDB_BUCKET, record=lines, write_precision="ms")
+
+    async def _write_with_retry(self, lines: List[str]) -> Optional[str]:
+        """写入一批，返回最后一次失败的错误信息，成功时返回 None"""
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.retries += 1
+                await asyncio.sleep(min(self.backoff * 2 ** (attempt - 1), 30.0))
+            try:
+                await self._write(lines)
+                return None
+            except Exception as e:
+                error = str(e)
+                logger.warning(f"InfluxDB批量写入失败（第 {attempt + 1} 次）: {e}")
+        return error
+
+    async def flush(self):
+        """写出队列中的全部数据"""
+        while self.queue:
+            batch = self._take_batch()
+            lines: List[str] = []
+            spans = []
+            for item in batch:
+                if item.key is None:
+                    lines.extend(item.payload)
+                    continue
+                series = item.payload
+                fresh = self._unwritten(item.key, series)
+                self.skipped_points += len(series) - len(fresh)
+                lines.extend(encode_candles(fresh))
+                spans.append((item.key, int(series.timestamp[0]), int(series.timestamp[-1])))
+            if not lines:
+                continue
+
+            started = time.time()
+            error = await self._write_with_retry(lines)
+            duration = time.time() - started
+            self.batches += 1
+            performance_monitor.record_request("influxdb_writer", duration, success=error is None, error=error)
+            if error is not None:
+                self.failed_points += len(lines)
+                logger.error(f"InfluxDB批量写入失败，丢弃 {len(lines)} 条数据: {error}")
+                continue
+
+            for key, start, end in spans:
+                self._mark_written(key, start, end)
+            self.written_points += len(lines)
+            self.last_lag = time.time() - min(item.enqueued_at for item in batch)
+            performance_monitor.record_metric("influxdb_write_lag", self.last_lag)
+            performance_monitor.record_metric("influxdb_write_points", len(lines))
+
+    async def _run(self):
+        while self.is_running:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"InfluxDB写入循环出错: {e}")
+
+    async def start(self):
+        if self.is_running:
+            return
+        self.is_running = True
+        self._wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self._run())
+        logger.info("InfluxDB批量写入已启动")
+
+    async def stop(self):
+        """停止后台任务，写出剩余数据后关闭客户端"""
+        if not self.is_running:
+            return
+        self.is_running = False
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"InfluxDB剩余数据写入失败: {e}")
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+        logger.info("InfluxDB批量写入已停止")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.is_running,
+            "pending": self.pending,
+            "queued_batches": len(self.queue),
+            "batches": self.batches,
+            "written_points": self.written_points,
+            "skipped_points": self.skipped_points,
+            "dropped_points": self.dropped_points,
+            "failed_points": self.failed_points,
+            "retries": self.retries,
+            "last_lag": self.last_lag
+        }
+
+
+# 全局InfluxDB写入实例
+influx_writer = InfluxKlineWriter(
+    batch_size=settings.INFLUX_WRITE_BATCH_SIZE,
+    flush_interval=settings.INFLUX_WRITE_FLUSH_INTERVAL,
+    max_pending=settings.INFLUX_WRITE_MAX_PENDING,
+    max_retries=settings.INFLUX_WRITE_MAX_RETRIES
+)
@@ -0,0 +1,168 @@
+"""
+区间感知的K线存储
+
+按 (symbol, market_type, timeframe) 保存一段连续的K线，并记录这段数据覆盖到哪里：
+任意 limit / start / end 的请求都从这段数据中切片返回，缺少的只有头部（更早的历史）
+或尾部（最新的K线）时才向数据源补取，补取结果合并回同一段。
+
+数据源大多只支持"最近 N 根"的查询，因此尾部补取按距上次最新K线经过的周期数计算 N，
+头部不足时按请求所需的总根数重新获取。
+"""
+import logging
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from models.market_data import CandleSeries, MarketType, Timeframe
+
+logger = logging.getLogger(__name__)
+
+SegmentKey = Tuple[str, MarketType, Timeframe]
+
+
+def _epoch_ms(value: Optional[datetime]) -> Optional[int]:
+    return None if value is None else int(value.timestamp() * 1000)
+
+
+@dataclass
+class KlineSegment:
+    """一个品种/周期已持有的连续K线区间"""
+    series: CandleSeries
+    head_complete: bool  # 数据源已没有更早的数据
+    updated_at: float  # 最近一次从数据源取到最新K线的时间
+
+    @property
+    def first_ms(self) -> int:
+        return int(self.series.timestamp[0])
+
+    @property
+    def last_ms(self) -> int:
+        return int(self.series.timestamp[-1])
+
+
+class KlineSegmentStore:
+    """K线区间存储：按需切片，只补取缺失的头部/尾部"""
+
+    def __init__(self, ttl: float = 300, max_segments: int = 512, max_bars: int = 20000):
+        self.ttl = ttl  # 尾部数据的新鲜期（秒），超过后补取最新K线
+        self.max_segments = max_segments
+        self.max_bars = max_bars
+        self.segments: "OrderedDict[SegmentKey, KlineSegment]" = OrderedDict()
+        self.served = 0
+        self.head_fetches = 0
+        self.tail_fetches = 0
+
+    def get_segment(self, key: SegmentKey) -> Optional[KlineSegment]:
+        segment = self.segments.get(key)
+        if segment is not None:
+            self.segments.move_to_end(key)
+        return segment
+
+    def plan(self, key: SegmentKey, interval_ms: int, limit: int,
+             start: Optional[datetime] = None, end: Optional[datetime] = None,
+             now: Optional[float] = None) -> int:
+        """计算满足请求需要向数据源获取的最近K线根数，0 表示可直接由存储返回"""
+        now = time.time() if now is None else now
+        now_ms = int(now * 1000)
+        start_ms, end_ms = _epoch_ms(start), _epoch_ms(end)
+
+        # 数据源按"最近 N 根"获取，覆盖到 start 需要的根数
+        needed = limit
+        if start_ms is not None:
+            needed = max(needed, math.ceil((now_ms - start_ms) / interval_ms) + 1)
+
+        segment = self.get_segment(key)
+        if segment is None or len(segment.series) == 0:
+            self.head_fetches += 1
+            return needed
+
+        if start_ms is not None:
+            has_head = segment.head_complete or segment.first_ms <= start_ms
+        else:
+            has_head = segment.head_complete or len(segment.series) >= limit
+        if not has_head:
+            self.head_fetches += 1
+            return needed
+
+        fresh = now - segment.updated_at < self.ttl
+        if fresh or (end_ms is not None and end_ms <= segment.last_ms):
+            self.served += 1
+            return 0
+
+        # 尾部补取：覆盖上次最新K线（可能尚未收盘）到现在
+        self.tail_fetches += 1
+        missing = max((now_ms - segment.last_ms) // interval_ms, 0) + 2
+        return int(min(missing, needed))
+
+    def load(self, key: SegmentKey, series: CandleSeries, updated_at: float) -> KlineSegment:
+        """用本地历史库中的连续K线建立区间（updated_at 为其最新K线的获取时间）"""
+        segment = KlineSegment(series.tail(self.max_bars), False, updated_at)
+        self.segments[key] = segment
+        self.segments.move_to_end(key)
+        while len(self.segments) > self.max_segments:
+            self.segments.popitem(last=False)
+        return segment
+
+    def merge(self, key: SegmentKey, fetched: CandleSeries, requested: int, interval_ms: int,
+              now: Optional[float] = None) -> KlineSegment:
+        """合并数据源返回的最近K线；无法与已有区间衔接时以新数据替换"""
+        now = time.time() if now is None else now
+        # 返回根数少于请求数说明数据源没有更早的数据了
+        exhausted = len(fetched) < requested
+        segment = self.segments.get(key)
+
+        if segment is None or len(segment.series) == 0:
+            segment = KlineSegment(fetched, exhausted, now)
+        elif len(fetched) == 0:
+            segment.updated_at = now
+        else:
+            old = segment.series
+            first, last = int(fetched.timestamp[0]), int(fetched.timestamp[-1])
+            newer = old[old.timestamp > last]
+            if first <= segment.first_ms:
+                # 新数据覆盖了已有区间的头部
+                segment = KlineSegment(CandleSeries.concat([fetched, newer]), exhausted, now)
+            elif first <= segment.last_ms + interval_ms:
+                # 与已有区间衔接：保留更早的部分，重叠处以新数据为准
+                older = old[old.timestamp < first]
+                segment = KlineSegment(CandleSeries.concat([older, fetched, newer]), segment.head_complete, now)
+            else:
+                logger.debug(f"K线区间无法衔接，重新建立: {key[0]} {key[2].value}")
+                segment = KlineSegment(fetched, exhausted, now)
+
+        if len(segment.series) > self.max_bars:
+            segment.series = segment.series.tail(self.max_bars)
+            segment.head_complete = False
+
+        self.segments[key] = segment
+        self.segments.move_to_end(key)
+        while len(self.segments) > self.max_segments:
+            self.segments.popitem(last=False)
+        return segment
+
+    def query(self, key: SegmentKey, limit: int, start: Optional[datetime] = None,
+              end: Optional[datetime] = None) -> Optional[CandleSeries]:
+        """从存储中切片：先按时间区间截取，再取最近 limit 根"""
+        segment = self.get_segment(key)
+        if segment is None:
+            return None
+        series = segment.series
+        if start is not None or end is not None:
+            series = series.between(start, end)
+        return series.tail(limit)
+
+    def invalidate(self, key: SegmentKey):
+        self.segments.pop(key, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "segments": len(self.segments),
+            "bars": int(sum(len(s.series) for s in self.segments.values())),
+            "memory_bytes": int(sum(s.series.nbytes for s in self.segments.values())),
+            "served": self.served,
+            "head_fetches": self.head_fetches,
+            "tail_fetches": self.tail_fetches
+        }
@@ -9,15 +9,23 @@ import tempfile
 import shutil
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Tuple, Union
 import pandas as pd
 import yfinance as yf
 from pydantic import BaseModel
-from backtesting import Backtest, Strategy
-from backtesting.lib import crossover
+from models.market_data import CandleSeries, MarketType, Timeframe
+from .provider_executor import provider_executor
+from .candle_store import candle_store
+from .backtest_executor import backtest_executor
+from .backtest_store import BacktestStore, backtest_store
+from .backtest_strategies import run_backtest
+from .vectorized_backtest import VECTORIZED_STRATEGIES, run_vectorized_backtest
 
 logger = logging.getLogger(__name__)
 
+# 回测的结束状态
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
 
 class BacktestRequest(BaseModel):
     """回测请求模型"""
@@ -29,15 +37,17 @@ class BacktestRequest(BaseModel):
     initial_capital: float = 10000.0
     parameters: Dict[str, Any] = {}
     data_source: str = "yfinance"  # yfinance, alpha_vantage, akshare, custom
+    priority: int = 0  # 排队优先级，数值越小越先执行
+    engine: str = "backtesting"  # backtesting（逐K线事件驱动）或 vectorized（内置模板的向量化引擎）
 
 
 class BacktestResult(BaseModel):
     """回测结果模型"""
     backtest_id: str
     strategy_id: str
-    status: str  # running, completed, failed
+    status: str  # queued, running, completed, failed, cancelled
     statistics: Dict[str, Any] = {}
-    equity_curve: List[Dict[str, float]] = []
+    equity_curve: List[Dict[str, Any]] = []
     trades: List[Dict[str, Any]] = []
     logs: List[str] = []
     error_message: Optional[str] = None
@@ -45,6 +55,17 @@ class BacktestResult(BaseModel):
     completed_at: Optional[str] = None
 
 
+class BacktestSummary(BaseModel):
+    """回测摘要（历史列表中的一行，不含日志、权益曲线和交易记录）"""
+    backtest_id: str
+    strategy_id: str
+    status: str
+    statistics: Dict[str, Any] = {}
+    error_message: Optional[str] = None
+    created_at: str
+    completed_at: Optional[str] = None
+
+
 class StrategyPerformance(BaseModel):
     """策略表现统计"""
     total_return: float
@@ -60,9 +81,12 @@ class StrategyPerformance(BaseModel):
 class LeanBacktestService:
     """LEAN回测服务"""
     
-    def __init__(self):
+    def __init__(self, store: Optional[BacktestStore] = None):
+        # 内存中只保留排队和运行中的回测，结束后写入结果存储（写入失败的暂留内存等待重试）
         self.active_backtests: Dict[str, BacktestResult] = {}
-        self.backtest_history: List[BacktestResult] = []
+        self.store = store if store is not None else backtest_store
+        # 回测ID -> 后台任务（数据下载阶段取消时使用）
+        self._tasks: Dict[str, asyncio.Task] = {}
         self.strategy_templates: Dict[str, str] = self._load_strategy_templates()
         logger.info("LEAN回测服务已初始化")
     
@@ -187,13 +211,13 @@ class MeanReversionAlgorithm(QCAlgorithm):
         }
     
     async def start_backtest(self, request: BacktestRequest) -> str:
-        """启动回测"""
-        backtest_id = f"backtest_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{request.strategy_id}"
+        """启动回测：后台加载数据后提交到回测进程池排队执行"""
+        backtest_id = f"backtest_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{request.strategy_id}"
         
         result = BacktestResult(
             backtest_id=backtest_id,
             strategy_id=request.strategy_id,
-            status="running",
+            status="queued",
             created_at=datetime.now().isoformat(),
             statistics={},
             equity_curve=[],
@@ -204,7 +228,7 @@ class MeanReversionAlgorithm(QCAlgorithm):
         self.active_backtests[backtest_id] = result
         
         # 在后台运行回测
-        asyncio.create_task(self._run_backtest(backtest_id, request))
+        self._tasks[backtest_id] = asyncio.create_task(self._run_backtest(backtest_id, request))
         
         logger.info(f"启动回测: {backtest_id}")
         return backtest_id
@@ -215,110 +239,123 @@ class MeanReversionAlgorithm(QCAlgorithm):
             # 使用backtesting库进行真实回测
             await self._run_backtesting_backtest(backtest_id, request)
             
+        except asyncio.CancelledError:
+            # cancel_backtest 已更新状态并移入历史记录
+            pass
         except Exception as e:
             logger.error(f"回测执行失败: {backtest_id}, 错误: {e}")
-            result = self.active_backtests[backtest_id]
-            result.status = "failed"
-            result.error_message = str(e)
-            result.completed_at = datetime.now().isoformat()
-            
-            # 移动到历史记录
-            self.backtest_history.append(result)
-            del self.active_backtests[backtest_id]
+            result = self.active_backtests.get(backtest_id)
+            if result is not None:
+                result.status = "failed"
+                result.error_message = str(e)
+                result.completed_at = datetime.now().isoformat()
+                await self._archive(backtest_id)
+        finally:
+            self._tasks.pop(backtest_id, None)
+    
+    async def _store_call(self, fn, *args):
+        """在线程池中执行结果存储的同步读写，不阻塞事件循环"""
+        return await provider_executor.run("backtest_store", fn, *args)
+    
+    async def _archive(self, backtest_id: str):
+        """写入结果存储，提交成功后才移出内存
+
+        之前写入失败、仍留在内存中的已结束回测一并重试；数据库不可用时停止本轮尝试。
+        """
+        retry = [
+            other for other, result in self.active_backtests.items()
+            if other != backtest_id and result.status in FINISHED_STATUSES
+        ]
+        for current in [backtest_id] + retry:
+            result = self.active_backtests.get(current)
+            if result is None:
+                continue
+            try:
+                await self._store_call(self.store.save, result.model_dump())
+            except Exception as e:
+                logger.error(f"保存回测结果失败: {current}, 错误: {e}")
+                return
+            self.active_backtests.pop(current, None)
+    
+    def _on_progress(self, result: BacktestResult, message: str):
+        """工作进程回传的进度写入回测日志，第一条进度表示已开始运行"""
+        if result.status == "queued":
+            result.status = "running"
+        result.logs.append(message)
     
     async def _run_backtesting_backtest(self, backtest_id: str, request: BacktestRequest):
-        """使用backtesting库执行真实回测"""
+        """使用backtesting库执行真实回测（策略运行在回测进程池中，不阻塞事件循环）"""
         result = self.active_backtests[backtest_id]
         result.logs.append("开始下载历史数据...")
         
         try:
-            # 根据策略ID选择相应的策略类
-            if request.strategy_id == "moving_average_crossover":
-                strategy_class = self._create_moving_average_crossover_strategy(request.parameters)
-            elif request.strategy_id == "rsi_strategy":
-                strategy_class = self._create_rsi_strategy(request.parameters)
-            elif request.strategy_id == "mean_reversion":
-                strategy_class = self._create_mean_reversion_strategy(request.parameters)
-            else:
-                # 默认使用移动平均线交叉策略
-                strategy_class = self._create_moving_average_crossover_strategy(request.parameters)
-            
             # 下载历史数据
             result.logs.append(f"下载数据: {request.symbol} 从 {request.start_date} 到 {request.end_date}")
-            data = self._download_historical_data(request.symbol, request.start_date, request.end_date)
+            data = await self._load_historical_data(request.symbol, request.start_date, request.end_date)
             
             if data.empty:
                 raise ValueError(f"无法获取 {request.symbol} 的历史数据")
             
-            result.logs.append(f"数据下载完成，共 {len(data)} 条记录")
+            result.logs.append(f"数据下载完成，共 {len(data)} 条记录，等待回测进程")
+            
+            # 内置模板可用向量化引擎，自定义策略仍由 backtesting 逐K线执行
+            runner = run_backtest
+            if request.engine == "vectorized":
+                if request.strategy_id in VECTORIZED_STRATEGIES:
+                    runner = run_vectorized_backtest
+                else:
+                    result.logs.append(f"向量化引擎不支持策略 {request.strategy_id}，改用 backtesting 引擎")
             
             # 运行回测
-            bt = Backtest(data, strategy_class, cash=request.initial_capital, commission=.002)
-            output = bt.run()
+            output = await backtest_executor.submit(
+                backtest_id, runner,
+                request.strategy_id, request.parameters, data, request.initial_capital,
+                priority=request.priority,
+                on_progress=lambda message: self._on_progress(result, message)
+            )
             
             # 提取回测结果
-            result.statistics = {
-                "total_return": output['Return [%]'],
-                "annual_return": output['Return (Ann.) [%]'],
-                "sharpe_ratio": output['Sharpe Ratio'],
-                "max_drawdown": output['Max. Drawdown [%]'],
-                "win_rate": output['Win Rate [%]'],
-                "total_trades": output['# Trades'],
-                "profit_factor": output['Profit Factor'],
-                "calmar_ratio": output['Calmar Ratio'],
-                "alpha": 0.0,  # 暂时设为0，后续可计算
-                "beta": 1.0,   # 暂时设为1，后续可计算
-                "volatility": output['Volatility (Ann.) [%]']
-            }
-            
-            # 生成权益曲线
-            equity_curve = output['_equity_curve']
-            if equity_curve is not None and not equity_curve.empty:
-                # 获取权益曲线的值和索引
-                equity_values = equity_curve.Equity if hasattr(equity_curve, 'Equity') else equity_curve
-                equity_index = equity_curve.index
-                
-                # 采样，最多100个点
-                step = max(1, len(equity_values) // 100)
-                for i in range(0, len(equity_values), step):
-                    equity = equity_values.iloc[i] if hasattr(equity_values, 'iloc') else equity_values[i]
-                    date_index = equity_index[i] if hasattr(equity_index, '__getitem__') else i
-                    
-                    result.equity_curve.append({
-                        "date": date_index.strftime("%Y-%m-%d") if hasattr(date_index, 'strftime') else str(date_index),
-                        "equity": round(float(equity), 2),
-                        "return": round((float(equity) / request.initial_capital - 1) * 100, 2) if i > 0 else 0
-                    })
-            
-            # 生成交易记录
-            trades = output['_trades']
-            if trades is not None and not trades.empty:
-                for i, trade in trades.iterrows():
-                    result.trades.append({
-                        "id": f"trade_{i}",
-                        "date": trade['EntryTime'].strftime("%Y-%m-%d") if hasattr(trade['EntryTime'], 'strftime') else str(trade['EntryTime']),
-                        "direction": "BUY" if trade['Size'] > 0 else "SELL",
-                        "quantity": abs(trade['Size']),
-                        "entry_price": trade['EntryPrice'],
-                        "exit_price": trade['ExitPrice'],
-                        "profit_loss": trade['PnL'],
-                        "return_pct": trade['ReturnPct']
-                    })
+            result.statistics = output["statistics"]
+            result.equity_curve = output["equity_curve"]
+            result.trades = output["trades"]
             
             result.logs.append("回测完成")
             result.status = "completed"
             result.completed_at = datetime.now().isoformat()
             
             # 移动到历史记录
-            self.backtest_history.append(result)
-            del self.active_backtests[backtest_id]
+            await self._archive(backtest_id)
             
             logger.info(f"回测完成: {backtest_id}")
             
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             logger.error(f"回测过程中出错: {e}")
             raise
     
+    async def _load_historical_data(self, symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
+        """获取日线历史数据：本地K线库完整覆盖时直接读盘，否则下载并写入本地库"""
+        key = (symbol, MarketType.STOCK, "yfinance", Timeframe.D1)
+        day_ms = 86_400_000
+        # yfinance 的 end 不含当天
+        start_ms = int(pd.Timestamp(start_date, tz="UTC").value // 1_000_000)
+        end_ms = int(pd.Timestamp(end_date, tz="UTC").value // 1_000_000) - 1
+        
+        cached = await candle_store.load_covered(key, start_ms, end_ms)
+        if cached:
+            logger.info(f"从本地K线库读取历史数据: {symbol} {start_date} ~ {end_date}")
+            return cached.to_frame()
+        
+        data = await provider_executor.run("yfinance", self._download_historical_data, symbol, start_date, end_date)
+        if not data.empty:
+            series = CandleSeries.from_frame(data, symbol, MarketType.STOCK, "yfinance", Timeframe.D1)
+            # 结束日期已完全过去时整段视为完整，否则只覆盖到已获取的最后一根
+            now_ms = int(datetime.now().timestamp() * 1000)
+            covered_end = end_ms if end_ms < now_ms - day_ms else int(series.timestamp[-1])
+            await candle_store.save(key, series, (start_ms, covered_end), interval_ms=day_ms)
+        return data
+    
     def _download_historical_data(self, symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
         """下载历史数据"""
         # 清理符号格式
@@ -351,109 +388,45 @@ class MeanReversionAlgorithm(QCAlgorithm):
             # 返回空DataFrame
             return pd.DataFrame()
     
-    def _create_moving_average_crossover_strategy(self, parameters: Dict[str, Any]) -> type:
-        """创建移动平均线交叉策略类"""
-        fast_period = parameters.get('fast_period', 10)
-        slow_period = parameters.get('slow_period', 30)
-        
-        class MovingAverageCross(Strategy):
-            def init(self):
-                # 使用pandas计算移动平均线
-                import pandas as pd
-                self.fast_ma = self.I(lambda x: pd.Series(x).rolling(fast_period).mean(), self.data.Close)
-                self.slow_ma = self.I(lambda x: pd.Series(x).rolling(slow_period).mean(), self.data.Close)
-            
-            def next(self):
-                if crossover(self.fast_ma, self.slow_ma):
-                    self.buy()
-                elif crossover(self.slow_ma, self.fast_ma):
-                    self.sell()
-        
-        return MovingAverageCross
-    
-    def _create_rsi_strategy(self, parameters: Dict[str, Any]) -> type:
-        """创建RSI策略类"""
-        rsi_period = parameters.get('rsi_period', 14)
-        oversold = parameters.get('oversold', 30)
-        overbought = parameters.get('overbought', 70)
-        
-        def compute_rsi(prices, period):
-            """计算RSI指标"""
-            delta = prices.diff()
-            gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-            rs = gain / loss
-            rsi = 100 - (100 / (1 + rs))
-            return rsi
-        
-        class RsiStrategy(Strategy):
-            rsi_period = rsi_period
-            oversold = oversold
-            overbought = overbought
-            
-            def init(self):
-                import pandas as pd
-                self.rsi = self.I(lambda x: compute_rsi(pd.Series(x), self.rsi_period), self.data.Close)
-            
-            def next(self):
-                if self.rsi[-1] < self.oversold and not self.position:
-                    self.buy()
-                elif self.rsi[-1] > self.overbought and self.position:
-                    self.sell()
-        
-        return RsiStrategy
-    
-    def _create_mean_reversion_strategy(self, parameters: Dict[str, Any]) -> type:
-        """创建均值回归策略类"""
-        bb_period = parameters.get('bb_period', 20)
-        std_dev = parameters.get('std_dev', 2.0)
-        
-        class MeanReversion(Strategy):
-            bb_period = bb_period
-            std_dev = std_dev
-            
-            def init(self):
-                from backtesting.lib import bollinger_bands
-                self.bb_upper, self.bb_mid, self.bb_lower = self.I(bollinger_bands, self.data.Close, self.bb_period, self.std_dev)
-            
-            def next(self):
-                if self.data.Close[-1] < self.bb_lower[-1] and not self.position:
-                    self.buy()
-                elif self.data.Close[-1] > self.bb_upper[-1] and self.position:
-                    self.sell()
-        
-        return MeanReversion
-    
-    def get_backtest_status(self, backtest_id: str) -> Optional[BacktestResult]:
+    async def get_backtest_status(self, backtest_id: str) -> Optional[BacktestResult]:
         """获取回测状态"""
         if backtest_id in self.active_backtests:
             return self.active_backtests[backtest_id]
         
         # 在历史记录中查找
-        for result in self.backtest_history:
-            if result.backtest_id == backtest_id:
-                return result
-        
-        return None
+        try:
+            record = await self._store_call(self.store.get, backtest_id)
+        except Exception as e:
+            logger.error(f"读取回测结果失败: {backtest_id}, 错误: {e}")
+            return None
+        return BacktestResult(**record) if record is not None else None
     
-    def get_all_backtests(self, strategy_id: Optional[str] = None) -> List[BacktestResult]:
-        """获取所有回测"""
-        if strategy_id:
-            return [
-                result for result in self.backtest_history
-                if result.strategy_id == strategy_id
-            ]
-        return self.backtest_history
+    async def get_all_backtests(self, strategy_id: Optional[str] = None, limit: int = 50,
+                                offset: int = 0) -> Tuple[int, List[BacktestSummary]]:
+        """分页获取历史回测摘要（按创建时间倒序），返回 (总数, 当前页)"""
+        total, rows = await self._store_call(self.store.list, strategy_id, limit, offset)
+        return total, [BacktestSummary(**row) for row in rows]
     
-    def cancel_backtest(self, backtest_id: str) -> bool:
-        """取消回测"""
+    async def delete_backtest(self, backtest_id: str) -> bool:
+        """删除已结束的回测记录（运行中的回测需先取消）"""
         if backtest_id in self.active_backtests:
-            result = self.active_backtests[backtest_id]
+            return False
+        return await self._store_call(self.store.delete, backtest_id)
+    
+    async def cancel_backtest(self, backtest_id: str) -> bool:
+        """取消回测：排队中的移出队列，运行中的终止工作进程"""
+        result = self.active_backtests.get(backtest_id)
+        if result is not None and result.status not in FINISHED_STATUSES:
             result.status = "cancelled"
             result.completed_at = datetime.now().isoformat()
             
-            self.backtest_history.append(result)
-            del self.active_backtests[backtest_id]
+            if not backtest_executor.cancel(backtest_id):
+                # 仍在下载数据，尚未提交到进程池
+                task = self._tasks.get(backtest_id)
+                if task is not None:
+                    task.cancel()
+            
+            await self._archive(backtest_id)
             
             logger.info(f"回测已取消: {backtest_id}")
             return True
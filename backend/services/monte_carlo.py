@@ -0,0 +1,67 @@
+"""
+交易重抽样蒙特卡洛分析
+
+把一次回测的逐笔收益率重新抽样（bootstrap 有放回抽样，或 shuffle 打乱顺序）生成大量
+资金曲线，统计总收益和最大回撤的分布以及资金曲线的置信带。模拟按批在工作进程中执行，
+每批使用独立的随机数流，批内所有路径一次矩阵运算完成。
+"""
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+METHODS = ("bootstrap", "shuffle")
+
+# 置信带最多保留的步数（按交易序号等间隔采样）
+BAND_POINTS = 50
+
+
+def band_steps(trades: int) -> np.ndarray:
+    """置信带采样的交易笔数（1 表示第一笔交易之后）"""
+    return np.unique(np.linspace(1, trades, min(trades, BAND_POINTS)).astype(int))
+
+
+def resample_trades(trade_returns: np.ndarray, simulations: int, seed: np.random.SeedSequence,
+                    method: str = "bootstrap",
+                    report: Optional[Callable[[str], None]] = None) -> Dict[str, np.ndarray]:
+    """一批模拟：每条路径的总收益、最大回撤，以及采样步上的资金倍数"""
+    returns = np.asarray(trade_returns, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    if method == "shuffle":
+        paths = rng.permuted(np.broadcast_to(returns, (simulations, len(returns))), axis=1)
+    else:
+        paths = rng.choice(returns, size=(simulations, len(returns)), replace=True)
+
+    equity = np.cumprod(1 + paths, axis=1)
+    peaks = np.maximum(np.maximum.accumulate(equity, axis=1), 1.0)
+    return {
+        "total_returns": equity[:, -1] - 1,
+        "max_drawdowns": (1 - equity / peaks).max(axis=1),
+        "bands": equity[:, band_steps(len(returns)) - 1]
+    }
+
+
+def _percentiles(values: np.ndarray, percentiles: List[float], scale: float = 1.0) -> Dict[str, float]:
+    points = np.percentile(values, percentiles)
+    summary = {f"p{p:g}": float(v * scale) for p, v in zip(percentiles, points)}
+    summary["mean"] = float(values.mean() * scale)
+    return summary
+
+
+def confidence_bands(chunks: List[Dict[str, np.ndarray]], trades: int,
+                     percentiles: List[float]) -> Dict[str, Any]:
+    """合并各批模拟结果，收益和回撤以百分比表示（回撤为负数，与回测统计一致）"""
+    totals = np.concatenate([chunk["total_returns"] for chunk in chunks])
+    drawdowns = np.concatenate([chunk["max_drawdowns"] for chunk in chunks])
+    bands = np.vstack([chunk["bands"] for chunk in chunks])
+    band_values = np.percentile(bands, percentiles, axis=0)
+    return {
+        "simulations": int(len(totals)),
+        "trades": trades,
+        "total_return": _percentiles(totals, percentiles, 100),
+        "max_drawdown": _percentiles(-drawdowns, percentiles, 100),
+        "probability_of_loss": float((totals < 0).mean() * 100),
+        "equity_bands": {
+            "trade_index": band_steps(trades).tolist(),
+            **{f"p{p:g}": np.round(values, 6).tolist() for p, values in zip(percentiles, band_values)}
+        }
+    }
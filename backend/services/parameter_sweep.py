@@ -0,0 +1,245 @@
+"""
+参数扫描（网格搜索）回测
+
+对一个策略模板的参数区间（如 fast_period 5..50 × slow_period 20..200）做全组合回测：
+历史数据只加载一次并放入共享内存，参数组合按顺序连续切成若干批，分发到占满全部 CPU
+核心的专用进程池；每批在工作进程内挂载一次数据，周期相同的指标数组在批内复用。
+结果按指定指标排名，并整理为可直接绘制热力图的二维矩阵。
+"""
+import asyncio
+import itertools
+import logging
+import math
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+from pydantic import BaseModel
+
+from config import settings
+from .background_jobs import BackgroundJobManager
+from .backtest_executor import BacktestExecutor
+from .backtest_strategies import is_valid_parameters, run_sweep_chunk, share_frame
+from .lean_backtest_service import lean_service
+from .vectorized_backtest import ENGINES
+
+logger = logging.getLogger(__name__)
+
+# 每个工作进程分到的批数（批数多于进程数，便于负载均衡和汇报进度）
+CHUNKS_PER_WORKER = 4
+
+# 可用于排名的统计指标
+RANK_METRICS = (
+    "total_return", "annual_return", "sharpe_ratio", "max_drawdown",
+    "win_rate", "profit_factor", "calmar_ratio", "volatility"
+)
+
+
+class ParameterRange(BaseModel):
+    """参数区间（含终点）"""
+    start: Union[int, float]
+    stop: Union[int, float]
+    step: Union[int, float] = 1
+
+
+class SweepRequest(BaseModel):
+    """参数扫描请求模型"""
+    strategy_id: str
+    symbol: str
+    start_date: str
+    end_date: str
+    initial_capital: float = 10000.0
+    parameter_grid: Dict[str, Union[ParameterRange, List[Any]]]  # 参数名 -> 区间或取值列表
+    fixed_parameters: Dict[str, Any] = {}
+    metric: str = "sharpe_ratio"  # 排名指标，数值越大越靠前
+    priority: int = 0
+    engine: str = "backtesting"  # backtesting 或 vectorized（内置模板的向量化引擎）
+
+
+class SweepResult(BaseModel):
+    """参数扫描结果模型"""
+    sweep_id: str
+    strategy_id: str
+    symbol: str
+    status: str  # queued, running, completed, failed, cancelled
+    metric: str
+    parameter_grid: Dict[str, List[Any]] = {}
+    total_combinations: int = 0
+    completed_combinations: int = 0
+    results: List[Dict[str, Any]] = []  # 按排名指标降序
+    heatmap: Optional[Dict[str, Any]] = None
+    logs: List[str] = []
+    error_message: Optional[str] = None
+    created_at: str
+    completed_at: Optional[str] = None
+
+
+def expand_values(spec: Union[ParameterRange, List[Any]]) -> List[Any]:
+    """把参数区间展开为取值列表（整数区间保持整数）"""
+    if not isinstance(spec, ParameterRange):
+        return list(spec)
+    if spec.step <= 0:
+        raise ValueError(f"参数步长必须为正数: {spec.step}")
+    count = int(math.floor((spec.stop - spec.start) / spec.step + 1e-9)) + 1
+    values = [spec.start + i * spec.step for i in range(max(count, 0))]
+    if all(isinstance(v, int) for v in (spec.start, spec.step)):
+        return values
+    return [round(v, 10) for v in values]
+
+
+def expand_grid(strategy_id: str, grid: Dict[str, List[Any]],
+                fixed_parameters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """参数网格的全部有效组合（按参数顺序，前面的参数变化最慢）"""
+    names = list(grid)
+    combinations = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        parameters = {**(fixed_parameters or {}), **dict(zip(names, values))}
+        if is_valid_parameters(strategy_id, parameters):
+            combinations.append(parameters)
+    return combinations
+
+
+def rank_results(rows: List[Dict[str, Any]], metric: str) -> List[Dict[str, Any]]:
+    """按指标降序排名，指标缺失（无交易、回测失败）的组合排在最后"""
+    ranked = sorted(rows, key=lambda row: (row["statistics"].get(metric) is None,
+                                           -(row["statistics"].get(metric) or 0.0)))
+    for rank, row in enumerate(ranked, 1):
+        row["rank"] = rank
+    return ranked
+
+
+def build_heatmap(rows: List[Dict[str, Any]], grid: Dict[str, List[Any]], metric: str) -> Optional[Dict[str, Any]]:
+    """前两个扫描参数构成的指标矩阵 values[y][x]
+
+    扫描参数多于两个时每格取其余参数下的最优值；无效组合或无指标的格子为 None。
+    """
+    axes = [name for name, values in grid.items() if len(values) > 1][:2]
+    if not axes:
+        return None
+    x_param = axes[0]
+    y_param = axes[1] if len(axes) > 1 else None
+    x_index = {value: i for i, value in enumerate(grid[x_param])}
+    y_index = {value: i for i, value in enumerate(grid[y_param])} if y_param else {None: 0}
+
+    matrix = np.full((len(y_index), len(x_index)), np.nan)
+    for row in rows:
+        value = row["statistics"].get(metric)
+        if value is None:
+            continue
+        i = y_index[row["parameters"][y_param]] if y_param else 0
+        j = x_index[row["parameters"][x_param]]
+        matrix[i, j] = np.fmax(matrix[i, j], value)
+
+    return {
+        "metric": metric,
+        "x_param": x_param,
+        "x_values": grid[x_param],
+        "y_param": y_param,
+        "y_values": grid[y_param] if y_param else [],
+        "values": [[None if np.isnan(v) else float(v) for v in line] for line in matrix]
+    }
+
+
+class ParameterSweepService:
+    """参数扫描服务"""
+
+    def __init__(self):
+        self.jobs = BackgroundJobManager("参数扫描", lambda: sweep_executor,
+                                         lambda: settings.BACKTEST_SWEEP_HISTORY)
+        # 进行中的扫描和最近 BACKTEST_SWEEP_HISTORY 个已结束的扫描（按创建顺序）
+        self.sweeps: Dict[str, SweepResult] = self.jobs.records
+        self._tasks: Dict[str, asyncio.Task] = self.jobs.tasks
+
+    async def start_sweep(self, request: SweepRequest) -> str:
+        """校验参数网格后在后台执行扫描，返回扫描ID"""
+        if request.metric not in RANK_METRICS:
+            raise ValueError(f"不支持的排名指标: {request.metric}")
+        if request.engine not in ENGINES:
+            raise ValueError(f"不支持的回测引擎: {request.engine}")
+        grid = {name: expand_values(spec) for name, spec in request.parameter_grid.items()}
+        if not grid or any(not values for values in grid.values()):
+            raise ValueError("参数网格不能为空")
+        combinations = expand_grid(request.strategy_id, grid, request.fixed_parameters)
+        if not combinations:
+            raise ValueError("参数网格中没有有效的参数组合")
+        if len(combinations) > settings.BACKTEST_SWEEP_MAX_COMBINATIONS:
+            raise ValueError(f"参数组合过多: {len(combinations)} > {settings.BACKTEST_SWEEP_MAX_COMBINATIONS}")
+
+        sweep_id = f"sweep_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{request.strategy_id}"
+        result = SweepResult(
+            sweep_id=sweep_id,
+            strategy_id=request.strategy_id,
+            symbol=request.symbol,
+            status="queued",
+            metric=request.metric,
+            parameter_grid=grid,
+            total_combinations=len(combinations),
+            created_at=datetime.now().isoformat(),
+            logs=[f"开始参数扫描 {sweep_id}，共 {len(combinations)} 组参数"]
+        )
+        self.jobs.start(sweep_id, result, lambda: self._run_sweep(result, request, grid, combinations))
+        return sweep_id
+
+    async def _run_sweep(self, result: SweepResult, request: SweepRequest,
+                         grid: Dict[str, List[Any]], combinations: List[Dict[str, Any]]):
+        """加载数据放入共享内存，分批提交到进程池并汇总排名"""
+        executor = self.jobs.executor
+        data = await lean_service._load_historical_data(request.symbol, request.start_date, request.end_date)
+        if data.empty:
+            raise ValueError(f"无法获取 {request.symbol} 的历史数据")
+        result.logs.append(f"数据加载完成，共 {len(data)} 条记录")
+
+        # 工作进程从共享内存挂载数据，任务消息中只携带共享内存的名称
+        shm, spec = share_frame(data)
+        try:
+            chunk_count = min(len(combinations), executor.max_workers * CHUNKS_PER_WORKER)
+            bounds = np.linspace(0, len(combinations), chunk_count + 1).astype(int)
+            futures = [
+                self.jobs.submit(
+                    result.sweep_id, run_sweep_chunk,
+                    spec, request.strategy_id, combinations[bounds[i]:bounds[i + 1]], request.initial_capital,
+                    request.engine,
+                    priority=request.priority
+                )
+                for i in range(chunk_count)
+            ]
+            result.status = "running"
+            result.logs.append(f"分为 {chunk_count} 批，使用 {executor.max_workers} 个工作进程")
+
+            rows = []
+            for future in asyncio.as_completed(futures):
+                rows.extend(await future)
+                result.completed_combinations = len(rows)
+        finally:
+            shm.close()
+            shm.unlink()
+
+        failed = sum(1 for row in rows if "error" in row)
+        if failed:
+            result.logs.append(f"{failed} 组参数回测失败")
+        result.results = rank_results(rows, request.metric)
+        result.heatmap = build_heatmap(rows, grid, request.metric)
+
+    def get_sweep(self, sweep_id: str) -> Optional[SweepResult]:
+        """获取参数扫描状态与结果"""
+        return self.sweeps.get(sweep_id)
+
+    def get_all_sweeps(self, strategy_id: Optional[str] = None) -> List[SweepResult]:
+        """获取所有参数扫描"""
+        return [
+            result for result in self.sweeps.values()
+            if strategy_id is None or result.strategy_id == strategy_id
+        ]
+
+    def cancel_sweep(self, sweep_id: str) -> bool:
+        """取消参数扫描：移出排队的批次并终止正在运行的工作进程"""
+        return self.jobs.cancel(sweep_id)
+
+
+# 全局参数扫描进程池与服务实例
+sweep_executor = BacktestExecutor(
+    max_workers=settings.BACKTEST_SWEEP_WORKERS or os.cpu_count() or 1,
+    start_method=settings.BACKTEST_START_METHOD
+)
+sweep_service = ParameterSweepService()
@@ -3,12 +3,14 @@
 支持: 头肩顶/底、双顶/底、三角形、旗形、楔形等
 """
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Union
 from dataclasses import dataclass
 from enum import Enum
 import numpy as np
 from datetime import datetime
-from models.market_data import KlineData
+from numpy.lib.stride_tricks import sliding_window_view
+from models.market_data import KlineData, CandleSeries
+from .extrema import SeriesExtrema, as_points
 
 logger = logging.getLogger(__name__)
 
@@ -74,19 +76,20 @@ class PatternRecognitionService:
         
     async def detect_all_patterns(
         self, 
-        klines: List[KlineData],
+        klines: Union[CandleSeries, List[KlineData]],
         min_confidence: float = 0.6
     ) -> List[PatternMatch]:
         """
         检测所有形态
         
         Args:
-            klines: K线数据列表
+            klines: K线数据（CandleSeries 或 KlineData 列表，按时间升序）
             min_confidence: 最小置信度阈值
             
         Returns:
             形态匹配列表
         """
+        klines = CandleSeries.from_klines(klines)
         if len(klines) < self.min_pattern_length:
             logger.warning(f"K线数据不足: {len(klines)} < {self.min_pattern_length}")
             return []
@@ -94,18 +97,21 @@ class PatternRecognitionService:
         patterns = []
         
         try:
+            # 各检测器共享同一份枢轴点和趋势线斜率
+            extrema = SeriesExtrema(klines)
+            
             # 检测反转形态
-            patterns.extend(await self._detect_head_and_shoulders(klines))
-            patterns.extend(await self._detect_double_top_bottom(klines))
-            patterns.extend(await self._detect_triple_top_bottom(klines))
+            patterns.extend(await self._detect_head_and_shoulders(klines, extrema))
+            patterns.extend(await self._detect_double_top_bottom(klines, extrema))
+            patterns.extend(await self._detect_triple_top_bottom(klines, extrema))
             
             # 检测持续形态
-            patterns.extend(await self._detect_triangles(klines))
-            patterns.extend(await self._detect_flags(klines))
-            patterns.extend(await self._detect_wedges(klines))
+            patterns.extend(await self._detect_triangles(klines, extrema))
+            patterns.extend(await self._detect_flags(klines, extrema))
+            patterns.extend(await self._detect_wedges(klines, extrema))
             
             # 检测K线组合
-            patterns.extend(await self._detect_candlestick_patterns(klines))
+            patterns.extend(await self._detect_candlestick_patterns(klines, extrema))
             
             # 过滤低置信度形态
             patterns = [p for p in patterns if p.confidence >= min_confidence]
@@ -122,114 +128,85 @@ class PatternRecognitionService:
     
     async def _detect_head_and_shoulders(
         self, 
-        klines: List[KlineData]
+        klines: CandleSeries,
+        extrema: Optional[SeriesExtrema] = None
     ) -> List[PatternMatch]:
-        """检测头肩顶/底形态"""
+        """检测头肩顶/底形态
+        
+        在以 i 为中心的 40 根窗口内取前 3 个峰值和前 2 个谷底（极值距离 5）。
+        窗口内的极值与整根序列上的极值一致，因此直接在预先计算的枢轴点上按位置截取。
+        """
+        extrema = extrema or SeriesExtrema(klines)
         patterns = []
-        prices = [k.high for k in klines]  # 用最高价检测头肩顶
         
-        # 寻找5个关键点: 左肩-左谷-头-右谷-右肩
-        for i in range(20, len(prices) - 20):
-            # 寻找局部极值
-            peaks = self._find_local_peaks(prices[i-20:i+20], distance=5)
-            valleys = self._find_local_valleys(prices[i-20:i+20], distance=5)
+        for field, reverse in (("high", False), ("low", True)):
+            prices = extrema.column(field)
+            peaks = extrema.peaks(field, 5)
+            valleys = extrema.valleys(field, 5)
+            # 头肩底的肩和头取谷底，颈线取峰值
+            tops, necks = (valleys, peaks) if reverse else (peaks, valleys)
             
-            if len(peaks) >= 3 and len(valleys) >= 2:
-                # 检查是否符合头肩形态
-                left_shoulder = peaks[0]
-                head = peaks[1]
-                right_shoulder = peaks[2]
-                left_valley = valleys[0]
-                right_valley = valleys[1]
-                
-                # 验证形态特征
-                if (self._is_similar_price(left_shoulder[1], right_shoulder[1]) and
-                    head[1] > left_shoulder[1] * 1.02 and  # 头部明显高于肩部
-                    head[1] > right_shoulder[1] * 1.02 and
-                    self._is_similar_price(left_valley[1], right_valley[1])):  # 颈线水平
-                    
-                    # 计算置信度
-                    confidence = self._calculate_hns_confidence(
-                        left_shoulder[1], head[1], right_shoulder[1],
-                        left_valley[1], right_valley[1]
-                    )
-                    
-                    # 计算目标价位 (头部到颈线的距离)
-                    neckline = (left_valley[1] + right_valley[1]) / 2
-                    target = neckline - (head[1] - neckline)
-                    
-                    pattern = PatternMatch(
-                        pattern_type=PatternType.HEAD_AND_SHOULDERS,
-                        signal_direction=SignalDirection.BEARISH,
-                        confidence=confidence,
-                        start_index=i - 20 + left_shoulder[0],
-                        end_index=i - 20 + right_shoulder[0],
-                        key_points=[
-                            (i - 20 + left_shoulder[0], left_shoulder[1]),
-                            (i - 20 + head[0], head[1]),
-                            (i - 20 + right_shoulder[0], right_shoulder[1])
-                        ],
-                        target_price=target,
-                        stop_loss=head[1],
-                        description="头肩顶形态 - 强烈看跌信号"
-                    )
-                    patterns.append(pattern)
-        
-        # 同样方法检测头肩底 (使用最低价)
-        prices = [k.low for k in klines]
-        for i in range(20, len(prices) - 20):
-            peaks = self._find_local_peaks(prices[i-20:i+20], distance=5)
-            valleys = self._find_local_valleys(prices[i-20:i+20], distance=5)
+            # 窗口 prices[i-20:i+20] 内可成为极值的位置为 [i-15, i+15)
+            centers = np.arange(20, len(prices) - 20)
+            top_start = np.searchsorted(tops, centers - 15)
+            top_count = np.searchsorted(tops, centers + 15) - top_start
+            neck_start = np.searchsorted(necks, centers - 15)
+            neck_count = np.searchsorted(necks, centers + 15) - neck_start
             
-            if len(valleys) >= 3 and len(peaks) >= 2:
-                left_shoulder = valleys[0]
-                head = valleys[1]
-                right_shoulder = valleys[2]
-                left_peak = peaks[0]
-                right_peak = peaks[1]
+            for k in np.flatnonzero((top_count >= 3) & (neck_count >= 2)).tolist():
+                ls_idx, head_idx, rs_idx = tops[top_start[k]:top_start[k] + 3].tolist()
+                lv_idx, rv_idx = necks[neck_start[k]:neck_start[k] + 2].tolist()
+                left_shoulder, head, right_shoulder = prices[ls_idx], prices[head_idx], prices[rs_idx]
+                left_neck, right_neck = prices[lv_idx], prices[rv_idx]
                 
-                if (self._is_similar_price(left_shoulder[1], right_shoulder[1]) and
-                    head[1] < left_shoulder[1] * 0.98 and
-                    head[1] < right_shoulder[1] * 0.98 and
-                    self._is_similar_price(left_peak[1], right_peak[1])):
-                    
-                    confidence = self._calculate_hns_confidence(
-                        left_shoulder[1], head[1], right_shoulder[1],
-                        left_peak[1], right_peak[1]
-                    )
-                    
-                    neckline = (left_peak[1] + right_peak[1]) / 2
-                    target = neckline + (neckline - head[1])
-                    
-                    pattern = PatternMatch(
-                        pattern_type=PatternType.INVERSE_HEAD_AND_SHOULDERS,
-                        signal_direction=SignalDirection.BULLISH,
-                        confidence=confidence,
-                        start_index=i - 20 + left_shoulder[0],
-                        end_index=i - 20 + right_shoulder[0],
-                        key_points=[
-                            (i - 20 + left_shoulder[0], left_shoulder[1]),
-                            (i - 20 + head[0], head[1]),
-                            (i - 20 + right_shoulder[0], right_shoulder[1])
-                        ],
-                        target_price=target,
-                        stop_loss=head[1],
-                        description="头肩底形态 - 强烈看涨信号"
-                    )
-                    patterns.append(pattern)
+                # 验证形态特征：肩部对称、头部明显突出、颈线水平
+                if reverse:
+                    prominent = head < left_shoulder * 0.98 and head < right_shoulder * 0.98
+                else:
+                    prominent = head > left_shoulder * 1.02 and head > right_shoulder * 1.02
+                if not (self._is_similar_price(left_shoulder, right_shoulder) and prominent and
+                        self._is_similar_price(left_neck, right_neck)):
+                    continue
+                
+                # 计算置信度
+                confidence = self._calculate_hns_confidence(
+                    left_shoulder, head, right_shoulder, left_neck, right_neck
+                )
+                
+                # 计算目标价位 (头部到颈线的距离)
+                neckline = (left_neck + right_neck) / 2
+                target = neckline + (neckline - head)
+                
+                patterns.append(PatternMatch(
+                    pattern_type=PatternType.INVERSE_HEAD_AND_SHOULDERS if reverse else PatternType.HEAD_AND_SHOULDERS,
+                    signal_direction=SignalDirection.BULLISH if reverse else SignalDirection.BEARISH,
+                    confidence=confidence,
+                    start_index=ls_idx,
+                    end_index=rs_idx,
+                    key_points=[
+                        (ls_idx, left_shoulder),
+                        (head_idx, head),
+                        (rs_idx, right_shoulder)
+                    ],
+                    target_price=target,
+                    stop_loss=head,
+                    description="头肩底形态 - 强烈看涨信号" if reverse else "头肩顶形态 - 强烈看跌信号"
+                ))
         
         return patterns
     
     async def _detect_double_top_bottom(
         self, 
-        klines: List[KlineData]
+        klines: CandleSeries,
+        extrema: Optional[SeriesExtrema] = None
     ) -> List[PatternMatch]:
         """检测双顶/双底形态"""
+        extrema = extrema or SeriesExtrema(klines)
         patterns = []
         
         # 双顶检测
-        prices = [k.high for k in klines]
-        peaks = self._find_local_peaks(prices, distance=10)
+        prices = extrema.column("high")
+        peaks = as_points(prices, extrema.peaks("high", 10))
         
         for i in range(len(peaks) - 1):
             peak1 = peaks[i]
@@ -238,86 +215,83 @@ class PatternRecognitionService:
             # 检查两个峰值是否在相似价位
             if self._is_similar_price(peak1[1], peak2[1]):
                 # 找中间的谷底
-                valley_prices = prices[peak1[0]:peak2[0]]
-                if len(valley_prices) > 0:
-                    valley_price = min(valley_prices)
-                    valley_idx = peak1[0] + valley_prices.index(valley_price)
+                valley_idx = peak1[0] + int(np.argmin(prices[peak1[0]:peak2[0]]))
+                valley_price = float(prices[valley_idx])
+                
+                # 验证形态 (峰值高于谷底足够多)
+                if peak1[1] > valley_price * 1.03:
+                    confidence = self._calculate_double_pattern_confidence(
+                        peak1[1], peak2[1], valley_price
+                    )
+                    
+                    target = valley_price - (peak1[1] - valley_price)
                     
-                    # 验证形态 (峰值高于谷底足够多)
-                    if peak1[1] > valley_price * 1.03:
-                        confidence = self._calculate_double_pattern_confidence(
-                            peak1[1], peak2[1], valley_price
-                        )
-                        
-                        target = valley_price - (peak1[1] - valley_price)
-                        
-                        pattern = PatternMatch(
-                            pattern_type=PatternType.DOUBLE_TOP,
-                            signal_direction=SignalDirection.BEARISH,
-                            confidence=confidence,
-                            start_index=peak1[0],
-                            end_index=peak2[0],
-                            key_points=[
-                                (peak1[0], peak1[1]),
-                                (valley_idx, valley_price),
-                                (peak2[0], peak2[1])
-                            ],
-                            target_price=target,
-                            stop_loss=max(peak1[1], peak2[1]),
-                            description="双顶形态 - 看跌信号"
-                        )
-                        patterns.append(pattern)
+                    pattern = PatternMatch(
+                        pattern_type=PatternType.DOUBLE_TOP,
+                        signal_direction=SignalDirection.BEARISH,
+                        confidence=confidence,
+                        start_index=peak1[0],
+                        end_index=peak2[0],
+                        key_points=[
+                            (peak1[0], peak1[1]),
+                            (valley_idx, valley_price),
+                            (peak2[0], peak2[1])
+                        ],
+                        target_price=target,
+                        stop_loss=max(peak1[1], peak2[1]),
+                        description="双顶形态 - 看跌信号"
+                    )
+                    patterns.append(pattern)
         
         # 双底检测
-        prices = [k.low for k in klines]
-        valleys = self._find_local_valleys(prices, distance=10)
+        prices = extrema.column("low")
+        valleys = as_points(prices, extrema.valleys("low", 10))
         
         for i in range(len(valleys) - 1):
             valley1 = valleys[i]
             valley2 = valleys[i + 1]
             
             if self._is_similar_price(valley1[1], valley2[1]):
-                peak_prices = prices[valley1[0]:valley2[0]]
-                if len(peak_prices) > 0:
-                    peak_price = max(peak_prices)
-                    peak_idx = valley1[0] + peak_prices.index(peak_price)
+                peak_idx = valley1[0] + int(np.argmax(prices[valley1[0]:valley2[0]]))
+                peak_price = float(prices[peak_idx])
+                
+                if valley1[1] < peak_price * 0.97:
+                    confidence = self._calculate_double_pattern_confidence(
+                        valley1[1], valley2[1], peak_price
+                    )
+                    
+                    target = peak_price + (peak_price - valley1[1])
                     
-                    if valley1[1] < peak_price * 0.97:
-                        confidence = self._calculate_double_pattern_confidence(
-                            valley1[1], valley2[1], peak_price
-                        )
-                        
-                        target = peak_price + (peak_price - valley1[1])
-                        
-                        pattern = PatternMatch(
-                            pattern_type=PatternType.DOUBLE_BOTTOM,
-                            signal_direction=SignalDirection.BULLISH,
-                            confidence=confidence,
-                            start_index=valley1[0],
-                            end_index=valley2[0],
-                            key_points=[
-                                (valley1[0], valley1[1]),
-                                (peak_idx, peak_price),
-                                (valley2[0], valley2[1])
-                            ],
-                            target_price=target,
-                            stop_loss=min(valley1[1], valley2[1]),
-                            description="双底形态 - 看涨信号"
-                        )
-                        patterns.append(pattern)
+                    pattern = PatternMatch(
+                        pattern_type=PatternType.DOUBLE_BOTTOM,
+                        signal_direction=SignalDirection.BULLISH,
+                        confidence=confidence,
+                        start_index=valley1[0],
+                        end_index=valley2[0],
+                        key_points=[
+                            (valley1[0], valley1[1]),
+                            (peak_idx, peak_price),
+                            (valley2[0], valley2[1])
+                        ],
+                        target_price=target,
+                        stop_loss=min(valley1[1], valley2[1]),
+                        description="双底形态 - 看涨信号"
+                    )
+                    patterns.append(pattern)
         
         return patterns
     
     async def _detect_triple_top_bottom(
         self, 
-        klines: List[KlineData]
+        klines: CandleSeries,
+        extrema: Optional[SeriesExtrema] = None
     ) -> List[PatternMatch]:
         """检测三重顶/底形态 (简化实现)"""
+        extrema = extrema or SeriesExtrema(klines)
         patterns = []
         
         # 三重顶检测
-        prices = [k.high for k in klines]
-        peaks = self._find_local_peaks(prices, distance=8)
+        peaks = as_points(extrema.column("high"), extrema.peaks("high", 8))
         
         for i in range(len(peaks) - 2):
             peak1, peak2, peak3 = peaks[i], peaks[i+1], peaks[i+2]
@@ -339,8 +313,7 @@ class PatternRecognitionService:
                 patterns.append(pattern)
         
         # 三重底检测
-        prices = [k.low for k in klines]
-        valleys = self._find_local_valleys(prices, distance=8)
+        valleys = as_points(extrema.column("low"), extrema.valleys("low", 8))
         
         for i in range(len(valleys) - 2):
             valley1, valley2, valley3 = valleys[i], valleys[i+1], valleys[i+2]
@@ -363,289 +336,274 @@ class PatternRecognitionService:
         
         return patterns
     
+    def _trendline_slopes(self, extrema: SeriesExtrema, window: int) -> Tuple[np.ndarray, np.ndarray]:
+        """窗口 [i-window, i) 的上下轨斜率，i 从 window 到 len-1（不含最后一个完整窗口）"""
+        upper = extrema.slopes("high", window)[:-1]
+        lower = extrema.slopes("low", window)[:-1]
+        return upper, lower
+    
     async def _detect_triangles(
         self, 
-        klines: List[KlineData]
+        klines: CandleSeries,
+        extrema: Optional[SeriesExtrema] = None
     ) -> List[PatternMatch]:
         """检测三角形形态"""
+        extrema = extrema or SeriesExtrema(klines)
         patterns = []
         
         # 简化实现: 使用线性回归检测趋势线
         window = 30  # 检测窗口
-        
-        for i in range(window, len(klines)):
-            highs = [k.high for k in klines[i-window:i]]
-            lows = [k.low for k in klines[i-window:i]]
-            
-            # 计算上下趋势线斜率
-            upper_slope = self._calculate_trendline_slope(highs)
-            lower_slope = self._calculate_trendline_slope(lows)
-            
-            # 上升三角形: 上轨水平,下轨上升
-            if abs(upper_slope) < 0.001 and lower_slope > 0.002:
+        upper_slope, lower_slope = self._trendline_slopes(extrema, window)
+        high, low = klines.high, klines.low
+        
+        # 上升三角形: 上轨水平,下轨上升；下降三角形: 下轨水平,上轨下降；对称三角形: 上轨下降,下轨上升
+        kind = np.select(
+            [
+                (np.abs(upper_slope) < 0.001) & (lower_slope > 0.002),
+                (np.abs(lower_slope) < 0.001) & (upper_slope < -0.002),
+                (upper_slope < -0.001) & (lower_slope > 0.001)
+            ],
+            [1, 2, 3],
+            default=0
+        )
+        
+        for s in np.flatnonzero(kind).tolist():
+            i = s + window
+            if kind[s] == 1:
                 pattern = PatternMatch(
                     pattern_type=PatternType.ASCENDING_TRIANGLE,
                     signal_direction=SignalDirection.BULLISH,
                     confidence=0.7,
-                    start_index=i - window,
+                    start_index=s,
                     end_index=i,
-                    key_points=[(i-window, lows[0]), (i, highs[-1])],
+                    key_points=[(s, float(low[s])), (i, float(high[i - 1]))],
                     description="上升三角形 - 看涨持续形态"
                 )
-                patterns.append(pattern)
-            
-            # 下降三角形: 下轨水平,上轨下降
-            elif abs(lower_slope) < 0.001 and upper_slope < -0.002:
+            elif kind[s] == 2:
                 pattern = PatternMatch(
                     pattern_type=PatternType.DESCENDING_TRIANGLE,
                     signal_direction=SignalDirection.BEARISH,
                     confidence=0.7,
-                    start_index=i - window,
+                    start_index=s,
                     end_index=i,
-                    key_points=[(i-window, highs[0]), (i, lows[-1])],
+                    key_points=[(s, float(high[s])), (i, float(low[i - 1]))],
                     description="下降三角形 - 看跌持续形态"
                 )
-                patterns.append(pattern)
-            
-            # 对称三角形: 上轨下降,下轨上升
-            elif upper_slope < -0.001 and lower_slope > 0.001:
+            else:
                 pattern = PatternMatch(
                     pattern_type=PatternType.SYMMETRICAL_TRIANGLE,
                     signal_direction=SignalDirection.NEUTRAL,
                     confidence=0.65,
-                    start_index=i - window,
+                    start_index=s,
                     end_index=i,
-                    key_points=[(i-window, highs[0]), (i-window, lows[0]), (i, (highs[-1]+lows[-1])/2)],
+                    key_points=[(s, float(high[s])), (s, float(low[s])), (i, float((high[i - 1] + low[i - 1]) / 2))],
                     description="对称三角形 - 突破方向待确认"
                 )
-                patterns.append(pattern)
+            patterns.append(pattern)
         
         return patterns
     
     async def _detect_flags(
         self, 
-        klines: List[KlineData]
+        klines: CandleSeries,
+        extrema: Optional[SeriesExtrema] = None
     ) -> List[PatternMatch]:
         """检测旗形形态"""
         patterns = []
+        close = klines.close
+        n = len(klines)
+        if n < 31:
+            return patterns
         
         # 旗形特征: 急速上涨/下跌后的短期横盘整理
-        for i in range(20, len(klines) - 10):
-            # 检测旗杆 (前期快速运动)
+        # 对 i 从 20 到 n-11：旗杆为 [i-20, i-10] 的涨跌幅，旗面为 close[i-10:i] 的变异系数
+        indices = np.arange(20, n - 10)
+        pole_change = (close[indices - 10] - close[indices - 20]) / close[indices - 20]
+        flag_windows = sliding_window_view(close, 10)[indices - 10]
+        flag_volatility = flag_windows.std(axis=1) / flag_windows.mean(axis=1)
+        
+        bull = (pole_change > 0.1) & (flag_volatility < 0.03)
+        bear = (pole_change < -0.1) & (flag_volatility < 0.03)
+        
+        for k in np.flatnonzero(bull | bear).tolist():
+            i = int(indices[k])
             pole_start = i - 20
             pole_end = i - 10
-            pole_change = (klines[pole_end].close - klines[pole_start].close) / klines[pole_start].close
+            change = float(pole_change[k])
+            key_points = [(pole_start, float(close[pole_start])), (pole_end, float(close[pole_end]))]
             
-            # 检测旗面 (后期横盘)
-            flag_prices = [k.close for k in klines[i-10:i]]
-            flag_volatility = np.std(flag_prices) / np.mean(flag_prices)
-            
-            # 牛旗: 大幅上涨 + 小幅整理
-            if pole_change > 0.1 and flag_volatility < 0.03:
-                pattern = PatternMatch(
-                    pattern_type=PatternType.BULL_FLAG,
-                    signal_direction=SignalDirection.BULLISH,
-                    confidence=0.75,
-                    start_index=pole_start,
-                    end_index=i,
-                    key_points=[(pole_start, klines[pole_start].close), (pole_end, klines[pole_end].close)],
-                    target_price=klines[i].close * (1 + pole_change),  # 预期继续上涨相同幅度
-                    description="牛旗形态 - 上涨中继"
-                )
-                patterns.append(pattern)
-            
-            # 熊旗: 大幅下跌 + 小幅整理
-            elif pole_change < -0.1 and flag_volatility < 0.03:
-                pattern = PatternMatch(
-                    pattern_type=PatternType.BEAR_FLAG,
-                    signal_direction=SignalDirection.BEARISH,
-                    confidence=0.75,
-                    start_index=pole_start,
-                    end_index=i,
-                    key_points=[(pole_start, klines[pole_start].close), (pole_end, klines[pole_end].close)],
-                    target_price=klines[i].close * (1 + pole_change),  # 预期继续下跌
-                    description="熊旗形态 - 下跌中继"
-                )
-                patterns.append(pattern)
+            # 牛旗: 大幅上涨 + 小幅整理；熊旗: 大幅下跌 + 小幅整理（预期继续运动相同幅度）
+            patterns.append(PatternMatch(
+                pattern_type=PatternType.BULL_FLAG if bull[k] else PatternType.BEAR_FLAG,
+                signal_direction=SignalDirection.BULLISH if bull[k] else SignalDirection.BEARISH,
+                confidence=0.75,
+                start_index=pole_start,
+                end_index=i,
+                key_points=key_points,
+                target_price=float(close[i]) * (1 + change),
+                description="牛旗形态 - 上涨中继" if bull[k] else "熊旗形态 - 下跌中继"
+            ))
         
         return patterns
     
     async def _detect_wedges(
         self, 
-        klines: List[KlineData]
+        klines: CandleSeries,
+        extrema: Optional[SeriesExtrema] = None
     ) -> List[PatternMatch]:
         """检测楔形形态"""
+        extrema = extrema or SeriesExtrema(klines)
         patterns = []
         
         window = 30
-        for i in range(window, len(klines)):
-            highs = [k.high for k in klines[i-window:i]]
-            lows = [k.low for k in klines[i-window:i]]
-            
-            upper_slope = self._calculate_trendline_slope(highs)
-            lower_slope = self._calculate_trendline_slope(lows)
-            
-            # 上升楔形: 两条趋势线都上升,但上轨上升更慢 (看跌)
-            if lower_slope > 0 and 0 < upper_slope < lower_slope * 0.7:
+        upper_slope, lower_slope = self._trendline_slopes(extrema, window)
+        high, low = klines.high, klines.low
+        
+        # 上升楔形: 两条趋势线都上升,但上轨上升更慢 (看跌)
+        rising = (lower_slope > 0) & (upper_slope > 0) & (upper_slope < lower_slope * 0.7)
+        # 下降楔形: 两条趋势线都下降,但下轨下降更慢 (看涨)
+        falling = ~rising & (upper_slope < 0) & (lower_slope < 0) & (lower_slope > upper_slope * 0.7)
+        
+        for s in np.flatnonzero(rising | falling).tolist():
+            i = s + window
+            if rising[s]:
                 pattern = PatternMatch(
                     pattern_type=PatternType.RISING_WEDGE,
                     signal_direction=SignalDirection.BEARISH,
                     confidence=0.7,
-                    start_index=i - window,
+                    start_index=s,
                     end_index=i,
-                    key_points=[(i-window, lows[0]), (i, highs[-1])],
+                    key_points=[(s, float(low[s])), (i, float(high[i - 1]))],
                     description="上升楔形 - 看跌反转信号"
                 )
-                patterns.append(pattern)
-            
-            # 下降楔形: 两条趋势线都下降,但下轨下降更慢 (看涨)
-            elif upper_slope < 0 and lower_slope < 0 and lower_slope > upper_slope * 0.7:
+            else:
                 pattern = PatternMatch(
                     pattern_type=PatternType.FALLING_WEDGE,
                     signal_direction=SignalDirection.BULLISH,
                     confidence=0.7,
-                    start_index=i - window,
+                    start_index=s,
                     end_index=i,
-                    key_points=[(i-window, highs[0]), (i, lows[-1])],
+                    key_points=[(s, float(high[s])), (i, float(low[i - 1]))],
                     description="下降楔形 - 看涨反转信号"
                 )
-                patterns.append(pattern)
+            patterns.append(pattern)
         
         return patterns
     
     async def _detect_candlestick_patterns(
         self, 
-        klines: List[KlineData]
+        klines: CandleSeries,
+        extrema: Optional[SeriesExtrema] = None
     ) -> List[PatternMatch]:
-        """检测K线组合形态"""
+        """检测K线组合形态（各形态条件按列整体计算，只对命中的位置构造结果）"""
         patterns = []
-        
-        for i in range(2, len(klines)):
-            k_prev2 = klines[i-2]
-            k_prev = klines[i-1]
-            k_curr = klines[i]
+        if len(klines) < 3:
+            return patterns
+        
+        o, h, l, c = klines.open, klines.high, klines.low, klines.close
+        body = np.abs(c - o)
+        total_range = h - l
+        bullish = c > o
+        bearish = c < o
+        strong = body > total_range * 0.6
+        small = body < total_range * 0.3
+        lower_shadow = np.minimum(c, o) - l
+        upper_shadow = h - np.maximum(c, o)
+        
+        # 以下掩码的第 k 项对应当前K线 i = k + 2
+        cur, prev, prev2 = slice(2, None), slice(1, -1), slice(None, -2)
+        # 早晨之星: 大阴线 -> 小实体 -> 大阳线；黄昏之星: 大阳线 -> 小实体 -> 大阴线
+        morning = (bearish[prev2] & strong[prev2]) & small[prev] & (bullish[cur] & strong[cur])
+        evening = ~morning & (bullish[prev2] & strong[prev2]) & small[prev] & (bearish[cur] & strong[cur])
+        # 吞没: 当前K线实体完全覆盖上一根相反方向的实体
+        engulf_bull = bearish[prev] & bullish[cur] & (o[cur] < c[prev]) & (c[cur] > o[prev])
+        engulf_bear = ~engulf_bull & bullish[prev] & bearish[cur] & (o[cur] > c[prev]) & (c[cur] < o[prev])
+        # 锤子线/射击之星: 一侧影线至少是实体的2倍、另一侧很短；十字星: 实体不超过总范围的10%
+        hammer = (lower_shadow[cur] > body[cur] * 2) & (upper_shadow[cur] < body[cur] * 0.3)
+        shooting = ~hammer & (upper_shadow[cur] > body[cur] * 2) & (lower_shadow[cur] < body[cur] * 0.3)
+        doji = ~hammer & ~shooting & (body[cur] < total_range[cur] * 0.1)
+        
+        any_match = morning | evening | engulf_bull | engulf_bear | hammer | shooting | doji
+        for k in np.flatnonzero(any_match).tolist():
+            i = k + 2
             
-            # 早晨之星: 下跌 -> 小实体 -> 大阳线
-            if self._is_morning_star(k_prev2, k_prev, k_curr):
-                pattern = PatternMatch(
+            if morning[k]:
+                patterns.append(PatternMatch(
                     pattern_type=PatternType.MORNING_STAR,
                     signal_direction=SignalDirection.BULLISH,
                     confidence=0.8,
                     start_index=i-2,
                     end_index=i,
-                    key_points=[(i-2, k_prev2.close), (i, k_curr.close)],
+                    key_points=[(i-2, float(c[i-2])), (i, float(c[i]))],
                     description="早晨之星 - 强看涨信号"
-                )
-                patterns.append(pattern)
-            
-            # 黄昏之星: 上涨 -> 小实体 -> 大阴线
-            elif self._is_evening_star(k_prev2, k_prev, k_curr):
-                pattern = PatternMatch(
+                ))
+            elif evening[k]:
+                patterns.append(PatternMatch(
                     pattern_type=PatternType.EVENING_STAR,
                     signal_direction=SignalDirection.BEARISH,
                     confidence=0.8,
                     start_index=i-2,
                     end_index=i,
-                    key_points=[(i-2, k_prev2.close), (i, k_curr.close)],
+                    key_points=[(i-2, float(c[i-2])), (i, float(c[i]))],
                     description="黄昏之星 - 强看跌信号"
-                )
-                patterns.append(pattern)
+                ))
             
-            # 看涨吞没
-            if self._is_bullish_engulfing(k_prev, k_curr):
-                pattern = PatternMatch(
+            if engulf_bull[k]:
+                patterns.append(PatternMatch(
                     pattern_type=PatternType.ENGULFING_BULLISH,
                     signal_direction=SignalDirection.BULLISH,
                     confidence=0.75,
                     start_index=i-1,
                     end_index=i,
-                    key_points=[(i-1, k_prev.close), (i, k_curr.close)],
+                    key_points=[(i-1, float(c[i-1])), (i, float(c[i]))],
                     description="看涨吞没 - 看涨信号"
-                )
-                patterns.append(pattern)
-            
-            # 看跌吞没
-            elif self._is_bearish_engulfing(k_prev, k_curr):
-                pattern = PatternMatch(
+                ))
+            elif engulf_bear[k]:
+                patterns.append(PatternMatch(
                     pattern_type=PatternType.ENGULFING_BEARISH,
                     signal_direction=SignalDirection.BEARISH,
                     confidence=0.75,
                     start_index=i-1,
                     end_index=i,
-                    key_points=[(i-1, k_prev.close), (i, k_curr.close)],
+                    key_points=[(i-1, float(c[i-1])), (i, float(c[i]))],
                     description="看跌吞没 - 看跌信号"
-                )
-                patterns.append(pattern)
+                ))
             
-            # 锤子线
-            if self._is_hammer(k_curr):
-                pattern = PatternMatch(
+            if hammer[k]:
+                patterns.append(PatternMatch(
                     pattern_type=PatternType.HAMMER,
                     signal_direction=SignalDirection.BULLISH,
                     confidence=0.7,
                     start_index=i,
                     end_index=i,
-                    key_points=[(i, k_curr.close)],
+                    key_points=[(i, float(c[i]))],
                     description="锤子线 - 底部反转信号"
-                )
-                patterns.append(pattern)
-            
-            # 射击之星
-            elif self._is_shooting_star(k_curr):
-                pattern = PatternMatch(
+                ))
+            elif shooting[k]:
+                patterns.append(PatternMatch(
                     pattern_type=PatternType.SHOOTING_STAR,
                     signal_direction=SignalDirection.BEARISH,
                     confidence=0.7,
                     start_index=i,
                     end_index=i,
-                    key_points=[(i, k_curr.close)],
+                    key_points=[(i, float(c[i]))],
                     description="射击之星 - 顶部反转信号"
-                )
-                patterns.append(pattern)
-            
-            # 十字星
-            elif self._is_doji(k_curr):
-                pattern = PatternMatch(
+                ))
+            elif doji[k]:
+                patterns.append(PatternMatch(
                     pattern_type=PatternType.DOJI,
                     signal_direction=SignalDirection.NEUTRAL,
                     confidence=0.6,
                     start_index=i,
                     end_index=i,
-                    key_points=[(i, k_curr.close)],
+                    key_points=[(i, float(c[i]))],
                     description="十字星 - 市场犹豫,趋势可能反转"
-                )
-                patterns.append(pattern)
+                ))
         
         return patterns
     
     # ============ 辅助方法 ============
     
-    def _find_local_peaks(
-        self, 
-        prices: List[float], 
-        distance: int = 5
-    ) -> List[Tuple[int, float]]:
-        """查找局部峰值"""
-        peaks = []
-        for i in range(distance, len(prices) - distance):
-            if all(prices[i] >= prices[i-j] for j in range(1, distance+1)) and \
-               all(prices[i] >= prices[i+j] for j in range(1, distance+1)):
-                peaks.append((i, prices[i]))
-        return peaks
-    
-    def _find_local_valleys(
-        self, 
-        prices: List[float], 
-        distance: int = 5
-    ) -> List[Tuple[int, float]]:
-        """查找局部谷底"""
-        valleys = []
-        for i in range(distance, len(prices) - distance):
-            if all(prices[i] <= prices[i-j] for j in range(1, distance+1)) and \
-               all(prices[i] <= prices[i+j] for j in range(1, distance+1)):
-                valleys.append((i, prices[i]))
-        return valleys
-    
     def _is_similar_price(self, price1: float, price2: float) -> bool:
         """判断两个价格是否相似"""
         diff = abs(price1 - price2) / ((price1 + price2) / 2)
@@ -691,94 +649,6 @@ class PatternRecognitionService:
         
         confidence = peak_symmetry * 0.6 + depth_score * 0.4
         return max(0.0, min(1.0, confidence))
-    
-    def _calculate_trendline_slope(self, prices: List[float]) -> float:
-        """计算趋势线斜率 (使用线性回归)"""
-        if len(prices) < 2:
-            return 0.0
-        
-        x = np.arange(len(prices))
-        y = np.array(prices)
-        
-        # 简单线性回归
-        x_mean = np.mean(x)
-        y_mean = np.mean(y)
-        
-        numerator = np.sum((x - x_mean) * (y - y_mean))
-        denominator = np.sum((x - x_mean) ** 2)
-        
-        if denominator == 0:
-            return 0.0
-        
-        slope = numerator / denominator
-        return slope / y_mean  # 归一化斜率
-    
-    def _is_morning_star(self, k1: KlineData, k2: KlineData, k3: KlineData) -> bool:
-        """判断是否为早晨之星"""
-        # K1: 大阴线
-        # K2: 小实体 (十字星或小K线)
-        # K3: 大阳线
-        
-        body1 = abs(k1.close - k1.open)
-        body2 = abs(k2.close - k2.open)
-        body3 = abs(k3.close - k3.open)
-        
-        is_k1_bearish = k1.close < k1.open and body1 > (k1.high - k1.low) * 0.6
-        is_k2_small = body2 < (k2.high - k2.low) * 0.3
-        is_k3_bullish = k3.close > k3.open and body3 > (k3.high - k3.low) * 0.6
-        
-        return is_k1_bearish and is_k2_small and is_k3_bullish
-    
-    def _is_evening_star(self, k1: KlineData, k2: KlineData, k3: KlineData) -> bool:
-        """判断是否为黄昏之星"""
-        body1 = abs(k1.close - k1.open)
-        body2 = abs(k2.close - k2.open)
-        body3 = abs(k3.close - k3.open)
-        
-        is_k1_bullish = k1.close > k1.open and body1 > (k1.high - k1.low) * 0.6
-        is_k2_small = body2 < (k2.high - k2.low) * 0.3
-        is_k3_bearish = k3.close < k3.open and body3 > (k3.high - k3.low) * 0.6
-        
-        return is_k1_bullish and is_k2_small and is_k3_bearish
-    
-    def _is_bullish_engulfing(self, k1: KlineData, k2: KlineData) -> bool:
-        """判断是否为看涨吞没"""
-        return (k1.close < k1.open and  # K1阴线
-                k2.close > k2.open and  # K2阳线
-                k2.open < k1.close and  # K2开盘低于K1收盘
-                k2.close > k1.open)     # K2收盘高于K1开盘
-    
-    def _is_bearish_engulfing(self, k1: KlineData, k2: KlineData) -> bool:
-        """判断是否为看跌吞没"""
-        return (k1.close > k1.open and  # K1阳线
-                k2.close < k2.open and  # K2阴线
-                k2.open > k1.close and  # K2开盘高于K1收盘
-                k2.close < k1.open)     # K2收盘低于K1开盘
-    
-    def _is_hammer(self, k: KlineData) -> bool:
-        """判断是否为锤子线"""
-        body = abs(k.close - k.open)
-        lower_shadow = min(k.close, k.open) - k.low
-        upper_shadow = k.high - max(k.close, k.open)
-        
-        return (lower_shadow > body * 2 and  # 下影线至少是实体的2倍
-                upper_shadow < body * 0.3)   # 上影线很短
-    
-    def _is_shooting_star(self, k: KlineData) -> bool:
-        """判断是否为射击之星"""
-        body = abs(k.close - k.open)
-        lower_shadow = min(k.close, k.open) - k.low
-        upper_shadow = k.high - max(k.close, k.open)
-        
-        return (upper_shadow > body * 2 and  # 上影线至少是实体的2倍
-                lower_shadow < body * 0.3)   # 下影线很短
-    
-    def _is_doji(self, k: KlineData) -> bool:
-        """判断是否为十字星"""
-        body = abs(k.close - k.open)
-        total_range = k.high - k.low
-        
-        return body < total_range * 0.1  # 实体不超过总范围的10%
 
 
 # 导出全局单例
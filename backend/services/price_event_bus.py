@@ -0,0 +1,97 @@
+"""
+价格事件总线
+
+DataService 每收到一批实时行情即按品种发布价格事件，订阅方（如预警服务）
+只会在自己关注的品种有新价格时被回调，不再需要固定周期轮询。
+"""
+import inspect
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, NamedTuple, Optional, Set
+
+from models.market_data import MarketType
+
+logger = logging.getLogger(__name__)
+
+
+class PriceEvent(NamedTuple):
+    """单个品种的价格更新"""
+    symbol: str
+    price: float
+    timestamp: datetime
+    volume: Optional[float] = None
+
+
+class PriceEventBus:
+    """按品种分发价格事件"""
+
+    def __init__(self):
+        # symbol -> 回调集合（dict 保持注册顺序）
+        self.subscribers: Dict[str, Dict[Callable, None]] = {}
+        # symbol -> 市场类型，用于补取不在默认行情中的品种
+        self.market_types: Dict[str, MarketType] = {}
+        self.total_events = 0
+
+    def subscribe(self, symbol: str, callback: Callable, market_type: Optional[MarketType] = None):
+        """订阅品种价格事件，回调可以是普通函数或协程函数"""
+        self.subscribers.setdefault(symbol, {})[callback] = None
+        if market_type is not None:
+            self.market_types[symbol] = market_type
+
+    def unsubscribe(self, symbol: str, callback: Callable):
+        """取消订阅"""
+        callbacks = self.subscribers.get(symbol)
+        if not callbacks:
+            return
+        callbacks.pop(callback, None)
+        if not callbacks:
+            del self.subscribers[symbol]
+            self.market_types.pop(symbol, None)
+
+    def missing_symbols(self, covered: Set[str]) -> Dict[MarketType, Set[str]]:
+        """有订阅但不在本轮行情中的品种，按市场类型分组（未知市场类型的品种不补取）"""
+        missing: Dict[MarketType, Set[str]] = {}
+        for symbol in self.subscribers:
+            market_type = self.market_types.get(symbol)
+            if symbol not in covered and market_type is not None:
+                missing.setdefault(market_type, set()).add(symbol)
+        return missing
+
+    async def publish(self, event: PriceEvent):
+        """向该品种的订阅者发布价格事件"""
+        callbacks = self.subscribers.get(event.symbol)
+        if not callbacks:
+            return
+        self.total_events += 1
+        for callback in list(callbacks):
+            try:
+                result = callback(event)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"价格事件回调失败 {event.symbol}: {e}")
+
+    async def publish_tickers(self, tickers: Iterable[Dict[str, Any]]):
+        """将行情数据转换为价格事件并发布"""
+        for ticker in tickers:
+            symbol = ticker.get('symbol')
+            price = ticker.get('last')
+            if price is None or symbol not in self.subscribers:
+                continue
+            await self.publish(PriceEvent(
+                symbol=symbol,
+                price=float(price),
+                timestamp=ticker.get('timestamp') or datetime.now(),
+                volume=ticker.get('volume')
+            ))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "symbols": len(self.subscribers),
+            "subscribers": sum(len(c) for c in self.subscribers.values()),
+            "total_events": self.total_events
+        }
+
+
+# 全局价格事件总线实例
+price_event_bus = PriceEventBus()
@@ -0,0 +1,134 @@
+"""
+数据源同步SDK调用的执行层
+
+yfinance、akshare 的接口都是阻塞的，直接在协程中调用会卡住整个事件循环
+（WebSocket 心跳、预警检查都会停顿）。这里为每个数据源建立独立的有界线程池，
+并限制同时进行的调用数、设置超时；调用方被取消时，尚未开始执行的调用会从队列中移除。
+交易所（ccxt）使用异步版本，见 exchange_pool。
+"""
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 各数据源的线程数、并发上限（含排队）和单次调用超时（秒）
+PROVIDER_LIMITS: Dict[str, Dict[str, float]] = {
+    "yfinance": {"max_workers": 4, "max_concurrency": 16, "timeout": 20.0},
+    "akshare": {"max_workers": 2, "max_concurrency": 8, "timeout": 30.0},
+    "candle_store": {"max_workers": 4, "max_concurrency": 64, "timeout": 30.0},  # 本地K线库的磁盘读写
+    "backtest_store": {"max_workers": 2, "max_concurrency": 32, "timeout": 30.0},  # 回测结果库的读写
+}
+DEFAULT_LIMITS = {"max_workers": 4, "max_concurrency": 16, "timeout": 20.0}
+
+
+class ProviderPool:
+    """单个数据源的线程池及并发控制"""
+
+    def __init__(self, name: str, max_workers: int, max_concurrency: int, timeout: float):
+        self.name = name
+        self.max_workers = int(max_workers)
+        self.max_concurrency = int(max_concurrency)
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"provider-{name}")
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.active = 0  # 已提交、线程尚未结束的调用数
+        self.calls = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.errors = 0
+
+    def _get_semaphore(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        # asyncio.Semaphore 绑定事件循环，循环变化时（如测试）重新创建
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    def _release(self, semaphore: asyncio.Semaphore):
+        self.active -= 1
+        semaphore.release()
+
+    async def run(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """在线程池中执行 fn(*args, **kwargs)，超时抛出 asyncio.TimeoutError"""
+        loop = asyncio.get_running_loop()
+        semaphore = self._get_semaphore(loop)
+        await semaphore.acquire()
+        try:
+            cf = self.executor.submit(functools.partial(fn, *args, **kwargs))
+        except Exception:
+            semaphore.release()
+            raise
+        self.active += 1
+        self.calls += 1
+
+        def on_done(_):
+            # 线程真正结束（或排队中被取消）后才释放并发名额
+            try:
+                loop.call_soon_threadsafe(self._release, semaphore)
+            except RuntimeError:
+                pass  # 事件循环已关闭
+
+        cf.add_done_callback(on_done)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(cf), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.warning(f"数据源 {self.name} 调用超时: {getattr(fn, '__name__', fn)}")
+            raise
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        except Exception:
+            self.errors += 1
+            raise
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "timeout": self.timeout,
+            "active": self.active,
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "errors": self.errors
+        }
+
+
+class ProviderExecutor:
+    """按数据源名称管理线程池"""
+
+    def __init__(self, limits: Optional[Dict[str, Dict[str, float]]] = None):
+        self.limits = dict(PROVIDER_LIMITS if limits is None else limits)
+        self.pools: Dict[str, ProviderPool] = {}
+
+    def get_pool(self, provider: str) -> ProviderPool:
+        pool = self.pools.get(provider)
+        if pool is None:
+            pool = ProviderPool(provider, **self.limits.get(provider, DEFAULT_LIMITS))
+            self.pools[provider] = pool
+        return pool
+
+    async def run(self, provider: str, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """在对应数据源的线程池中执行同步调用"""
+        return await self.get_pool(provider).run(fn, *args, timeout=timeout, **kwargs)
+
+    def shutdown(self):
+        """关闭所有线程池，丢弃尚未开始的调用"""
+        for pool in self.pools.values():
+            pool.shutdown()
+        self.pools.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {name: pool.get_stats() for name, pool in self.pools.items()}
+
+
+# 全局数据源执行器实例
+provider_executor = ProviderExecutor()
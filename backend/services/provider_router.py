@@ -0,0 +1,127 @@
+"""
+数据源路由与对冲请求
+
+按 data_quality_monitor 观测到的健康状态和响应时间中位数对数据源排序，先请求最快的数据源；
+若它在自身 p95 响应时间内没有返回，再并行发出对冲请求。任一请求返回有效结果即采用，
+其余仍在进行的请求被取消。请求失败或返回空数据、模拟数据时立即尝试下一个数据源。
+被对冲或取消的请求记录已等待的时长作为响应时间下限，慢数据源的 p50/p95 随之上升。
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .data_quality_monitor import DataQualityMonitor, data_quality_monitor
+
+logger = logging.getLogger(__name__)
+
+ProviderCall = Callable[[], Awaitable[Any]]
+
+
+def is_real_data(result: Any) -> bool:
+    """非空且不是模拟数据（数据源失败时的兜底结果不能算作一次成功）"""
+    return bool(result) and not getattr(result, "is_mock", False)
+
+
+class ProviderRouter:
+    """按延迟排序、对冲发出数据源请求"""
+
+    def __init__(
+        self,
+        monitor: DataQualityMonitor,
+        hedge_percentile: float = 95,
+        default_hedge_delay: float = 2.0,
+        min_hedge_delay: float = 0.25,
+        max_hedge_delay: float = 10.0
+    ):
+        self.monitor = monitor
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = default_hedge_delay  # 没有样本的数据源使用的对冲等待时间
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+        self.requests = 0
+        self.hedges = 0
+        self.cancelled = 0
+        self.wins: Dict[str, int] = {}
+
+    def hedge_delay(self, source_name: str) -> float:
+        """数据源的对冲等待时间：其 p95 响应时间，限制在上下限之间"""
+        delay = self.monitor.get_latency_percentile(source_name, self.hedge_percentile)
+        if delay is None:
+            delay = self.default_hedge_delay
+        return min(max(delay, self.min_hedge_delay), self.max_hedge_delay)
+
+    async def route(
+        self,
+        calls: Dict[str, ProviderCall],
+        is_valid: Callable[[Any], bool] = is_real_data
+    ) -> Tuple[Optional[str], Any]:
+        """依次/对冲地请求各数据源，返回 (数据源名称, 结果)；全部失败时返回 (None, None)
+
+        calls 的顺序为配置的优先级，仅在没有延迟数据可比较时起作用。
+        """
+        self.requests += 1
+        order = self.monitor.rank_sources(list(calls))
+        running: Dict[asyncio.Task, Tuple[str, float]] = {}
+        next_index = 0
+
+        def launch():
+            nonlocal next_index
+            source_name = order[next_index]
+            next_index += 1
+            task = asyncio.ensure_future(calls[source_name]())
+            running[task] = (source_name, time.time())
+            return source_name
+
+        try:
+            last_source = launch()
+            while running:
+                timeout = self.hedge_delay(last_source) if next_index < len(order) else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # 当前最新的请求超过 p95 仍未返回，发出对冲请求
+                    self.hedges += 1
+                    last_source = launch()
+                    logger.debug(f"数据源响应过慢，对冲请求: {last_source}")
+                    continue
+
+                for task in done:
+                    source_name, started = running.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        self.monitor.record_error(source_name)
+                        logger.warning(f"数据源 {source_name} 请求失败: {e}")
+                        continue
+                    if is_valid(result):
+                        self.monitor.record_success(source_name, time.time() - started)
+                        self.wins[source_name] = self.wins.get(source_name, 0) + 1
+                        return source_name, result
+                    self.monitor.record_error(source_name)
+                    logger.warning(f"数据源 {source_name} 未返回数据")
+
+                # 有请求失败或返回空数据，立即尝试下一个数据源
+                if next_index < len(order):
+                    last_source = launch()
+
+            return None, None
+        finally:
+            now = time.time()
+            for task, (source_name, started) in running.items():
+                task.cancel()
+                # 未返回的请求至少耗时这么久，否则只有胜出者有样本，慢数据源永远显得很快
+                self.monitor.record_latency(source_name, now - started)
+            self.cancelled += len(running)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "cancelled": self.cancelled,
+            "wins": dict(self.wins)
+        }
+
+
+# 全局数据源路由实例
+provider_router = ProviderRouter(data_quality_monitor)
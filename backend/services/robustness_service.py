@@ -0,0 +1,263 @@
+"""
+回测稳健性分析服务
+
+在单次回测之上提供前向滚动分析（walk-forward）和交易重抽样蒙特卡洛分析。两者都把窗口/模拟
+分批提交到参数扫描的进程池并行执行：前向分析的K线数据只加载一次、放入共享内存，由各工作进程挂载。
+分析在后台运行，通过分析ID查询进度与结果，可随时取消。
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel
+
+from config import settings
+from .background_jobs import BackgroundJobManager
+from .backtest_strategies import share_frame
+from .lean_backtest_service import lean_service
+from .monte_carlo import METHODS, confidence_bands, resample_trades
+from .parameter_sweep import (
+    CHUNKS_PER_WORKER, RANK_METRICS, ParameterRange, expand_grid, expand_values, sweep_executor
+)
+from .vectorized_backtest import ENGINES, compute_statistics, sample_equity_curve
+from .walk_forward import run_walk_forward_windows, stitch_equity, walk_forward_efficiency, walk_forward_windows
+
+logger = logging.getLogger(__name__)
+
+
+class WalkForwardRequest(BaseModel):
+    """前向滚动分析请求模型"""
+    strategy_id: str
+    symbol: str
+    start_date: str
+    end_date: str
+    initial_capital: float = 10000.0
+    parameter_grid: Dict[str, Union[ParameterRange, List[Any]]]  # 每个训练窗口内寻优的参数网格
+    fixed_parameters: Dict[str, Any] = {}
+    metric: str = "sharpe_ratio"  # 训练窗口内的寻优指标
+    train_bars: int = 252
+    test_bars: int = 63
+    anchored: bool = False  # True 时训练窗口从第一根K线开始逐步扩展
+    engine: str = "vectorized"
+    priority: int = 0
+
+
+class MonteCarloRequest(BaseModel):
+    """蒙特卡洛分析请求模型"""
+    source_id: str  # 已完成的回测ID或前向分析ID，使用其逐笔交易收益率
+    simulations: int = 10000
+    method: str = "bootstrap"  # bootstrap（有放回抽样）或 shuffle（打乱交易顺序）
+    percentiles: List[float] = [5, 25, 50, 75, 95]
+    seed: Optional[int] = None
+    priority: int = 0
+
+
+class AnalysisResult(BaseModel):
+    """稳健性分析结果模型"""
+    analysis_id: str
+    kind: str  # walk_forward, monte_carlo
+    status: str  # queued, running, completed, failed, cancelled
+    total_jobs: int = 0
+    completed_jobs: int = 0
+    result: Dict[str, Any] = {}
+    logs: List[str] = []
+    error_message: Optional[str] = None
+    created_at: str
+    completed_at: Optional[str] = None
+
+
+def _split(items: List[Any], chunks: int) -> List[List[Any]]:
+    """按顺序切成至多 chunks 段连续的批次"""
+    bounds = np.linspace(0, len(items), min(chunks, len(items)) + 1).astype(int)
+    return [items[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+
+
+class RobustnessService:
+    """回测稳健性分析服务"""
+
+    def __init__(self):
+        self.jobs = BackgroundJobManager("稳健性分析", lambda: sweep_executor,
+                                         lambda: settings.BACKTEST_ANALYSIS_HISTORY)
+        # 进行中的分析和最近 BACKTEST_ANALYSIS_HISTORY 个已结束的分析（按创建顺序）
+        self.analyses: Dict[str, AnalysisResult] = self.jobs.records
+        self._tasks: Dict[str, asyncio.Task] = self.jobs.tasks
+
+    # ------------------------------------------------------------------
+    # 任务管理
+    # ------------------------------------------------------------------
+
+    def _launch(self, kind: str, name: str, run: Callable[[AnalysisResult], Coroutine]) -> str:
+        analysis_id = f"{kind}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{name}"
+        result = AnalysisResult(
+            analysis_id=analysis_id,
+            kind=kind,
+            status="queued",
+            created_at=datetime.now().isoformat(),
+            logs=[f"开始分析 {analysis_id}"]
+        )
+
+        async def execute():
+            result.result = await run(result)
+
+        self.jobs.start(analysis_id, result, execute)
+        return analysis_id
+
+    async def _fan_out(self, result: AnalysisResult, fn: Callable, batches: List[tuple], priority: int) -> List[Any]:
+        """把各批参数提交到进程池，按提交顺序返回结果"""
+        futures = [self.jobs.submit(result.analysis_id, fn, *args, priority=priority) for args in batches]
+        result.total_jobs = len(futures)
+        result.status = "running"
+        result.logs.append(f"分为 {len(futures)} 批，使用 {self.jobs.executor.max_workers} 个工作进程")
+
+        for future in asyncio.as_completed(futures):
+            await future
+            result.completed_jobs += 1
+        return [future.result() for future in futures]
+
+    # ------------------------------------------------------------------
+    # 前向滚动分析
+    # ------------------------------------------------------------------
+
+    async def start_walk_forward(self, request: WalkForwardRequest) -> str:
+        """校验参数后在后台执行前向滚动分析，返回分析ID"""
+        if request.metric not in RANK_METRICS:
+            raise ValueError(f"不支持的寻优指标: {request.metric}")
+        if request.engine not in ENGINES:
+            raise ValueError(f"不支持的回测引擎: {request.engine}")
+        if request.train_bars <= 0 or request.test_bars <= 0:
+            raise ValueError("训练窗口和测试窗口的K线数必须为正数")
+        grid = {name: expand_values(spec) for name, spec in request.parameter_grid.items()}
+        combinations = expand_grid(request.strategy_id, grid, request.fixed_parameters)
+        if not combinations:
+            raise ValueError("参数网格中没有有效的参数组合")
+        if len(combinations) > settings.BACKTEST_SWEEP_MAX_COMBINATIONS:
+            raise ValueError(f"参数组合过多: {len(combinations)} > {settings.BACKTEST_SWEEP_MAX_COMBINATIONS}")
+
+        return self._launch("walk_forward", request.strategy_id,
+                            lambda result: self._walk_forward(result, request, combinations))
+
+    async def _walk_forward(self, result: AnalysisResult, request: WalkForwardRequest,
+                            combinations: List[Dict[str, Any]]) -> Dict[str, Any]:
+        data = await lean_service._load_historical_data(request.symbol, request.start_date, request.end_date)
+        if data.empty:
+            raise ValueError(f"无法获取 {request.symbol} 的历史数据")
+        windows = walk_forward_windows(len(data), request.train_bars, request.test_bars, request.anchored)
+        if not windows:
+            raise ValueError(f"数据只有 {len(data)} 根K线，不足一个训练+测试窗口")
+        result.logs.append(f"数据加载完成，共 {len(data)} 条记录，{len(windows)} 个窗口 × {len(combinations)} 组参数")
+
+        # 工作进程从共享内存挂载数据，任务消息中只携带共享内存的名称
+        shm, spec = share_frame(data)
+        try:
+            batches = [
+                (spec, request.strategy_id, combinations, chunk, request.initial_capital, request.metric, request.engine)
+                for chunk in _split(windows, sweep_executor.max_workers * CHUNKS_PER_WORKER)
+            ]
+            outputs = await self._fan_out(result, run_walk_forward_windows, batches, request.priority)
+        finally:
+            shm.close()
+            shm.unlink()
+
+        windows_out = [window for output in outputs for window in output]
+        equity = stitch_equity(windows_out, request.initial_capital)
+        trade_returns = np.concatenate([window["test_trade_returns"] for window in windows_out])
+        start, end = windows[0][1], windows[-1][2]
+        index = pd.DatetimeIndex(data.index)[start:end]
+        statistics = compute_statistics({"equity": equity, "trade_returns": trade_returns},
+                                        index, data["Close"].to_numpy(dtype=np.float64)[start:end])
+
+        dates = pd.DatetimeIndex(data.index).strftime("%Y-%m-%d")
+        window_rows = []
+        for window in windows_out:
+            train_start, test_start, test_end = window["window"]
+            window_rows.append({
+                "train_start": dates[train_start],
+                "test_start": dates[test_start],
+                "test_end": dates[test_end - 1],
+                "parameters": window["parameters"],
+                "train_statistics": window["train_statistics"],
+                "test_statistics": window["test_statistics"]
+            })
+
+        return {
+            "strategy_id": request.strategy_id,
+            "symbol": request.symbol,
+            "metric": request.metric,
+            "windows": window_rows,
+            "oos_statistics": statistics,
+            "oos_equity_curve": sample_equity_curve(equity, index, request.initial_capital),
+            "walk_forward_efficiency": walk_forward_efficiency(windows_out),
+            "trade_returns": trade_returns.tolist()
+        }
+
+    # ------------------------------------------------------------------
+    # 蒙特卡洛
+    # ------------------------------------------------------------------
+
+    async def _trade_returns(self, source_id: str) -> np.ndarray:
+        """已完成的回测或前向分析的逐笔收益率"""
+        backtest = await lean_service.get_backtest_status(source_id)
+        if backtest is not None:
+            if backtest.status != "completed":
+                raise ValueError(f"回测尚未完成: {source_id}")
+            return np.array([trade["return_pct"] for trade in backtest.trades], dtype=np.float64)
+        analysis = self.analyses.get(source_id)
+        if analysis is not None and analysis.kind == "walk_forward":
+            if analysis.status != "completed":
+                raise ValueError(f"前向分析尚未完成: {source_id}")
+            return np.asarray(analysis.result["trade_returns"], dtype=np.float64)
+        raise ValueError(f"回测或分析不存在: {source_id}")
+
+    async def start_monte_carlo(self, request: MonteCarloRequest) -> str:
+        """校验参数后在后台执行蒙特卡洛分析，返回分析ID"""
+        if request.method not in METHODS:
+            raise ValueError(f"不支持的抽样方法: {request.method}")
+        if not 0 < request.simulations <= settings.BACKTEST_MONTE_CARLO_MAX_SIMULATIONS:
+            raise ValueError(f"模拟次数必须在 1 到 {settings.BACKTEST_MONTE_CARLO_MAX_SIMULATIONS} 之间")
+        if not request.percentiles or any(not 0 <= p <= 100 for p in request.percentiles):
+            raise ValueError("分位数必须在 0 到 100 之间")
+        trade_returns = await self._trade_returns(request.source_id)
+        if len(trade_returns) < 2:
+            raise ValueError(f"交易笔数不足，无法重抽样: {len(trade_returns)}")
+
+        return self._launch("monte_carlo", request.source_id,
+                            lambda result: self._monte_carlo(result, request, trade_returns))
+
+    async def _monte_carlo(self, result: AnalysisResult, request: MonteCarloRequest,
+                           trade_returns: np.ndarray) -> Dict[str, Any]:
+        chunk_count = min(request.simulations, sweep_executor.max_workers * CHUNKS_PER_WORKER)
+        counts = np.diff(np.linspace(0, request.simulations, chunk_count + 1).astype(int)).tolist()
+        # 每批独立的随机数流，给定 seed 时结果可复现
+        seeds = np.random.SeedSequence(request.seed).spawn(len(counts))
+        batches = [(trade_returns, count, seed, request.method) for count, seed in zip(counts, seeds)]
+        result.logs.append(f"{len(trade_returns)} 笔交易，{request.simulations} 次 {request.method} 模拟")
+
+        chunks = await self._fan_out(result, resample_trades, batches, request.priority)
+        return {
+            "source_id": request.source_id,
+            "method": request.method,
+            **confidence_bands(chunks, len(trade_returns), request.percentiles)
+        }
+
+    # ------------------------------------------------------------------
+    # 查询与取消
+    # ------------------------------------------------------------------
+
+    def get_analysis(self, analysis_id: str) -> Optional[AnalysisResult]:
+        """获取分析状态与结果"""
+        return self.analyses.get(analysis_id)
+
+    def get_all_analyses(self, kind: Optional[str] = None) -> List[AnalysisResult]:
+        """获取所有分析"""
+        return [result for result in self.analyses.values() if kind is None or result.kind == kind]
+
+    def cancel_analysis(self, analysis_id: str) -> bool:
+        """取消分析：移出排队的批次并终止正在运行的工作进程"""
+        return self.jobs.cancel(analysis_id)
+
+
+# 全局稳健性分析服务实例
+robustness_service = RobustnessService()
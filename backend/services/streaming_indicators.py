@@ -0,0 +1,561 @@
+"""
+流式（增量）技术指标
+
+每个指标对象逐根消费已收盘K线（update），内部只保存计算下一个值所需的状态，
+单次更新 O(1)；peek 在不修改状态的前提下给出"如果当前未收盘K线就此收盘"时的取值。
+
+StreamingIndicatorService 按 (symbol, timeframe) 维护K线流，由
+DataService._real_time_update_loop 推送的行情聚合出当前K线，
+流上的指标按 (名称, 参数) 区分，供预警等场景直接读取当前值。
+"""
+import logging
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from models.market_data import CandleSeries, MarketType, Timeframe
+from .indicator_engine import normalize_indicator_name
+
+logger = logging.getLogger(__name__)
+
+# 时间周期对应的毫秒数（月线按30天近似，与 DataService._get_timeframe_minutes 一致）
+TIMEFRAME_MS = {
+    Timeframe.M1: 60_000,
+    Timeframe.M5: 5 * 60_000,
+    Timeframe.M15: 15 * 60_000,
+    Timeframe.M30: 30 * 60_000,
+    Timeframe.H1: 60 * 60_000,
+    Timeframe.H4: 4 * 60 * 60_000,
+    Timeframe.D1: 24 * 60 * 60_000,
+    Timeframe.W1: 7 * 24 * 60 * 60_000,
+    Timeframe.MN1: 30 * 24 * 60 * 60_000,
+}
+
+
+class Bar(NamedTuple):
+    """流式指标使用的K线（open_time 为毫秒时间戳）"""
+    open_time: int
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+
+
+class StreamingIndicator(ABC):
+    """增量指标基类"""
+
+    def __init__(self):
+        self.value: Any = None
+        self.count = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.value is not None
+
+    @abstractmethod
+    def update(self, bar) -> Any:
+        """提交一根已收盘K线，返回最新值"""
+
+    @abstractmethod
+    def peek(self, bar) -> Any:
+        """假设 bar 为下一根收盘K线时的取值，不修改内部状态"""
+
+
+class StreamingSMA(StreamingIndicator):
+    """简单移动平均"""
+
+    # 滑动求和每隔若干次重新精确求和，避免浮点误差累积
+    RESYNC_INTERVAL = 1024
+
+    def __init__(self, period: int = 20):
+        super().__init__()
+        self.period = period
+        self.window: deque = deque()
+        self.total = 0.0
+
+    def _push(self, x: float) -> Optional[float]:
+        if len(self.window) == self.period:
+            self.total -= self.window.popleft()
+        self.window.append(x)
+        self.total += x
+        self.count += 1
+        if self.count % self.RESYNC_INTERVAL == 0:
+            self.total = math.fsum(self.window)
+        self.value = self.total / self.period if len(self.window) == self.period else None
+        return self.value
+
+    def _peek(self, x: float) -> Optional[float]:
+        if len(self.window) < self.period - 1:
+            return None
+        total = self.total + x
+        if len(self.window) == self.period:
+            total -= self.window[0]
+        return total / self.period
+
+    def update(self, bar) -> Optional[float]:
+        return self._push(bar.close)
+
+    def peek(self, bar) -> Optional[float]:
+        return self._peek(bar.close)
+
+
+class StreamingEMA(StreamingIndicator):
+    """指数移动平均，以前 period 个值的 SMA 作为种子"""
+
+    def __init__(self, period: int = 20):
+        super().__init__()
+        self.period = period
+        self.alpha = 2.0 / (period + 1)
+        self._seed: List[float] = []
+
+    def _push(self, x: float) -> Optional[float]:
+        self.count += 1
+        if self.value is None:
+            self._seed.append(x)
+            if len(self._seed) == self.period:
+                self.value = sum(self._seed) / self.period
+                self._seed = []
+        else:
+            self.value = (x - self.value) * self.alpha + self.value
+        return self.value
+
+    def _peek(self, x: float) -> Optional[float]:
+        if self.value is None:
+            if len(self._seed) == self.period - 1:
+                return (sum(self._seed) + x) / self.period
+            return None
+        return (x - self.value) * self.alpha + self.value
+
+    def update(self, bar) -> Optional[float]:
+        return self._push(bar.close)
+
+    def peek(self, bar) -> Optional[float]:
+        return self._peek(bar.close)
+
+
+class StreamingMACD(StreamingIndicator):
+    """MACD，信号线为 MACD 线有效后的 EMA"""
+
+    def __init__(self, fast_period: int = 12, slow_period: int = 26, signal_period: int = 9):
+        super().__init__()
+        self.fast = StreamingEMA(fast_period)
+        self.slow = StreamingEMA(slow_period)
+        self.signal = StreamingEMA(signal_period)
+
+    @staticmethod
+    def _result(macd: Optional[float], signal: Optional[float]) -> Optional[Dict[str, float]]:
+        if macd is None or signal is None:
+            return None
+        return {"macd": macd, "signal": signal, "histogram": macd - signal}
+
+    def update(self, bar) -> Optional[Dict[str, float]]:
+        self.count += 1
+        fast = self.fast._push(bar.close)
+        slow = self.slow._push(bar.close)
+        if fast is None or slow is None:
+            return None
+        macd = fast - slow
+        self.value = self._result(macd, self.signal._push(macd))
+        return self.value
+
+    def peek(self, bar) -> Optional[Dict[str, float]]:
+        fast = self.fast._peek(bar.close)
+        slow = self.slow._peek(bar.close)
+        if fast is None or slow is None:
+            return None
+        macd = fast - slow
+        return self._result(macd, self.signal._peek(macd))
+
+
+class _WilderAverage:
+    """Wilder 平滑：前 period 个值取均值作为种子，之后 avg = (avg * (p-1) + x) / p"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.value: Optional[float] = None
+        self._seed: List[float] = []
+
+    def push(self, x: float) -> Optional[float]:
+        if self.value is None:
+            self._seed.append(x)
+            if len(self._seed) == self.period:
+                self.value = sum(self._seed) / self.period
+                self._seed = []
+        else:
+            self.value = (self.value * (self.period - 1) + x) / self.period
+        return self.value
+
+    def peek(self, x: float) -> Optional[float]:
+        if self.value is None:
+            if len(self._seed) == self.period - 1:
+                return (sum(self._seed) + x) / self.period
+            return None
+        return (self.value * (self.period - 1) + x) / self.period
+
+
+class StreamingRSI(StreamingIndicator):
+    """RSI（Wilder 平滑）"""
+
+    def __init__(self, period: int = 14):
+        super().__init__()
+        self.period = period
+        self.prev_close: Optional[float] = None
+        self.gain = _WilderAverage(period)
+        self.loss = _WilderAverage(period)
+
+    @staticmethod
+    def _rsi(avg_gain: Optional[float], avg_loss: Optional[float]) -> Optional[float]:
+        if avg_gain is None or avg_loss is None:
+            return None
+        if avg_loss == 0:
+            return 100.0
+        return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+    def update(self, bar) -> Optional[float]:
+        self.count += 1
+        x = bar.close
+        if self.prev_close is not None:
+            change = x - self.prev_close
+            self.value = self._rsi(self.gain.push(max(change, 0.0)), self.loss.push(max(-change, 0.0)))
+        self.prev_close = x
+        return self.value
+
+    def peek(self, bar) -> Optional[float]:
+        if self.prev_close is None:
+            return None
+        change = bar.close - self.prev_close
+        return self._rsi(self.gain.peek(max(change, 0.0)), self.loss.peek(max(-change, 0.0)))
+
+
+class StreamingATR(StreamingIndicator):
+    """平均真实波幅（Wilder 平滑）"""
+
+    def __init__(self, period: int = 14):
+        super().__init__()
+        self.period = period
+        self.prev_close: Optional[float] = None
+        self.average = _WilderAverage(period)
+
+    def _true_range(self, bar) -> float:
+        return max(bar.high - bar.low, abs(bar.high - self.prev_close), abs(bar.low - self.prev_close))
+
+    def update(self, bar) -> Optional[float]:
+        self.count += 1
+        if self.prev_close is not None:
+            self.value = self.average.push(self._true_range(bar))
+        self.prev_close = bar.close
+        return self.value
+
+    def peek(self, bar) -> Optional[float]:
+        if self.prev_close is None:
+            return None
+        return self.average.peek(self._true_range(bar))
+
+
+class StreamingBollinger(StreamingIndicator):
+    """布林带（总体标准差），维护窗口内的中心化一阶/二阶和"""
+
+    def __init__(self, period: int = 20, std_dev: float = 2):
+        super().__init__()
+        self.period = period
+        self.std_dev = std_dev
+        self.window: deque = deque()
+        self.ref: Optional[float] = None
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def _bands(self, total: float, total_sq: float, ref: float) -> Dict[str, float]:
+        mean = total / self.period
+        variance = max(total_sq / self.period - mean * mean, 0.0)
+        middle = mean + ref
+        width = self.std_dev * math.sqrt(variance)
+        return {"upper": middle + width, "middle": middle, "lower": middle - width}
+
+    def update(self, bar) -> Optional[Dict[str, float]]:
+        self.count += 1
+        if self.ref is None:
+            self.ref = bar.close
+        c = bar.close - self.ref
+        if len(self.window) == self.period:
+            old = self.window.popleft()
+            self.total -= old
+            self.total_sq -= old * old
+        self.window.append(c)
+        self.total += c
+        self.total_sq += c * c
+        if self.count % StreamingSMA.RESYNC_INTERVAL == 0:
+            self.total = math.fsum(self.window)
+            self.total_sq = math.fsum(v * v for v in self.window)
+        self.value = self._bands(self.total, self.total_sq, self.ref) if len(self.window) == self.period else None
+        return self.value
+
+    def peek(self, bar) -> Optional[Dict[str, float]]:
+        if len(self.window) < self.period - 1:
+            return None
+        ref = self.ref if self.ref is not None else bar.close
+        c = bar.close - ref
+        total, total_sq = self.total + c, self.total_sq + c * c
+        if len(self.window) == self.period:
+            old = self.window[0]
+            total -= old
+            total_sq -= old * old
+        return self._bands(total, total_sq, ref)
+
+
+class _MonotonicExtreme:
+    """单调队列维护滑动窗口极值，元素为 (序号, 值)"""
+
+    def __init__(self, period: int, is_max: bool):
+        self.period = period
+        self.is_max = is_max
+        self.items: deque = deque()
+
+    def _better(self, a: float, b: float) -> bool:
+        return a >= b if self.is_max else a <= b
+
+    def push(self, index: int, value: float) -> float:
+        while self.items and self._better(value, self.items[-1][1]):
+            self.items.pop()
+        self.items.append((index, value))
+        while self.items[0][0] <= index - self.period:
+            self.items.popleft()
+        return self.items[0][1]
+
+    def peek(self, index: int, value: float) -> float:
+        """假设在 index 处加入 value 后的窗口极值（最多只有队首会过期）"""
+        candidate = None
+        for i, v in list(self.items)[:2]:
+            if i > index - self.period:
+                candidate = v
+                break
+        if candidate is None or self._better(value, candidate):
+            return value
+        return candidate
+
+
+class StreamingStochastic(StreamingIndicator):
+    """随机指标 (%K, %D)，最高价等于最低价时 %K 记为 50"""
+
+    def __init__(self, k_period: int = 14, d_period: int = 3):
+        super().__init__()
+        self.k_period = k_period
+        self.highest = _MonotonicExtreme(k_period, is_max=True)
+        self.lowest = _MonotonicExtreme(k_period, is_max=False)
+        self.d = StreamingSMA(d_period)
+
+    @staticmethod
+    def _k(close: float, hh: float, ll: float) -> float:
+        if hh == ll:
+            return 50.0
+        return (close - ll) / (hh - ll) * 100
+
+    def update(self, bar) -> Optional[Dict[str, Optional[float]]]:
+        index = self.count
+        self.count += 1
+        hh = self.highest.push(index, bar.high)
+        ll = self.lowest.push(index, bar.low)
+        if self.count < self.k_period:
+            return None
+        k = self._k(bar.close, hh, ll)
+        self.value = {"k": k, "d": self.d._push(k)}
+        return self.value
+
+    def peek(self, bar) -> Optional[Dict[str, Optional[float]]]:
+        if self.count + 1 < self.k_period:
+            return None
+        k = self._k(bar.close, self.highest.peek(self.count, bar.high), self.lowest.peek(self.count, bar.low))
+        return {"k": k, "d": self.d._peek(k)}
+
+
+class StreamingVWAP(StreamingIndicator):
+    """累计成交量加权平均价"""
+
+    def __init__(self):
+        super().__init__()
+        self.cum_volume = 0.0
+        self.cum_pv = 0.0
+
+    def update(self, bar) -> Optional[float]:
+        self.count += 1
+        typical = (bar.high + bar.low + bar.close) / 3
+        self.cum_volume += bar.volume
+        self.cum_pv += typical * bar.volume
+        self.value = self.cum_pv / self.cum_volume if self.cum_volume else None
+        return self.value
+
+    def peek(self, bar) -> Optional[float]:
+        cum_volume = self.cum_volume + bar.volume
+        if not cum_volume:
+            return None
+        return (self.cum_pv + (bar.high + bar.low + bar.close) / 3 * bar.volume) / cum_volume
+
+
+# 支持的流式指标；键为 normalize_indicator_name 归一化后的名称
+STREAMING_INDICATORS = {
+    "SMA": StreamingSMA,
+    "EMA": StreamingEMA,
+    "MACD": StreamingMACD,
+    "RSI": StreamingRSI,
+    "ATR": StreamingATR,
+    "BOLLINGER": StreamingBollinger,
+    "BOLLINGERBANDS": StreamingBollinger,
+    "STOCHASTIC": StreamingStochastic,
+    "VWAP": StreamingVWAP,
+}
+
+
+class BarStream:
+    """单个 (symbol, timeframe) 的K线流：聚合行情为K线，并驱动挂在其上的指标"""
+
+    def __init__(self, symbol: str, market_type: MarketType, timeframe: Timeframe, history_size: int = 500):
+        self.symbol = symbol
+        self.market_type = market_type
+        self.timeframe = timeframe
+        self.interval_ms = TIMEFRAME_MS.get(timeframe, 60 * 60_000)
+        self.history: deque = deque(maxlen=history_size)
+        self.forming: Optional[Bar] = None
+        self.indicators: Dict[Tuple[str, tuple], StreamingIndicator] = {}
+        # 最近一次用行情（或历史K线预热）更新的时间，用于判断是否漏掉了K线
+        self.last_tick_at: Optional[float] = None
+        self._last_volume_total: Optional[float] = None
+
+    def seed(self, series: CandleSeries):
+        """用历史K线初始化：除最后一根外均视为已收盘，最后一根作为当前K线"""
+        bars = [
+            Bar(int(ts), o, h, l, c, 0.0 if v != v else v)
+            for ts, o, h, l, c, v in zip(
+                series.timestamp.tolist(), series.open.tolist(), series.high.tolist(),
+                series.low.tolist(), series.close.tolist(), series.volume.tolist()
+            )
+        ]
+        if not bars:
+            return
+        for bar in bars[:-1]:
+            self._close(bar)
+        self.forming = bars[-1]
+        self.last_tick_at = time.time()
+
+    def is_stale(self, max_bars: int = 2, now: Optional[float] = None) -> bool:
+        """超过 max_bars 个周期没有收到行情：期间的K线已漏掉，指标需要用历史K线重新预热"""
+        if self.last_tick_at is None:
+            return True
+        now = time.time() if now is None else now
+        return now - self.last_tick_at > max_bars * self.interval_ms / 1000
+
+    def _close(self, bar: Bar):
+        self.history.append(bar)
+        for indicator in self.indicators.values():
+            indicator.update(bar)
+
+    def indicator(self, name: str, **params) -> StreamingIndicator:
+        """获取（必要时创建并用已有历史预热）指定参数的指标"""
+        normalized = normalize_indicator_name(name)
+        key = (normalized, tuple(sorted(params.items())))
+        indicator = self.indicators.get(key)
+        if indicator is None:
+            cls = STREAMING_INDICATORS.get(normalized)
+            if cls is None:
+                raise ValueError(f"不支持的流式指标: {name}")
+            indicator = cls(**params)
+            for bar in self.history:
+                indicator.update(bar)
+            self.indicators[key] = indicator
+        return indicator
+
+    def values(self, name: str, **params) -> Tuple[Any, Any]:
+        """返回 (上一根已收盘K线的值, 含当前K线的值)"""
+        indicator = self.indicator(name, **params)
+        current = indicator.peek(self.forming) if self.forming is not None else indicator.value
+        return indicator.value, current
+
+    def on_tick(self, price: float, timestamp_ms: int, volume_total: Optional[float] = None):
+        """处理一笔行情：跨周期时收盘当前K线并开启新K线，否则更新当前K线"""
+        volume = 0.0
+        if volume_total is not None:
+            if self._last_volume_total is not None:
+                volume = max(volume_total - self._last_volume_total, 0.0)
+            self._last_volume_total = volume_total
+
+        open_time = timestamp_ms - timestamp_ms % self.interval_ms
+        forming = self.forming
+        if forming is None or open_time > forming.open_time:
+            if forming is not None:
+                self._close(forming)
+            self.forming = Bar(open_time, price, price, price, price, volume)
+        elif open_time == forming.open_time:
+            self.forming = Bar(
+                forming.open_time, forming.open, max(forming.high, price),
+                min(forming.low, price), price, forming.volume + volume
+            )
+        self.last_tick_at = time.time()
+
+
+class StreamingIndicatorService:
+    """流式指标服务：按 (symbol, timeframe) 管理K线流及其上的增量指标"""
+
+    def __init__(self, history_size: int = 500):
+        self.history_size = history_size
+        self.streams: Dict[Tuple[str, Timeframe], BarStream] = {}
+
+    def get_stream(self, symbol: str, timeframe: Timeframe) -> Optional[BarStream]:
+        return self.streams.get((symbol, timeframe))
+
+    def create_stream(self, symbol: str, market_type: MarketType, timeframe: Timeframe,
+                      history: Optional[CandleSeries] = None) -> BarStream:
+        """创建K线流；已存在时直接返回"""
+        key = (symbol, timeframe)
+        stream = self.streams.get(key)
+        if stream is None:
+            stream = BarStream(symbol, market_type, timeframe, self.history_size)
+            if history is not None:
+                stream.seed(CandleSeries.from_klines(history))
+            self.streams[key] = stream
+            logger.info(f"创建流式指标K线流: {symbol} {timeframe.value}")
+        return stream
+
+    def remove_stream(self, symbol: str, timeframe: Timeframe):
+        if self.streams.pop((symbol, timeframe), None) is not None:
+            logger.info(f"移除流式指标K线流: {symbol} {timeframe.value}")
+
+    def on_tickers(self, tickers: Iterable[Dict[str, Any]]):
+        """用实时行情推进所有相关K线流"""
+        by_symbol: Dict[str, List[BarStream]] = {}
+        for stream in self.streams.values():
+            by_symbol.setdefault(stream.symbol, []).append(stream)
+        if not by_symbol:
+            return
+
+        for ticker in tickers:
+            streams = by_symbol.get(ticker.get('symbol'))
+            price = ticker.get('last')
+            if not streams or price is None:
+                continue
+            timestamp = ticker.get('timestamp') or datetime.now()
+            timestamp_ms = int(timestamp.timestamp() * 1000) if isinstance(timestamp, datetime) else int(timestamp)
+            for stream in streams:
+                try:
+                    stream.on_tick(float(price), timestamp_ms, ticker.get('volume'))
+                except Exception as e:
+                    logger.error(f"更新流式指标失败 {stream.symbol}: {e}")
+
+    def missing_symbols(self, covered: Set[str]) -> Dict[MarketType, Set[str]]:
+        """已跟踪但不在本轮行情中的品种，按市场类型分组"""
+        missing: Dict[MarketType, Set[str]] = {}
+        for stream in self.streams.values():
+            if stream.symbol not in covered:
+                missing.setdefault(stream.market_type, set()).add(stream.symbol)
+        return missing
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "streams": len(self.streams),
+            "indicators": sum(len(s.indicators) for s in self.streams.values())
+        }
+
+
+# 全局流式指标服务实例
+streaming_indicator_service = StreamingIndicatorService()
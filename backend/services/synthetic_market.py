@@ -0,0 +1,235 @@
+"""
+合成行情生成器
+
+用几何布朗运动（GBM）按矩阵一次生成多个品种的价格路径，开高低收与成交量相互一致：
+开盘价为上一根收盘价，最高/最低价包住开收盘，成交量随涨跌幅放大。
+给定种子时结果可复现（按品种名派生随机数种子，与进程、调用顺序无关），
+用于数据源全部失败时的模拟数据、基准测试，以及按固定速率回放行情的离线压测。
+"""
+import asyncio
+import logging
+import time
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from models.market_data import CandleSeries, MarketType, Timeframe
+
+logger = logging.getLogger(__name__)
+
+YEAR_MS = 365 * 24 * 3600 * 1000
+
+TIMEFRAME_MS = {
+    Timeframe.M1: 60_000,
+    Timeframe.M5: 300_000,
+    Timeframe.M15: 900_000,
+    Timeframe.M30: 1_800_000,
+    Timeframe.H1: 3_600_000,
+    Timeframe.H4: 14_400_000,
+    Timeframe.D1: 86_400_000,
+    Timeframe.W1: 604_800_000,
+    Timeframe.MN1: 2_592_000_000,
+}
+
+# 常见品种的起始价格（按名称包含关系匹配），其余为 100
+BASE_PRICES = {
+    "BTC": 42567.39, "ETH": 2345.67, "AAPL": 182.45, "MSFT": 345.67, "GOOGL": 2789.12,
+    "AMZN": 3456.78, "TSLA": 245.67, "EUR": 1.0850, "GBP": 1.2650, "JPY": 150.25,
+    "CNY": 7.1987, "AUD": 0.6580,
+}
+
+# 各市场的年化波动率
+VOLATILITY = {
+    MarketType.CRYPTO: 0.8,
+    MarketType.STOCK: 0.3,
+    MarketType.FOREX: 0.1,
+    MarketType.FUTURES: 0.35,
+    MarketType.INDEX: 0.2,
+    MarketType.FUND: 0.15,
+}
+
+
+def base_price_of(symbol: str) -> float:
+    return next((price for key, price in BASE_PRICES.items() if key in symbol), 100.0)
+
+
+def _draw(rng: Union[np.random.Generator, Sequence[np.random.Generator]],
+          shape: tuple) -> tuple:
+    """GBM 所需的随机数：价格冲击、上下影线、成交量噪声
+
+    rng 为生成器列表时每个品种（行）使用各自的生成器，单个品种的路径与同批的其他品种无关。
+    """
+    if isinstance(rng, np.random.Generator):
+        return (rng.standard_normal(shape),
+                rng.standard_exponential((2,) + shape, dtype=np.float32),
+                rng.standard_normal(shape, dtype=np.float32))
+    n_bars = shape[1]
+    rows = [
+        (g.standard_normal(n_bars),
+         g.standard_exponential((2, n_bars), dtype=np.float32),
+         g.standard_normal(n_bars, dtype=np.float32))
+        for g in rng
+    ]
+    return (np.stack([row[0] for row in rows]).reshape(shape),
+            np.stack([row[1] for row in rows], axis=1).reshape((2,) + shape),
+            np.stack([row[2] for row in rows]).reshape(shape))
+
+
+def gbm_ohlcv(rng: Union[np.random.Generator, Sequence[np.random.Generator]], start_prices: np.ndarray,
+              n_bars: int, dt: float, drift: float, volatility: float, base_volume: float) -> Dict[str, np.ndarray]:
+    """生成 (品种数, 根数) 的 OHLCV 矩阵
+
+    dt 为每根K线的年化时长；收盘价服从 GBM，最高/最低价在开收盘之外按同量级的波动延伸。
+    rng 可以是单个生成器，也可以是每个品种一个生成器的列表。
+    """
+    shape = (len(start_prices), n_bars)
+    step_sigma = volatility * np.sqrt(dt)
+    shocks, wicks, noise = _draw(rng, shape)
+    log_returns = shocks * step_sigma
+    log_returns += (drift - 0.5 * volatility ** 2) * dt
+    close = np.exp(np.cumsum(log_returns, axis=1))
+    close *= start_prices[:, None]
+    open_ = np.empty_like(close)
+    open_[:, 0] = start_prices
+    open_[:, 1:] = close[:, :-1]
+    # 影线与成交量噪声不影响路径，用 float32 抽样以减少开销
+    wicks *= 0.5 * step_sigma
+    high = np.maximum(open_, close) * np.exp(wicks[0])
+    low = np.minimum(open_, close) * np.exp(-wicks[1])
+    # 成交量：对数正态噪声，并随本根涨跌幅放大
+    noise *= 0.3
+    volume = np.exp(noise) * (1.0 + np.abs(shocks))
+    volume *= base_volume
+    return {"open": open_, "high": high, "low": low, "close": close, "volume": volume}
+
+
+class SyntheticMarket:
+    """可复现的合成行情"""
+
+    def __init__(self, seed: Optional[int] = None, drift: float = 0.0):
+        self.seed = seed
+        self.drift = drift
+        self._session_rng = np.random.default_rng(seed)
+        # 实时模拟行情的状态：品种 -> [开盘价, 最新价, 上次更新时间(ms)]
+        self._live: Dict[str, List[float]] = {}
+
+    def _rngs(self, symbols: Sequence[str],
+              *keys: str) -> Union[np.random.Generator, List[np.random.Generator]]:
+        """未指定种子时使用同一个随机源；指定种子时每个品种一个按品种名派生的生成器，
+        同一品种单独生成或与任意其他品种一起生成时路径相同，与调用顺序无关"""
+        if self.seed is None:
+            return self._session_rng
+        prefix = [self.seed] + [zlib.crc32(k.encode("utf-8")) for k in keys]
+        return [np.random.default_rng(prefix + [zlib.crc32(s.encode("utf-8"))]) for s in symbols]
+
+    @staticmethod
+    def _timestamps(n_bars: int, interval_ms: int, end: Optional[datetime]) -> np.ndarray:
+        end_ms = int((end or datetime.now()).timestamp() * 1000)
+        last = end_ms - end_ms % interval_ms
+        return last - interval_ms * np.arange(n_bars - 1, -1, -1, dtype=np.int64)
+
+    def candles(self, symbol: str, market_type: MarketType, exchange: str, timeframe: Timeframe,
+                limit: int, end: Optional[datetime] = None, base_price: Optional[float] = None,
+                volatility: Optional[float] = None, base_volume: float = 5000.0) -> CandleSeries:
+        """单个品种最近 limit 根K线（时间升序，对齐到周期边界）"""
+        return self.candles_batch([symbol], market_type, exchange, timeframe, limit, end,
+                                  base_price, volatility, base_volume)[symbol]
+
+    def candles_batch(self, symbols: Sequence[str], market_type: MarketType, exchange: str,
+                      timeframe: Timeframe, limit: int, end: Optional[datetime] = None,
+                      base_price: Optional[float] = None, volatility: Optional[float] = None,
+                      base_volume: float = 5000.0) -> Dict[str, CandleSeries]:
+        """多个品种的K线，一次矩阵运算生成"""
+        interval_ms = TIMEFRAME_MS.get(timeframe, 3_600_000)
+        timestamps = self._timestamps(limit, interval_ms, end)
+        start_prices = np.array([base_price or base_price_of(s) for s in symbols], dtype=np.float64)
+        rng = self._rngs(symbols, market_type.value, timeframe.value)
+        data = gbm_ohlcv(rng, start_prices, limit, interval_ms / YEAR_MS, self.drift,
+                         volatility or VOLATILITY.get(market_type, 0.3), base_volume)
+        return {
+            symbol: CandleSeries(symbol, market_type, exchange, timeframe, timestamps,
+                                 **{name: values[i] for name, values in data.items()}, is_mock=True)
+            for i, symbol in enumerate(symbols)
+        }
+
+    def tickers(self, symbols: Sequence[str], market_type: Optional[MarketType] = None,
+                now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """实时模拟行情：每个品种沿各自的 GBM 路径从上次的价格继续走，涨跌相对首次报价计算"""
+        now_ms = int((time.time() if now is None else now) * 1000)
+        volatility = VOLATILITY.get(market_type, 0.3) if market_type else 0.5
+        state = np.array([self._live.get(s) or [base_price_of(s), base_price_of(s), now_ms] for s in symbols],
+                         dtype=np.float64).reshape(len(symbols), 3)
+        dt = np.maximum(now_ms - state[:, 2], 1000.0) / YEAR_MS
+        # 连续调用需要沿同一路径前进，使用会话随机源（指定种子时整个序列可复现）
+        rng = self._session_rng
+        shocks = rng.standard_normal(len(symbols))
+        last = state[:, 1] * np.exp((self.drift - 0.5 * volatility ** 2) * dt + volatility * np.sqrt(dt) * shocks)
+        span = np.abs(rng.standard_normal((2, len(symbols)))) * volatility * np.sqrt(dt) * state[:, 0]
+        volume = 5000.0 * np.exp(0.5 * rng.standard_normal(len(symbols))) * 100
+        timestamp = datetime.fromtimestamp(now_ms / 1000)
+
+        tickers = []
+        for i, symbol in enumerate(symbols):
+            open_price = float(state[i, 0])
+            price = float(last[i])
+            self._live[symbol] = [open_price, price, now_ms]
+            tickers.append({
+                'symbol': symbol,
+                'last': round(price, 4),
+                'open': round(open_price, 4),
+                'high': round(max(open_price, price) + float(span[0, i]), 4),
+                'low': round(min(open_price, price) - float(span[1, i]), 4),
+                'close': round(price, 4),
+                'volume': round(float(volume[i]), 2),
+                'timestamp': timestamp,
+                'change': round(price - open_price, 4),
+                'change_percent': round((price / open_price - 1) * 100, 2),
+            })
+        return tickers
+
+    async def replay(self, symbols: Sequence[str], ticks_per_second: float = 10.0,
+                     max_ticks: Optional[int] = None, market_type: MarketType = MarketType.CRYPTO,
+                     volatility: Optional[float] = None, chunk: int = 1024) -> AsyncIterator[List[Dict[str, Any]]]:
+        """按固定速率回放行情，每次产出所有品种的一批 tick（路径按块预先生成）
+
+        按绝对时间表调度，处理较慢时不会累积漂移；max_ticks 为批次数，为空时持续产出。
+        """
+        interval = 1.0 / ticks_per_second
+        dt = interval * 1000 / YEAR_MS
+        volatility = volatility or VOLATILITY.get(market_type, 0.3)
+        rng = self._rngs(symbols, "replay", market_type.value)
+        prices = np.array([base_price_of(s) for s in symbols], dtype=np.float64)
+        opens = prices.copy()
+        loop = asyncio.get_running_loop()
+        next_at = loop.time()
+        emitted = 0
+
+        while max_ticks is None or emitted < max_ticks:
+            steps = chunk if max_ticks is None else min(chunk, max_ticks - emitted)
+            block = gbm_ohlcv(rng, prices, steps, dt, self.drift, volatility, 100.0)
+            closes, volumes = block["close"], block["volume"]
+            prices = closes[:, -1]
+            for j in range(steps):
+                delay = next_at - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                next_at += interval
+                timestamp = datetime.now()
+                yield [
+                    {
+                        'symbol': symbol,
+                        'last': float(closes[i, j]),
+                        'volume': float(volumes[i, j]),
+                        'change': float(closes[i, j] - opens[i]),
+                        'change_percent': float((closes[i, j] / opens[i] - 1) * 100),
+                        'timestamp': timestamp,
+                    }
+                    for i, symbol in enumerate(symbols)
+                ]
+                emitted += 1
+
+
+# 全局合成行情实例（模拟数据使用）
+synthetic_market = SyntheticMarket()
@@ -2,196 +2,72 @@ import logging
 from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
 from models.market_data import KlineData
+from . import extrema, indicator_engine
+from .indicator_engine import to_optional_list
 
 logger = logging.getLogger(__name__)
 
+
+def batch_result_keys(indicators: List[Dict[str, Any]]) -> List[str]:
+    """批量计算各指标的结果键，结果键重复时抛出 ValueError（否则后面的结果会覆盖前面的）
+
+    未指定 id 时结果键为 名称_参数值，名称转大写、空格替换为下划线，如 BOLLINGER_BANDS_20_2。
+    """
+    keys = [
+        spec.get("id") or "_".join([spec.get("name", "").upper().replace(" ", "_")]
+                                   + [str(v) for v in (spec.get("params") or {}).values()])
+        for spec in indicators
+    ]
+    duplicates = sorted({key for key in keys if keys.count(key) > 1})
+    if duplicates:
+        raise ValueError(f"指标结果键重复: {', '.join(duplicates)}，请为重复的指标指定不同的 id")
+    return keys
+
+
 class TechnicalAnalysisService:
     def __init__(self):
         pass
     
     def calculate_sma(self, prices: List[float], period: int) -> List[Optional[float]]:
-        """计算简单移动平均线 - 优化版本使用numpy"""
-        if len(prices) < period:
-            return [None] * len(prices)
-        
-        # 使用numpy进行向量化计算以提高性能
-        prices_array = np.array(prices)
-        sma_values = [None] * (period - 1)
-        
-        for i in range(period - 1, len(prices_array)):
-            window = prices_array[i-period+1:i+1]
-            sma = np.mean(window)
-            sma_values.append(float(sma))
-        
-        return sma_values
+        """计算简单移动平均线"""
+        return to_optional_list(indicator_engine.sma(prices, period))
     
     def calculate_ema(self, prices: List[float], period: int) -> List[Optional[float]]:
         """计算指数移动平均线"""
-        if len(prices) < period:
-            return [None] * len(prices)
-        
-        ema_values = [None] * (period - 1)
-        multiplier = 2 / (period + 1)
-        
-        # 第一个EMA是前period个值的SMA
-        first_ema = sum(prices[:period]) / period
-        ema_values.append(first_ema)
-        
-        for i in range(period, len(prices)):
-            ema = (prices[i] - ema_values[-1]) * multiplier + ema_values[-1]
-            ema_values.append(ema)
-        
-        return ema_values
+        return to_optional_list(indicator_engine.ema(prices, period))
     
     def calculate_macd(self, prices: List[float], 
                       fast_period: int = 12, 
                       slow_period: int = 26, 
                       signal_period: int = 9) -> Dict[str, List[Optional[float]]]:
         """计算MACD指标"""
-        if len(prices) < slow_period + signal_period:
-            return {
-                "macd": [None] * len(prices),
-                "signal": [None] * len(prices),
-                "histogram": [None] * len(prices)
-            }
-        
-        # 计算EMA
-        ema_fast = self.calculate_ema(prices, fast_period)
-        ema_slow = self.calculate_ema(prices, slow_period)
-        
-        # 计算MACD线
-        macd_line = []
-        for i in range(len(prices)):
-            if ema_fast[i] is None or ema_slow[i] is None:
-                macd_line.append(None)
-            else:
-                macd_line.append(ema_fast[i] - ema_slow[i])
-        
-        # 计算信号线 (MACD的EMA)
-        signal_line = self.calculate_ema(
-            [x if x is not None else 0 for x in macd_line], 
-            signal_period
+        macd_line, signal_line, histogram = indicator_engine.macd(
+            prices, fast_period, slow_period, signal_period
         )
-        
-        # 计算柱状图
-        histogram = []
-        for i in range(len(prices)):
-            if macd_line[i] is None or signal_line[i] is None:
-                histogram.append(None)
-            else:
-                histogram.append(macd_line[i] - signal_line[i])
-        
         return {
-            "macd": macd_line,
-            "signal": signal_line,
-            "histogram": histogram
+            "macd": to_optional_list(macd_line),
+            "signal": to_optional_list(signal_line),
+            "histogram": to_optional_list(histogram)
         }
     
     def calculate_rsi(self, prices: List[float], period: int = 14) -> List[Optional[float]]:
         """计算RSI指标"""
-        if len(prices) <= period:
-            return [None] * len(prices)
-        
-        # 计算价格变化
-        changes = [prices[i] - prices[i-1] for i in range(1, len(prices))]
-        
-        gains = [max(change, 0) for change in changes]
-        losses = [max(-change, 0) for change in changes]
-        
-        rsi_values = [None] * period
-        
-        # 计算初始平均值
-        avg_gain = sum(gains[:period]) / period
-        avg_loss = sum(losses[:period]) / period
-        
-        if avg_loss == 0:
-            rsi = 100
-        else:
-            rs = avg_gain / avg_loss
-            rsi = 100 - (100 / (1 + rs))
-        
-        rsi_values.append(rsi)
-        
-        # 计算后续RSI值
-        for i in range(period, len(changes)):
-            avg_gain = (avg_gain * (period - 1) + gains[i]) / period
-            avg_loss = (avg_loss * (period - 1) + losses[i]) / period
-            
-            if avg_loss == 0:
-                rsi = 100
-            else:
-                rs = avg_gain / avg_loss
-                rsi = 100 - (100 / (1 + rs))
-            
-            rsi_values.append(rsi)
-        
-        # 在前面添加None以匹配原始价格数组长度
-        rsi_values = [None] + rsi_values
-        
-        return rsi_values
+        return to_optional_list(indicator_engine.rsi(prices, period))
     
     def calculate_bollinger_bands(self, prices: List[float], period: int = 20, 
                                  std_dev: float = 2) -> Dict[str, List[Optional[float]]]:
         """计算布林带"""
-        if len(prices) < period:
-            return {
-                "upper": [None] * len(prices),
-                "middle": [None] * len(prices),
-                "lower": [None] * len(prices)
-            }
-        
-        upper_band = []
-        middle_band = []
-        lower_band = []
-        
-        for i in range(len(prices)):
-            if i < period - 1:
-                upper_band.append(None)
-                middle_band.append(None)
-                lower_band.append(None)
-            else:
-                window = prices[i-period+1:i+1]
-                sma = sum(window) / period
-                std = np.std(window)
-                
-                middle_band.append(sma)
-                upper_band.append(sma + std_dev * std)
-                lower_band.append(sma - std_dev * std)
-        
+        upper, middle, lower = indicator_engine.bollinger_bands(prices, period, std_dev)
         return {
-            "upper": upper_band,
-            "middle": middle_band,
-            "lower": lower_band
+            "upper": to_optional_list(upper),
+            "middle": to_optional_list(middle),
+            "lower": to_optional_list(lower)
         }
     
     def calculate_atr(self, high_prices: List[float], low_prices: List[float], 
                      close_prices: List[float], period: int = 14) -> List[Optional[float]]:
         """计算平均真实波幅(ATR)"""
-        if len(high_prices) < period + 1:
-            return [None] * len(high_prices)
-        
-        # 计算真实波幅(TR)
-        tr_values = []
-        for i in range(1, len(high_prices)):
-            tr1 = high_prices[i] - low_prices[i]
-            tr2 = abs(high_prices[i] - close_prices[i-1])
-            tr3 = abs(low_prices[i] - close_prices[i-1])
-            tr = max(tr1, tr2, tr3)
-            tr_values.append(tr)
-        
-        # 计算ATR
-        atr_values = [None] * period
-        atr = sum(tr_values[:period]) / period
-        atr_values.append(atr)
-        
-        for i in range(period, len(tr_values)):
-            atr = (atr * (period - 1) + tr_values[i]) / period
-            atr_values.append(atr)
-        
-        # 在前面添加None以匹配原始数组长度
-        atr_values = [None] + atr_values
-        
-        return atr_values
+        return to_optional_list(indicator_engine.atr(high_prices, low_prices, close_prices, period))
     
     def detect_golden_cross(self, short_ma: List[Optional[float]], 
                            long_ma: List[Optional[float]]) -> List[bool]:
@@ -223,84 +99,22 @@ class TechnicalAnalysisService:
                            close_prices: List[float], k_period: int = 14, 
                            d_period: int = 3) -> Dict[str, List[Optional[float]]]:
         """计算随机指标(Stochastic Oscillator)"""
-        if len(high_prices) < k_period:
-            return {
-                "k": [None] * len(high_prices),
-                "d": [None] * len(high_prices)
-            }
-        
-        k_values = [None] * (k_period - 1)
-        d_values = [None] * (k_period - 1)
-        
-        for i in range(k_period - 1, len(high_prices)):
-            # 计算%K
-            highest_high = max(high_prices[i-k_period+1:i+1])
-            lowest_low = min(low_prices[i-k_period+1:i+1])
-            
-            if highest_high == lowest_low:
-                k_value = 50.0  # 避免除以零
-            else:
-                k_value = ((close_prices[i] - lowest_low) / (highest_high - lowest_low)) * 100
-            k_values.append(k_value)
-        
-        # 计算%D (%K的SMA)
-        for i in range(len(k_values)):
-            if k_values[i] is None:
-                d_values.append(None)
-            elif i < k_period + d_period - 2:
-                d_values.append(None)
-            else:
-                d_window = k_values[i-d_period+1:i+1]
-                d_value = sum(d_window) / d_period
-                d_values.append(d_value)
-        
+        k_values, d_values = indicator_engine.stochastic(
+            high_prices, low_prices, close_prices, k_period, d_period
+        )
         return {
-            "k": k_values,
-            "d": d_values
+            "k": to_optional_list(k_values),
+            "d": to_optional_list(d_values)
         }
 
     def calculate_cci(self, high_prices: List[float], low_prices: List[float], 
                      close_prices: List[float], period: int = 20) -> List[Optional[float]]:
         """计算商品通道指数(CCI)"""
-        if len(high_prices) < period:
-            return [None] * len(high_prices)
-        
-        cci_values = [None] * (period - 1)
-        
-        for i in range(period - 1, len(high_prices)):
-            # 计算典型价格
-            typical_prices = [(high_prices[j] + low_prices[j] + close_prices[j]) / 3 
-                             for j in range(i-period+1, i+1)]
-            
-            # 计算简单移动平均
-            sma = sum(typical_prices) / period
-            
-            # 计算平均偏差
-            mean_deviation = sum(abs(tp - sma) for tp in typical_prices) / period
-            
-            # 计算CCI
-            current_tp = (high_prices[i] + low_prices[i] + close_prices[i]) / 3
-            if mean_deviation == 0:
-                cci = 0.0
-            else:
-                cci = (current_tp - sma) / (0.015 * mean_deviation)
-            
-            cci_values.append(cci)
-        
-        return cci_values
+        return to_optional_list(indicator_engine.cci(high_prices, low_prices, close_prices, period))
 
     def calculate_momentum(self, prices: List[float], period: int = 10) -> List[Optional[float]]:
         """计算动量指标"""
-        if len(prices) < period:
-            return [None] * len(prices)
-        
-        momentum_values = [None] * period
-        
-        for i in range(period, len(prices)):
-            momentum = prices[i] - prices[i-period]
-            momentum_values.append(momentum)
-        
-        return momentum_values
+        return to_optional_list(indicator_engine.momentum(prices, period))
 
     def calculate_volume_profile(self, prices: List[float], volumes: List[float], 
                                 price_levels: int = 20) -> Dict[str, List[float]]:
@@ -337,21 +151,11 @@ class TechnicalAnalysisService:
         if len(prices) < window * 2:
             return {"support": [], "resistance": []}
         
-        support_levels = []
-        resistance_levels = []
-        
-        for i in range(window, len(prices) - window):
-            # 检查是否为局部最小值（支撑）
-            if all(prices[i] <= prices[j] for j in range(i-window, i+window+1) if j != i):
-                support_levels.append(prices[i])
-            
-            # 检查是否为局部最大值（阻力）
-            if all(prices[i] >= prices[j] for j in range(i-window, i+window+1) if j != i):
-                resistance_levels.append(prices[i])
-        
+        # 局部最小值为支撑，局部最大值为阻力（前后 window 根内的极值，按位置先后排列）
+        values = indicator_engine.as_array(prices)
         return {
-            "support": support_levels,
-            "resistance": resistance_levels
+            "support": values[extrema.valley_mask(values, window)].tolist(),
+            "resistance": values[extrema.peak_mask(values, window)].tolist()
         }
 
     def calculate_vwap(self, high_prices: List[float], low_prices: List[float], 
@@ -360,24 +164,42 @@ class TechnicalAnalysisService:
         if len(high_prices) == 0:
             return [None]
         
-        vwap_values = []
-        cumulative_volume = 0.0
-        cumulative_price_volume = 0.0
-        
-        for i in range(len(high_prices)):
-            # 典型价格
-            typical_price = (high_prices[i] + low_prices[i] + close_prices[i]) / 3
+        return to_optional_list(indicator_engine.vwap(high_prices, low_prices, close_prices, volumes))
+
+    def calculate_batch(self, sources: Dict[str, Any],
+                        indicators: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        批量计算多个指标，共享中间结果（EMA、前缀和、真实波幅等）只计算一次
+        
+        Args:
+            sources: 价格序列，键为 open/high/low/close/volume，至少包含 close
+            indicators: 指标定义列表，每项包含 name、可选 params 与结果键 id
+                （未指定 id 时结果键见 batch_result_keys，结果键重复时抛出 ValueError）
             
-            cumulative_price_volume += typical_price * volumes[i]
-            cumulative_volume += volumes[i]
+        Returns:
+            {"results": {id: 指标结果}, "graph": 计算图统计}
+        """
+        keys = batch_result_keys(indicators)
+        graph = indicator_engine.IndicatorGraph(**sources)
+        results: Dict[str, Any] = {}
+        
+        for key, spec in zip(keys, indicators):
+            name = spec.get("name", "")
+            builder = indicator_engine.BATCH_INDICATORS.get(indicator_engine.normalize_indicator_name(name))
+            if builder is None:
+                raise ValueError(f"不支持的技术指标: {name}")
+            params = spec.get("params") or {}
+            try:
+                value = builder(graph, **params)
+            except TypeError as e:
+                raise ValueError(f"指标 {name} 参数错误: {e}")
             
-            if cumulative_volume == 0:
-                vwap_values.append(None)
+            if isinstance(value, dict):
+                results[key] = {field: to_optional_list(series) for field, series in value.items()}
             else:
-                vwap = cumulative_price_volume / cumulative_volume
-                vwap_values.append(vwap)
+                results[key] = to_optional_list(value)
         
-        return vwap_values
+        return {"results": results, "graph": graph.stats}
 
 
 # 全局技术分析服务实例
@@ -0,0 +1,291 @@
+"""
+向量化信号回测引擎
+
+内置模板都是交叉/阈值规则，不需要逐K线回调：入场、出场信号直接算成布尔数组，
+持仓由信号前向填充得到，权益、手续费、交易、回撤和夏普比率全部用数组运算完成，
+输出与 backtest_strategies.run_backtest 相同结构的结果字典。
+
+撮合规则与模板一致：只做多、满仓；第 t 根K线收盘产生信号，第 t+1 根开盘成交；
+每次开仓和平仓按成交额收取 commission 比例的手续费；回测结束时未平仓的持仓按最后
+收盘价结算。持仓数量按资金可分割计算（不取整到整股）。
+统计指标的口径与 backtesting 库相同（按日收益几何平均年化）。
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .indicator_engine import bollinger_bands, sma
+
+# 可选的回测引擎：backtesting（逐K线事件驱动，支持任意策略）、vectorized（内置模板）
+ENGINES = ("backtesting", "vectorized")
+
+# 权益曲线的最大采样点数
+EQUITY_CURVE_POINTS = 100
+
+DAY_NS = 86_400_000_000_000
+
+
+def _cached(cache: Optional[Dict[tuple, np.ndarray]], key: tuple, compute: Callable[[], np.ndarray]) -> np.ndarray:
+    """参数扫描时按 key 复用指标数组"""
+    if cache is None:
+        return compute()
+    value = cache.get(key)
+    if value is None:
+        value = cache[key] = compute()
+    return value
+
+
+def _crossover(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """a 在第 t 根上穿 b（前一根 a < b，当前 a > b）"""
+    out = np.zeros(len(a), dtype=bool)
+    with np.errstate(invalid="ignore"):
+        out[1:] = (a[:-1] < b[:-1]) & (a[1:] > b[1:])
+    return out
+
+
+def simple_rsi(close: np.ndarray, period: int) -> np.ndarray:
+    """涨跌幅简单移动平均的RSI（与模板的 MovingAverageType.Simple 一致）"""
+    delta = np.diff(close, prepend=np.nan)
+    gain = sma(np.where(delta > 0, delta, 0.0), period)
+    loss = sma(np.where(delta < 0, -delta, 0.0), period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 100 - 100 / (1 + gain / loss)
+
+
+def ma_crossover_signals(close: np.ndarray, parameters: Dict[str, Any],
+                         cache: Optional[Dict[tuple, np.ndarray]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """快线上穿慢线买入，下穿卖出"""
+    fast_period = parameters.get('fast_period', 10)
+    slow_period = parameters.get('slow_period', 30)
+    fast = _cached(cache, ("sma", fast_period), lambda: sma(close, fast_period))
+    slow = _cached(cache, ("sma", slow_period), lambda: sma(close, slow_period))
+    return _crossover(fast, slow), _crossover(slow, fast)
+
+
+def rsi_signals(close: np.ndarray, parameters: Dict[str, Any],
+                cache: Optional[Dict[tuple, np.ndarray]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """RSI 低于超卖线买入，高于超买线卖出"""
+    period = parameters.get('rsi_period', 14)
+    rsi = _cached(cache, ("rsi", period), lambda: simple_rsi(close, period))
+    with np.errstate(invalid="ignore"):
+        return rsi < parameters.get('oversold', 30), rsi > parameters.get('overbought', 70)
+
+
+def mean_reversion_signals(close: np.ndarray, parameters: Dict[str, Any],
+                           cache: Optional[Dict[tuple, np.ndarray]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """收盘价跌破布林下轨买入，突破上轨卖出"""
+    period = parameters.get('bb_period', 20)
+    std_dev = parameters.get('std_dev', 2.0)
+    upper, _, lower = _cached(cache, ("bollinger", period, std_dev),
+                              lambda: np.vstack(bollinger_bands(close, period, std_dev)))
+    with np.errstate(invalid="ignore"):
+        return close < lower, close > upper
+
+
+# 策略ID -> 信号生成函数
+VECTORIZED_STRATEGIES: Dict[str, Callable[..., Tuple[np.ndarray, np.ndarray]]] = {
+    "moving_average_crossover": ma_crossover_signals,
+    "rsi_strategy": rsi_signals,
+    "mean_reversion": mean_reversion_signals,
+}
+
+
+def positions_from_signals(entries: np.ndarray, exits: np.ndarray) -> np.ndarray:
+    """信号前向填充为每根K线收盘后的目标持仓（1 持有，0 空仓）"""
+    n = len(entries)
+    marks = np.where(entries, 1.0, np.where(exits, 0.0, np.nan))
+    last = np.where(~np.isnan(marks), np.arange(n), -1)
+    np.maximum.accumulate(last, out=last)
+    return np.where(last >= 0, marks[np.maximum(last, 0)], 0.0)
+
+
+def simulate(open_: np.ndarray, close: np.ndarray, entries: np.ndarray, exits: np.ndarray,
+             initial_capital: float, commission: float = .002) -> Dict[str, np.ndarray]:
+    """按信号模拟权益曲线与交易（信号次根开盘成交）
+
+    每笔交易以开仓前的全部权益买入，手续费从现金中扣除；交易结束后的权益为
+    投入资金 × (卖价/买价 × (1 - c) - c)，逐笔连乘即得各笔交易的投入资金。
+    """
+    n = len(close)
+    held = np.zeros(n, dtype=bool)
+    held[1:] = positions_from_signals(entries, exits)[:-1] > 0
+    before = np.zeros(n, dtype=bool)
+    before[1:] = held[:-1]
+    entering = held & ~before
+    leaving = ~held & before
+
+    entry_bars = np.flatnonzero(entering)
+    exit_bars = np.flatnonzero(leaving)
+    exit_prices = open_[exit_bars]
+    if len(exit_bars) < len(entry_bars):
+        # 未平仓的持仓按最后收盘价结算
+        exit_bars = np.append(exit_bars, n - 1)
+        exit_prices = np.append(exit_prices, close[-1])
+    entry_prices = open_[entry_bars]
+
+    growth = exit_prices / entry_prices * (1 - commission) - commission
+    after = initial_capital * np.cumprod(growth)
+    invested = np.concatenate([[initial_capital], after[:-1]])
+
+    # 空仓时权益为最近一笔已平仓交易后的资金，持仓时为持仓市值减去开仓手续费
+    closed = np.cumsum(leaving)
+    equity = np.where(closed > 0, after[np.maximum(closed - 1, 0)] if len(after) else initial_capital,
+                      initial_capital).astype(np.float64)
+    trade = np.cumsum(entering) - 1
+    holding = np.flatnonzero(held)
+    equity[holding] = invested[trade[holding]] * (close[holding] / entry_prices[trade[holding]] - commission)
+    if n and held[-1]:
+        equity[-1] = after[-1]
+
+    return {
+        "equity": equity,
+        "held": held,
+        "entry_bars": entry_bars,
+        "exit_bars": exit_bars,
+        "entry_prices": entry_prices,
+        "exit_prices": exit_prices,
+        "quantities": invested / entry_prices,
+        "pnl": after - invested,
+        "trade_returns": growth - 1,
+    }
+
+
+def _day_returns(equity: np.ndarray, index: pd.DatetimeIndex) -> Tuple[np.ndarray, int]:
+    """按自然日（周线/月线/年线数据按对应周期）取最后权益的收益率，以及年化天数
+
+    年化天数与重采样周期的判定与 backtesting 库相同；日内和日线数据直接按整数日期分组。
+    """
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    nanos = index.asi8
+    days = nanos // DAY_NS
+    freq_days = int(np.median(np.diff(nanos)) // DAY_NS) if len(nanos) > 1 else 1
+    periodic = {7: (52, "W"), 31: (12, "ME"), 365: (1, "YE")}.get(freq_days)
+    if periodic is not None:
+        annual_days, freq = periodic
+        values = pd.Series(equity, index=index).resample(freq).last().dropna().to_numpy()
+    else:
+        # 1970-01-01 是星期四
+        have_weekends = (((days + 3) % 7) >= 5).mean() > 2 / 7 * .6
+        annual_days = 365 if have_weekends else 252
+        values = equity[np.flatnonzero(np.diff(days, append=days[-1] + 1 if len(days) else 0))]
+    return values[1:] / values[:-1] - 1, annual_days
+
+
+def _optional(value: float) -> Optional[float]:
+    value = float(value)
+    return None if np.isnan(value) or np.isinf(value) else value
+
+
+def compute_statistics(simulation: Dict[str, np.ndarray], index: pd.DatetimeIndex,
+                       close: np.ndarray) -> Dict[str, Any]:
+    """回测统计指标（字段与 backtest_strategies.extract_statistics 相同，无法计算的为 None）"""
+    equity = simulation["equity"]
+    trade_returns = simulation["trade_returns"]
+
+    drawdown = 1 - equity / np.maximum.accumulate(equity)
+    max_drawdown = float(np.nan_to_num(drawdown.max()))
+
+    day_returns, annual_days = _day_returns(equity, index)
+    gmean = np.exp(np.log1p(day_returns).mean()) - 1 if len(day_returns) and (day_returns > -1).all() else 0.0
+    annual_return = (1 + gmean) ** annual_days - 1
+    variance = day_returns.var(ddof=1) if len(day_returns) > 1 else np.nan
+    volatility = np.sqrt((variance + (1 + gmean) ** 2) ** annual_days - (1 + gmean) ** (2 * annual_days))
+
+    total_return = (equity[-1] / equity[0] - 1) * 100 if len(equity) else 0.0
+    buy_hold_return = (close[-1] / close[0] - 1) * 100 if len(close) else 0.0
+    beta = np.nan
+    if len(equity) > 2:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            equity_log = np.log(equity[1:] / equity[:-1])
+            market_log = np.log(close[1:] / close[:-1])
+            cov = np.cov(equity_log, market_log)
+            beta = cov[0, 1] / cov[1, 1]
+
+    wins = trade_returns[trade_returns > 0].sum()
+    losses = -trade_returns[trade_returns < 0].sum()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {
+            "total_return": _optional(total_return),
+            "annual_return": _optional(annual_return * 100),
+            "sharpe_ratio": _optional(annual_return / volatility if volatility else np.nan),
+            "max_drawdown": _optional(-max_drawdown * 100),
+            "win_rate": _optional((trade_returns > 0).mean() * 100 if len(trade_returns) else np.nan),
+            "total_trades": int(len(trade_returns)),
+            "profit_factor": _optional(wins / losses if losses else np.nan),
+            "calmar_ratio": _optional(annual_return / max_drawdown if max_drawdown else np.nan),
+            "alpha": _optional(total_return - beta * buy_hold_return),
+            "beta": _optional(beta),
+            "volatility": _optional(volatility * 100)
+        }
+
+
+def sample_equity_curve(equity: np.ndarray, index: pd.DatetimeIndex, initial_capital: float) -> List[Dict[str, Any]]:
+    """等间隔采样权益曲线（最多约 EQUITY_CURVE_POINTS 个点）"""
+    positions = np.arange(0, len(equity), max(1, len(equity) // EQUITY_CURVE_POINTS))
+    values = equity[positions]
+    returns = np.round((values / initial_capital - 1) * 100, 2)
+    returns[positions == 0] = 0
+    dates = index[positions].strftime("%Y-%m-%d")
+    return [
+        {"date": date, "equity": round(float(value), 2), "return": float(ret)}
+        for date, value, ret in zip(dates, values, returns)
+    ]
+
+
+def _trades(simulation: Dict[str, np.ndarray], index: pd.DatetimeIndex) -> List[Dict[str, Any]]:
+    dates = index[simulation["entry_bars"]].strftime("%Y-%m-%d")
+    return [
+        {
+            "id": f"trade_{i}",
+            "date": date,
+            "direction": "BUY",
+            "quantity": float(quantity),
+            "entry_price": float(entry_price),
+            "exit_price": float(exit_price),
+            "profit_loss": float(pnl),
+            "return_pct": float(ret)
+        }
+        for i, (date, quantity, entry_price, exit_price, pnl, ret) in enumerate(zip(
+            dates, simulation["quantities"], simulation["entry_prices"], simulation["exit_prices"],
+            simulation["pnl"], simulation["trade_returns"]))
+    ]
+
+
+def backtest_signals(strategy_id: str, parameters: Dict[str, Any], data: pd.DataFrame,
+                     initial_capital: float, commission: float = .002,
+                     cache: Optional[Dict[tuple, np.ndarray]] = None,
+                     window: Optional[Tuple[int, int]] = None) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """生成信号并模拟，返回 (模拟结果数组, 统计指标)
+
+    window=(start, end) 时只模拟这一段K线（空仓开始）。指标只依赖当前及之前的K线，
+    信号在整段数据上计算一次后截取，窗口开头不需要重新预热。
+    """
+    signals = VECTORIZED_STRATEGIES.get(strategy_id)
+    if signals is None:
+        raise ValueError(f"向量化引擎不支持的策略: {strategy_id}")
+    open_ = data["Open"].to_numpy(dtype=np.float64)
+    close = data["Close"].to_numpy(dtype=np.float64)
+    entries, exits = signals(close, parameters or {}, cache)
+    index = pd.DatetimeIndex(data.index)
+    if window is not None:
+        part = slice(*window)
+        open_, close, entries, exits, index = open_[part], close[part], entries[part], exits[part], index[part]
+    simulation = simulate(open_, close, entries, exits, initial_capital, commission)
+    return simulation, compute_statistics(simulation, index, close)
+
+
+def run_vectorized_backtest(strategy_id: str, parameters: Dict[str, Any], data: pd.DataFrame,
+                            initial_capital: float, commission: float = .002,
+                            report: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """向量化回测（在工作进程中调用），返回结构与 run_backtest 相同"""
+    report = report or (lambda text: None)
+    report(f"向量化引擎运行策略 {strategy_id}，共 {len(data)} 根K线")
+    simulation, statistics = backtest_signals(strategy_id, parameters, data, initial_capital, commission)
+    index = pd.DatetimeIndex(data.index)
+    return {
+        "statistics": statistics,
+        "equity_curve": sample_equity_curve(simulation["equity"], index, initial_capital),
+        "trades": _trades(simulation, index)
+    }
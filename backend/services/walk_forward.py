@@ -0,0 +1,82 @@
+"""
+前向滚动分析（walk-forward）
+
+把K线切成滚动的训练/测试窗口：每个窗口在训练段上对参数网格寻优，用最优参数回测紧随其后的
+测试段，各测试段的权益拼接成一条样本外权益曲线。窗口在工作进程中执行（与参数扫描共用进程池），
+数据通过共享内存挂载，同一批窗口共享指标缓存。
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .backtest_strategies import attach_frame, evaluate
+
+
+def walk_forward_windows(rows: int, train_bars: int, test_bars: int,
+                         anchored: bool = False) -> List[Tuple[int, int, int]]:
+    """(训练起点, 训练终点=测试起点, 测试终点) 列表，测试段首尾相接、每次前移 test_bars
+
+    anchored 为 True 时训练段总是从第一根K线开始（扩展窗口）。
+    """
+    if train_bars <= 0 or test_bars <= 0:
+        raise ValueError("训练窗口和测试窗口的K线数必须为正数")
+    return [
+        (0 if anchored else start - train_bars, start, start + test_bars)
+        for start in range(train_bars, rows - test_bars + 1, test_bars)
+    ]
+
+
+def run_walk_forward_windows(spec: Dict[str, Any], strategy_id: str, combinations: List[Dict[str, Any]],
+                             windows: List[Tuple[int, int, int]], initial_capital: float, metric: str,
+                             engine: str = "vectorized", commission: float = .002,
+                             report: Optional[Callable[[str], None]] = None) -> List[Dict[str, Any]]:
+    """在工作进程中依次处理一批窗口：训练段寻优，测试段用最优参数回测"""
+    data = attach_frame(spec)
+    cache: Dict[tuple, np.ndarray] = {}
+    results = []
+    for train_start, train_end, test_end in windows:
+        best, best_statistics, best_score = combinations[0], {}, None
+        for parameters in combinations:
+            try:
+                statistics = evaluate(strategy_id, parameters, data, initial_capital, engine, commission,
+                                      cache, (train_start, train_end))["statistics"]
+            except Exception:
+                continue
+            score = statistics.get(metric)
+            if score is not None and (best_score is None or score > best_score):
+                best, best_statistics, best_score = parameters, statistics, score
+
+        test = evaluate(strategy_id, best, data, initial_capital, engine, commission, cache, (train_end, test_end))
+        results.append({
+            "window": (train_start, train_end, test_end),
+            "parameters": best,
+            "train_statistics": best_statistics,
+            "test_statistics": test["statistics"],
+            "test_equity": test["equity"],
+            "test_trade_returns": test["trade_returns"]
+        })
+        if report is not None:
+            report(f"窗口 {train_end}-{test_end} 完成")
+    return results
+
+
+def stitch_equity(windows: List[Dict[str, Any]], initial_capital: float) -> np.ndarray:
+    """把各测试段（均从 initial_capital 开始）的权益按收益率首尾相接"""
+    factors = []
+    for window in sorted(windows, key=lambda w: w["window"][1]):
+        equity = np.asarray(window["test_equity"], dtype=np.float64)
+        factors.append(equity / np.concatenate([[initial_capital], equity[:-1]]))
+    if not factors:
+        return np.array([], dtype=np.float64)
+    return initial_capital * np.cumprod(np.concatenate(factors))
+
+
+def walk_forward_efficiency(windows: List[Dict[str, Any]]) -> Optional[float]:
+    """前向效率：测试段平均年化收益 / 训练段平均年化收益（训练段平均收益不为正时无意义）"""
+    train = [w["train_statistics"].get("annual_return") for w in windows]
+    test = [w["test_statistics"].get("annual_return") for w in windows]
+    train = [v for v in train if v is not None]
+    test = [v for v in test if v is not None]
+    if not train or not test or np.mean(train) <= 0:
+        return None
+    return float(np.mean(test) / np.mean(train))
@@ -3,14 +3,105 @@ import logging
 import json
 import time
 from datetime import datetime
-from typing import Dict, List, Set, Callable, Optional
+from typing import Any, Dict, List, Set, Callable, Optional, Tuple, Union
 from collections import deque, defaultdict
 from dataclasses import dataclass, field
 import websockets
 from websockets.exceptions import ConnectionClosed
+from config import settings
+from .wire_format import JSON, decode_message, encode_message, negotiate_format
 
 logger = logging.getLogger(__name__)
 
+# 慢消费者处理策略
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "conflate", "disconnect")
+
+
+class OutboundQueue:
+    """单个连接的有界待发送队列
+    
+    消息在入队前已编码为共享的字符串，所有接收者复用同一份。队列满时按策略处理：
+    drop_oldest 丢弃最早的消息；conflate 对同一品种只保留最新一条（没有可合并的则丢弃最早的）；
+    disconnect 拒绝入队，由调用方断开该连接。
+    
+    每条消息可附带 on_sent / on_dropped 回调，分别在实际发出和被丢弃（或被合并替换）时调用。
+    """
+    
+    def __init__(self, maxsize: int = 256, policy: str = "drop_oldest"):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"未知的慢消费者策略: {policy}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.items: deque = deque()  # [key, payload, on_sent, on_dropped]
+        self.pending: Dict[str, list] = {}  # 可合并消息的键 -> 队列中的条目
+        self.ready = asyncio.Event()
+        self.dropped = 0
+        self.conflated = 0
+        
+    def __len__(self) -> int:
+        return len(self.items)
+        
+    def put(self, payload: Union[str, bytes], key: Optional[str] = None,
+            on_sent: Optional[Callable] = None, on_dropped: Optional[Callable] = None) -> bool:
+        """入队，返回 False 表示队列已满且策略为断开连接"""
+        if self.policy == "conflate" and key is not None and key in self.pending:
+            # 同一品种尚未发出的旧消息直接替换为最新的
+            entry = self.pending[key]
+            if entry[3]:
+                entry[3]()
+            entry[1:] = [payload, on_sent, on_dropped]
+            self.conflated += 1
+            return True
+        
+        if len(self.items) >= self.maxsize:
+            if self.policy == "disconnect":
+                return False
+            entry = self.items.popleft()
+            old_key = entry[0]
+            if old_key is not None and self.pending.get(old_key) is entry:
+                del self.pending[old_key]
+            if entry[3]:
+                entry[3]()
+            self.dropped += 1
+        
+        entry = [key, payload, on_sent, on_dropped]
+        self.items.append(entry)
+        if key is not None:
+            self.pending[key] = entry
+        self.ready.set()
+        return True
+        
+    async def get(self) -> Tuple[Union[str, bytes], Optional[Callable]]:
+        """取出下一条待发送消息及其 on_sent 回调，队列为空时等待"""
+        while not self.items:
+            self.ready.clear()
+            await self.ready.wait()
+        entry = self.items.popleft()
+        key = entry[0]
+        if key is not None and self.pending.get(key) is entry:
+            del self.pending[key]
+        return entry[1], entry[2]
+
+
+class ASGIConnection:
+    """把 FastAPI/Starlette 的 WebSocket 适配为管理器使用的 send/close 接口
+
+    管理器按 websockets 库的方式调用 send(payload)：bytes 以二进制帧（send_bytes）发出，
+    str 以文本帧（send_text）发出。
+    """
+    
+    def __init__(self, websocket: Any):
+        self.websocket = websocket
+        
+    async def send(self, payload: Union[str, bytes]):
+        if isinstance(payload, (bytes, bytearray)):
+            await self.websocket.send_bytes(bytes(payload))
+        else:
+            await self.websocket.send_text(payload)
+            
+    async def close(self):
+        await self.websocket.close()
+
 
 @dataclass
 class ConnectionInfo:
@@ -22,6 +113,127 @@ class ConnectionInfo:
     subscriptions: Set[str] = field(default_factory=set)
     message_count: int = 0
     is_alive: bool = True
+    outbox: Optional[OutboundQueue] = None  # 待发送队列，由独立的写任务发送
+    writer_task: Optional[asyncio.Task] = None
+    last_ticks: Dict[str, dict] = field(default_factory=dict)  # 各品种最近一次实际发出的行情状态
+    wire_format: str = JSON  # 推送编码格式：json（文本帧）或 msgpack（二进制帧）
+
+
+class TickConflator:
+    """行情合并推送
+    
+    每个品种只保留最新状态，按固定间隔批量推送：每个连接收到一帧，只包含其订阅的品种，
+    且只包含相对该连接上次实际收到的状态发生变化的字段。上次状态相同的连接共享同一份编码结果。
+    """
+    
+    TICK_KEY = "__ticks__"
+    
+    def __init__(self, manager: "WebSocketManager", flush_interval: float = 0.2):
+        self.manager = manager
+        self.flush_interval = flush_interval
+        self.latest: Dict[str, dict] = {}
+        self.dirty: Set[str] = set()
+        self.task: Optional[asyncio.Task] = None
+        self.updates = 0
+        self.flushes = 0
+        self.frames = 0
+        self.encodings = 0
+        
+    def publish(self, symbol: str, state: dict):
+        """更新品种的最新状态，在下一次推送时发出"""
+        self.latest[symbol] = dict(state)
+        self.dirty.add(symbol)
+        self.updates += 1
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+            
+    def mark_dirty(self, symbols):
+        """重新推送这些品种（新订阅或此前的帧被丢弃）"""
+        self.dirty.update(s for s in symbols if s in self.latest)
+        
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self.dirty:
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.error(f"行情合并推送失败: {e}")
+                    
+    async def flush(self):
+        """向订阅了变化品种的连接各推送一帧"""
+        dirty, self.dirty = self.dirty, set()
+        self.flushes += 1
+        
+        recipients: Dict[Any, List[str]] = defaultdict(list)
+        for symbol in dirty:
+            for websocket in self.manager.subscriptions.get(symbol, ()):
+                recipients[websocket].append(symbol)
+                
+        timestamp = datetime.now().isoformat()
+        frames: Dict[tuple, Tuple[Optional[Union[str, bytes]], Dict[str, dict]]] = {}
+        overflow = set()
+        
+        for websocket, symbols in recipients.items():
+            conn_info = self.manager.connections.get(websocket)
+            if conn_info is None:
+                continue
+            symbols.sort()
+            # 编码格式相同、上次发出的状态对象也相同的连接，增量内容相同
+            cache_key = (conn_info.wire_format,) + tuple((s, id(conn_info.last_ticks.get(s))) for s in symbols)
+            frame = frames.get(cache_key)
+            if frame is None:
+                frame = frames[cache_key] = self._encode(symbols, conn_info.last_ticks, timestamp,
+                                                         conn_info.wire_format)
+            payload, states = frame
+            if payload is None:
+                continue
+                
+            if self.manager._enqueue(
+                websocket, payload, key=self.TICK_KEY,
+                on_sent=lambda conn_info=conn_info, states=states: conn_info.last_ticks.update(states),
+                on_dropped=lambda symbols=symbols: self.mark_dirty(symbols)
+            ):
+                self.frames += 1
+            else:
+                overflow.add(websocket)
+                
+        await self.manager._disconnect_slow(overflow)
+        
+    def _encode(self, symbols: List[str], last_ticks: Dict[str, dict], timestamp: str,
+                fmt: str = JSON) -> Tuple[Optional[Union[str, bytes]], Dict[str, dict]]:
+        data = {}
+        states = {}
+        for symbol in symbols:
+            state = self.latest[symbol]
+            last = last_ticks.get(symbol)
+            delta = state if last is None else {k: v for k, v in state.items() if k not in last or last[k] != v}
+            if delta:
+                data[symbol] = delta
+            states[symbol] = state
+        if not data:
+            return None, states
+        self.encodings += 1
+        return encode_message({'type': 'price_batch', 'data': data, 'timestamp': timestamp}, fmt), states
+        
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+            
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "flush_interval": self.flush_interval,
+            "symbols": len(self.latest),
+            "updates": self.updates,
+            "flushes": self.flushes,
+            "frames": self.frames,
+            "encodings": self.encodings
+        }
 
 
 class MessageQueue:
@@ -66,6 +278,13 @@ class WebSocketManager:
         self.heartbeat_timeout = 60  # 60秒未响应则认为连接断开
         self.heartbeat_task: Optional[asyncio.Task] = None
         
+        # 推送配置：每个连接的待发送队列上限及慢消费者策略
+        self.send_queue_size = settings.WS_SEND_QUEUE_SIZE
+        self.slow_consumer_policy = settings.WS_SLOW_CONSUMER_POLICY
+        
+        # 行情合并推送
+        self.tick_conflator = TickConflator(self, settings.WS_TICK_FLUSH_MS / 1000)
+        
         # 数据处理器
         self.data_handlers: Dict[str, Callable] = {}
         
@@ -75,6 +294,7 @@ class WebSocketManager:
         # 统计信息
         self.total_connections = 0
         self.total_messages = 0
+        self.slow_disconnects = 0
         
         logger.info("WebSocketManager 增强版初始化完成")
         
@@ -85,9 +305,11 @@ class WebSocketManager:
             websocket=websocket,
             connected_at=current_time,
             last_ping=current_time,
-            last_pong=current_time
+            last_pong=current_time,
+            outbox=OutboundQueue(self.send_queue_size, self.slow_consumer_policy)
         )
         self.connections[websocket] = conn_info
+        conn_info.writer_task = asyncio.create_task(self._writer(websocket, conn_info))
         self.total_connections += 1
         
         logger.info(f"新WebSocket连接 (总连接: {len(self.connections)}, 历史: {self.total_connections})")
@@ -106,8 +328,10 @@ class WebSocketManager:
                 if not self.subscriptions[symbol]:
                     del self.subscriptions[symbol]
         
-        # 移除连接
+        # 移除连接并停止写任务（写任务自身出错时会调用到这里，不能取消自己）
         del self.connections[websocket]
+        if conn_info.writer_task and conn_info.writer_task is not asyncio.current_task():
+            conn_info.writer_task.cancel()
         
         duration = time.time() - conn_info.connected_at
         logger.info(f"WebSocket连接断开 (连接时长: {duration:.1f}s, 消息数: {conn_info.message_count}, 剩余: {len(self.connections)})")
@@ -120,6 +344,8 @@ class WebSocketManager:
             
         self.subscriptions[symbol].add(websocket)
         self.connections[websocket].subscriptions.add(symbol)
+        # 新订阅在下一次合并推送时收到完整的最新状态
+        self.tick_conflator.mark_dirty([symbol])
         
         logger.info(f"订阅 {symbol} (订阅者: {len(self.subscriptions[symbol])})")
         
@@ -127,6 +353,7 @@ class WebSocketManager:
         """取消订阅特定符号的实时数据 - 增强版"""
         if websocket in self.connections:
             self.connections[websocket].subscriptions.discard(symbol)
+            self.connections[websocket].last_ticks.pop(symbol, None)
             
         if symbol in self.subscriptions:
             self.subscriptions[symbol].discard(websocket)
@@ -135,65 +362,130 @@ class WebSocketManager:
                 
         logger.info(f"取消订阅 {symbol}")
             
+    async def _writer(self, websocket: websockets.WebSocketServerProtocol, conn_info: ConnectionInfo):
+        """连接的写任务：依次发送待发送队列中的消息，慢连接只影响自己"""
+        try:
+            while True:
+                payload, on_sent = await conn_info.outbox.get()
+                await websocket.send(payload)
+                if on_sent:
+                    on_sent()
+                conn_info.message_count += 1
+                self.total_messages += 1
+        except asyncio.CancelledError:
+            raise
+        except ConnectionClosed:
+            conn_info.is_alive = False
+        except Exception as e:
+            logger.error(f"发送WebSocket消息失败: {e}")
+        await self.unregister(websocket)
+        
+    def _encode_for(self, websocket: websockets.WebSocketServerProtocol, message: dict,
+                    encoded: Dict[str, Union[str, bytes]]) -> Union[str, bytes]:
+        """按连接的编码格式取消息编码结果，同一格式只编码一次"""
+        conn_info = self.connections.get(websocket)
+        fmt = conn_info.wire_format if conn_info else JSON
+        payload = encoded.get(fmt)
+        if payload is None:
+            payload = encoded[fmt] = encode_message(message, fmt)
+        return payload
+        
+    def set_wire_format(self, websocket: websockets.WebSocketServerProtocol, requested: Optional[str]) -> str:
+        """设置连接的推送格式，msgpack 不可用时保持 JSON，返回实际生效的格式"""
+        conn_info = self.connections.get(websocket)
+        if conn_info is None:
+            return JSON
+        fmt = negotiate_format(requested)
+        if fmt != conn_info.wire_format:
+            conn_info.wire_format = fmt
+            # 行情增量基于上次发出的内容，切换格式后重新推送完整状态
+            conn_info.last_ticks.clear()
+            self.tick_conflator.mark_dirty(conn_info.subscriptions)
+        return fmt
+        
+    def _enqueue(self, websocket: websockets.WebSocketServerProtocol, payload: Union[str, bytes], key: Optional[str] = None,
+                 on_sent: Optional[Callable] = None, on_dropped: Optional[Callable] = None) -> bool:
+        """放入连接的待发送队列，返回 False 表示该连接需要断开"""
+        conn_info = self.connections.get(websocket)
+        if conn_info is None or not conn_info.is_alive:
+            return False
+        if conn_info.outbox.put(payload, key, on_sent, on_dropped):
+            return True
+        conn_info.is_alive = False
+        return False
+        
+    async def _disconnect_slow(self, websockets_to_close: Set[websockets.WebSocketServerProtocol]):
+        """断开待发送队列溢出的连接"""
+        for websocket in websockets_to_close:
+            if websocket not in self.connections:
+                continue
+            self.slow_disconnects += 1
+            logger.warning("WebSocket连接消费过慢，断开连接")
+            await self.unregister(websocket)
+            try:
+                await websocket.close()
+            except Exception:
+                pass
+        
+    async def send_message(self, websocket: websockets.WebSocketServerProtocol, message: dict):
+        """向单个连接发送消息（经待发送队列，与广播保持顺序）"""
+        if not self._enqueue(websocket, self._encode_for(websocket, message, {})):
+            await self._disconnect_slow({websocket})
+            
     async def broadcast_to_subscribers(self, symbol: str, message: dict):
-        """向订阅特定符号的所有连接广播消息 - 增强版"""
+        """向订阅特定符号的所有连接广播消息
+        
+        消息按编码格式各编码一次，放入各连接的待发送队列后立即返回，不等待慢连接。
+        """
         if symbol not in self.subscriptions:
             return
             
-        disconnected = set()
-        success_count = 0
+        encoded: Dict[str, Union[str, bytes]] = {}
+        overflow = set()
+        queued = 0
         
-        for websocket in self.subscriptions[symbol]:
-            if websocket not in self.connections:
-                disconnected.add(websocket)
-                continue
-                
-            try:
-                await websocket.send(json.dumps(message))
-                self.connections[websocket].message_count += 1
-                self.total_messages += 1
-                success_count += 1
-            except ConnectionClosed:
-                disconnected.add(websocket)
-                self.connections[websocket].is_alive = False
-            except Exception as e:
-                logger.error(f"广播消息失败: {e}")
-                disconnected.add(websocket)
+        for websocket in list(self.subscriptions[symbol]):
+            if self._enqueue(websocket, self._encode_for(websocket, message, encoded), key=symbol):
+                queued += 1
+            else:
+                overflow.add(websocket)
                 
-        # 清理断开的连接
-        for websocket in disconnected:
-            await self.unregister(websocket)
+        await self._disconnect_slow(overflow)
+        # 让各写任务开始发送
+        await asyncio.sleep(0)
             
-        if success_count > 0:
-            logger.debug(f"广播到 {symbol}: {success_count} 个连接")
+        if queued > 0:
+            logger.debug(f"广播到 {symbol}: {queued} 个连接")
                     
+    def publish_tick(self, symbol: str, state: dict):
+        """提交品种的最新行情，由合并推送按固定间隔批量发给订阅者"""
+        self.tick_conflator.publish(symbol, state)
+        
     async def broadcast_to_all(self, message: dict):
-        """向所有连接广播消息 - 增强版"""
-        disconnected = set()
-        success_count = 0
+        """向所有连接广播消息（每种编码格式只编码一次，经各连接的待发送队列发送）"""
+        encoded: Dict[str, Union[str, bytes]] = {}
+        overflow = set()
+        queued = 0
         
         for websocket in list(self.connections.keys()):
-            try:
-                await websocket.send(json.dumps(message))
-                self.connections[websocket].message_count += 1
-                self.total_messages += 1
-                success_count += 1
-            except ConnectionClosed:
-                disconnected.add(websocket)
-                self.connections[websocket].is_alive = False
-            except Exception as e:
-                logger.error(f"广播消息失败: {e}")
+            if self._enqueue(websocket, self._encode_for(websocket, message, encoded)):
+                queued += 1
+            else:
+                overflow.add(websocket)
                 
-        # 清理断开的连接
-        for websocket in disconnected:
-            await self.unregister(websocket)
+        await self._disconnect_slow(overflow)
+        await asyncio.sleep(0)
             
-        logger.debug(f"全局广播: {success_count}/{len(self.connections)} 个连接")
+        logger.debug(f"全局广播: {queued}/{len(self.connections)} 个连接")
                 
-    async def handle_message(self, websocket: websockets.WebSocketServerProtocol, message: str):
-        """处理从客户端接收的消息 - 增强版"""
+    async def handle_message(self, websocket: websockets.WebSocketServerProtocol, message: Union[str, bytes]):
+        """处理从客户端接收的消息 - 增强版
+        
+        文本帧按 JSON 解析，二进制帧按 MessagePack 解析。
+        订阅消息可带 format 选项（json / msgpack）选择推送格式，也可单独发送 set_format 消息。
+        """
         try:
-            data = json.loads(message)
+            data = decode_message(message)
             message_type = data.get('type')
             
             # 更新消息计数
@@ -202,45 +494,56 @@ class WebSocketManager:
             
             if message_type == 'subscribe':
                 symbol = data.get('symbol')
+                if data.get('format'):
+                    self.set_wire_format(websocket, data['format'])
                 if symbol:
                     await self.subscribe(websocket, symbol)
-                    await websocket.send(json.dumps({
+                    await self.send_message(websocket, {
                         'type': 'subscribed',
                         'symbol': symbol,
+                        'format': self.connections[websocket].wire_format if websocket in self.connections else JSON,
                         'timestamp': datetime.now().isoformat()
-                    }))
+                    })
+                    
+            elif message_type == 'set_format':
+                fmt = self.set_wire_format(websocket, data.get('format'))
+                await self.send_message(websocket, {
+                    'type': 'format',
+                    'format': fmt,
+                    'timestamp': datetime.now().isoformat()
+                })
                     
             elif message_type == 'unsubscribe':
                 symbol = data.get('symbol')
                 if symbol:
                     await self.unsubscribe(websocket, symbol)
-                    await websocket.send(json.dumps({
+                    await self.send_message(websocket, {
                         'type': 'unsubscribed',
                         'symbol': symbol,
                         'timestamp': datetime.now().isoformat()
-                    }))
+                    })
                     
             elif message_type == 'ping':
                 # 更新pong时间
                 if websocket in self.connections:
                     self.connections[websocket].last_pong = time.time()
                     
-                await websocket.send(json.dumps({
+                await self.send_message(websocket, {
                     'type': 'pong',
                     'timestamp': datetime.now().isoformat()
-                }))
+                })
                 
             elif message_type == 'get_status':
                 # 返回连接状态
                 conn_info = self.connections.get(websocket)
                 if conn_info:
-                    await websocket.send(json.dumps({
+                    await self.send_message(websocket, {
                         'type': 'status',
                         'connected_at': conn_info.connected_at,
                         'subscriptions': list(conn_info.subscriptions),
                         'message_count': conn_info.message_count,
                         'timestamp': datetime.now().isoformat()
-                    }))
+                    })
                     
         except json.JSONDecodeError:
             logger.error("无法解析WebSocket消息")
@@ -255,6 +558,11 @@ class WebSocketManager:
             try:
                 current_time = time.time()
                 disconnected = set()
+                heartbeat = {
+                    'type': 'ping',
+                    'timestamp': datetime.now().isoformat()
+                }
+                encoded_heartbeat: Dict[str, Union[str, bytes]] = {}
                 
                 for websocket, conn_info in list(self.connections.items()):
                     # 检查是否超时
@@ -266,16 +574,12 @@ class WebSocketManager:
                         disconnected.add(websocket)
                         continue
                     
-                    # 发送心跳
+                    # 发送心跳（经待发送队列，不会被慢连接阻塞）
                     if current_time - conn_info.last_ping >= self.heartbeat_interval:
-                        try:
-                            await websocket.send(json.dumps({
-                                'type': 'ping',
-                                'timestamp': datetime.now().isoformat()
-                            }))
+                        if self._enqueue(websocket, self._encode_for(websocket, heartbeat, encoded_heartbeat)):
                             conn_info.last_ping = current_time
-                        except Exception as e:
-                            logger.error(f"发送心跳失败: {e}")
+                        else:
+                            logger.error("发送心跳失败: 待发送队列已满")
                             disconnected.add(websocket)
                 
                 # 清理超时连接
@@ -341,6 +645,8 @@ class WebSocketManager:
         logger.info("开始停止WebSocket管理器...")
         self.is_running = False
         
+        await self.tick_conflator.stop()
+        
         # 停止心跳检测
         if self.heartbeat_task:
             self.heartbeat_task.cancel()
@@ -365,6 +671,11 @@ class WebSocketManager:
             "active_connections": len(self.connections),
             "total_connections": self.total_connections,
             "total_messages": self.total_messages,
+            "queued_messages": sum(len(c.outbox) for c in self.connections.values() if c.outbox),
+            "dropped_messages": sum(c.outbox.dropped for c in self.connections.values() if c.outbox),
+            "slow_consumer_policy": self.slow_consumer_policy,
+            "slow_disconnects": self.slow_disconnects,
+            "tick_conflator": self.tick_conflator.get_stats(),
             "subscriptions": {
                 symbol: len(subscribers)
                 for symbol, subscribers in self.subscriptions.items()
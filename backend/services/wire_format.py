@@ -0,0 +1,103 @@
+"""
+传输格式协商
+
+默认使用 JSON；客户端可通过 Accept 头（REST）或订阅选项（WebSocket）选择 MessagePack。
+K线以列式类型化数组传输（CandleSeries.to_columns），避免逐根K线构造字典。
+msgpack 已列入 requirements；未安装时请求 MessagePack 的客户端回退为 JSON 并记录警告。
+"""
+import json
+import logging
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Optional, Union
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - 取决于部署环境
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+JSON = "json"
+MSGPACK = "msgpack"
+MSGPACK_MEDIA_TYPES = ("application/x-msgpack", "application/msgpack", "application/vnd.msgpack")
+MSGPACK_MEDIA_TYPE = MSGPACK_MEDIA_TYPES[0]
+
+
+def msgpack_available() -> bool:
+    return msgpack is not None
+
+
+def _warn_unavailable():
+    logger.warning("客户端请求 MessagePack，但 msgpack 未安装，回退为 JSON")
+
+
+def negotiate_format(requested: Optional[str]) -> str:
+    """规范化客户端请求的格式，不支持时回退为 JSON"""
+    if requested and requested.lower() == MSGPACK:
+        if msgpack_available():
+            return MSGPACK
+        _warn_unavailable()
+    return JSON
+
+
+def wants_msgpack(accept: Optional[str]) -> bool:
+    """根据 Accept 头判断是否返回 MessagePack（q 值高于 JSON 时才选择）"""
+    if not accept:
+        return False
+    best_msgpack = best_json = 0.0
+    for part in accept.split(","):
+        fields = [f.strip() for f in part.split(";")]
+        media_type, q = fields[0].lower(), 1.0
+        for param in fields[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if media_type in MSGPACK_MEDIA_TYPES:
+            best_msgpack = max(best_msgpack, q)
+        elif media_type in ("application/json", "*/*", "application/*"):
+            best_json = max(best_json, q)
+    if best_msgpack > 0 and best_msgpack >= best_json:
+        if msgpack_available():
+            return True
+        _warn_unavailable()
+    return False
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"无法编码为 MessagePack: {type(value).__name__}")
+
+
+def packb(obj: Any) -> bytes:
+    """编码为 MessagePack，msgpack 未安装时抛出 RuntimeError"""
+    if msgpack is None:
+        raise RuntimeError("msgpack 未安装")
+    return msgpack.packb(obj, default=_default, use_bin_type=True)
+
+
+def encode_message(message: Any, fmt: str = JSON) -> Union[str, bytes]:
+    """按连接格式编码推送消息：JSON 为文本帧，MessagePack 为二进制帧"""
+    if fmt == MSGPACK:
+        return packb(message)
+    return json.dumps(message)
+
+
+def decode_message(raw: Union[str, bytes]) -> Any:
+    """解码客户端消息：二进制帧按 MessagePack 解析，文本帧按 JSON 解析"""
+    if isinstance(raw, (bytes, bytearray)):
+        if msgpack is None:
+            raise ValueError("收到二进制消息但 msgpack 未安装")
+        return msgpack.unpackb(raw, raw=False)
+    return json.loads(raw)
@@ -1,10 +1,12 @@
 import asyncio
 import logging
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from datetime import datetime
+from typing import List, Dict, Optional, Union
 import yfinance as yf
 import pandas as pd
-from models.market_data import KlineData, MarketType, Timeframe
+from models.market_data import KlineData, CandleSeries, MarketType, Timeframe
+from .provider_executor import provider_executor
+from .synthetic_market import synthetic_market
 
 logger = logging.getLogger(__name__)
 
@@ -20,65 +22,58 @@ class YFinanceDataService:
         timeframe: Timeframe,
         limit: int = 1000,
         start_time: Optional[datetime] = None,
-        end_time: Optional[datetime] = None
-    ) -> List[KlineData]:
-        """获取股票K线数据"""
+        end_time: Optional[datetime] = None,
+        mock_on_error: bool = True
+    ) -> Union[CandleSeries, List[KlineData]]:
+        """获取股票K线数据
+        
+        mock_on_error 为 False 时失败返回空序列（由调用方路由到其他数据源），不返回模拟数据
+        """
         try:
             # 时间框架映射
             period_mapping = {
-                Timeframe.MINUTE_1: "1d",  # yfinance最小支持1分钟
-                Timeframe.MINUTE_5: "1d",
-                Timeframe.MINUTE_15: "1d",
-                Timeframe.HOUR_1: "1d",
-                Timeframe.HOUR_4: "5d",
-                Timeframe.DAILY: "1mo",
-                Timeframe.WEEKLY: "3mo",
-                Timeframe.MONTHLY: "1y"
+                Timeframe.M1: "1d",  # yfinance最小支持1分钟
+                Timeframe.M5: "1d",
+                Timeframe.M15: "1d",
+                Timeframe.H1: "1d",
+                Timeframe.H4: "5d",
+                Timeframe.D1: "1mo",
+                Timeframe.W1: "3mo",
+                Timeframe.MN1: "1y"
             }
             
             interval_mapping = {
-                Timeframe.MINUTE_1: "1m",
-                Timeframe.MINUTE_5: "5m",
-                Timeframe.MINUTE_15: "15m",
-                Timeframe.HOUR_1: "1h",
-                Timeframe.HOUR_4: "1h",  # yfinance不支持4小时，用1小时替代
-                Timeframe.DAILY: "1d",
-                Timeframe.WEEKLY: "1wk",
-                Timeframe.MONTHLY: "1mo"
+                Timeframe.M1: "1m",
+                Timeframe.M5: "5m",
+                Timeframe.M15: "15m",
+                Timeframe.H1: "1h",
+                Timeframe.H4: "1h",  # yfinance不支持4小时，用1小时替代
+                Timeframe.D1: "1d",
+                Timeframe.W1: "1wk",
+                Timeframe.MN1: "1mo"
             }
             
             period = period_mapping.get(timeframe, "1mo")
             interval = interval_mapping.get(timeframe, "1d")
             
-            # 获取股票数据
-            ticker = yf.Ticker(symbol)
-            data = ticker.history(period=period, interval=interval)
+            # 获取股票数据（yfinance 为阻塞调用，在数据源线程池中执行）
+            data = await provider_executor.run("yfinance", self._load_history, symbol, period, interval)
             
             if data.empty:
                 logger.warning(f"Yahoo Finance返回空数据: {symbol}")
+                if not mock_on_error:
+                    return CandleSeries.empty(symbol, MarketType.STOCK, 'yahoo_finance', timeframe)
                 return await self._get_mock_stock_data(symbol, timeframe, limit)
             
-            klines = []
-            for timestamp, row in data.iterrows():
-                kline = KlineData(
-                    symbol=symbol,
-                    timeframe=timeframe,
-                    market_type=MarketType.STOCK,
-                    exchange='yahoo_finance',
-                    timestamp=timestamp.to_pydatetime(),
-                    open=float(row['Open']),
-                    high=float(row['High']),
-                    low=float(row['Low']),
-                    close=float(row['Close']),
-                    volume=float(row['Volume'])
-                )
-                klines.append(kline)
+            klines = CandleSeries.from_frame(data, symbol, MarketType.STOCK, 'yahoo_finance', timeframe)
             
             # 限制返回数量
-            return klines[-limit:] if len(klines) > limit else klines
+            return klines.tail(limit)
             
         except Exception as e:
             logger.error(f"获取股票K线数据失败: {e}")
+            if not mock_on_error:
+                return CandleSeries.empty(symbol, MarketType.STOCK, 'yahoo_finance', timeframe)
             return await self._get_mock_stock_data(symbol, timeframe, limit)
     
     async def _get_mock_stock_data(
@@ -86,60 +81,27 @@ class YFinanceDataService:
         symbol: str, 
         timeframe: Timeframe,
         limit: int
-    ) -> List[KlineData]:
-        """生成股票模拟数据"""
-        klines = []
-        base_price = 100.0  # 美股典型价格
-        current_time = datetime.now()
-        
-        for i in range(limit):
-            timestamp = current_time - self._get_timeframe_delta(timeframe) * i
-            
-            # 生成随机价格波动
-            import random
-            change = random.uniform(-5.0, 5.0)
-            open_price = base_price + change
-            high = open_price + random.uniform(0, 3.0)
-            low = open_price - random.uniform(0, 3.0)
-            close_price = (high + low) / 2 + random.uniform(-1.0, 1.0)
-            volume = random.uniform(1000000, 10000000)  # 美股交易量较大
-            
-            kline = KlineData(
-                symbol=symbol,
-                timeframe=timeframe,
-                market_type=MarketType.STOCK,
-                exchange='yahoo_finance',
-                timestamp=timestamp,
-                open=open_price,
-                high=high,
-                low=low,
-                close=close_price,
-                volume=volume
-            )
-            klines.append(kline)
-        
-        return klines
+    ) -> CandleSeries:
+        """生成股票模拟数据（几何布朗运动路径）"""
+        return synthetic_market.candles(
+            symbol, MarketType.STOCK, 'yahoo_finance', timeframe, limit, base_price=100.0, base_volume=5_000_000
+        )
     
-    def _get_timeframe_delta(self, timeframe: Timeframe):
-        """获取时间框架对应的时间差"""
-        timeframe_delta = {
-            Timeframe.MINUTE_1: timedelta(minutes=1),
-            Timeframe.MINUTE_5: timedelta(minutes=5),
-            Timeframe.MINUTE_15: timedelta(minutes=15),
-            Timeframe.HOUR_1: timedelta(hours=1),
-            Timeframe.HOUR_4: timedelta(hours=4),
-            Timeframe.DAILY: timedelta(days=1),
-            Timeframe.WEEKLY: timedelta(weeks=1),
-            Timeframe.MONTHLY: timedelta(days=30)
-        }
-        return timeframe_delta.get(timeframe, timedelta(hours=1))
+    @staticmethod
+    def _load_history(symbol: str, period: str, interval: str) -> pd.DataFrame:
+        """同步获取历史行情（在线程池中调用）"""
+        return yf.Ticker(symbol).history(period=period, interval=interval)
+    
+    @staticmethod
+    def _load_quote(symbol: str):
+        """同步获取基本信息和当日行情（在线程池中调用）"""
+        ticker = yf.Ticker(symbol)
+        return ticker.info, ticker.history(period="1d")
     
     async def get_stock_quote(self, symbol: str) -> Dict:
         """获取股票实时报价"""
         try:
-            ticker = yf.Ticker(symbol)
-            info = ticker.info
-            history = ticker.history(period="1d")
+            info, history = await provider_executor.run("yfinance", self._load_quote, symbol)
             
             if history.empty:
                 logger.warning(f"Yahoo Finance返回空报价数据: {symbol}")
@@ -191,12 +153,17 @@ class YFinanceDataService:
                 '000001.SS': '上证指数'
             }
             
+            # 各指数的请求在线程池中并行执行
+            results = await asyncio.gather(*(
+                provider_executor.run("yfinance", self._load_quote, symbol) for symbol in indices
+            ), return_exceptions=True)
+            
             summary = {}
-            for symbol, name in indices.items():
+            for (symbol, name), result in zip(indices.items(), results):
                 try:
-                    ticker = yf.Ticker(symbol)
-                    info = ticker.info
-                    history = ticker.history(period="1d")
+                    if isinstance(result, BaseException):
+                        raise result
+                    info, history = result
                     
                     if not history.empty:
                         latest = history.iloc[-1]
@@ -199,6 +199,48 @@ def sample_kline_data():
     ]
 
 
+@pytest.fixture
+def candle_series():
+    """CandleSeries 构造函数
+
+    candle_series(n 或收盘价序列, start=0, base_ms=0, timeframe=Timeframe.M1, ...)：
+    第 i 根K线的时间为 base_ms + (start + i) * 周期；传入整数 n 时收盘价为 100 + start + i。
+    开盘价等于收盘价，最高/最低价在收盘价上下 spread 比例处，成交量为 volume（常数或序列）。
+    """
+    import numpy as np
+    from models.market_data import CandleSeries
+    from services.synthetic_market import TIMEFRAME_MS
+
+    def make(close, start: int = 0, base_ms: int = 0, timeframe: Timeframe = Timeframe.M1,
+             symbol: str = "BTC/USDT", market_type: MarketType = MarketType.CRYPTO,
+             exchange: str = "binance", volume=10.0, spread: float = 0.001) -> CandleSeries:
+        if isinstance(close, (int, np.integer)):
+            close = 100.0 + start + np.arange(close)
+        close = np.asarray(close, dtype=np.float64)
+        timestamp = base_ms + (start + np.arange(len(close), dtype=np.int64)) * TIMEFRAME_MS[timeframe]
+        volume = np.broadcast_to(np.asarray(volume, dtype=np.float64), close.shape).copy()
+        return CandleSeries(symbol, market_type, exchange, timeframe, timestamp, close.copy(),
+                            close * (1 + spread), close * (1 - spread), close, volume)
+
+    return make
+
+
+@pytest.fixture
+def data():
+    """回测用的合成日K线 DataFrame（AAPL，700 根，固定种子）"""
+    from services.synthetic_market import SyntheticMarket
+    return SyntheticMarket(seed=6).candles("AAPL", MarketType.STOCK, "yfinance", Timeframe.D1, 700).to_frame()
+
+
+@pytest.fixture
+def executor():
+    """单工作进程的回测进程池（forkserver 启动，不继承测试进程里其他线程持有的网络会话；测试结束时关闭）"""
+    from services.backtest_executor import BacktestExecutor
+    pool = BacktestExecutor(max_workers=1, start_method="forkserver")
+    yield pool
+    pool.shutdown()
+
+
 @pytest.fixture
 def sample_alert_config():
     """示例预警配置"""
@@ -280,6 +322,32 @@ def test_settings(monkeypatch):
     return settings
 
 
+@pytest.fixture(autouse=True)
+def isolated_candle_store(tmp_path, monkeypatch):
+    """本地K线库写入临时目录（自动应用）"""
+    from services.candle_store import candle_store
+    monkeypatch.setattr(candle_store, "root", tmp_path / "candles")
+    return candle_store
+
+
+@pytest.fixture(autouse=True)
+def isolated_database(tmp_path, monkeypatch):
+    """关系库会话和回测结果存储绑定到临时 SQLite 库（自动应用）"""
+    from sqlalchemy import create_engine
+    import database
+    import models  # noqa: F401  注册全部表
+    from services.backtest_store import BacktestStore, backtest_store
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    database.Base.metadata.create_all(bind=engine)
+    database.SessionLocal.configure(bind=engine)
+    store = BacktestStore(engine)
+    for name in ("engine", "_session", "_ready"):
+        monkeypatch.setattr(backtest_store, name, getattr(store, name))
+    yield engine
+    database.SessionLocal.configure(bind=database.engine)
+    engine.dispose()
+
+
 # ============================================
 # 清理 Fixtures
 # ============================================
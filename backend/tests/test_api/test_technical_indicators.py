@@ -0,0 +1,78 @@
+"""
+Technical Indicators API 集成测试
+测试批量指标计算端点
+"""
+import pytest
+from httpx import AsyncClient
+from fastapi import status
+
+from main import app
+
+
+@pytest.fixture
+async def async_client():
+    """创建异步HTTP客户端"""
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        yield client
+
+
+class TestBatchIndicatorsAPI:
+    """批量指标计算API测试套件"""
+
+    @pytest.mark.asyncio
+    async def test_batch_with_price_array(self, async_client):
+        """测试使用请求体价格数组批量计算"""
+        prices = [100 + (i % 7) - (i % 3) * 0.5 for i in range(60)]
+        response = await async_client.post(
+            "/api/v1/technical/batch",
+            json={
+                "prices": prices,
+                "indicators": [
+                    {"name": "SMA", "params": {"period": 5}},
+                    {"name": "MACD", "id": "macd"},
+                    {"name": "BOLLINGER", "params": {"period": 5}}
+                ]
+            }
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["count"] == 60
+        assert set(data["results"]) == {"SMA_5", "macd", "BOLLINGER_5"}
+        assert len(data["results"]["SMA_5"]) == 60
+        assert data["results"]["SMA_5"][3] is None
+        assert data["results"]["BOLLINGER_5"]["middle"] == data["results"]["SMA_5"]
+        assert data["graph"]["reused"] >= 1
+
+    @pytest.mark.asyncio
+    async def test_batch_requires_data_source(self, async_client):
+        """测试既没有 symbol 也没有价格数组时返回 400"""
+        response = await async_client.post(
+            "/api/v1/technical/batch",
+            json={"indicators": [{"name": "SMA"}]}
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @pytest.mark.asyncio
+    async def test_batch_unknown_indicator(self, async_client):
+        """测试未知指标返回 400"""
+        response = await async_client.post(
+            "/api/v1/technical/batch",
+            json={"prices": [1.0, 2.0, 3.0], "indicators": [{"name": "NOPE"}]}
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @pytest.mark.asyncio
+    async def test_batch_duplicate_result_keys(self, async_client):
+        """测试结果键重复的指标返回 400"""
+        response = await async_client.post(
+            "/api/v1/technical/batch",
+            json={"prices": [1.0, 2.0, 3.0], "indicators": [
+                {"name": "SMA", "params": {"period": 2}}, {"name": "SMA", "params": {"period": 2}}
+            ]}
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "SMA_2" in response.json()["detail"]
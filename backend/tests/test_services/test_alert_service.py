@@ -7,8 +7,9 @@ from unittest.mock import Mock, AsyncMock, patch
 from datetime import datetime
 
 from services.alert_service import AlertService, AlertStatus
+from services.price_event_bus import price_event_bus, PriceEvent
 from models.alerts import Alert, AlertConditionType, NotificationType
-from models.market_data import MarketType
+from models.market_data import CandleSeries, MarketType, Timeframe
 
 # 为扩展测试添加必要的枚举类型
 class AlertType:
@@ -331,6 +332,212 @@ class TestAlertService:
         del service.active_alerts[alert.id]
         assert alert.id not in service.active_alerts
 
+    
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_check_all_alerts_fetches_once_per_bucket(self):
+        """测试同一品种/周期的预警共享一次行情获取"""
+        service = AlertService()
+        
+        for i in range(50):
+            alert = Alert(
+                id=f"alert_{i}",
+                symbol="BTC/USDT" if i % 2 else "ETH/USDT",
+                market_type=MarketType.CRYPTO,
+                timeframe=Timeframe.H1,
+                condition_type=AlertConditionType.PRICE_CROSS_MA if i % 5 == 0 else AlertConditionType.PRICE_ABOVE,
+                condition_config={"threshold": 40000.0, "ma_period": 10 + i},
+                status=AlertStatus.ACTIVE.value
+            )
+            service.active_alerts[alert.id] = alert
+        
+        klines = CandleSeries.from_ohlcv(
+            [(i * 3_600_000, 100.0, 101.0, 99.0, 100.0 + i, 1.0) for i in range(100)],
+            symbol="BTC/USDT", market_type=MarketType.CRYPTO, exchange="", timeframe=Timeframe.H1
+        )
+        with patch('services.alert_service.data_service') as mock_data:
+            mock_data.get_current_price = AsyncMock(return_value=46000.0)
+            mock_data.get_kline_data = AsyncMock(return_value=klines)
+            with patch.object(service, '_trigger_alert_enhanced', new=AsyncMock()) as mock_trigger:
+                await service._check_all_alerts()
+        
+        # 两个分组，每组一次报价、一次K线（窗口取组内最大需求）
+        assert mock_data.get_current_price.await_count == 2
+        assert mock_data.get_kline_data.await_count == 2
+        assert max(c.kwargs['limit'] for c in mock_data.get_kline_data.await_args_list) == 10 + 45 + 2
+        assert mock_trigger.await_count == 40
+        assert service._snapshots == {}
+
+    
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_price_event_triggers_only_crossed_thresholds(self):
+        """测试价格事件经阈值索引只评估被触及的预警"""
+        service = AlertService()
+        service.is_running = True
+        configs = [
+            ("above_44k", AlertConditionType.PRICE_ABOVE, {"threshold": 44000.0}),
+            ("above_46k", AlertConditionType.PRICE_ABOVE, {"threshold": 46000.0}),
+            ("below_46k", AlertConditionType.PRICE_BELOW, {"threshold": 46000.0}),
+            ("below_44k", AlertConditionType.PRICE_BELOW, {"threshold": 44000.0}),
+            ("stop_long", AlertConditionType.STOP_LOSS, {"stop_price": 45000.0}),
+            ("take_short", AlertConditionType.TAKE_PROFIT, {"target_price": 50000.0, "position_type": "short"}),
+        ]
+        for alert_id, condition_type, config in configs:
+            service.add_alert(Alert(
+                id=alert_id,
+                name=alert_id,
+                symbol="BTC/USDT",
+                market_type=MarketType.CRYPTO,
+                timeframe=Timeframe.H1,
+                condition_type=condition_type,
+                condition_config=config,
+                status=AlertStatus.ACTIVE.value
+            ))
+        
+        assert len(service._threshold_indexes["BTC/USDT"]) == 6
+        assert "BTC/USDT" in price_event_bus.subscribers
+        
+        try:
+            with patch('services.alert_service.data_service') as mock_data:
+                mock_data.get_current_price = AsyncMock(return_value=0.0)
+                with patch.object(service, '_trigger_alert_enhanced', new=AsyncMock()) as mock_trigger:
+                    await price_event_bus.publish(PriceEvent("BTC/USDT", 45000.0, datetime.now()))
+                    # 事件回调只登记被触及的预警，评估由监控循环执行
+                    assert not mock_trigger.called
+                    assert len(service._pending_alerts) == 4
+                    await service._check_pending_alerts()
+            
+            triggered = {c.args[0].id for c in mock_trigger.await_args_list}
+            assert triggered == {"above_44k", "below_46k", "stop_long", "take_short"}
+            assert not mock_data.get_current_price.called
+            assert service._pending_symbols == {"BTC/USDT": 45000.0}
+        finally:
+            service.is_running = False
+            price_event_bus.unsubscribe("BTC/USDT", service._on_price_event)
+    
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_trigger_removes_only_that_alert_from_index(self):
+        """测试触发后只从索引中移除该预警，品种最后一个预警移除后才退订"""
+        service = AlertService()
+        service.is_running = True
+        for alert_id, threshold in (("a", 100.0), ("b", 200.0)):
+            service.add_alert(Alert(
+                id=alert_id, name=alert_id, symbol="SYNIDX", market_type=MarketType.CRYPTO,
+                timeframe=Timeframe.H1, condition_type=AlertConditionType.PRICE_ABOVE,
+                condition_config={"threshold": threshold}, status=AlertStatus.ACTIVE.value,
+                notification_types=[]
+            ))
+        index = service._threshold_indexes["SYNIDX"]
+        
+        try:
+            with patch.object(service, '_refresh_alert_index') as mock_refresh, \
+                 patch.object(service, '_send_alert_notifications', new=AsyncMock()):
+                await service._trigger_alert_enhanced(service.active_alerts["a"], 150.0, {})
+                assert service._threshold_indexes["SYNIDX"] is index
+                assert index.rising_levels == [200.0]
+                assert "SYNIDX" in price_event_bus.subscribers
+                
+                await service._trigger_alert_enhanced(service.active_alerts["b"], 250.0, {})
+                assert "SYNIDX" not in service._threshold_indexes
+                assert "SYNIDX" not in service._subscribed_symbols
+                assert not price_event_bus.subscribers.get("SYNIDX")
+            assert not mock_refresh.called
+        finally:
+            service.is_running = False
+            price_event_bus.unsubscribe("SYNIDX", service._on_price_event)
+
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_alert_changes_update_index_incrementally(self):
+        """测试预警增删改只更新所属品种的索引，不重建全部索引"""
+        service = AlertService()
+        service.is_running = True
+        
+        def make(alert_id, symbol, threshold):
+            return Alert(
+                id=alert_id, name=alert_id, symbol=symbol, market_type=MarketType.CRYPTO,
+                timeframe=Timeframe.H1, condition_type=AlertConditionType.PRICE_ABOVE,
+                condition_config={"threshold": threshold}, status=AlertStatus.ACTIVE.value,
+                notification_types=[]
+            )
+        
+        try:
+            with patch.object(service, '_refresh_alert_index') as mock_refresh:
+                service.add_alert(make("a", "SYNINC", 100.0))
+                service.add_alert(make("b", "SYNINC", 200.0))
+                other = service._threshold_indexes["SYNINC"]
+                assert "SYNINC" in price_event_bus.subscribers
+                
+                # 原地修改阈值后重新添加：旧阈值按建索引时的位置移除
+                alert = service.active_alerts["a"]
+                alert.condition_config = {"threshold": 300.0}
+                service.add_alert(alert)
+                assert service._threshold_indexes["SYNINC"] is other
+                assert other.rising_levels == [200.0, 300.0]
+                
+                service.add_alert(make("b", "SYNMOV", 50.0))
+                assert other.rising_levels == [300.0]
+                assert service._threshold_indexes["SYNMOV"].rising_levels == [50.0]
+                
+                service.delete_alert("a")
+                assert "SYNINC" not in service._threshold_indexes
+                assert not price_event_bus.subscribers.get("SYNINC")
+                assert set(service._subscribed_symbols) == {"SYNMOV"}
+            assert not mock_refresh.called
+        finally:
+            service.is_running = False
+            for symbol in ("SYNINC", "SYNMOV"):
+                price_event_bus.unsubscribe(symbol, service._on_price_event)
+    
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_price_event_check_reuses_event_price(self):
+        """测试按价格事件检查非阈值类预警时使用事件价格，不再查询报价"""
+        service = AlertService()
+        service.add_alert(Alert(
+            id="ma", name="ma", symbol="BTC/USDT", market_type=MarketType.CRYPTO,
+            timeframe=Timeframe.H1, condition_type=AlertConditionType.PRICE_CROSS_MA,
+            condition_config={"ma_period": 10}, status=AlertStatus.ACTIVE.value, notification_types=[]
+        ))
+        await service._on_price_event(PriceEvent("BTC/USDT", 46000.0, datetime.now()))
+        
+        with patch('services.alert_service.data_service') as mock_data, \
+             patch.object(service, '_check_alert', new=AsyncMock()) as mock_check:
+            mock_data.get_current_price = AsyncMock(return_value=0.0)
+            mock_data.get_kline_data = AsyncMock(return_value=None)
+            await service._check_all_alerts(service._pending_symbols)
+        
+        assert not mock_data.get_current_price.called
+        assert mock_check.await_count == 1
+        assert mock_data.get_kline_data.await_args.kwargs["limit"] > 0
+    
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_indicator_streams_released_with_last_alert(self):
+        """测试不再有活跃预警需要时移除流式指标K线流"""
+        from services.streaming_indicators import streaming_indicator_service
+        service = AlertService()
+        for alert_id in ("rsi_1", "rsi_2"):
+            service.add_alert(Alert(
+                id=alert_id, name=alert_id, symbol="SYNRSI", market_type=MarketType.CRYPTO,
+                timeframe=Timeframe.H1, condition_type=AlertConditionType.RSI_OVERBOUGHT,
+                condition_config={"threshold": 70}, status=AlertStatus.ACTIVE.value, notification_types=[]
+            ))
+        streaming_indicator_service.create_stream("SYNRSI", MarketType.CRYPTO, Timeframe.H1)
+        
+        try:
+            with patch.object(service, '_send_alert_notifications', new=AsyncMock()):
+                await service._trigger_alert_enhanced(service.active_alerts["rsi_1"], 75.0, {})
+            assert streaming_indicator_service.get_stream("SYNRSI", Timeframe.H1) is not None
+            
+            service.delete_alert("rsi_2")
+            assert streaming_indicator_service.get_stream("SYNRSI", Timeframe.H1) is None
+        finally:
+            streaming_indicator_service.remove_stream("SYNRSI", Timeframe.H1)
+
 
 @pytest.mark.unit
 class TestAlertServiceExtended:
@@ -0,0 +1,70 @@
+"""
+Backplane 单元测试
+测试主节点租约选举，以及多个 worker 经背板共享同一份行情
+"""
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from services.backplane import InMemoryBackplane, LeaderElector
+
+
+class TestBackplane:
+    """背板与选主测试套件"""
+
+    @pytest.mark.asyncio
+    async def test_single_leader_and_failover(self):
+        """测试同一时刻只有一个主节点，主节点释放或租约过期后由其他 worker 接替"""
+        bus = InMemoryBackplane()
+        a = LeaderElector(bus, "producer", ttl=0.05, owner="a")
+        b = LeaderElector(bus, "producer", ttl=0.05, owner="b")
+
+        assert await a.campaign() is True
+        assert await b.campaign() is False
+        assert await a.campaign() is True  # 持有者续期
+
+        await a.stop()
+        assert await b.campaign() is True
+
+        # b 停止续期后租约过期，a 可以接替
+        await asyncio.sleep(0.06)
+        assert await a.campaign() is True
+        assert await b.campaign() is False and b.transitions == 2
+
+    @pytest.mark.asyncio
+    async def test_workers_fan_out_leader_tickers(self):
+        """测试只有主节点拉取行情，每个 worker 都推送给本进程的连接"""
+        from services.data_service import DataService, TICKER_CHANNEL
+
+        bus = InMemoryBackplane()
+        leader = LeaderElector(bus, "producer", owner="leader")
+        await leader.campaign()
+        ws_manager = MagicMock()
+        tickers = [{'symbol': 'BTC/USDT', 'last': 100.0, 'change': 1.0, 'change_percent': 1.0,
+                    'volume': 5.0, 'timestamp': datetime(2024, 1, 1, 12, 0)}]
+
+        with patch('services.data_service.backplane', bus), \
+             patch('services.data_service.market_leader', leader), \
+             patch('services.data_service.websocket_manager', ws_manager), \
+             patch('services.data_service.price_event_bus') as event_bus:
+            event_bus.missing_symbols.return_value = {}
+            event_bus.publish_tickers = AsyncMock()
+            workers = [DataService(), DataService()]
+            for worker in workers:
+                await bus.subscribe(TICKER_CHANNEL, worker._on_backplane_tickers)
+            workers[0].get_tickers = AsyncMock(return_value=tickers)
+            workers[1].get_tickers = AsyncMock(return_value=tickers)
+
+            await workers[0]._produce_tickers()
+
+        workers[0].get_tickers.assert_awaited_once()
+        workers[1].get_tickers.assert_not_awaited()
+        assert ws_manager.publish_tick.call_count == 2
+        ws_manager.publish_tick.assert_called_with('BTC/USDT', {
+            'price': 100.0, 'change': 1.0, 'change_percent': 1.0, 'volume': 5.0
+        })
+        received = event_bus.publish_tickers.await_args.args[0]
+        assert received[0]['timestamp'] == datetime(2024, 1, 1, 12, 0)
+        assert workers[1]._last_covered == {'BTC/USDT'}
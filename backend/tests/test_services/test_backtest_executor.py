@@ -0,0 +1,137 @@
+"""
+Backtest Executor 单元测试
+测试进程池执行与进度回传、优先级排队、并发上限、取消正在运行的任务，以及回测服务的接入
+"""
+import asyncio
+import os
+import time
+import pytest
+from unittest.mock import patch
+
+from models.market_data import MarketType, Timeframe
+from services.backtest_executor import BacktestJobError
+from services.lean_backtest_service import BacktestRequest, LeanBacktestService
+from services.synthetic_market import SyntheticMarket
+
+
+def _square(x, report):
+    report(f"计算 {x}")
+    return {"value": x * x, "pid": os.getpid()}
+
+
+def _sleep(seconds, name, report):
+    time.sleep(seconds)
+    return name
+
+
+def _slow_backtest(strategy_id, parameters, data, initial_capital, report):
+    report("开始运行策略")
+    time.sleep(30)
+
+
+def _fail(report):
+    raise ValueError("参数错误")
+
+
+class TestBacktestExecutor:
+    """回测进程池测试套件"""
+
+    @pytest.mark.asyncio
+    async def test_runs_job_in_worker_process_with_progress(self, executor):
+        progress = []
+
+        result = await executor.submit("job-1", _square, 7, on_progress=progress.append)
+
+        assert result["value"] == 49
+        assert result["pid"] != os.getpid()
+        assert progress == ["计算 7"]
+        assert executor.get_stats()["completed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_queue_orders_by_priority_then_fifo(self, executor):
+        finished = []
+        blocker = executor.submit("blocker", _sleep, 0.3, "blocker")
+        jobs = [
+            executor.submit("low", _sleep, 0, "low", priority=5),
+            executor.submit("high-1", _sleep, 0, "high-1", priority=1),
+            executor.submit("high-2", _sleep, 0, "high-2", priority=1),
+        ]
+        for future in jobs:
+            future.add_done_callback(lambda f: finished.append(f.result()))
+
+        assert executor.get_stats()["queued"] == 3
+        await asyncio.gather(blocker, *jobs)
+
+        assert finished == ["high-1", "high-2", "low"]
+        # 同一时间只运行一个任务，工作进程被复用
+        assert executor.spawned == 1
+
+    @pytest.mark.asyncio
+    async def test_cancel_terminates_running_worker(self, executor):
+        long_job = executor.submit("long", _sleep, 30, "long")
+        queued = executor.submit("next", _square, 3)
+        await asyncio.sleep(0.2)
+        worker = executor._running["long"]
+
+        assert executor.cancel("long") is True
+        assert long_job.cancelled()
+        assert (await queued)["value"] == 9
+
+        worker.process.join(timeout=2)
+        assert not worker.process.is_alive()
+        assert executor.cancel("long") is False
+        assert executor.get_stats()["cancelled"] == 1
+
+    @pytest.mark.asyncio
+    async def test_job_error_is_raised(self, executor):
+        with pytest.raises(BacktestJobError, match="参数错误"):
+            await executor.submit("bad", _fail)
+
+        # 出错后工作进程仍可继续使用
+        assert (await executor.submit("ok", _square, 2))["value"] == 4
+        assert executor.spawned == 1
+
+
+class TestLeanBacktestExecution:
+    """回测服务接入进程池测试"""
+
+    @pytest.mark.asyncio
+    async def test_backtest_runs_in_pool_and_reports_progress(self, data, executor):
+        service = LeanBacktestService()
+        request = BacktestRequest(strategy_id="rsi_strategy", strategy_code="", symbol="AAPL",
+                                  start_date="2023-01-01", end_date="2024-01-01")
+
+        with patch("services.lean_backtest_service.backtest_executor", executor), \
+             patch.object(service, "_load_historical_data", return_value=data):
+            backtest_id = await service.start_backtest(request)
+            await service._tasks[backtest_id]
+
+        result = await service.get_backtest_status(backtest_id)
+        assert result.status == "completed"
+        assert "total_return" in result.statistics
+        assert len(result.equity_curve) > 0
+        assert any(log.startswith("回测进度") for log in result.logs)
+        assert backtest_id not in service.active_backtests
+
+    @pytest.mark.asyncio
+    async def test_cancel_backtest_while_running(self, executor):
+        data = SyntheticMarket(seed=1).candles("AAPL", MarketType.STOCK, "yfinance", Timeframe.D1, 50).to_frame()
+        service = LeanBacktestService()
+        request = BacktestRequest(strategy_id="rsi_strategy", strategy_code="", symbol="AAPL",
+                                  start_date="2023-01-01", end_date="2024-01-01")
+
+        with patch("services.lean_backtest_service.backtest_executor", executor), \
+             patch("services.lean_backtest_service.run_backtest", _slow_backtest), \
+             patch.object(service, "_load_historical_data", return_value=data):
+            backtest_id = await service.start_backtest(request)
+            task = service._tasks[backtest_id]
+            await asyncio.sleep(0.3)
+
+            assert await service.cancel_backtest(backtest_id) is True
+            await task
+
+        result = await service.get_backtest_status(backtest_id)
+        assert result.status == "cancelled"
+        assert backtest_id not in service.active_backtests
+        assert executor.get_stats()["cancelled"] == 1
+        assert executor.get_stats()["running"] == []
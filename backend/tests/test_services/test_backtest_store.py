@@ -0,0 +1,161 @@
+"""
+Backtest Store 单元测试
+测试列式压缩编码的无损往返、摘要分页查询，以及回测服务结束后只在内存中保留活动回测
+"""
+import pytest
+from sqlalchemy import create_engine, inspect
+from unittest.mock import patch
+
+from services.backtest_store import BacktestStore, pack_columns, unpack_columns
+from services.lean_backtest_service import BacktestRequest, BacktestResult, LeanBacktestService
+
+
+def _result(backtest_id, strategy_id, created_at, **fields):
+    return {
+        "backtest_id": backtest_id, "strategy_id": strategy_id, "status": "completed",
+        "statistics": {"total_return": 1.5, "sharpe_ratio": None}, "created_at": created_at,
+        "logs": ["开始回测", "回测完成"], "equity_curve": [], "trades": [], **fields
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BacktestStore(create_engine(f"sqlite:///{tmp_path / 'store.db'}"))
+
+
+class TestColumnarBlob:
+    """列式编码测试套件"""
+
+    def test_round_trip_keeps_types(self):
+        records = [
+            {"id": i, "date": f"2024-01-{i + 1:02d}", "quantity": 10 + i, "price": 100.5 + i / 3,
+             "note": None if i % 2 else "x"}
+            for i in range(20)
+        ]
+
+        restored = unpack_columns(pack_columns(records))
+
+        assert restored == records
+        assert isinstance(restored[0]["quantity"], int)
+        assert isinstance(restored[0]["price"], float)
+        assert unpack_columns(pack_columns([])) == []
+
+    def test_numeric_columns_are_compact(self):
+        import json
+        records = [{"date": f"2024-{d // 28 + 1:02d}-{d % 28 + 1:02d}", "equity": 10000 + d * 1.2345,
+                    "return": d * 0.0001234} for d in range(300)]
+
+        assert len(pack_columns(records)) < len(json.dumps(records)) / 2
+
+
+class TestBacktestStore:
+    """回测结果存储测试套件"""
+
+    def test_save_and_get_full_result(self, store):
+        equity = [{"date": "2024-01-02", "equity": 10000.0, "return": 0.0},
+                  {"date": "2024-01-03", "equity": 10120.5, "return": 1.205}]
+        trades = [{"id": 1, "date": "2024-01-02", "direction": "long", "quantity": 5,
+                   "entry_price": 100.0, "exit_price": 102.41, "profit_loss": 12.05, "return_pct": 0.0241}]
+
+        store.save(_result("bt-1", "rsi_strategy", "2024-01-01T00:00:00", equity_curve=equity, trades=trades))
+
+        result = store.get("bt-1")
+        assert result["equity_curve"] == equity
+        assert result["trades"] == trades
+        assert result["logs"] == ["开始回测", "回测完成"]
+        assert result["statistics"] == {"total_return": 1.5, "sharpe_ratio": None}
+        assert store.get("missing") is None
+
+    def test_list_is_paginated_newest_first(self, store):
+        for i in range(5):
+            store.save(_result(f"bt-{i}", "rsi_strategy" if i % 2 else "mean_reversion", f"2024-01-0{i + 1}"))
+
+        total, page = store.list(limit=2, offset=1)
+        assert total == 5
+        assert [row["backtest_id"] for row in page] == ["bt-3", "bt-2"]
+        assert "trades" not in page[0]
+
+        total, page = store.list("rsi_strategy")
+        assert total == 2
+        assert [row["backtest_id"] for row in page] == ["bt-3", "bt-1"]
+
+    def test_indexes_and_delete(self, store):
+        store.save(_result("bt-1", "rsi_strategy", "2024-01-01"))
+
+        indexes = {tuple(index["column_names"]) for index in inspect(store.engine).get_indexes("backtest_results")}
+        assert ("strategy_id", "created_at") in indexes
+        assert ("created_at",) in indexes
+        assert store.delete("bt-1") is True
+        assert store.delete("bt-1") is False
+        assert store.count() == 0
+
+
+class TestLeanBacktestHistory:
+    """回测服务历史记录测试"""
+
+    @pytest.mark.asyncio
+    async def test_finished_backtest_persists_and_leaves_memory(self, store, data, executor):
+        service = LeanBacktestService(store=store)
+        request = BacktestRequest(strategy_id="rsi_strategy", strategy_code="", symbol="AAPL",
+                                  start_date="2023-01-01", end_date="2024-01-01", engine="vectorized")
+
+        with patch("services.lean_backtest_service.backtest_executor", executor), \
+             patch.object(service, "_load_historical_data", return_value=data):
+            backtest_id = await service.start_backtest(request)
+            await service._tasks[backtest_id]
+
+        assert service.active_backtests == {}
+        # 服务重启后仍可读取
+        result = await LeanBacktestService(store=store).get_backtest_status(backtest_id)
+        assert result.status == "completed"
+        assert len(result.equity_curve) > 0
+        total, page = await service.get_all_backtests("rsi_strategy")
+        assert total == 1
+        assert page[0].statistics == result.statistics
+        assert await service.delete_backtest(backtest_id) is True
+        assert await service.get_backtest_status(backtest_id) is None
+
+    @pytest.mark.asyncio
+    async def test_store_io_runs_off_event_loop(self, store):
+        """测试归档和查询在线程池中执行结果存储的同步读写"""
+        import threading
+        service = LeanBacktestService(store=store)
+        service.active_backtests["bt-1"] = BacktestResult(
+            backtest_id="bt-1", strategy_id="rsi_strategy", status="completed", created_at="2024-01-01T00:00:00"
+        )
+        threads = []
+        save, get = store.save, store.get
+
+        def record(fn):
+            def wrapper(*args):
+                threads.append(threading.current_thread())
+                return fn(*args)
+            return wrapper
+
+        with patch.object(store, "save", side_effect=record(save)), \
+             patch.object(store, "get", side_effect=record(get)):
+            await service._archive("bt-1")
+            assert (await service.get_backtest_status("bt-1")).status == "completed"
+
+        assert len(threads) == 2
+        assert threading.main_thread() not in threads
+
+    @pytest.mark.asyncio
+    async def test_result_stays_in_memory_until_saved(self, store):
+        service = LeanBacktestService(store=store)
+        for backtest_id in ("bt-1", "bt-2"):
+            service.active_backtests[backtest_id] = BacktestResult(
+                backtest_id=backtest_id, strategy_id="rsi_strategy", status="completed",
+                created_at="2024-01-01T00:00:00"
+            )
+
+        with patch.object(store, "save", side_effect=OSError("database is locked")):
+            await service._archive("bt-1")
+        assert set(service.active_backtests) == {"bt-1", "bt-2"}
+        assert (await service.get_backtest_status("bt-1")).status == "completed"
+        assert await service.cancel_backtest("bt-1") is False
+
+        # 下一次归档时重试之前写入失败的结果
+        await service._archive("bt-2")
+        assert service.active_backtests == {}
+        assert store.count() == 2
@@ -0,0 +1,133 @@
+"""
+Candle Store 单元测试
+测试按月分区的追加写入、尾部原地覆盖、重叠重写、覆盖区间和读盘预热
+"""
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+
+from models.market_data import CandleSeries, MarketType, Timeframe
+from services.candle_store import CandleDiskStore
+
+DAY = 86_400_000
+# 2024-01-30 00:00 UTC
+BASE = 1_706_572_800_000
+KEY = ("BTC/USDT", MarketType.CRYPTO, "binance", Timeframe.D1)
+
+
+class TestCandleDiskStore:
+    """本地K线库测试套件"""
+
+    def test_append_across_month_partitions(self, tmp_path, candle_series):
+        store = CandleDiskStore(str(tmp_path))
+        store.write(KEY, candle_series(2, base_ms=BASE, timeframe=Timeframe.D1), interval_ms=DAY)
+        store.write(KEY, candle_series(3, start=2, base_ms=BASE, timeframe=Timeframe.D1), interval_ms=DAY)
+
+        manifest = store._load_manifest(KEY)
+        assert sorted(manifest["partitions"]) == ["2024-01", "2024-02"]
+        assert manifest["partitions"]["2024-02"]["rows"] == 3
+        assert store.coverage(KEY) == [(BASE, BASE + 4 * DAY)]
+        assert store.rewrites == 0
+
+        series = store.read(KEY)
+        np.testing.assert_array_equal(series.timestamp, BASE + np.arange(5) * DAY)
+        np.testing.assert_array_equal(store.read(KEY, limit=2).close, [103.0, 104.0])
+        assert len(store.read(KEY, BASE + DAY, BASE + 3 * DAY)) == 3
+
+    def test_overlapping_write_rewrites_partition(self, tmp_path, candle_series):
+        """测试重叠写入以新数据为准，旧的一代文件被删除，manifest 之外的字节被忽略"""
+        store = CandleDiskStore(str(tmp_path))
+        store.write(KEY, candle_series(4, start=2, base_ms=BASE, timeframe=Timeframe.D1))
+        store.write(KEY, candle_series([103.5, 104.5], start=3, base_ms=BASE, timeframe=Timeframe.D1))
+
+        series = store.read(KEY)
+        np.testing.assert_array_equal(series.close, [102.0, 103.5, 104.5, 105.0])
+        part_dir = store._dir(KEY) / "2024-02"
+        assert sorted(p.name for p in part_dir.iterdir())[0] == "close.1.bin"
+        assert store.rewrites == 1
+
+        # 模拟追加到一半中断：文件比 manifest 记录的多出字节
+        with open(part_dir / "timestamp.1.bin", "ab") as f:
+            f.write(b"\x00" * 8)
+        assert len(store.read(KEY)) == 4
+        assert store.read_covered(KEY, BASE, BASE + 10 * DAY) is None
+        assert len(store.read_covered(KEY, BASE + 2 * DAY, BASE + 5 * DAY)) == 4
+
+    def test_tail_refresh_overwrites_in_place(self, tmp_path, candle_series):
+        """测试刷新尾部（重叠最后一根）时从重叠处原地覆盖，不重写整个分区"""
+        store = CandleDiskStore(str(tmp_path))
+        store.write(KEY, candle_series(4, start=2, base_ms=BASE, timeframe=Timeframe.D1))
+        store.write(KEY, candle_series([105.5, 106.0, 107.0], start=5, base_ms=BASE, timeframe=Timeframe.D1))
+
+        series = store.read(KEY)
+        np.testing.assert_array_equal(series.close, [102.0, 103.0, 104.0, 105.5, 106.0, 107.0])
+        np.testing.assert_array_equal(series.timestamp, BASE + np.arange(2, 8) * DAY)
+        part = store._load_manifest(KEY)["partitions"]["2024-02"]
+        assert (part["rows"], part["gen"], part["last"]) == (6, 0, BASE + 7 * DAY)
+        assert (store.rewrites, store.tail_overwrites) == (0, 1)
+
+        # 新数据缺少分区中已有的某根K线时仍按合并重写处理
+        store.write(KEY, candle_series([106.5], start=6, base_ms=BASE, timeframe=Timeframe.D1))
+        np.testing.assert_array_equal(store.read(KEY).close[-2:], [106.5, 107.0])
+        assert store.rewrites == 1
+
+    def test_read_retries_after_concurrent_rewrite(self, tmp_path, candle_series):
+        """测试读取时旧一代文件已被并发写入删除，重新读取 manifest 后重试"""
+        store = CandleDiskStore(str(tmp_path))
+        store.write(KEY, candle_series(4, start=2, base_ms=BASE, timeframe=Timeframe.D1))
+        stale = store._load_manifest(KEY)
+        store.write(KEY, candle_series([103.5], start=3, base_ms=BASE, timeframe=Timeframe.D1))
+        fresh = store._load_manifest(KEY)
+
+        with patch.object(store, "_load_manifest", side_effect=[stale, fresh]):
+            series = store.read(KEY)
+
+        np.testing.assert_array_equal(series.close, [102.0, 103.5, 104.0, 105.0])
+        assert store.get_stats()["read_retries"] == 1
+
+    @pytest.mark.asyncio
+    async def test_data_service_warms_from_disk(self, isolated_candle_store):
+        """测试冷启动时从本地库建立区间，只向数据源补取尾部"""
+        from services.data_service import DataService
+
+        now_ms = int(datetime.now().timestamp() * 1000)
+        minute = 60_000
+        last = now_ms - now_ms % minute - minute
+        rows = [[last - (99 - i) * minute, 1.0, 2.0, 0.5, 1.5, 1.0] for i in range(100)]
+        key = ("BTC/USDT", MarketType.CRYPTO, "binance", Timeframe.M1)
+        isolated_candle_store.write(key, CandleSeries.from_ohlcv(rows, "BTC/USDT", *key[1:]), interval_ms=minute)
+        # 上次写入已超过尾部新鲜期
+        manifest = isolated_candle_store._load_manifest(key)
+        manifest["updated_at"] -= 600
+        isolated_candle_store._save_manifest(key, manifest)
+
+        cache = MagicMock()
+        cache.get = AsyncMock(return_value=None)
+        cache.set = AsyncMock()
+        with patch('services.data_service.data_cache_service', cache):
+            service = DataService()
+            service._fetch_from_providers = AsyncMock(side_effect=lambda *args: CandleSeries.from_ohlcv(
+                rows[-2:], "BTC/USDT", *key[1:]))
+            klines = await service.get_klines("BTC/USDT", MarketType.CRYPTO, "binance", Timeframe.M1, limit=50)
+
+        assert len(klines) == 50
+        # 只补取了距最新K线的几根，而不是请求的 50 根
+        assert service._fetch_from_providers.await_args.args[4] < 50
+
+    @pytest.mark.asyncio
+    async def test_mock_klines_are_not_persisted(self, isolated_candle_store):
+        """测试没有真实数据源的市场返回的模拟K线不写入本地库和 InfluxDB"""
+        from services.data_service import DataService
+
+        cache = MagicMock()
+        cache.get = AsyncMock(return_value=None)
+        cache.set = AsyncMock()
+        with patch('services.data_service.data_cache_service', cache), \
+             patch('services.data_service.influx_writer') as writer:
+            klines = await DataService().get_klines("IF2406", MarketType.FUTURES, "cffex", Timeframe.D1, limit=30)
+
+        assert len(klines) == 30 and klines.is_mock
+        writer.submit.assert_not_called()
+        assert isolated_candle_store.coverage(("IF2406", MarketType.FUTURES, "cffex", Timeframe.D1)) == []
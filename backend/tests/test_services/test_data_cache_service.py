@@ -0,0 +1,198 @@
+"""
+Data Cache Service 单元测试
+测试分层缓存的字节计量、淘汰策略、二级缓存序列化和请求合并
+"""
+import asyncio
+import pytest
+import numpy as np
+from datetime import datetime
+from unittest.mock import patch
+
+from services.data_cache_service import DataCacheService, encode_value, decode_value, estimate_size
+from services.single_flight import SingleFlight
+from models.market_data import CandleSeries, MarketType, Timeframe
+
+
+class FakeRedis:
+    """只实现缓存服务用到的 Redis 命令"""
+
+    def __init__(self):
+        self.store = {}
+
+    def set(self, key, value, px=None):
+        self.store[key] = value
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def pttl(self, key):
+        return 5000 if key in self.store else -2
+
+    def delete(self, *keys):
+        for key in keys:
+            self.store.pop(key, None)
+
+    def pipeline(self):
+        redis = self
+        calls = []
+
+        class Pipeline:
+            def get(self, key):
+                calls.append(lambda: redis.get(key))
+
+            def pttl(self, key):
+                calls.append(lambda: redis.pttl(key))
+
+            def execute(self):
+                return [call() for call in calls]
+
+        return Pipeline()
+
+
+class TestDataCacheService:
+    """DataCacheService 测试套件"""
+
+    @pytest.mark.asyncio
+    async def test_memory_accounting_and_lru_eviction(self, candle_series):
+        """测试字节计量及超出上限时淘汰最久未访问的条目"""
+        size = estimate_size(candle_series(100))
+        cache = DataCacheService(max_memory_bytes=size * 3, redis_enabled=False)
+
+        await cache.set("a", candle_series(100))
+        await cache.set("b", candle_series(100))
+        await cache.set("c", candle_series(100))
+        assert cache.memory_bytes == size * 3
+
+        assert await cache.get("a") is not None  # a 变为最近访问
+        await cache.set("d", candle_series(100))
+
+        assert await cache.exists("b") is False
+        assert await cache.exists("a") is True
+        stats = cache.get_stats()
+        assert stats["evictions"] == 1
+        assert stats["memory_bytes"] == size * 3
+        assert stats["memory_usage"] == f"{size * 3} bytes"
+
+        await cache.delete("a")
+        assert cache.memory_bytes == size * 2
+
+    @pytest.mark.asyncio
+    async def test_lfu_evicts_least_frequently_used(self, candle_series):
+        """测试 LFU 策略淘汰访问次数最少的条目"""
+        size = estimate_size(candle_series(10))
+        cache = DataCacheService(max_memory_bytes=size * 2, eviction_policy="lfu", redis_enabled=False)
+
+        await cache.set("hot", candle_series(10))
+        await cache.set("cold", candle_series(10))
+        for _ in range(3):
+            await cache.get("hot")
+        await cache.get("cold")
+        await cache.set("new", candle_series(10))
+
+        assert await cache.exists("hot") is True
+        assert await cache.exists("cold") is False
+
+    def test_value_codec_roundtrip(self, candle_series):
+        """测试K线二进制编码和 JSON 编码可还原"""
+        series = candle_series(50)
+        restored = decode_value(encode_value(series))
+        assert isinstance(restored, CandleSeries)
+        assert restored.market_type == MarketType.CRYPTO
+        assert restored.timeframe == Timeframe.M1
+        np.testing.assert_array_equal(restored.timestamp, series.timestamp)
+        np.testing.assert_array_equal(restored.close, series.close)
+        assert len(encode_value(series)) < 50 * 6 * 8 + 200
+
+        quote = {"symbol": "AAPL", "price": 100.5, "timestamp": datetime(2024, 1, 1, 9, 30)}
+        assert decode_value(encode_value(quote)) == quote
+
+    @pytest.mark.asyncio
+    async def test_l2_shared_between_instances(self, candle_series):
+        """测试 L1 未命中时从 Redis 读取并回填"""
+        redis = FakeRedis()
+        with patch('services.data_cache_service.database.get_redis', return_value=redis):
+            writer = DataCacheService(redis_enabled=True)
+            reader = DataCacheService(redis_enabled=True)
+
+            await writer.set("klines_BTC", candle_series(20), ttl=60)
+            value = await reader.get("klines_BTC")
+
+            assert isinstance(value, CandleSeries)
+            assert len(value) == 20
+            assert await reader.exists("klines_BTC") is True
+            assert reader.get_stats()["l2"]["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_stale_while_revalidate(self):
+        """测试过期后宽限期内返回旧值并只触发一次后台刷新"""
+        cache = DataCacheService(redis_enabled=False)
+        calls = []
+
+        async def refresh():
+            calls.append(1)
+            await asyncio.sleep(0)
+            await cache.set("quote", {"price": 2.0}, ttl=60)
+
+        await cache.set("quote", {"price": 1.0}, ttl=0, stale_ttl=30, refresh=refresh)
+        await asyncio.sleep(0.01)
+
+        assert await cache.get("quote") == {"price": 1.0}
+        assert await cache.get("quote") == {"price": 1.0}
+        await asyncio.sleep(0.01)
+
+        assert len(calls) == 1
+        assert await cache.get("quote") == {"price": 2.0}
+        assert cache.get_stats()["stale_hits"] == 2
+
+
+class TestSingleFlight:
+    """SingleFlight 请求合并测试"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return len(calls)
+
+        results = await asyncio.gather(*(flight.do("k", fetch) for _ in range(20)))
+
+        assert results == [1] * 20
+        assert flight.get_stats() == {"in_flight": 0, "executions": 1, "coalesced": 19}
+
+    @pytest.mark.asyncio
+    async def test_errors_are_shared_and_not_cached(self):
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("rate limited")
+
+        results = await asyncio.gather(*(flight.do("k", fail) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+        async def ok():
+            return "fresh"
+
+        assert await flight.do("k", ok) == "fresh"
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_fail_others(self):
+        flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.02)
+            return 42
+
+        first = asyncio.create_task(flight.do("k", fetch))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(flight.do("k", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        assert await second == 42
+        assert first.cancelled()
+        assert flight.get_stats() == {"in_flight": 0, "executions": 1, "coalesced": 1}
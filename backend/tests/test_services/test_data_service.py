@@ -2,12 +2,15 @@
 测试 DataService 数据服务
 包含数据源降级、缓存策略、K线数据获取等功能的测试
 """
+import asyncio
 import pytest
 from unittest.mock import Mock, AsyncMock, patch
-from datetime import datetime
+from datetime import datetime, timedelta
+
+import numpy as np
 
 from services.data_service import DataService
-from models.market_data import KlineData, MarketType, Timeframe
+from models.market_data import KlineData, CandleSeries, MarketType, Timeframe
 
 
 class TestDataService:
@@ -166,7 +169,8 @@ class TestDataService:
         
         # 验证模拟数据
         assert len(result) == 10
-        assert all(isinstance(k, KlineData) for k in result)
+        assert isinstance(result, CandleSeries)
+        assert np.all(np.diff(result.timestamp) > 0), "模拟数据应按时间升序排列"
         assert all(k.symbol == "TEST/USDT" for k in result)
         assert all(k.market_type == MarketType.CRYPTO for k in result)
         
@@ -440,6 +444,151 @@ class TestDataServiceExtended:
         assert result1 is not None
         assert result2 is not None
 
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_get_kline_data_returns_latest_last(self):
+        """测试 get_kline_data 返回升序序列且最后一根为最新K线"""
+        service = DataService()
+        
+        with patch('services.data_service.data_cache_service') as mock_cache:
+            mock_cache.get = AsyncMock(return_value=None)
+            mock_cache.set = AsyncMock()
+            
+            result = await service.get_kline_data(
+                symbol="TEST/FUND",
+                timeframe="1h",
+                market_type=MarketType.FUND,
+                limit=5
+            )
+        
+        assert isinstance(result, CandleSeries)
+        assert len(result) == 5
+        assert result.timeframe == Timeframe.H1
+        assert result[-1].timestamp > result[0].timestamp
+
+    
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_concurrent_cache_misses_fetch_once(self):
+        """测试同一缓存键的并发未命中只请求一次数据源"""
+        service = DataService()
+        
+        async def slow_klines(symbol, timeframe, limit, mock_on_error=True):
+            await asyncio.sleep(0.01)
+            return [KlineData(
+                symbol=symbol, timeframe=timeframe, market_type=MarketType.CRYPTO,
+                timestamp=datetime.now(), open=1.0, high=1.0, low=1.0, close=1.0, volume=1.0
+            )]
+        
+        with patch('services.data_service.data_cache_service') as mock_cache, \
+             patch('services.data_service.coingecko_service') as mock_cg:
+            mock_cache.get = AsyncMock(return_value=None)
+            mock_cache.set = AsyncMock()
+            mock_cg.get_crypto_klines = AsyncMock(side_effect=slow_klines)
+            
+            results = await asyncio.gather(*(
+                service.get_klines("BTC/USDT", MarketType.CRYPTO, "binance", Timeframe.H1, limit=10)
+                for _ in range(10)
+            ))
+        
+        assert mock_cg.get_crypto_klines.await_count == 1
+        assert all(r is results[0] for r in results)
+        assert mock_cache.set.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_smaller_limit_served_from_kline_store(self):
+        """测试已取得 1000 根后，请求 500 根直接从区间存储切片，不再请求数据源"""
+        service = DataService()
+        base = int(datetime.now().timestamp() * 1000) // 3600_000 * 3600_000
+        rows = [[base - (999 - i) * 3600_000, 1.0, 2.0, 0.5, 1.0 + i, 1.0] for i in range(1000)]
+
+        with patch('services.data_service.data_cache_service') as mock_cache, \
+             patch('services.data_service.coingecko_service') as mock_cg:
+            mock_cache.get = AsyncMock(return_value=None)
+            mock_cache.set = AsyncMock()
+            mock_cg.get_crypto_klines = AsyncMock(return_value=CandleSeries.from_ohlcv(
+                rows, "BTC/USDT", MarketType.CRYPTO, "binance", Timeframe.H1
+            ))
+
+            full = await service.get_klines("BTC/USDT", MarketType.CRYPTO, "binance", Timeframe.H1, limit=1000)
+            part = await service.get_klines("BTC/USDT", MarketType.CRYPTO, "binance", Timeframe.H1, limit=500)
+
+        assert mock_cg.get_crypto_klines.await_count == 1
+        assert len(full) == 1000
+        assert len(part) == 500
+        np.testing.assert_array_equal(part.close, full.close[-500:])
+        assert service.kline_store.get_stats()["served"] == 1
+
+
+class TestCandleSeries:
+    """CandleSeries 列式K线测试类"""
+    
+    def _make_rows(self, n=5):
+        base = int(datetime(2024, 1, 1).timestamp() * 1000)
+        return [[base + i * 3600_000, 100 + i, 101 + i, 99 + i, 100.5 + i, 10.0 * i] for i in range(n)]
+    
+    @pytest.mark.unit
+    def test_from_ohlcv_sorts_and_types(self):
+        """测试从 OHLCV 行构建时按时间排序并使用紧凑的数值类型"""
+        rows = self._make_rows()
+        series = CandleSeries.from_ohlcv(list(reversed(rows)), "BTC/USDT", MarketType.CRYPTO, "binance", Timeframe.H1)
+        
+        assert len(series) == 5
+        assert series.timestamp.dtype == np.int64
+        assert series.close.dtype == np.float64
+        assert series.close.tolist() == [r[4] for r in rows]
+        assert series[0].timestamp == datetime(2024, 1, 1)
+    
+    @pytest.mark.unit
+    def test_from_ohlcv_empty_and_missing_volume(self):
+        """测试空数据与缺失成交量列"""
+        empty = CandleSeries.from_ohlcv([], "BTC/USDT", MarketType.CRYPTO, "binance", Timeframe.H1)
+        assert len(empty) == 0
+        assert not empty
+        
+        series = CandleSeries.from_ohlcv([r[:5] for r in self._make_rows(3)], "BTC/USDT", MarketType.CRYPTO, "binance", Timeframe.H1)
+        assert np.isnan(series.volume).all()
+        assert series.to_dicts()[0]["volume"] is None
+    
+    @pytest.mark.unit
+    def test_round_trip_with_klines(self):
+        """测试与 KlineData 之间的相互转换"""
+        series = CandleSeries.from_ohlcv(self._make_rows(), "AAPL", MarketType.STOCK, "nasdaq", Timeframe.H1)
+        klines = series.to_klines()
+        
+        assert all(isinstance(k, KlineData) for k in klines)
+        assert klines[-1].close == series.close[-1]
+        
+        restored = CandleSeries.from_klines(klines)
+        assert restored.symbol == "AAPL"
+        assert restored.exchange == "nasdaq"
+        np.testing.assert_array_equal(restored.timestamp, series.timestamp)
+        np.testing.assert_array_equal(restored.close, series.close)
+    
+    @pytest.mark.unit
+    def test_slicing_tail_and_between(self):
+        """测试切片、tail 与按时间区间截取"""
+        series = CandleSeries.from_ohlcv(self._make_rows(10), "BTC/USDT", MarketType.CRYPTO, "binance", Timeframe.H1)
+        
+        assert isinstance(series[2:5], CandleSeries)
+        assert len(series[2:5]) == 3
+        assert series.tail(3).close.tolist() == series.close[-3:].tolist()
+        assert len(series.tail(0)) == 0
+        
+        start = datetime(2024, 1, 1) + timedelta(hours=2)
+        end = datetime(2024, 1, 1) + timedelta(hours=4)
+        window = series.between(start, end)
+        assert len(window) == 3
+        assert window[0].timestamp == start
+        assert window[-1].timestamp == end
+    
+    @pytest.mark.unit
+    def test_length_mismatch_rejected(self):
+        """测试列长度不一致时报错"""
+        with pytest.raises(ValueError):
+            CandleSeries("X", MarketType.CRYPTO, "binance", Timeframe.H1,
+                         np.arange(3), np.ones(3), np.ones(3), np.ones(2), np.ones(3), np.ones(3))
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,107 @@
+"""
+Exchange Pool 单元测试
+测试实例懒加载、共享连接池、市场信息缓存和批量行情获取
+"""
+import asyncio
+import pytest
+from unittest.mock import patch
+
+from services.exchange_pool import ExchangePool
+
+
+class FakeExchange:
+    """只实现连接池用到的 ccxt 异步接口"""
+
+    def __init__(self, has_fetch_tickers=True):
+        self.session = None
+        self.own_session = True
+        self.has = {'fetchTickers': has_fetch_tickers}
+        self.markets = {}
+        self.calls = []
+        self.closed = False
+
+    async def load_markets(self, reload=False):
+        self.calls.append(("load_markets", reload))
+        await asyncio.sleep(0.01)
+        self.markets = {"BTC/USDT": {"base": "BTC"}, "ETH/USDT": {"base": "ETH"}}
+        return self.markets
+
+    async def fetch_tickers(self, symbols=None):
+        self.calls.append(("fetch_tickers", symbols))
+        return {s: {"symbol": s, "last": 1.0} for s in (symbols or ["BTC/USDT", "ETH/USDT"])}
+
+    async def fetch_ticker(self, symbol):
+        self.calls.append(("fetch_ticker", symbol))
+        if symbol == "BAD/USDT":
+            raise RuntimeError("bad symbol")
+        return {"symbol": symbol, "last": 2.0}
+
+    async def close(self):
+        self.session = None
+        self.closed = True
+
+
+class TestExchangePool:
+    """ExchangePool 测试套件"""
+
+    def test_lazy_instances_and_unknown_exchange(self):
+        pool = ExchangePool(["binance", "okx"])
+        assert pool.exchanges == {}
+        exchange = pool.get_exchange("okx")
+        assert pool.get_exchange("okx") is exchange
+        with pytest.raises(ValueError):
+            pool.get_exchange("not_an_exchange")
+
+    @pytest.mark.asyncio
+    async def test_shared_session_and_markets_loaded_once(self):
+        """测试各交易所共享同一会话，并发加载市场信息只请求一次"""
+        pool = ExchangePool()
+        pool.exchanges = {"binance": FakeExchange(), "okx": FakeExchange()}
+
+        results = await asyncio.gather(*(pool.load_markets("binance") for _ in range(5)))
+        await pool.load_markets("okx")
+
+        assert all(r is results[0] for r in results)
+        assert pool.exchanges["binance"].calls == [("load_markets", False)]
+        assert pool.exchanges["binance"].session is pool.exchanges["okx"].session
+        assert pool.exchanges["binance"].own_session is False
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_batched_tickers_across_exchanges(self):
+        """测试支持 fetchTickers 的交易所一次请求取回，不支持的逐个并发请求并跳过失败品种"""
+        pool = ExchangePool()
+        pool.exchanges = {"binance": FakeExchange(), "okx": FakeExchange(has_fetch_tickers=False)}
+
+        tickers = await pool.fetch_tickers_across({
+            "binance": ["BTC/USDT", "ETH/USDT"],
+            "okx": ["BTC/USDT", "BAD/USDT"]
+        })
+
+        assert list(tickers["binance"]) == ["BTC/USDT", "ETH/USDT"]
+        assert pool.exchanges["binance"].calls == [("fetch_tickers", ["BTC/USDT", "ETH/USDT"])]
+        assert list(tickers["okx"]) == ["BTC/USDT"]
+        assert pool.get_stats()["errors"] == 1
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_loop_change_closes_old_instances_and_session(self):
+        """测试事件循环变化时先关闭旧的交易所实例和会话，再重新创建"""
+        pool = ExchangePool()
+        old = FakeExchange()
+        pool.exchanges = {"binance": old}
+        await pool.load_markets("binance")
+        session = pool._session
+
+        stale_loop = asyncio.new_event_loop()
+        pool._loop = stale_loop
+        try:
+            with patch.object(pool, "_create_exchange", side_effect=lambda exchange_id: FakeExchange()):
+                await pool.load_markets("binance")
+        finally:
+            stale_loop.close()
+
+        assert old.closed and session.closed
+        assert pool.exchanges["binance"] is not old
+        assert pool.exchanges["binance"].session is pool._session is not session
+        await pool.close()
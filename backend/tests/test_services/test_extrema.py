@@ -0,0 +1,83 @@
+"""
+Extrema 单元测试
+测试向量化局部极值与逐点定义一致、滚动趋势线斜率、枢轴点缓存以及形态识别对枢轴点的使用
+"""
+import pytest
+
+import numpy as np
+
+from services.extrema import SeriesExtrema, find_peaks, find_valleys, rolling_slope
+from services.pattern_recognition_service import PatternRecognitionService, PatternType
+from services.technical_analysis_service import TechnicalAnalysisService
+
+
+def _naive_peaks(prices, distance):
+    return [i for i in range(distance, len(prices) - distance)
+            if all(prices[i] >= prices[i - j] for j in range(1, distance + 1)) and
+            all(prices[i] >= prices[i + j] for j in range(1, distance + 1))]
+
+
+def _naive_valleys(prices, distance):
+    return [i for i in range(distance, len(prices) - distance)
+            if all(prices[i] <= prices[i - j] for j in range(1, distance + 1)) and
+            all(prices[i] <= prices[i + j] for j in range(1, distance + 1))]
+
+
+class TestExtrema:
+    """局部极值测试套件"""
+
+    @pytest.mark.parametrize("distance", [1, 5, 10])
+    def test_matches_pointwise_definition(self, distance):
+        rng = np.random.default_rng(distance)
+        # 离散化后存在大量相等的平台，并混入 NaN
+        prices = np.round(rng.standard_normal(400).cumsum()).tolist()
+        prices[50] = float("nan")
+
+        assert find_peaks(prices, distance).tolist() == _naive_peaks(prices, distance)
+        assert find_valleys(prices, distance).tolist() == _naive_valleys(prices, distance)
+
+    def test_short_series_has_no_extrema(self):
+        assert find_peaks([1.0, 3.0, 2.0], 5).tolist() == []
+        assert find_valleys([], 5).tolist() == []
+
+    def test_rolling_slope_matches_regression(self):
+        rng = np.random.default_rng(0)
+        prices = 100 + rng.standard_normal(80).cumsum()
+        slopes = rolling_slope(prices, 30)
+
+        assert len(slopes) == 51
+        for s in (0, 17, 50):
+            window = prices[s:s + 30]
+            expected = np.polyfit(np.arange(30), window, 1)[0] / window.mean()
+            assert slopes[s] == pytest.approx(expected, rel=1e-9)
+
+    def test_series_extrema_caches_pivots(self, candle_series):
+        extrema = SeriesExtrema(candle_series(100 + np.sin(np.arange(200) / 5) * 10))
+
+        first = extrema.peaks("high", 5)
+        assert extrema.peaks("high", 5) is first
+        extrema.valleys("low", 5)
+        extrema.slopes("high", 30)
+        assert extrema.stats() == {"nodes": 3}
+
+    def test_support_resistance_uses_local_extrema(self):
+        prices = [10, 9, 8, 9, 10, 11, 12, 11, 10, 9, 8, 9, 10]
+
+        levels = TechnicalAnalysisService().calculate_support_resistance(prices, window=2)
+
+        assert levels == {"support": [8.0, 8.0], "resistance": [12.0]}
+
+    @pytest.mark.asyncio
+    async def test_double_top_detected_from_shared_pivots(self, candle_series):
+        # 两个相同高度的峰值，中间回落约 10%
+        close = np.concatenate([
+            np.linspace(90, 110, 20), np.linspace(110, 99, 15), np.linspace(99, 110, 15), np.linspace(110, 95, 20)
+        ])
+
+        patterns = await PatternRecognitionService().detect_all_patterns(candle_series(close), min_confidence=0.0)
+
+        double_tops = [p for p in patterns if p.pattern_type == PatternType.DOUBLE_TOP]
+        # 每个峰顶是两根等高K线的平台，只有跨越回落的一对峰值构成双顶
+        assert len(double_tops) == 1
+        assert double_tops[0].start_index == 20
+        assert double_tops[0].end_index == 49
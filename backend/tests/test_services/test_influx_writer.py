@@ -0,0 +1,79 @@
+"""
+InfluxDB 批量写入单元测试
+测试 line protocol 编码、批量去重、失败重试和队列上限
+"""
+import pytest
+from unittest.mock import AsyncMock
+
+from models.market_data import CandleSeries, MarketType, Timeframe
+from services.influx_writer import InfluxKlineWriter, encode_candles
+
+BASE = 1_700_000_000_000
+
+
+def _writer(**kwargs) -> InfluxKlineWriter:
+    writer = InfluxKlineWriter(backoff=0, **kwargs)
+    writer.is_running = True
+    writer._write = AsyncMock()
+    return writer
+
+
+class TestInfluxKlineWriter:
+    """InfluxDB 批量写入测试套件"""
+
+    def test_encode_candles_line_protocol(self, candle_series):
+        rows = [[BASE, 1.0, 2.0, 0.5, 1.5, None]]
+        series = CandleSeries.from_ohlcv(rows, "S&P 500", MarketType.INDEX, "", Timeframe.D1)
+
+        assert encode_candles(series) == [
+            f"kline_data,symbol=S&P\\ 500,market_type=index,timeframe=1d open=1.0,high=2.0,low=0.5,close=1.5 {BASE}"
+        ]
+        assert encode_candles(candle_series(2, base_ms=BASE))[1].endswith(f"volume=10.0 {BASE + 60_000}")
+
+    @pytest.mark.asyncio
+    async def test_batches_and_skips_written_bars(self, candle_series):
+        """测试多次提交合并为一批写入，重叠部分只重写最后一根未收盘K线"""
+        writer = _writer(batch_size=100)
+        assert writer.submit(candle_series(5, base_ms=BASE))
+        assert writer.submit(candle_series(5, base_ms=BASE, symbol="ETH/USDT"))
+        await writer.flush()
+
+        assert writer._write.await_count == 1
+        assert len(writer._write.await_args.args[0]) == 10
+
+        writer.submit(candle_series(6, start=2, base_ms=BASE))
+        await writer.flush()
+
+        lines = writer._write.await_args.args[0]
+        assert [int(line.rsplit(" ", 1)[1]) for line in lines] == [BASE + i * 60_000 for i in range(4, 8)]
+        assert writer.skipped_points == 2
+        assert writer.get_stats()["written_points"] == 14
+
+    @pytest.mark.asyncio
+    async def test_retry_then_drop_on_persistent_failure(self, candle_series):
+        writer = _writer(max_retries=2)
+        writer._write.side_effect = [RuntimeError("timeout"), None]
+        writer.submit(candle_series(3, base_ms=BASE))
+        await writer.flush()
+        assert writer.retries == 1 and writer.written_points == 3
+
+        writer._write.side_effect = RuntimeError("down")
+        writer.submit(candle_series(3, start=10, base_ms=BASE))
+        await writer.flush()
+        assert writer._write.await_count == 5
+        assert writer.failed_points == 3
+        # 写入失败的区间未标记，之后可以重新写入
+        writer._write.side_effect = None
+        writer.submit(candle_series(3, start=10, base_ms=BASE))
+        await writer.flush()
+        assert len(writer._write.await_args.args[0]) == 3
+
+    def test_bounded_queue_and_idle_writer(self, candle_series):
+        writer = _writer(max_pending=5)
+        assert writer.submit(candle_series(4, base_ms=BASE))
+        assert writer.submit(candle_series(4, start=4, base_ms=BASE)) is False
+        assert writer.dropped_points == 4
+
+        idle = InfluxKlineWriter()
+        assert idle.submit(candle_series(4, base_ms=BASE)) is False
+        assert idle.pending == 0
@@ -0,0 +1,62 @@
+"""
+K线区间存储单元测试
+测试按区间切片返回、尾部增量补取和头部不足时的重新获取
+"""
+import pytest
+import numpy as np
+from datetime import datetime
+
+from services.kline_segment_store import KlineSegmentStore
+from models.market_data import MarketType, Timeframe
+
+HOUR = 3600_000
+KEY = ("BTC/USDT", MarketType.CRYPTO, Timeframe.H1)
+NOW_MS = 1_700_000_000_000 // HOUR * HOUR
+
+
+class TestKlineSegmentStore:
+    """KlineSegmentStore 测试套件"""
+
+    def test_serves_smaller_limit_and_range_without_fetch(self, candle_series):
+        """测试较小 limit 与时间区间请求直接切片"""
+        store = KlineSegmentStore(ttl=300)
+        now = NOW_MS / 1000
+        assert store.plan(KEY, HOUR, 100, now=now) == 100
+        store.merge(KEY, candle_series(100, start=-99, base_ms=NOW_MS, timeframe=Timeframe.H1), 100, HOUR, now=now)
+
+        assert store.plan(KEY, HOUR, 50, now=now + 10) == 0
+        assert len(store.query(KEY, 50)) == 50
+
+        start = datetime.fromtimestamp((NOW_MS - 20 * HOUR) / 1000)
+        end = datetime.fromtimestamp((NOW_MS - 10 * HOUR) / 1000)
+        assert store.plan(KEY, HOUR, 1000, start, end, now=now + 10) == 0
+        assert len(store.query(KEY, 1000, start, end)) == 11
+
+    def test_stale_tail_fetches_only_new_bars(self, candle_series):
+        """测试过期后只补取最新的几根并与已有区间合并"""
+        store = KlineSegmentStore(ttl=300)
+        now = NOW_MS / 1000
+        store.merge(KEY, candle_series(100, start=-99, base_ms=NOW_MS, timeframe=Timeframe.H1), 100, HOUR, now=now)
+
+        later = now + 3 * 3600
+        fetch = store.plan(KEY, HOUR, 100, now=later)
+        assert fetch == 5
+        segment = store.merge(KEY, candle_series(fetch, start=-1, base_ms=NOW_MS, timeframe=Timeframe.H1), fetch, HOUR, now=later)
+
+        assert len(segment.series) == 103
+        assert np.all(np.diff(segment.series.timestamp) == HOUR)
+        assert store.plan(KEY, HOUR, 100, now=later + 1) == 0
+        assert store.get_stats()["tail_fetches"] == 1
+
+    def test_larger_limit_refetches_head(self, candle_series):
+        """测试请求超出已有区间时按总根数重新获取，数据源耗尽后不再重复获取"""
+        store = KlineSegmentStore(ttl=300)
+        now = NOW_MS / 1000
+        store.merge(KEY, candle_series(100, start=-99, base_ms=NOW_MS, timeframe=Timeframe.H1), 100, HOUR, now=now)
+
+        assert store.plan(KEY, HOUR, 500, now=now) == 500
+        # 数据源只有 300 根，说明已没有更早的数据
+        segment = store.merge(KEY, candle_series(300, start=-299, base_ms=NOW_MS, timeframe=Timeframe.H1), 500, HOUR, now=now)
+        assert segment.head_complete
+        assert store.plan(KEY, HOUR, 500, now=now) == 0
+        assert len(store.query(KEY, 500)) == 300
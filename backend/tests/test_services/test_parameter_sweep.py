@@ -0,0 +1,170 @@
+"""
+Parameter Sweep 单元测试
+测试参数网格展开与约束、共享内存数据与指标复用、进程池扫描的排名和热力图，以及取消扫描
+"""
+import asyncio
+import pytest
+from multiprocessing import shared_memory
+from unittest.mock import patch
+
+from backtesting import Backtest
+
+from services import backtest_strategies
+from services.lean_backtest_service import lean_service
+from services.parameter_sweep import (
+    ParameterRange, ParameterSweepService, SweepRequest, SweepResult, build_heatmap, expand_grid, expand_values
+)
+
+
+def _request(**grid) -> SweepRequest:
+    return SweepRequest(strategy_id="moving_average_crossover", symbol="AAPL",
+                        start_date="2023-01-01", end_date="2024-01-01", parameter_grid=grid)
+
+
+class TestParameterGrid:
+    """参数网格测试套件"""
+
+    def test_expand_inclusive_ranges(self):
+        assert expand_values(ParameterRange(start=5, stop=20, step=5)) == [5, 10, 15, 20]
+        assert expand_values(ParameterRange(start=1.5, stop=2.5, step=0.5)) == [1.5, 2.0, 2.5]
+        assert expand_values([7, 14]) == [7, 14]
+
+    def test_invalid_combinations_are_skipped(self):
+        combinations = expand_grid("moving_average_crossover",
+                                   {"fast_period": [10, 20], "slow_period": [10, 20, 30]})
+
+        assert combinations == [
+            {"fast_period": 10, "slow_period": 20}, {"fast_period": 10, "slow_period": 30},
+            {"fast_period": 20, "slow_period": 30},
+        ]
+
+    def test_heatmap_takes_best_over_extra_parameters(self):
+        grid = {"bb_period": [10, 20], "std_dev": [1.5, 2.0], "commission": [0, 1]}
+        rows = [
+            {"parameters": {"bb_period": 10, "std_dev": 1.5, "commission": 0}, "statistics": {"sharpe_ratio": 0.2}},
+            {"parameters": {"bb_period": 10, "std_dev": 1.5, "commission": 1}, "statistics": {"sharpe_ratio": 0.5}},
+            {"parameters": {"bb_period": 20, "std_dev": 2.0, "commission": 0}, "statistics": {"sharpe_ratio": None}},
+        ]
+
+        heatmap = build_heatmap(rows, grid, "sharpe_ratio")
+
+        assert (heatmap["x_param"], heatmap["y_param"]) == ("bb_period", "std_dev")
+        assert heatmap["values"] == [[0.5, None], [None, None]]
+
+
+class TestSweepChunk:
+    """共享内存与分批回测测试套件"""
+
+    def test_shared_frame_round_trip(self, data):
+        shm, spec = backtest_strategies.share_frame(data)
+        try:
+            restored = backtest_strategies.attach_frame(spec)
+        finally:
+            shm.close()
+            shm.unlink()
+
+        assert restored.equals(data[list(backtest_strategies.FRAME_COLUMNS)])
+        assert restored.index.equals(data.index)
+
+    def test_indicators_are_reused_across_runs(self, data):
+        cache = {}
+        for fast, slow in [(5, 20), (5, 30), (10, 30)]:
+            strategy = backtest_strategies.create_strategy(
+                "moving_average_crossover", {"fast_period": fast, "slow_period": slow}, cache)
+            cached = Backtest(data, strategy, cash=10000, commission=.002).run()
+            plain = Backtest(data, backtest_strategies.create_strategy(
+                "moving_average_crossover", {"fast_period": fast, "slow_period": slow}),
+                cash=10000, commission=.002).run()
+            assert cached["Return [%]"] == plain["Return [%]"]
+
+        assert sorted(cache) == [("sma", 5), ("sma", 10), ("sma", 20), ("sma", 30)]
+
+
+class TestParameterSweepService:
+    """参数扫描服务测试套件"""
+
+    @pytest.mark.asyncio
+    async def test_sweep_ranks_results_and_builds_heatmap(self, data, executor):
+        service = ParameterSweepService()
+        request = _request(fast_period=[5, 10], slow_period=ParameterRange(start=10, stop=30, step=10))
+        specs = []
+
+        def share(frame):
+            shm, spec = backtest_strategies.share_frame(frame)
+            specs.append(spec)
+            return shm, spec
+
+        with patch("services.parameter_sweep.sweep_executor", executor), \
+             patch("services.parameter_sweep.share_frame", share), \
+             patch.object(lean_service, "_load_historical_data", return_value=data):
+            sweep_id = await service.start_sweep(request)
+            await service._tasks[sweep_id]
+
+        result = service.get_sweep(sweep_id)
+        assert result.status == "completed"
+        # (10, 10) 不满足快线周期小于慢线周期
+        assert result.total_combinations == result.completed_combinations == 5
+        assert [row["rank"] for row in result.results] == [1, 2, 3, 4, 5]
+        sharpes = [row["statistics"]["sharpe_ratio"] for row in result.results]
+        assert sharpes == sorted(sharpes, reverse=True)
+
+        best = result.results[0]
+        expected = Backtest(data, backtest_strategies.create_strategy("moving_average_crossover", best["parameters"]),
+                            cash=10000, commission=.002).run()
+        assert best["statistics"]["total_return"] == pytest.approx(expected["Return [%]"])
+
+        heatmap = result.heatmap
+        assert (heatmap["x_values"], heatmap["y_values"]) == ([5, 10], [10, 20, 30])
+        assert heatmap["values"][0][1] is None
+        assert max(v for line in heatmap["values"] for v in line if v is not None) == sharpes[0]
+
+        # 数据只放入共享内存一次，扫描结束后已释放
+        assert len(specs) == 1
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=specs[0]["name"])
+
+    @pytest.mark.asyncio
+    async def test_rejects_oversized_or_empty_grid(self):
+        service = ParameterSweepService()
+
+        with pytest.raises(ValueError, match="没有有效的参数组合"):
+            await service.start_sweep(_request(fast_period=[30], slow_period=[10]))
+        with patch("services.parameter_sweep.settings.BACKTEST_SWEEP_MAX_COMBINATIONS", 10):
+            with pytest.raises(ValueError, match="参数组合过多"):
+                await service.start_sweep(_request(fast_period=ParameterRange(start=1, stop=5),
+                                                   slow_period=ParameterRange(start=10, stop=20)))
+        assert service.sweeps == {}
+
+    @pytest.mark.asyncio
+    async def test_cancel_sweep_stops_workers(self, data, executor):
+        service = ParameterSweepService()
+        request = _request(fast_period=ParameterRange(start=2, stop=20), slow_period=ParameterRange(start=21, stop=40))
+
+        with patch("services.parameter_sweep.sweep_executor", executor), \
+             patch.object(lean_service, "_load_historical_data", return_value=data):
+            sweep_id = await service.start_sweep(request)
+            task = service._tasks[sweep_id]
+            await asyncio.sleep(0.5)
+
+            assert service.cancel_sweep(sweep_id) is True
+            await task
+
+        result = service.get_sweep(sweep_id)
+        assert result.status == "cancelled"
+        assert result.completed_combinations < result.total_combinations
+        assert executor.get_stats()["running"] == []
+        assert executor.get_stats()["queued"] == 0
+        assert service.cancel_sweep(sweep_id) is False
+
+    def test_finished_sweeps_are_evicted_oldest_first(self):
+        service = ParameterSweepService()
+        for i, status in enumerate(["completed", "running", "failed", "completed", "cancelled"]):
+            service.sweeps[f"s{i}"] = SweepResult(
+                sweep_id=f"s{i}", strategy_id="moving_average_crossover", symbol="AAPL", status=status,
+                metric="sharpe_ratio", parameter_grid={}, total_combinations=1, created_at=f"2024-01-0{i + 1}"
+            )
+
+        with patch("services.parameter_sweep.settings.BACKTEST_SWEEP_HISTORY", 2):
+            service.jobs.evict_finished()
+
+        assert list(service.sweeps) == ["s1", "s3", "s4"]
@@ -0,0 +1,80 @@
+"""
+Provider Executor 单元测试
+测试同步调用不阻塞事件循环、并发上限、超时和排队调用的取消
+"""
+import asyncio
+import threading
+import time
+import pytest
+
+from services.provider_executor import ProviderExecutor
+
+
+class TestProviderExecutor:
+    """ProviderExecutor 测试套件"""
+
+    @pytest.mark.asyncio
+    async def test_blocking_call_does_not_stall_event_loop(self):
+        """测试阻塞调用在线程池中执行，期间事件循环仍可调度"""
+        executor = ProviderExecutor({"ccxt": {"max_workers": 2, "max_concurrency": 4, "timeout": 5}})
+        ticks = []
+
+        async def heartbeat():
+            for _ in range(5):
+                ticks.append(time.time())
+                await asyncio.sleep(0.01)
+
+        result, _ = await asyncio.gather(
+            executor.run("ccxt", lambda: time.sleep(0.1) or "ok"),
+            heartbeat()
+        )
+
+        assert result == "ok"
+        assert len(ticks) == 5
+        assert executor.get_stats()["ccxt"]["calls"] == 1
+        executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_concurrency_cap(self):
+        """测试同一数据源同时进行的调用数不超过上限"""
+        executor = ProviderExecutor({"akshare": {"max_workers": 4, "max_concurrency": 2, "timeout": 5}})
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+
+        def work():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.03)
+            with lock:
+                running[0] -= 1
+
+        await asyncio.gather(*(executor.run("akshare", work) for _ in range(6)))
+
+        assert peak[0] == 2
+        assert executor.get_pool("akshare").active == 0
+        executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_timeout_and_cancel_queued_call(self):
+        """测试超时抛出 TimeoutError，被取消的排队调用不会执行"""
+        executor = ProviderExecutor({"yfinance": {"max_workers": 1, "max_concurrency": 4, "timeout": 5}})
+        executed = []
+
+        with pytest.raises(asyncio.TimeoutError):
+            await executor.run("yfinance", time.sleep, 0.2, timeout=0.05)
+
+        queued = asyncio.ensure_future(executor.run("yfinance", lambda: executed.append(1)))
+        await asyncio.sleep(0.01)
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        await asyncio.sleep(0.3)
+
+        assert executed == []
+        stats = executor.get_stats()["yfinance"]
+        assert stats["timeouts"] == 1
+        assert stats["cancelled"] == 1
+        assert stats["active"] == 0
+        executor.shutdown()
@@ -0,0 +1,118 @@
+"""
+Provider Router 单元测试
+测试按延迟排序、慢请求对冲及失败时的快速降级
+"""
+import asyncio
+import pytest
+
+from services.data_quality_monitor import DataQualityMonitor, DataSourceStatus
+from services.provider_router import ProviderRouter
+
+
+def _monitor(latencies):
+    monitor = DataQualityMonitor()
+    for name, samples in latencies.items():
+        monitor.register_source(name)
+        for value in samples:
+            monitor.record_success(name, value)
+    return monitor
+
+
+class TestProviderRouter:
+    """ProviderRouter 测试套件"""
+
+    def test_rank_sources_by_health_and_p50(self):
+        """测试健康状态优先，其次按响应时间中位数，无样本的保持原顺序排在后面"""
+        monitor = _monitor({"a": [3.0, 3.0], "b": [0.5, 0.7], "c": [], "d": [0.1]})
+        monitor.sources["d"].update_status(DataSourceStatus.OFFLINE)
+
+        assert monitor.rank_sources(["a", "b", "c", "d"]) == ["b", "a", "c", "d"]
+
+    @pytest.mark.asyncio
+    async def test_hedges_slow_source_and_cancels_loser(self):
+        """测试首选数据源超过 p95 未返回时发出对冲请求，先返回者胜出"""
+        monitor = _monitor({"fast": [0.01] * 10, "backup": [0.5] * 10})
+        router = ProviderRouter(monitor, min_hedge_delay=0.01)
+        cancelled = []
+
+        async def stuck():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def backup():
+            return [1]
+
+        source, result = await router.route({"fast": stuck, "backup": backup})
+        await asyncio.sleep(0)
+
+        assert (source, result) == ("backup", [1])
+        assert cancelled == [True]
+        assert router.get_stats()["hedges"] == 1
+
+    @pytest.mark.asyncio
+    async def test_failures_fall_through_immediately(self):
+        """测试失败或空结果立即尝试下一个数据源，全部失败返回 (None, None)"""
+        monitor = _monitor({"a": [], "b": [], "c": []})
+        router = ProviderRouter(monitor, default_hedge_delay=5)
+        calls = []
+
+        async def fail():
+            calls.append("a")
+            raise RuntimeError("rate limited")
+
+        async def empty():
+            calls.append("b")
+            return []
+
+        async def ok():
+            calls.append("c")
+            return [42]
+
+        assert await asyncio.wait_for(router.route({"a": fail, "b": empty, "c": ok}), 1) == ("c", [42])
+        assert calls == ["a", "b", "c"]
+        assert monitor.sources["a"].metrics.error_count == 1
+        assert await router.route({"a": fail, "b": empty}) == (None, None)
+
+    @pytest.mark.asyncio
+    async def test_mock_result_counts_as_failure(self, candle_series):
+        """测试模拟数据不被当作成功返回，也不产生响应时间样本"""
+        monitor = _monitor({"mock": [], "real": []})
+        router = ProviderRouter(monitor, default_hedge_delay=5)
+        fallback = candle_series(3)
+        fallback.is_mock = True
+        real = candle_series(3)
+
+        async def mock():
+            return fallback
+
+        async def ok():
+            return real
+
+        assert await router.route({"mock": mock, "real": ok}) == ("real", real)
+        metrics = monitor.sources["mock"].metrics
+        assert (metrics.error_count, metrics.success_count, metrics.response_times) == (1, 0, [])
+        assert monitor.rank_sources(["mock", "real"]) == ["real", "mock"]
+
+    @pytest.mark.asyncio
+    async def test_cancelled_source_records_elapsed_time(self):
+        """测试被对冲取消的数据源记录已等待的时长，p50 上升后不再排在最前"""
+        monitor = _monitor({"slow": [0.01], "backup": [0.08]})
+        router = ProviderRouter(monitor, min_hedge_delay=0.05)
+
+        async def stuck():
+            await asyncio.sleep(5)
+
+        async def backup():
+            await asyncio.sleep(0.05)
+            return [1]
+
+        for _ in range(2):
+            assert await router.route({"slow": stuck, "backup": backup}) == ("backup", [1])
+
+        metrics = monitor.sources["slow"].metrics
+        assert len(metrics.response_times) == 3 and metrics.success_count == 1
+        assert min(metrics.response_times[1:]) >= 0.09
+        assert monitor.rank_sources(["slow", "backup"]) == ["backup", "slow"]
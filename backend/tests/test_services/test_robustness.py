@@ -0,0 +1,154 @@
+"""
+Robustness 单元测试
+测试前向滚动窗口划分、窗口内寻优与样本外拼接、交易重抽样蒙特卡洛，以及稳健性分析服务的并行执行
+"""
+from datetime import datetime
+
+import numpy as np
+import pytest
+from unittest.mock import patch
+
+from services.backtest_strategies import evaluate, share_frame
+from services.lean_backtest_service import BacktestResult, LeanBacktestService
+from services.monte_carlo import confidence_bands, resample_trades
+from services.parameter_sweep import ParameterRange
+from services.robustness_service import AnalysisResult, MonteCarloRequest, RobustnessService, WalkForwardRequest
+from services.walk_forward import run_walk_forward_windows, stitch_equity, walk_forward_windows
+
+COMBINATIONS = [{"fast_period": f, "slow_period": s} for f in (5, 10) for s in (20, 40)]
+
+
+class TestWalkForward:
+    """前向滚动分析测试套件"""
+
+    def test_rolling_and_anchored_windows(self):
+        assert walk_forward_windows(10, 4, 2) == [(0, 4, 6), (2, 6, 8), (4, 8, 10)]
+        assert walk_forward_windows(10, 4, 2, anchored=True) == [(0, 4, 6), (0, 6, 8), (0, 8, 10)]
+        assert walk_forward_windows(5, 4, 2) == []
+
+    def test_window_optimizes_on_train_and_runs_best_on_test(self, data):
+        shm, spec = share_frame(data)
+        try:
+            (window,) = run_walk_forward_windows(spec, "moving_average_crossover", COMBINATIONS,
+                                                 [(100, 400, 500)], 10000, "total_return")
+        finally:
+            shm.close()
+            shm.unlink()
+
+        train = [evaluate("moving_average_crossover", p, data, 10000, "vectorized", window=(100, 400))
+                 for p in COMBINATIONS]
+        best = max(range(len(COMBINATIONS)), key=lambda i: train[i]["statistics"]["total_return"])
+        assert window["parameters"] == COMBINATIONS[best]
+        test = evaluate("moving_average_crossover", COMBINATIONS[best], data, 10000, "vectorized", window=(400, 500))
+        assert len(window["test_equity"]) == 100
+        assert window["test_equity"] == pytest.approx(test["equity"])
+
+    def test_stitch_chains_window_returns(self):
+        windows = [
+            {"window": (2, 4, 6), "test_equity": [110.0, 121.0]},
+            {"window": (0, 2, 4), "test_equity": [100.0, 50.0]},
+        ]
+
+        assert stitch_equity(windows, 100.0).tolist() == pytest.approx([100.0, 50.0, 55.0, 60.5])
+
+
+class TestMonteCarlo:
+    """交易重抽样测试套件"""
+
+    def test_shuffle_keeps_total_return(self):
+        returns = np.array([0.1, -0.05, 0.2, -0.1, 0.03])
+
+        chunk = resample_trades(returns, 200, np.random.SeedSequence(1), method="shuffle")
+
+        assert chunk["total_returns"] == pytest.approx(np.full(200, np.prod(1 + returns) - 1))
+        assert (chunk["max_drawdowns"] >= 0.1 - 1e-12).all()
+        assert chunk["bands"].shape == (200, 5)
+
+    def test_bootstrap_bands_are_ordered_and_reproducible(self):
+        returns = np.random.default_rng(0).normal(0.01, 0.05, 80)
+        seeds = np.random.SeedSequence(7).spawn(2)
+
+        chunks = [resample_trades(returns, 500, seed) for seed in seeds]
+        again = [resample_trades(returns, 500, seed) for seed in np.random.SeedSequence(7).spawn(2)]
+        bands = confidence_bands(chunks, len(returns), [5, 50, 95])
+
+        assert bands == confidence_bands(again, len(returns), [5, 50, 95])
+        assert bands["simulations"] == 1000
+        assert bands["total_return"]["p5"] < bands["total_return"]["p50"] < bands["total_return"]["p95"]
+        assert bands["max_drawdown"]["p5"] <= bands["max_drawdown"]["p95"] <= 0
+        assert len(bands["equity_bands"]["p50"]) == len(bands["equity_bands"]["trade_index"]) == 50
+        assert bands["equity_bands"]["trade_index"][-1] == 80
+
+
+class TestRobustnessService:
+    """稳健性分析服务测试套件"""
+
+    @pytest.mark.asyncio
+    async def test_walk_forward_then_monte_carlo(self, data, executor):
+        service = RobustnessService()
+        request = WalkForwardRequest(
+            strategy_id="moving_average_crossover", symbol="AAPL", start_date="2020-01-01", end_date="2023-01-01",
+            parameter_grid={"fast_period": [5, 10], "slow_period": ParameterRange(start=20, stop=40, step=20)},
+            train_bars=300, test_bars=100
+        )
+
+        with patch("services.robustness_service.sweep_executor", executor), \
+             patch("services.robustness_service.lean_service._load_historical_data", return_value=data):
+            analysis_id = await service.start_walk_forward(request)
+            await service._tasks[analysis_id]
+
+            walk_forward = service.get_analysis(analysis_id)
+            assert walk_forward.status == "completed"
+            assert walk_forward.completed_jobs == walk_forward.total_jobs == 4
+            windows = walk_forward.result["windows"]
+            assert len(windows) == 4
+            assert windows[0]["test_start"] == data.index[300].strftime("%Y-%m-%d")
+            # 样本外总收益等于各测试窗口收益的连乘
+            chained = np.prod([1 + w["test_statistics"]["total_return"] / 100 for w in windows]) - 1
+            assert walk_forward.result["oos_statistics"]["total_return"] == pytest.approx(chained * 100)
+            assert walk_forward.result["oos_equity_curve"][0]["date"] == windows[0]["test_start"]
+
+            monte_carlo_id = await service.start_monte_carlo(
+                MonteCarloRequest(source_id=analysis_id, simulations=1000, seed=3))
+            await service._tasks[monte_carlo_id]
+
+        monte_carlo = service.get_analysis(monte_carlo_id)
+        assert monte_carlo.status == "completed"
+        assert monte_carlo.result["simulations"] == 1000
+        assert monte_carlo.result["trades"] == len(walk_forward.result["trade_returns"])
+
+    @pytest.mark.asyncio
+    async def test_monte_carlo_from_completed_backtest(self, executor):
+        backtests = LeanBacktestService()
+        backtests.store.save(BacktestResult(
+            backtest_id="bt-1", strategy_id="rsi_strategy", status="completed",
+            created_at=datetime.now().isoformat(),
+            trades=[{"return_pct": r} for r in (0.05, -0.02, 0.03, -0.04, 0.06)]
+        ).model_dump())
+        service = RobustnessService()
+
+        with patch("services.robustness_service.sweep_executor", executor), \
+             patch("services.robustness_service.lean_service", backtests):
+            analysis_id = await service.start_monte_carlo(
+                MonteCarloRequest(source_id="bt-1", simulations=300, method="shuffle", seed=1))
+            await service._tasks[analysis_id]
+
+            with pytest.raises(ValueError, match="不存在"):
+                await service.start_monte_carlo(MonteCarloRequest(source_id="missing"))
+
+        result = service.get_analysis(analysis_id).result
+        expected = (np.prod([1.05, 0.98, 1.03, 0.96, 1.06]) - 1) * 100
+        assert result["total_return"]["p5"] == pytest.approx(expected)
+        assert result["total_return"]["p95"] == pytest.approx(expected)
+        assert result["probability_of_loss"] == (100.0 if expected < 0 else 0.0)
+
+    def test_finished_analyses_are_evicted_oldest_first(self):
+        service = RobustnessService()
+        for i, status in enumerate(["completed", "running", "failed", "completed"]):
+            service.analyses[f"a{i}"] = AnalysisResult(analysis_id=f"a{i}", kind="monte_carlo", status=status,
+                                                       created_at=f"2024-01-0{i + 1}")
+
+        with patch("services.robustness_service.settings.BACKTEST_ANALYSIS_HISTORY", 1):
+            service.jobs.evict_finished()
+
+        assert list(service.analyses) == ["a1", "a3"]
@@ -0,0 +1,160 @@
+"""
+Streaming Indicators 单元测试
+测试流式指标与向量化指标引擎结果一致，以及行情聚合为K线的逻辑
+"""
+import pytest
+import numpy as np
+from datetime import datetime
+
+from services import indicator_engine
+from services.streaming_indicators import (
+    Bar,
+    StreamingSMA,
+    StreamingEMA,
+    StreamingMACD,
+    StreamingRSI,
+    StreamingATR,
+    StreamingBollinger,
+    StreamingStochastic,
+    StreamingVWAP,
+    StreamingIndicatorService,
+)
+from models.market_data import CandleSeries, MarketType, Timeframe
+
+
+@pytest.fixture
+def bars():
+    """600根随机游走K线（固定种子）"""
+    rng = np.random.default_rng(7)
+    close = 30000 + np.cumsum(rng.normal(0, 50, 600))
+    high = close + np.abs(rng.normal(0, 20, 600))
+    low = close - np.abs(rng.normal(0, 20, 600))
+    volume = rng.uniform(0, 100, 600)
+    return [
+        Bar(i * 60_000, c, h, l, c, v)
+        for i, (h, l, c, v) in enumerate(zip(high, low, close, volume))
+    ]
+
+
+def _columns(bars):
+    return (
+        np.array([b.high for b in bars]),
+        np.array([b.low for b in bars]),
+        np.array([b.close for b in bars]),
+        np.array([b.volume for b in bars]),
+    )
+
+
+def _run(indicator, bars, extract=lambda v: v):
+    """逐根推进，返回每根K线后的值，并校验 peek 与下一次 update 一致"""
+    out = []
+    for bar in bars:
+        peeked = indicator.peek(bar)
+        value = indicator.update(bar)
+        assert (peeked is None) == (value is None)
+        if value is not None:
+            assert extract(peeked) == pytest.approx(extract(value), rel=1e-12, nan_ok=True)
+        out.append(np.nan if value is None else extract(value))
+    return np.array(out)
+
+
+def _assert_matches(streamed, expected):
+    assert np.array_equal(np.isnan(streamed), np.isnan(expected))
+    mask = ~np.isnan(expected)
+    np.testing.assert_allclose(streamed[mask], expected[mask], rtol=1e-9)
+
+
+class TestStreamingIndicators:
+    """流式指标与指标引擎一致性测试"""
+
+    def test_sma_and_ema(self, bars):
+        _, _, close, _ = _columns(bars)
+        _assert_matches(_run(StreamingSMA(20), bars), indicator_engine.sma(close, 20))
+        _assert_matches(_run(StreamingEMA(20), bars), indicator_engine.ema(close, 20))
+
+    def test_rsi_and_atr(self, bars):
+        high, low, close, _ = _columns(bars)
+        _assert_matches(_run(StreamingRSI(14), bars), indicator_engine.rsi(close, 14))
+        _assert_matches(_run(StreamingATR(14), bars), indicator_engine.atr(high, low, close, 14))
+
+    def test_bollinger(self, bars):
+        _, _, close, _ = _columns(bars)
+        upper, middle, lower = indicator_engine.bollinger_bands(close, 20, 2)
+        _assert_matches(_run(StreamingBollinger(20, 2), bars, lambda v: v['upper']), upper)
+        _assert_matches(_run(StreamingBollinger(20, 2), bars, lambda v: v['lower']), lower)
+
+    def test_macd(self, bars):
+        _, _, close, _ = _columns(bars)
+        macd_line, _, _ = indicator_engine.macd(close)
+        streamed = _run(StreamingMACD(), bars, lambda v: v['macd'])
+        # 流式信号线从 MACD 线有效处开始计算，只比较 MACD 线本身
+        mask = ~np.isnan(streamed)
+        np.testing.assert_allclose(streamed[mask], macd_line[mask], rtol=1e-9)
+        expected_signal = indicator_engine.ema(macd_line[25:], 9)
+        streamed_signal = _run(StreamingMACD(), bars, lambda v: v['signal'])[25:]
+        _assert_matches(streamed_signal, expected_signal)
+
+    def test_stochastic(self, bars):
+        high, low, close, _ = _columns(bars)
+        k, d = indicator_engine.stochastic(high, low, close, 14, 3)
+        _assert_matches(_run(StreamingStochastic(14, 3), bars, lambda v: v['k']), k)
+        streamed_d = _run(StreamingStochastic(14, 3), bars, lambda v: np.nan if v['d'] is None else v['d'])
+        _assert_matches(streamed_d, d)
+
+    def test_vwap(self, bars):
+        high, low, close, volume = _columns(bars)
+        _assert_matches(_run(StreamingVWAP(), bars), indicator_engine.vwap(high, low, close, volume))
+
+
+class TestStreamingIndicatorService:
+    """K线流与行情聚合测试"""
+
+    def test_ticks_roll_bars_and_warm_new_indicators(self, bars):
+        service = StreamingIndicatorService()
+        history = CandleSeries.from_ohlcv(
+            [(b.open_time, b.open, b.high, b.low, b.close, b.volume) for b in bars[:100]],
+            symbol="BTC/USDT", market_type=MarketType.CRYPTO, exchange="", timeframe=Timeframe.M1
+        )
+        stream = service.create_stream("BTC/USDT", MarketType.CRYPTO, Timeframe.M1, history)
+        assert len(stream.history) == 99
+        assert stream.forming.open_time == bars[99].open_time
+
+        closes = [b.close for b in bars[:100]]
+        previous, current = stream.values('SMA', period=10)
+        assert previous == pytest.approx(np.mean(closes[89:99]))
+        assert current == pytest.approx(np.mean(closes[90:100]))
+
+        # 同一周期内的行情更新当前K线，跨周期时收盘并推进指标
+        next_open = bars[99].open_time + 60_000
+        service.on_tickers([
+            {'symbol': "BTC/USDT", 'last': 1.0, 'timestamp': datetime.fromtimestamp((next_open - 1) / 1000)},
+            {'symbol': "ETH/USDT", 'last': 2.0, 'timestamp': datetime.fromtimestamp(next_open / 1000)},
+        ])
+        assert stream.forming.close == 1.0
+        assert stream.forming.low == 1.0
+        service.on_tickers([
+            {'symbol': "BTC/USDT", 'last': 5.0, 'timestamp': datetime.fromtimestamp(next_open / 1000)},
+        ])
+        assert len(stream.history) == 100
+        assert stream.forming.open_time == next_open
+        previous, current = stream.values('SMA', period=10)
+        assert previous == pytest.approx(np.mean(closes[90:99] + [1.0]))
+        assert current == pytest.approx(np.mean(closes[91:99] + [1.0, 5.0]))
+
+    def test_missing_symbols_grouped_by_market(self):
+        service = StreamingIndicatorService()
+        service.create_stream("BTC/USDT", MarketType.CRYPTO, Timeframe.H1)
+        service.create_stream("AAPL", MarketType.STOCK, Timeframe.D1)
+        assert service.missing_symbols({"BTC/USDT"}) == {MarketType.STOCK: {"AAPL"}}
+
+    def test_stream_goes_stale_after_missed_bars(self, bars):
+        service = StreamingIndicatorService()
+        stream = service.create_stream("BTC/USDT", MarketType.CRYPTO, Timeframe.M1)
+        assert stream.is_stale()
+
+        stream.on_tick(1.0, bars[0].open_time)
+        assert not stream.is_stale(now=stream.last_tick_at + 119)
+        assert stream.is_stale(now=stream.last_tick_at + 121)
+
+        service.remove_stream("BTC/USDT", Timeframe.M1)
+        assert service.get_stream("BTC/USDT", Timeframe.M1) is None
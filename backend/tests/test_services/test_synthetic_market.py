@@ -0,0 +1,84 @@
+"""
+Synthetic Market 单元测试
+测试种子可复现、开高低收一致性、批量生成、模拟行情连续性和定速回放
+"""
+import pytest
+from datetime import datetime
+
+import numpy as np
+
+from models.market_data import MarketType, Timeframe
+from services.synthetic_market import SyntheticMarket
+
+END = datetime(2024, 3, 1, 12, 30)
+
+
+class TestSyntheticMarket:
+    """合成行情测试套件"""
+
+    def test_seeded_candles_are_reproducible(self):
+        first = SyntheticMarket(seed=7).candles("BTC/USDT", MarketType.CRYPTO, "binance", Timeframe.H1, 200, end=END)
+        # 中间插入其他品种的调用不影响结果
+        market = SyntheticMarket(seed=7)
+        market.candles("ETH/USDT", MarketType.CRYPTO, "binance", Timeframe.H1, 50, end=END)
+        second = market.candles("BTC/USDT", MarketType.CRYPTO, "binance", Timeframe.H1, 200, end=END)
+
+        np.testing.assert_array_equal(first.close, second.close)
+        np.testing.assert_array_equal(first.timestamp, second.timestamp)
+        other = SyntheticMarket(seed=8).candles("BTC/USDT", MarketType.CRYPTO, "binance", Timeframe.H1, 200, end=END)
+        assert not np.array_equal(first.close, other.close)
+
+    def test_candles_are_consistent_ohlc(self):
+        series = SyntheticMarket(seed=1).candles("AAPL", MarketType.STOCK, "mock_exchange", Timeframe.M5, 5000, end=END)
+
+        assert len(series) == 5000
+        assert np.all(np.diff(series.timestamp) == 300_000)
+        assert series.timestamp[-1] % 300_000 == 0
+        assert series.open[0] == pytest.approx(182.45)
+        # 开盘价为上一根收盘价，最高/最低价包住开收盘
+        np.testing.assert_array_equal(series.open[1:], series.close[:-1])
+        assert np.all(series.high >= np.maximum(series.open, series.close))
+        assert np.all(series.low <= np.minimum(series.open, series.close))
+        assert np.all(series.low > 0) and np.all(series.volume > 0)
+
+    def test_batch_generates_every_symbol(self):
+        symbols = [f"SYM{i}" for i in range(100)]
+        batch = SyntheticMarket(seed=3).candles_batch(symbols, MarketType.STOCK, "mock_exchange", Timeframe.D1,
+                                                      1000, end=END, base_price=50.0)
+
+        assert list(batch) == symbols
+        assert all(len(series) == 1000 and series.open[0] == 50.0 for series in batch.values())
+        assert not np.array_equal(batch["SYM0"].close, batch["SYM1"].close)
+
+    def test_batch_matches_single_symbol_paths(self):
+        market = SyntheticMarket(seed=3)
+        batch = market.candles_batch(["ETH/USDT", "BTC/USDT"], MarketType.CRYPTO, "binance", Timeframe.H1,
+                                     300, end=END)
+        single = market.candles("BTC/USDT", MarketType.CRYPTO, "binance", Timeframe.H1, 300, end=END)
+
+        for column in ("open", "high", "low", "close", "volume"):
+            np.testing.assert_array_equal(getattr(batch["BTC/USDT"], column), getattr(single, column))
+
+    def test_tickers_continue_from_last_price(self):
+        market = SyntheticMarket(seed=5)
+        first = market.tickers(["BTC/USDT", "EUR/USD"], MarketType.CRYPTO, now=1_700_000_000.0)
+        second = market.tickers(["BTC/USDT", "EUR/USD"], MarketType.CRYPTO, now=1_700_000_060.0)
+
+        assert [t["symbol"] for t in second] == ["BTC/USDT", "EUR/USD"]
+        # 开盘价保持首次报价，涨跌相对开盘价计算
+        assert second[0]["open"] == first[0]["open"] == pytest.approx(42567.39)
+        assert second[0]["change"] == pytest.approx(second[0]["last"] - second[0]["open"], abs=1e-3)
+        assert second[0]["high"] >= max(second[0]["open"], second[0]["last"])
+        assert abs(second[1]["last"] / first[1]["last"] - 1) < 0.01
+
+    @pytest.mark.asyncio
+    async def test_replay_emits_requested_batches(self):
+        market = SyntheticMarket(seed=9)
+        batches = [batch async for batch in market.replay(["BTC/USDT", "ETH/USDT"], ticks_per_second=1000,
+                                                         max_ticks=25, chunk=10)]
+
+        assert len(batches) == 25
+        assert all([tick["symbol"] for tick in batch] == ["BTC/USDT", "ETH/USDT"] for batch in batches)
+        prices = [batch[0]["last"] for batch in batches]
+        assert len(set(prices)) > 1
+        assert batches[-1][0]["change"] == pytest.approx(prices[-1] - 42567.39)
@@ -9,6 +9,7 @@ from datetime import datetime, timedelta
 from unittest.mock import Mock, AsyncMock, patch
 
 from services.technical_analysis_service import TechnicalAnalysisService
+from services import indicator_engine
 from models.market_data import Timeframe
 
 
@@ -141,8 +142,9 @@ class TestTechnicalAnalysisService:
         
         # 验证ATR结果 - 返回值是 List
         assert isinstance(result, list)
-        # ATR 实现会在前面添加一个 None，所以长度会是 len(prices) + 1
-        assert len(result) in [len(sample_klines_df), len(sample_klines_df) + 1]
+        # 输出与输入等长，第一个有效值位于索引 period
+        assert len(result) == len(sample_klines_df)
+        assert result[13] is None and result[14] is not None
         
         # ATR应该是正值 (跳过 None 值)
         atr_values = [v for v in result if v is not None]
@@ -233,3 +235,194 @@ class TestTechnicalAnalysisService:
         assert len(ma_values) == len(prices)
         assert len(rsi_values) == len(prices)
 
+
+@pytest.fixture
+def random_ohlcv():
+    """5000根随机游走K线（固定种子）"""
+    rng = np.random.default_rng(42)
+    close = 30000 + np.cumsum(rng.normal(0, 50, 5000))
+    high = close + np.abs(rng.normal(0, 20, 5000))
+    low = close - np.abs(rng.normal(0, 20, 5000))
+    volume = rng.uniform(0, 100, 5000)
+    return high, low, close, volume
+
+
+def _naive_wilder(values, period):
+    """逐根递推的 Wilder 平滑参考实现"""
+    out = [None] * (period - 1)
+    avg = sum(values[:period]) / period
+    out.append(avg)
+    for v in values[period:]:
+        avg = (avg * (period - 1) + v) / period
+        out.append(avg)
+    return out
+
+
+class TestIndicatorEngine:
+    """向量化指标引擎与逐窗口参考实现的一致性测试"""
+    
+    @pytest.mark.unit
+    def test_sma_and_std_match_window_reference(self, random_ohlcv):
+        """测试前缀和 SMA / 滑动标准差与逐窗口计算一致"""
+        close = random_ohlcv[2]
+        period = 20
+        windows = np.lib.stride_tricks.sliding_window_view(close, period)
+        
+        np.testing.assert_allclose(indicator_engine.sma(close, period)[period - 1:], windows.mean(axis=1), rtol=1e-12)
+        np.testing.assert_allclose(indicator_engine.rolling_std(close, period)[period - 1:], windows.std(axis=1), rtol=1e-8)
+        assert np.isnan(indicator_engine.sma(close, period)[:period - 1]).all()
+    
+    @pytest.mark.unit
+    @pytest.mark.parametrize("period", [1, 3, 14, 50])
+    def test_rolling_extrema_match_window_reference(self, random_ohlcv, period):
+        """测试分块滑动最大/最小值与逐窗口计算一致"""
+        high, low = random_ohlcv[0], random_ohlcv[1]
+        
+        np.testing.assert_array_equal(
+            indicator_engine.rolling_max(high, period)[period - 1:],
+            np.lib.stride_tricks.sliding_window_view(high, period).max(axis=1)
+        )
+        np.testing.assert_array_equal(
+            indicator_engine.rolling_min(low, period)[period - 1:],
+            np.lib.stride_tricks.sliding_window_view(low, period).min(axis=1)
+        )
+    
+    @pytest.mark.unit
+    @pytest.mark.parametrize("period", [2, 12, 26, 200])
+    def test_ema_matches_recurrence(self, random_ohlcv, period):
+        """测试分块闭式 EMA 与逐根递推一致"""
+        close = random_ohlcv[2].tolist()
+        multiplier = 2 / (period + 1)
+        expected = [sum(close[:period]) / period]
+        for price in close[period:]:
+            expected.append((price - expected[-1]) * multiplier + expected[-1])
+        
+        np.testing.assert_allclose(indicator_engine.ema(close, period)[period - 1:], expected, rtol=1e-10)
+    
+    @pytest.mark.unit
+    def test_rsi_and_atr_match_wilder_reference(self, random_ohlcv):
+        """测试 RSI / ATR 与 Wilder 递推参考实现一致"""
+        high, low, close, _ = (a.tolist() for a in random_ohlcv)
+        period = 14
+        
+        changes = [close[i] - close[i - 1] for i in range(1, len(close))]
+        avg_gain = _naive_wilder([max(c, 0) for c in changes], period)
+        avg_loss = _naive_wilder([max(-c, 0) for c in changes], period)
+        expected_rsi = [100 - 100 / (1 + g / l) for g, l in zip(avg_gain[period - 1:], avg_loss[period - 1:])]
+        rsi = indicator_engine.rsi(close, period)
+        assert np.isnan(rsi[:period]).all()
+        np.testing.assert_allclose(rsi[period:], expected_rsi, rtol=1e-10)
+        
+        tr = [max(high[i] - low[i], abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1])) for i in range(1, len(close))]
+        expected_atr = _naive_wilder(tr, period)[period - 1:]
+        atr = indicator_engine.atr(high, low, close, period)
+        assert np.isnan(atr[:period]).all()
+        np.testing.assert_allclose(atr[period:], expected_atr, rtol=1e-10)
+    
+    @pytest.mark.unit
+    def test_stochastic_and_cci_match_window_reference(self, random_ohlcv):
+        """测试随机指标与 CCI 与逐窗口计算一致"""
+        high, low, close, _ = random_ohlcv
+        k, d = indicator_engine.stochastic(high, low, close, 14, 3)
+        
+        hh = np.lib.stride_tricks.sliding_window_view(high, 14).max(axis=1)
+        ll = np.lib.stride_tricks.sliding_window_view(low, 14).min(axis=1)
+        expected_k = (close[13:] - ll) / (hh - ll) * 100
+        np.testing.assert_allclose(k[13:], expected_k, rtol=1e-12)
+        np.testing.assert_allclose(d[15:], np.convolve(expected_k, np.ones(3) / 3, mode="valid"), rtol=1e-10)
+        assert np.isnan(d[:15]).all()
+        
+        tp = (high + low + close) / 3
+        windows = np.lib.stride_tricks.sliding_window_view(tp, 20)
+        mean = windows.mean(axis=1)
+        mean_dev = np.abs(windows - mean[:, None]).mean(axis=1)
+        np.testing.assert_allclose(indicator_engine.cci(high, low, close, 20)[19:], (tp[19:] - mean) / (0.015 * mean_dev), rtol=1e-9)
+    
+    @pytest.mark.unit
+    def test_degenerate_windows(self, ta_service):
+        """测试平坦行情下的除零保护与列表封装"""
+        flat = [5.0] * 30
+        
+        assert ta_service.calculate_stochastic(flat, flat, flat)["k"][-1] == 50.0
+        assert ta_service.calculate_cci(flat, flat, flat)[-1] == 0.0
+        assert ta_service.calculate_rsi(flat)[-1] == 100.0
+        assert ta_service.calculate_bollinger_bands(flat)["upper"][-1] == pytest.approx(5.0)
+        assert ta_service.calculate_vwap([], [], [], []) == [None]
+        assert ta_service.calculate_rsi([1.0, 2.0], 14) == [None, None]
+
+
+class TestBatchIndicators:
+    """批量指标计算（共享中间结果）测试"""
+    
+    @pytest.mark.unit
+    def test_batch_matches_individual_methods(self, ta_service, random_ohlcv):
+        """测试批量结果与逐个调用结果一致"""
+        high, low, close, volume = (a.tolist() for a in random_ohlcv)
+        specs = [
+            {"name": "SMA", "params": {"period": 20}},
+            {"name": "EMA", "params": {"period": 12}, "id": "ema_fast"},
+            {"name": "MACD"},
+            {"name": "RSI", "params": {"period": 14}},
+            {"name": "Bollinger Bands", "params": {"period": 20, "std_dev": 2}},
+            {"name": "ATR", "params": {"period": 14}},
+            {"name": "Stochastic", "params": {"k_period": 14, "d_period": 3}},
+            {"name": "CCI", "params": {"period": 20}},
+            {"name": "Momentum", "params": {"period": 10}},
+            {"name": "VWAP"},
+        ]
+        batch = ta_service.calculate_batch(
+            {"high": high, "low": low, "close": close, "volume": volume}, specs
+        )
+        results = batch["results"]
+        
+        assert results["SMA_20"] == ta_service.calculate_sma(close, 20)
+        assert results["ema_fast"] == ta_service.calculate_ema(close, 12)
+        assert results["MACD"] == ta_service.calculate_macd(close)
+        assert results["RSI_14"] == ta_service.calculate_rsi(close, 14)
+        assert results["BOLLINGER_BANDS_20_2"] == ta_service.calculate_bollinger_bands(close, 20, 2)
+        assert results["ATR_14"] == ta_service.calculate_atr(high, low, close, 14)
+        assert results["STOCHASTIC_14_3"] == ta_service.calculate_stochastic(high, low, close, 14, 3)
+        np.testing.assert_allclose(
+            np.array(results["CCI_20"][19:]), ta_service.calculate_cci(high, low, close, 20)[19:], rtol=1e-12
+        )
+        assert results["MOMENTUM_10"] == ta_service.calculate_momentum(close, 10)
+        assert results["VWAP"] == ta_service.calculate_vwap(high, low, close, volume)
+    
+    @pytest.mark.unit
+    def test_shared_intermediates_are_reused(self, ta_service, random_ohlcv):
+        """测试 MACD 与同周期 EMA、布林带与 SMA 共享中间结果"""
+        close = random_ohlcv[2]
+        batch = ta_service.calculate_batch({"close": close}, [
+            {"name": "EMA", "params": {"period": 12}},
+            {"name": "EMA", "params": {"period": 26}},
+            {"name": "MACD", "params": {"fast_period": 12, "slow_period": 26, "signal_period": 9}},
+            {"name": "SMA", "params": {"period": 20}},
+            {"name": "BOLLINGER", "params": {"period": 20}},
+        ])
+        
+        # EMA12、EMA26、SMA20 和 close 前缀和各被复用一次以上
+        assert batch["graph"]["reused"] >= 4
+        # 节点：close 前缀和、SMA20、STD20、EMA12、EMA26、MACD 线、信号线
+        assert batch["graph"]["nodes"] == 7
+    
+    @pytest.mark.unit
+    def test_batch_rejects_unknown_and_missing_sources(self, ta_service):
+        """测试未知指标与缺少价格序列时报错"""
+        with pytest.raises(ValueError):
+            ta_service.calculate_batch({"close": [1.0, 2.0]}, [{"name": "FOO"}])
+        with pytest.raises(ValueError):
+            ta_service.calculate_batch({"close": [1.0] * 30}, [{"name": "ATR"}])
+        with pytest.raises(ValueError):
+            ta_service.calculate_batch({"close": [1.0, 2.0]}, [{"name": "SMA", "params": {"length": 2}}])
+
+    @pytest.mark.unit
+    def test_batch_rejects_duplicate_result_keys(self, ta_service):
+        """测试结果键重复时报错，指定不同 id 后可正常计算"""
+        sma = {"name": "SMA", "params": {"period": 2}}
+        with pytest.raises(ValueError, match="SMA_2"):
+            ta_service.calculate_batch({"close": [1.0, 2.0, 3.0]}, [sma, dict(sma)])
+        with pytest.raises(ValueError, match="fast"):
+            ta_service.calculate_batch({"close": [1.0, 2.0, 3.0]}, [{**sma, "id": "fast"}, {"name": "EMA", "id": "fast"}])
+
+        batch = ta_service.calculate_batch({"close": [1.0, 2.0, 3.0]}, [sma, {**sma, "id": "sma_copy"}])
+        assert set(batch["results"]) == {"SMA_2", "sma_copy"}
@@ -0,0 +1,174 @@
+"""
+Vectorized Backtest 单元测试
+测试信号前向填充、次根开盘成交与手续费、与 backtesting 同规则实现的一致性，以及按请求选择引擎
+"""
+import numpy as np
+import pytest
+from unittest.mock import patch
+
+from backtesting import Backtest, Strategy
+
+from models.market_data import MarketType, Timeframe
+from services.backtest_strategies import create_strategy, run_sweep_chunk, share_frame
+from services.lean_backtest_service import BacktestRequest, LeanBacktestService
+from services.synthetic_market import SyntheticMarket
+from services.vectorized_backtest import (
+    VECTORIZED_STRATEGIES, backtest_signals, compute_statistics, positions_from_signals,
+    run_vectorized_backtest, simulate
+)
+
+
+def _reference_strategy(strategy_id, parameters):
+    """用相同信号在 backtesting 中逐K线执行：空仓时买入，持仓时平仓"""
+    class Reference(Strategy):
+        def init(self):
+            entries, exits = VECTORIZED_STRATEGIES[strategy_id](np.asarray(self.data.Close), parameters)
+            self.entries = self.I(lambda: entries.astype(float))
+            self.exits = self.I(lambda: exits.astype(float))
+
+        def next(self):
+            if self.entries[-1] and not self.position:
+                self.buy()
+            elif self.exits[-1] and self.position:
+                self.position.close()
+
+    return Reference
+
+
+class TestVectorizedBacktest:
+    """向量化回测引擎测试套件"""
+
+    def test_positions_forward_fill_signals(self):
+        entries = np.array([0, 1, 0, 0, 1, 0, 0], dtype=bool)
+        exits = np.array([1, 0, 0, 1, 0, 0, 1], dtype=bool)
+
+        assert positions_from_signals(entries, exits).tolist() == [0, 1, 1, 0, 1, 1, 0]
+
+    def test_fills_at_next_open_with_commission(self):
+        open_ = np.array([10.0, 10.0, 11.0, 12.0, 13.0])
+        close = np.array([10.0, 11.0, 12.0, 13.0, 14.0])
+        entries = np.array([1, 0, 0, 0, 0], dtype=bool)
+        exits = np.array([0, 0, 1, 0, 0], dtype=bool)
+
+        simulation = simulate(open_, close, entries, exits, 1000.0, commission=0.01)
+
+        # 第1根开盘 10 买入，第3根开盘 12 卖出
+        assert simulation["entry_bars"].tolist() == [1]
+        assert simulation["exit_bars"].tolist() == [3]
+        assert simulation["equity"][1] == pytest.approx(1000 * (11 / 10 - 0.01))
+        after = 1000 * (12 / 10 * 0.99 - 0.01)
+        assert simulation["equity"][3:].tolist() == pytest.approx([after, after])
+        assert simulation["pnl"][0] == pytest.approx(after - 1000)
+
+    def test_open_position_settled_at_last_close(self):
+        open_ = np.array([10.0, 10.0, 11.0])
+        close = np.array([10.0, 11.0, 12.0])
+
+        simulation = simulate(open_, close, np.array([1, 0, 0], dtype=bool), np.zeros(3, dtype=bool), 100.0, 0.0)
+
+        assert simulation["exit_prices"].tolist() == [12.0]
+        assert simulation["equity"][-1] == pytest.approx(120.0)
+
+    @pytest.mark.parametrize("strategy_id, parameters", [
+        ("moving_average_crossover", {"fast_period": 10, "slow_period": 30}),
+        ("rsi_strategy", {}),
+        ("mean_reversion", {"bb_period": 20, "std_dev": 2.0}),
+    ])
+    def test_matches_event_driven_engine(self, strategy_id, parameters):
+        data = SyntheticMarket(seed=5).candles("AAPL", MarketType.STOCK, "yfinance", Timeframe.H1, 3000).to_frame()
+        # 资金足够大，整股取整的影响可以忽略
+        expected = Backtest(data, _reference_strategy(strategy_id, parameters),
+                            cash=1e9, commission=.002, finalize_trades=True).run()
+
+        simulation, statistics = backtest_signals(strategy_id, parameters, data, 1e9)
+
+        trades = expected["_trades"]
+        assert statistics["total_trades"] == len(trades) > 0
+        # backtesting 不处理最后一根K线，未平仓持仓的结算价不同；之前的交易和权益逐根一致
+        assert simulation["entry_bars"].tolist() == trades.EntryBar.tolist()
+        assert simulation["trade_returns"][:-1] == pytest.approx(trades.ReturnPct.to_numpy()[:-1], abs=1e-4)
+        equity = expected["_equity_curve"].Equity.to_numpy()
+        assert simulation["equity"][:-1] == pytest.approx(equity[:-1], rel=1e-3)
+
+    @pytest.mark.parametrize("strategy_id, parameters", [
+        ("moving_average_crossover", {"fast_period": 10, "slow_period": 30}),
+        ("rsi_strategy", {}),
+        ("mean_reversion", {"bb_period": 20, "std_dev": 2.0}),
+    ])
+    def test_strategy_classes_close_positions(self, strategy_id, parameters):
+        """测试 backtesting 策略类在卖出信号时平仓，交易与向量化引擎逐笔对应"""
+        data = SyntheticMarket(seed=5).candles("AAPL", MarketType.STOCK, "yfinance", Timeframe.H1, 3000).to_frame()
+        output = Backtest(data, create_strategy(strategy_id, parameters),
+                          cash=1e9, commission=.002, finalize_trades=True).run()
+
+        simulation, _ = backtest_signals(strategy_id, parameters, data, 1e9)
+
+        trades = output["_trades"]
+        assert len(trades) > 1
+        assert simulation["entry_bars"].tolist() == trades.EntryBar.tolist()
+
+    def test_statistics_match_event_driven_engine(self):
+        data = SyntheticMarket(seed=5).candles("AAPL", MarketType.STOCK, "yfinance", Timeframe.H1, 3000).to_frame()
+        expected = Backtest(data, _reference_strategy("rsi_strategy", {}),
+                            cash=10000, commission=.002, finalize_trades=True).run()
+
+        # 用 backtesting 的权益曲线和交易计算统计指标，口径应一致
+        statistics = compute_statistics(
+            {"equity": expected["_equity_curve"].Equity.to_numpy(),
+             "trade_returns": expected["_trades"].ReturnPct.to_numpy()},
+            data.index, data["Close"].to_numpy()
+        )
+
+        for key, column in [("total_return", "Return [%]"), ("annual_return", "Return (Ann.) [%]"),
+                            ("volatility", "Volatility (Ann.) [%]"), ("sharpe_ratio", "Sharpe Ratio"),
+                            ("max_drawdown", "Max. Drawdown [%]"), ("calmar_ratio", "Calmar Ratio"),
+                            ("win_rate", "Win Rate [%]"), ("profit_factor", "Profit Factor"), ("beta", "Beta")]:
+            assert statistics[key] == pytest.approx(expected[column], rel=1e-6), key
+
+    def test_result_has_backtest_shape(self):
+        data = SyntheticMarket(seed=2).candles("AAPL", MarketType.STOCK, "yfinance", Timeframe.D1, 600).to_frame()
+
+        output = run_vectorized_backtest("rsi_strategy", {}, data, 10000)
+
+        assert set(output) == {"statistics", "equity_curve", "trades"}
+        assert 0 < len(output["equity_curve"]) <= 101
+        assert output["equity_curve"][0]["return"] == 0
+        assert set(output["trades"][0]) == {
+            "id", "date", "direction", "quantity", "entry_price", "exit_price", "profit_loss", "return_pct"
+        }
+
+    def test_sweep_chunk_uses_vectorized_engine(self):
+        data = SyntheticMarket(seed=2).candles("AAPL", MarketType.STOCK, "yfinance", Timeframe.D1, 400).to_frame()
+        combinations = [{"fast_period": 5, "slow_period": 20}, {"fast_period": 5, "slow_period": 40}]
+        shm, spec = share_frame(data)
+        try:
+            rows = run_sweep_chunk(spec, "moving_average_crossover", combinations, 10000, "vectorized")
+        finally:
+            shm.close()
+            shm.unlink()
+
+        for row, parameters in zip(rows, combinations):
+            _, expected = backtest_signals("moving_average_crossover", parameters, data, 10000)
+            assert row["statistics"] == pytest.approx(expected)
+
+
+class TestEngineSelection:
+    """按请求选择回测引擎测试"""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("strategy_id, vectorized", [("mean_reversion", True), ("custom_strategy", False)])
+    async def test_vectorized_engine_with_fallback(self, data, executor, strategy_id, vectorized):
+        service = LeanBacktestService()
+        request = BacktestRequest(strategy_id=strategy_id, strategy_code="", symbol="AAPL",
+                                  start_date="2023-01-01", end_date="2024-01-01", engine="vectorized")
+
+        with patch("services.lean_backtest_service.backtest_executor", executor), \
+             patch.object(service, "_load_historical_data", return_value=data):
+            backtest_id = await service.start_backtest(request)
+            await service._tasks[backtest_id]
+
+        result = await service.get_backtest_status(backtest_id)
+        assert result.status == "completed"
+        assert "sharpe_ratio" in result.statistics
+        assert any(log.startswith("向量化引擎运行策略") for log in result.logs) is vectorized
+        assert any("改用 backtesting 引擎" in log for log in result.logs) is not vectorized
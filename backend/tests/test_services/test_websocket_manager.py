@@ -5,7 +5,7 @@ WebSocket Manager 单元测试
 import pytest
 import asyncio
 from unittest.mock import Mock, AsyncMock, patch
-from services.websocket_manager import WebSocketManager
+from services.websocket_manager import ASGIConnection, WebSocketManager
 
 
 @pytest.fixture
@@ -227,3 +227,204 @@ class TestWebSocketManager:
         # 实际 API 通过 subscriptions[symbol] 访问订阅者
         subscribers = ws_manager.subscriptions.get(symbol, set())
         assert len(subscribers) == 5
+
+
+class TestWebSocketFanOut:
+    """广播编码一次、待发送队列及慢消费者策略测试"""
+    
+    @pytest.mark.asyncio
+    async def test_message_encoded_once_and_slow_client_isolated(self, ws_manager):
+        """测试消息只编码一次，慢连接不阻塞其他连接"""
+        import json
+        slow_release = asyncio.Event()
+        
+        async def slow_send(payload):
+            await slow_release.wait()
+        
+        slow = Mock()
+        slow.send = AsyncMock(side_effect=slow_send)
+        fast = [Mock() for _ in range(20)]
+        for ws in fast:
+            ws.send = AsyncMock()
+        for ws in [slow] + fast:
+            await ws_manager.register(ws)
+            await ws_manager.subscribe(ws, "BTC/USDT")
+        
+        message = {"symbol": "BTC/USDT", "price": 50000}
+        with patch('services.websocket_manager.json.dumps', wraps=json.dumps) as dumps:
+            await asyncio.wait_for(ws_manager.broadcast_to_subscribers("BTC/USDT", message), 1)
+            await asyncio.wait_for(ws_manager.broadcast_to_subscribers("BTC/USDT", message), 1)
+        
+        assert dumps.call_count == 2
+        for ws in fast:
+            assert ws.send.await_count == 2
+        assert slow.send.await_count == 1
+        assert len(ws_manager.connections[slow].outbox) == 1
+        slow_release.set()
+    
+    def test_outbound_queue_policies(self):
+        """测试队列满时丢弃最早消息、按品种合并和断开连接三种策略"""
+        from services.websocket_manager import OutboundQueue
+        
+        drop = OutboundQueue(maxsize=2, policy="drop_oldest")
+        for payload in ["a1", "a2", "a3"]:
+            assert drop.put(payload, key="A")
+        assert [item[1] for item in drop.items] == ["a2", "a3"]
+        assert drop.dropped == 1
+        
+        conflate = OutboundQueue(maxsize=2, policy="conflate")
+        conflate.put("btc1", key="BTC")
+        conflate.put("eth1", key="ETH")
+        conflate.put("btc2", key="BTC")
+        assert [item[1] for item in conflate.items] == ["btc2", "eth1"]
+        assert conflate.conflated == 1
+        
+        disconnect = OutboundQueue(maxsize=1, policy="disconnect")
+        assert disconnect.put("x")
+        assert disconnect.put("y") is False
+    
+    @pytest.mark.asyncio
+    async def test_disconnect_policy_closes_slow_consumer(self, ws_manager):
+        """测试 disconnect 策略下队列溢出的连接被断开"""
+        ws_manager.send_queue_size = 1
+        ws_manager.slow_consumer_policy = "disconnect"
+        blocked = asyncio.Event()
+        
+        async def blocked_send(payload):
+            await blocked.wait()
+        
+        slow = Mock()
+        slow.send = AsyncMock(side_effect=blocked_send)
+        slow.close = AsyncMock()
+        await ws_manager.register(slow)
+        
+        for i in range(3):
+            await ws_manager.broadcast_to_all({"seq": i})
+        
+        assert slow not in ws_manager.connections
+        slow.close.assert_awaited_once()
+        assert ws_manager.get_stats()["slow_disconnects"] == 1
+
+    @pytest.mark.asyncio
+    async def test_tick_conflation_sends_subscribed_deltas(self, ws_manager):
+        """测试合并推送：每个连接一帧，只含订阅品种和变化的字段，状态相同的连接共享编码"""
+        import json
+        clients = [Mock() for _ in range(3)]
+        for ws in clients:
+            ws.send = AsyncMock()
+            await ws_manager.register(ws)
+        for ws in clients[:2]:
+            await ws_manager.subscribe(ws, "BTC/USDT")
+            await ws_manager.subscribe(ws, "ETH/USDT")
+        await ws_manager.subscribe(clients[2], "ETH/USDT")
+        conflator = ws_manager.tick_conflator
+        
+        # 同一品种多次更新只推送最新状态
+        conflator.latest = {}
+        for price in (100, 101, 102):
+            conflator.latest["BTC/USDT"] = {"price": price, "volume": 5}
+        conflator.latest["ETH/USDT"] = {"price": 10, "volume": 7}
+        conflator.dirty = {"BTC/USDT", "ETH/USDT"}
+        await conflator.flush()
+        await asyncio.sleep(0)
+        
+        first = json.loads(clients[0].send.await_args.args[0])
+        assert first["type"] == "price_batch"
+        assert first["data"] == {"BTC/USDT": {"price": 102, "volume": 5}, "ETH/USDT": {"price": 10, "volume": 7}}
+        assert json.loads(clients[2].send.await_args.args[0])["data"] == {"ETH/USDT": {"price": 10, "volume": 7}}
+        assert conflator.encodings == 2
+        
+        # 只发送变化的字段；没有变化的连接不发送
+        conflator.latest["BTC/USDT"] = {"price": 103, "volume": 5}
+        conflator.dirty = {"BTC/USDT"}
+        await conflator.flush()
+        await asyncio.sleep(0)
+        
+        assert json.loads(clients[1].send.await_args.args[0])["data"] == {"BTC/USDT": {"price": 103}}
+        assert clients[2].send.await_count == 1
+        assert conflator.frames == 5
+    
+    @pytest.mark.asyncio
+    async def test_dropped_tick_frame_is_resent(self, ws_manager):
+        """测试被丢弃的增量帧中的品种会在下一次推送中补发"""
+        ws_manager.send_queue_size = 1
+        release = asyncio.Event()
+        
+        async def blocked_send(payload):
+            await release.wait()
+        
+        ws = Mock()
+        ws.send = AsyncMock(side_effect=blocked_send)
+        await ws_manager.register(ws)
+        await ws_manager.send_message(ws, {"type": "hello"})
+        await asyncio.sleep(0)  # 写任务卡在第一条消息上
+        await ws_manager.subscribe(ws, "BTC/USDT")
+        conflator = ws_manager.tick_conflator
+        
+        conflator.latest = {"BTC/USDT": {"price": 1}}
+        conflator.dirty = {"BTC/USDT"}
+        await conflator.flush()
+        await ws_manager.broadcast_to_all({"type": "notice"})  # 队列已满，丢弃行情帧
+        
+        assert conflator.dirty == {"BTC/USDT"}
+
+    @pytest.mark.asyncio
+    async def test_msgpack_request_falls_back_to_json(self, ws_manager, monkeypatch):
+        """测试 msgpack 未安装时订阅请求的二进制格式回退为 JSON"""
+        import json
+        from services import wire_format
+        monkeypatch.setattr(wire_format, "msgpack", None)
+        ws = Mock()
+        ws.send = AsyncMock()
+        await ws_manager.register(ws)
+        
+        await ws_manager.handle_message(ws, json.dumps({"type": "subscribe", "symbol": "BTC/USDT", "format": "msgpack"}))
+        await asyncio.sleep(0)
+        
+        assert ws_manager.connections[ws].wire_format == "json"
+        reply = json.loads(ws.send.await_args.args[0])
+        assert reply["type"] == "subscribed" and reply["format"] == "json"
+    
+    @pytest.mark.asyncio
+    async def test_msgpack_subscribers_receive_binary_frames(self, ws_manager):
+        """测试同一广播按连接格式各编码一次：JSON 连接收文本帧，msgpack 连接收二进制帧"""
+        import json
+        msgpack = pytest.importorskip("msgpack")
+        clients = [Mock() for _ in range(3)]
+        for ws in clients:
+            ws.send = AsyncMock()
+            await ws_manager.register(ws)
+            await ws_manager.subscribe(ws, "BTC/USDT")
+        for ws in clients[1:]:
+            assert ws_manager.set_wire_format(ws, "msgpack") == "msgpack"
+        
+        message = {"type": "price_update", "symbol": "BTC/USDT", "price": 100.5}
+        await ws_manager.broadcast_to_subscribers("BTC/USDT", message)
+        await asyncio.sleep(0)
+        
+        assert json.loads(clients[0].send.await_args.args[0]) == message
+        binary = clients[1].send.await_args.args[0]
+        assert isinstance(binary, bytes)
+        assert clients[2].send.await_args.args[0] is binary
+        assert msgpack.unpackb(binary) == message
+
+    @pytest.mark.asyncio
+    async def test_asgi_connection_sends_binary_frames(self, ws_manager, mock_websocket):
+        """测试 FastAPI 连接收到原始二进制帧后按 MessagePack 解码，回复以 send_bytes 发出"""
+        msgpack = pytest.importorskip("msgpack")
+        mock_websocket.send_bytes = AsyncMock()
+        connection = ASGIConnection(mock_websocket)
+        await ws_manager.register(connection)
+        
+        await ws_manager.handle_message(connection, msgpack.packb({"type": "subscribe", "symbol": "BTC/USDT",
+                                                                   "format": "msgpack"}))
+        await asyncio.sleep(0)
+        
+        reply = msgpack.unpackb(mock_websocket.send_bytes.await_args.args[0])
+        assert reply["type"] == "subscribed" and reply["format"] == "msgpack"
+        assert not mock_websocket.send_text.called
+        
+        ws_manager.set_wire_format(connection, "json")
+        await ws_manager.handle_message(connection, '{"type": "ping"}')
+        await asyncio.sleep(0)
+        assert '"pong"' in mock_websocket.send_text.await_args.args[0]
@@ -0,0 +1,46 @@
+"""
+Wire Format 单元测试
+测试 Accept 头协商、K线列式编码和 MessagePack 可选依赖的回退
+"""
+import numpy as np
+import pytest
+
+from services import wire_format
+
+
+class TestWireFormat:
+    """传输格式测试套件"""
+
+    def test_accept_negotiation(self, monkeypatch, caplog):
+        monkeypatch.setattr(wire_format, "msgpack", object())
+        assert wire_format.wants_msgpack("application/x-msgpack")
+        assert wire_format.wants_msgpack("application/json;q=0.5, application/msgpack")
+        assert not wire_format.wants_msgpack("application/json, application/x-msgpack;q=0.8")
+        assert not wire_format.wants_msgpack("*/*")
+        assert not wire_format.wants_msgpack(None)
+        assert wire_format.negotiate_format("MSGPACK") == "msgpack"
+
+        monkeypatch.setattr(wire_format, "msgpack", None)
+        assert not wire_format.wants_msgpack("application/x-msgpack")
+        assert wire_format.negotiate_format("msgpack") == "json"
+        assert sum("msgpack 未安装" in r.getMessage() for r in caplog.records) == 2
+
+    def test_candle_columns_are_typed_arrays(self, candle_series):
+        series = candle_series(4, base_ms=1_700_000_000_000)
+        payload = series.to_columns()
+
+        assert payload["length"] == 4 and payload["timeframe"] == "1m"
+        timestamps = np.frombuffer(payload["columns"]["timestamp"], dtype=payload["dtypes"]["timestamp"])
+        closes = np.frombuffer(payload["columns"]["close"], dtype=payload["dtypes"]["close"])
+        np.testing.assert_array_equal(timestamps, series.timestamp)
+        np.testing.assert_array_equal(closes, series.close)
+
+    def test_msgpack_round_trip(self, candle_series):
+        msgpack = pytest.importorskip("msgpack")
+        series = candle_series(3, base_ms=1_700_000_000_000)
+
+        decoded = msgpack.unpackb(wire_format.packb(series.to_columns()))
+
+        volume = np.frombuffer(decoded["columns"]["volume"], dtype="<f8")
+        np.testing.assert_array_equal(volume, series.volume)
+        assert wire_format.decode_message(wire_format.encode_message({"type": "ping"}, "msgpack")) == {"type": "ping"}